@@ -0,0 +1 @@
+"""Local benchmarks spanning both services"""
@@ -0,0 +1,504 @@
+"""
+Load Test Suite
+Seeds the user service, starts both Django services locally and drives their endpoints
+
+Usage (from the repository root):
+    python -m benchmarks.load_suite
+    python -m benchmarks.load_suite --users 5000 --requests 1000 --concurrency 1,16,64 --output results/main.json
+    python -m benchmarks.load_suite --output results/branch.json --compare results/main.json
+    python -m benchmarks.load_suite --database postgres --redis local --workers 4
+
+The user service database is migrated and seeded with --users users and
+--vehicles vehicles (benchmarks/load_seed.py in django_user_service),
+then both services run under gunicorn on free local ports, the gateway
+proxying to the user service. Each scenario (registration, login, the
+user list, /api/users/me/, the vehicle list and a vehicle) is driven
+with --requests requests at every --concurrency, straight at the user
+service and through the gateway's proxy.
+
+Every request asks for the services' Server-Timing breakdown, so each
+result row carries the user service's SQL queries and database time per
+request next to RPS and p50/p95/p99 latency. Rows and the run's
+configuration are written as JSON by --output; --compare reads an
+earlier file and exits non-zero when a row lost more than --tolerance
+percent of its RPS, gained as much p95 latency, or runs more queries.
+
+Runs are reproducible: the database is reseeded every run, and the users,
+pages and vehicles each request uses come from a generator seeded with
+--seed. The default SQLite file and fakeredis (pip install fakeredis;
+in-process, so one worker per service) need nothing running locally.
+--database postgres uses DB_NAME etc. and --redis local REDIS_HOST/PORT,
+as the services' own settings do. The client runs in this process, so
+at high concurrency its own GIL shows in the latencies: compare runs
+made on the same machine with the same options.
+"""
+
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_SERVICE_DIR = os.path.join(ROOT, 'django_user_service')
+GATEWAY_DIR = os.path.join(ROOT, 'django_api_gateway')
+
+SCENARIOS = ('register', 'login', 'users_list', 'me', 'vehicles', 'vehicle_detail')
+TARGETS = ('direct', 'gateway')
+
+# Server-Timing entry: name, then ;dur= and ;desc= parameters
+TIMING_ENTRY = re.compile(r'\s*([\w-]+)((?:\s*;\s*\w+=(?:"[^"]*"|[^,;]*))*)')
+TIMING_PARAM = re.compile(r';\s*(\w+)=("[^"]*"|[^,;]*)')
+QUERY_COUNT = re.compile(r'(\d+) queries')
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def parse_server_timing(header):
+    """{name: {'dur': ms, 'desc': text}} from a Server-Timing header"""
+    entries = {}
+    for match in TIMING_ENTRY.finditer(header or ''):
+        params = {name: value.strip('"') for name, value in TIMING_PARAM.findall(match.group(2))}
+        entries[match.group(1)] = params
+    return entries
+
+
+class Service:
+    """One Django project served by gunicorn in a child process"""
+
+    def __init__(self, name, directory, application, env, log_dir):
+        self.name = name
+        self.directory = directory
+        self.application = application
+        self.env = env
+        self.port = free_port()
+        self.log_path = os.path.join(log_dir, f'{name}.log')
+        self.process = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self, workers, threads, worker_class='gthread'):
+        command = [
+            sys.executable, '-m', 'gunicorn',
+            '--bind', f'127.0.0.1:{self.port}',
+            '--workers', str(workers),
+            '--worker-class', worker_class,
+            '--log-level', 'warning',
+        ]
+        if worker_class == 'gthread':
+            command += ['--threads', str(threads)]
+        command.append(self.application)
+
+        with open(self.log_path, 'ab') as log:
+            # WEB_CONCURRENCY too, so the password hashing pool splits the CPUs
+            env = dict(self.env, WEB_CONCURRENCY=str(workers))
+            self.process = subprocess.Popen(
+                command, cwd=self.directory, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+        self.wait_until_ready()
+
+    def wait_until_ready(self, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if requests.get(f'{self.url}/api/health/', timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise SystemExit(f"{self.name} did not become healthy, see {self.log_path}:\n{self.log_tail()}")
+
+    def log_tail(self, lines=30):
+        try:
+            with open(self.log_path, errors='replace') as log:
+                return ''.join(log.readlines()[-lines:])
+        except OSError:
+            return ''
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def run_django(directory, env, *args):
+    """Run a module of one project; returns its stdout"""
+    completed = subprocess.run(
+        [sys.executable, *args], cwd=directory, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"{' '.join(args)} failed in {directory}:\n{completed.stderr[-3000:]}")
+    return completed.stdout
+
+
+class Client:
+    """Keep-alive HTTP client, one session per thread"""
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, spec):
+        """Send one (method, url, body, token); returns a sample dict"""
+        method, url, body, token = spec
+        headers = {'X-Debug-Metrics': '1'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        started = time.perf_counter()
+        try:
+            response = self.session().request(method, url, json=body, headers=headers, timeout=self.timeout)
+            # Read the whole body, streamed or not
+            response.content
+            status = response.status_code
+            timing = parse_server_timing(response.headers.get('Server-Timing'))
+            cache_state = response.headers.get('X-Cache')
+        except requests.RequestException:
+            status, timing, cache_state = 0, {}, None
+        return {
+            'seconds': time.perf_counter() - started,
+            'status': status,
+            'timing': timing,
+            'cache': cache_state,
+        }
+
+
+def login(client, base_url, email, password):
+    url = f'{base_url}api/auth/login/'
+    response = client.session().post(url, json={'username': email, 'password': password}, timeout=60)
+    if response.status_code != 200:
+        raise SystemExit(f"Could not log in {email}: {response.status_code} {response.text[:200]}")
+    return response.json()['access']
+
+
+class Workload:
+    """Builds each scenario's requests from the seeded data and a seeded generator"""
+
+    def __init__(self, fixture, tokens, admin_token, seed):
+        self.fixture = fixture
+        self.tokens = tokens
+        self.admin_token = admin_token
+        self.rng = random.Random(seed)
+        self.registrations = 0
+        self.owned = [(vehicle_id, owner) for vehicle_id, owner in fixture['vehicles'] if owner in tokens]
+        self.pages = max(1, fixture['users'] // 20)
+
+    def email(self, index):
+        return self.fixture['user_email'].format(index)
+
+    def requests(self, scenario, base_url, total):
+        password = self.fixture['password']
+        owners = sorted(self.tokens)
+        specs = []
+        for _ in range(total):
+            if scenario == 'register':
+                self.registrations += 1
+                email = f'register{self.registrations}@bench.dz'
+                specs.append(('POST', f'{base_url}api/auth/register/', {
+                    'email': email, 'password': password, 'password_confirm': password,
+                    'first_name': 'Load', 'last_name': 'Register',
+                }, None))
+            elif scenario == 'login':
+                email = self.email(self.rng.randrange(self.fixture['users']))
+                specs.append(('POST', f'{base_url}api/auth/login/', {'username': email, 'password': password}, None))
+            elif scenario == 'users_list':
+                page = self.rng.randint(1, self.pages)
+                specs.append(('GET', f'{base_url}api/users/list/?page={page}', None, self.admin_token))
+            elif scenario == 'me':
+                specs.append(('GET', f'{base_url}api/users/me/', None, self.tokens[self.rng.choice(owners)]))
+            elif scenario == 'vehicles':
+                specs.append(('GET', f'{base_url}api/vehicles/', None, self.tokens[self.rng.choice(owners)]))
+            elif scenario == 'vehicle_detail':
+                vehicle_id, owner = self.rng.choice(self.owned)
+                specs.append(('GET', f'{base_url}api/vehicles/{vehicle_id}/', None, self.tokens[owner]))
+        return specs
+
+
+def expected_status(scenario):
+    return 201 if scenario == 'register' else 200
+
+
+def summarize(target, scenario, concurrency, samples, elapsed):
+    """One result row"""
+    latencies = [sample['seconds'] for sample in samples]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+
+    queries = []
+    db_ms = []
+    upstream_ms = [
+        float(sample['timing']['gateway-upstream'].get('dur', 0))
+        for sample in samples if 'gateway-upstream' in sample['timing']
+    ]
+    for sample in samples:
+        db = sample['timing'].get('db')
+        if db is None:
+            continue
+        found = QUERY_COUNT.search(db.get('desc', ''))
+        if found:
+            queries.append(int(found.group(1)))
+        db_ms.append(float(db.get('dur', 0)))
+
+    return {
+        'target': target,
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'ok': statuses.get(str(expected_status(scenario)), 0),
+        'statuses': statuses,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        # Upstream queries, measured by the user service for both targets
+        'queries_per_request': round(statistics.mean(queries), 2) if queries else None,
+        'db_ms_per_request': round(statistics.mean(db_ms), 3) if db_ms else None,
+        # Time the gateway waited on the user service
+        'upstream_ms_per_request': round(statistics.mean(upstream_ms), 3) if upstream_ms else None,
+        'cache_hits': sum(1 for sample in samples if sample['cache'] in ('HIT', 'STALE')),
+    }
+
+
+def drive(client, specs, concurrency):
+    """Send specs from concurrency threads; returns (samples, seconds)"""
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        samples = list(executor.map(client.send, specs))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{revision}-dirty' if dirty else revision
+
+
+# Options that change what a run measures
+COMPARED_OPTIONS = ('users', 'vehicles', 'requests', 'seed', 'database', 'redis', 'workers', 'threads', 'gateway_mode')
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a baseline run; returns the regressed rows"""
+    rows = results['results']
+    before = {(row['target'], row['scenario'], row['concurrency']): row for row in baseline['results']}
+    print(f"\ncompared with {baseline['meta'].get('revision')} ({baseline['meta'].get('started_at')})")
+
+    options, old_options = results['meta']['options'], baseline['meta'].get('options', {})
+    differing = [name for name in COMPARED_OPTIONS if options.get(name) != old_options.get(name)]
+    if differing:
+        print("options differ, so will the numbers: " + ', '.join(
+            f"{name} {old_options.get(name)}->{options.get(name)}" for name in differing
+        ))
+    if not any(key in before for key in ((row['target'], row['scenario'], row['concurrency']) for row in rows)):
+        print("no rows in common")
+        return []
+
+    header = (f"{'target':<8} {'scenario':<15} {'conc':>4} {'rps':>9} {'change':>8} "
+              f"{'p95_ms':>8} {'change':>8} {'queries':>9}")
+    print(header)
+    print('-' * len(header))
+
+    regressions = []
+    for row in rows:
+        old = before.get((row['target'], row['scenario'], row['concurrency']))
+        if old is None:
+            continue
+        rps_change = (row['rps'] - old['rps']) / old['rps'] * 100 if old['rps'] else 0.0
+        p95_change = (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        queries = f"{old['queries_per_request']}->{row['queries_per_request']}"
+        regressed = (
+            rps_change < -tolerance
+            or p95_change > tolerance
+            or (row['queries_per_request'] or 0) > (old['queries_per_request'] or 0)
+        )
+        if regressed:
+            regressions.append(row)
+        print(f"{row['target']:<8} {row['scenario']:<15} {row['concurrency']:>4} {row['rps']:>9} "
+              f"{rps_change:>+7.1f}% {row['p95_ms']:>8} {p95_change:>+7.1f}% {queries:>9}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test both services')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--vehicles', type=int, default=300)
+    parser.add_argument('--requests', type=int, default=300, help='per scenario, target and concurrency')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests before each run')
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--targets', default=','.join(TARGETS))
+    parser.add_argument('--token-users', type=int, default=50, help='vehicle owners logged in for the GETs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database', choices=['sqlite', 'postgres'], default='sqlite')
+    parser.add_argument('--redis', choices=['fake', 'local', 'none'], default='fake')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers per service')
+    parser.add_argument('--threads', type=int, default=32, help='threads per gunicorn worker')
+    parser.add_argument('--gateway-mode', choices=['sync', 'async'], default='sync')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='results JSON of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=10.0, help='percent')
+    args = parser.parse_args(argv)
+
+    redis = args.redis
+    if redis == 'fake' and importlib.util.find_spec('fakeredis') is None:
+        print("fakeredis is not installed, using local memory caches (pip install fakeredis)")
+        redis = 'none'
+    if redis in ('fake', 'none') and args.workers > 1:
+        print(f"Caches with --redis {redis} are per worker: profile and role invalidation "
+              f"will not reach the other {args.workers - 1} workers")
+
+    work_dir = tempfile.mkdtemp(prefix='load-suite-')
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='benchmarks.load_settings',
+        LOAD_DIR=work_dir,
+        LOAD_DATABASE=args.database,
+        LOAD_REDIS=redis,
+        PYTHONDONTWRITEBYTECODE='1',
+    )
+
+    print(f"seeding {args.users} users and {args.vehicles} vehicles ({args.database})")
+    fixture = json.loads(run_django(
+        USER_SERVICE_DIR, env, '-m', 'benchmarks.load_seed',
+        '--users', str(args.users), '--vehicles', str(args.vehicles),
+    ).strip().splitlines()[-1])
+    run_django(GATEWAY_DIR, env, 'manage.py', 'migrate', '--skip-checks', '--verbosity', '0')
+
+    user_service = Service('user_service', USER_SERVICE_DIR, 'user_service.wsgi:application', env, work_dir)
+    gateway_env = dict(env, USER_SERVICE_URL=user_service.url, GATEWAY_PROXY_MODE=args.gateway_mode)
+    gateway_env.pop('USER_SERVICE_URLS', None)
+    if args.gateway_mode == 'async':
+        gateway = Service('gateway', GATEWAY_DIR, 'gateway_service.asgi:application', gateway_env, work_dir)
+        gateway_class = 'uvicorn.workers.UvicornWorker'
+    else:
+        gateway = Service('gateway', GATEWAY_DIR, 'gateway_service.wsgi:application', gateway_env, work_dir)
+        gateway_class = 'gthread'
+
+    bases = {
+        'direct': f'{user_service.url}/',
+        'gateway': f'{gateway.url}/api/user/',
+    }
+    concurrencies = [int(value) for value in args.concurrency.split(',')]
+    scenarios = args.scenarios.split(',')
+    targets = args.targets.split(',')
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+
+    rows = []
+    client = Client()
+    try:
+        user_service.start(args.workers, args.threads)
+        gateway.start(args.workers, args.threads, gateway_class)
+
+        rng = random.Random(args.seed)
+        owners = sorted({owner for _, owner in fixture['vehicles']})
+        sampled = sorted(rng.sample(owners, min(args.token_users, len(owners))))
+        tokens = {owner: login(client, bases['direct'], fixture['user_email'].format(owner), fixture['password'])
+                  for owner in sampled}
+        admin_token = login(client, bases['direct'], fixture['admin_email'], fixture['password'])
+        workload = Workload(fixture, tokens, admin_token, args.seed)
+
+        header = (f"{'target':<8} {'scenario':<15} {'conc':>4} {'ok':>6} {'rps':>9} "
+                  f"{'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'queries':>7}")
+        print(header)
+        print('-' * len(header))
+        for target in targets:
+            for scenario in scenarios:
+                for concurrency in concurrencies:
+                    drive(client, workload.requests(scenario, bases[target], args.warmup), concurrency)
+                    specs = workload.requests(scenario, bases[target], args.requests)
+                    samples, elapsed = drive(client, specs, concurrency)
+                    row = summarize(target, scenario, concurrency, samples, elapsed)
+                    rows.append(row)
+                    queries = '-' if row['queries_per_request'] is None else row['queries_per_request']
+                    print(f"{target:<8} {scenario:<15} {concurrency:>4} {row['ok']:>6} {row['rps']:>9} "
+                          f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {queries:>7}")
+    finally:
+        gateway.stop()
+        user_service.stop()
+
+    options = vars(args).copy()
+    options.pop('output')
+    options.pop('compare')
+    options['redis'] = redis
+    results = {
+        'meta': {
+            'started_at': started_at,
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'options': options,
+        },
+        'results': rows,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as stream:
+            json.dump(results, stream, indent=2)
+        print(f"results written to {args.output}")
+
+    failed = [row for row in rows if row['ok'] < row['requests']]
+    for row in failed:
+        print(f"{row['target']} {row['scenario']} at {row['concurrency']}: statuses {row['statuses']}")
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as stream:
+            regressions = compare(results, json.load(stream), args.tolerance)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1 @@
+"""Local benchmarks for the API Gateway"""
@@ -0,0 +1,123 @@
+"""
+Load Balancer Harness
+Runs the proxy against several stub instances with different latencies,
+kills one part-way through and reports how each strategy spread the load
+
+Usage:
+    python -m benchmarks.balancer_harness --requests 3000 --concurrency 50 --delays 5,20,80
+
+The circuit breaker is disabled so the numbers show the balancer alone:
+ejection of the killed instance, and the latency bias of each strategy.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.proxy_throughput import percentile
+
+
+def run_strategy(strategy, urls, total, concurrency, kill_after, victim):
+    """Proxy `total` requests with one strategy, stopping `victim` midway"""
+    from django.test import RequestFactory, override_settings
+    from gateway_service import balancer as balancer_module
+    from gateway_service.views import ServiceProxyView
+
+    load_balancer = dict(balancer_module.get_balancer_settings(), STRATEGY=strategy)
+    factory = RequestFactory()
+    view = ServiceProxyView.as_view()
+    path = 'api/health/'
+
+    def one(index):
+        if index == kill_after:
+            victim.terminate()
+        request = factory.get(f'/api/user/{path}')
+        started = time.perf_counter()
+        response = view(request, service_name='user', path=path)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+            response.close()
+        else:
+            response.render()
+        return time.perf_counter() - started, response.status_code
+
+    with override_settings(USER_SERVICE_URLS=urls, GATEWAY_LOAD_BALANCER=load_balancer):
+        balancer_module._balancers.clear()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+        snapshot = balancer_module.get_balancer('user', urls).snapshot()
+
+    latencies = [r[0] for r in results]
+    statuses = Counter(r[1] for r in results)
+    return {
+        'strategy': strategy,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'ok': statuses.get(200, 0),
+        'errors': total - statuses.get(200, 0),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'instances': snapshot['instances'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load balancing strategy comparison')
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--delays', default='5,20,80', help='stub latency per instance, in ms')
+    parser.add_argument('--kill', type=int, default=0, help='index of the instance to stop midway')
+    parser.add_argument('--base-port', type=int, default=8911)
+    parser.add_argument('--strategies', default='round_robin,least_outstanding,ewma')
+    args = parser.parse_args(argv)
+
+    from benchmarks.stub_upstream import start_in_background
+
+    delays = [float(delay) for delay in args.delays.split(',')]
+    ports = [args.base_port + index for index in range(len(delays))]
+    urls = [f'http://127.0.0.1:{port}' for port in ports]
+
+    os.environ['USER_SERVICE_URLS'] = ','.join(urls)
+    os.environ.setdefault('UPSTREAM_POOL_MAX_PER_HOST', str(args.concurrency))
+    os.environ.setdefault('UPSTREAM_CONNECT_TIMEOUT', '0.5')
+    os.environ.setdefault('CIRCUIT_BREAKER_ENABLED', 'False')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    rows = []
+    for strategy in args.strategies.split(','):
+        stubs = [start_in_background(port, delay) for port, delay in zip(ports, delays)]
+        try:
+            rows.append(run_strategy(
+                strategy, urls, args.requests, args.concurrency,
+                kill_after=args.requests // 3, victim=stubs[args.kill],
+            ))
+        finally:
+            for stub in stubs:
+                stub.terminate()
+                stub.join()
+
+    for row in rows:
+        print(
+            f"{row['strategy']}: {row['rps']} rps, ok={row['ok']} errors={row['errors']} "
+            f"p50={row['p50_ms']}ms p99={row['p99_ms']}ms"
+        )
+        for instance, delay in zip(row['instances'], delays):
+            print(
+                f"    {instance['url']} ({delay:g} ms): requests={instance['requests']} "
+                f"failures={instance['failures']} ejected={instance['ejected']} "
+                f"ewma_ms={instance['ewma_ms']}"
+            )
+    return rows
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,51 @@
+"""
+Load Test Settings
+Gateway settings for the load suite: SQLite, fake or local Redis, no rate limits
+
+Set by benchmarks/load_suite.py at the repository root:
+    LOAD_DIR          directory for the SQLite database
+    LOAD_REDIS        fake (fakeredis, in process), local (REDIS_* as in
+                      gateway_service.settings) or none (local memory cache)
+    USER_SERVICE_URL  the user service started by the suite
+"""
+
+import os
+import tempfile
+
+from benchmarks.settings import *  # noqa: F401,F403
+from gateway_service import settings as gateway_settings
+
+LOAD_DIR = os.environ.get('LOAD_DIR', tempfile.gettempdir())
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(LOAD_DIR, 'gateway.sqlite3'),
+    }
+}
+
+LOAD_REDIS = os.environ.get('LOAD_REDIS', 'fake')
+if LOAD_REDIS == 'local':
+    CACHES = gateway_settings.CACHES
+elif LOAD_REDIS == 'fake':
+    import fakeredis
+
+    # Every connection of a worker reaches the same in-process server
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://fakeredis:6379/2',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'CONNECTION_POOL_KWARGS': {
+                    'connection_class': fakeredis.FakeConnection,
+                },
+            },
+        }
+    }
+
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+DEBUG = False
+
+# Gateway timings follow the user service's in each response
+METRICS = dict(METRICS, SERVER_TIMING=True)  # noqa: F405
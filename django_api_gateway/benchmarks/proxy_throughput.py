@@ -0,0 +1,149 @@
+"""
+Proxy Throughput Benchmark
+Compares the sync (DRF) and async (ASGI) proxy paths against a stub upstream
+
+Usage:
+    python -m benchmarks.proxy_throughput --requests 2000 --concurrency 200 --delay-ms 20
+
+The sync path runs on a thread pool sized to the concurrency (one thread
+per in-flight request, like threaded WSGI workers); the async path runs
+every request as a task on a single event loop.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(mode, latencies, statuses, elapsed):
+    """Build a result row for one benchmark run"""
+    ok = sum(1 for code in statuses if code == 200)
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'ok': ok,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def run_sync(total, concurrency, path):
+    """Drive ServiceProxyView from a thread pool"""
+    from django.test import RequestFactory
+    from gateway_service.views import ServiceProxyView
+
+    factory = RequestFactory()
+    view = ServiceProxyView.as_view()
+
+    def one(_):
+        request = factory.get(f'/api/user/{path}')
+        started = time.perf_counter()
+        response = view(request, service_name='user', path=path)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+            response.close()
+        else:
+            response.render()
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    return summarize('sync', [r[0] for r in results], [r[1] for r in results], elapsed)
+
+
+def run_async(total, concurrency, path):
+    """Drive AsyncServiceProxyView from a single event loop"""
+    from django.test import AsyncRequestFactory
+    from gateway_service.upstream import get_async_upstream_pool
+    from gateway_service.views import AsyncServiceProxyView
+
+    factory = AsyncRequestFactory()
+    view = AsyncServiceProxyView.as_view()
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                request = factory.get(f'/api/user/{path}')
+                started = time.perf_counter()
+                response = await view(request, service_name='user', path=path)
+                if response.streaming:
+                    async for _ in response.streaming_content:
+                        pass
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        await get_async_upstream_pool().aclose()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(main())
+    return summarize('async', [r[0] for r in results], [r[1] for r in results], elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sync vs async proxy throughput')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--delay-ms', type=float, default=20.0, help='stub upstream latency')
+    parser.add_argument('--body-bytes', type=int, default=512, help='stub response padding')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--modes', default='sync,async')
+    args = parser.parse_args(argv)
+
+    from benchmarks.stub_upstream import start_in_background
+
+    stub = start_in_background(args.port, args.delay_ms, args.body_bytes)
+
+    os.environ['USER_SERVICE_URL'] = f'http://127.0.0.1:{args.port}'
+    # Let both paths keep one idle connection per in-flight request
+    os.environ.setdefault('UPSTREAM_POOL_MAX_PER_HOST', str(args.concurrency))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    runners = {'sync': run_sync, 'async': run_async}
+    rows = []
+    try:
+        for mode in args.modes.split(','):
+            rows.append(runners[mode](args.requests, args.concurrency, 'api/health/'))
+    finally:
+        stub.terminate()
+
+    header = f"{'mode':<6} {'requests':>8} {'ok':>6} {'rps':>9} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(
+            f"{row['mode']:<6} {row['requests']:>8} {row['ok']:>6} {row['rps']:>9} "
+            f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}"
+        )
+    return rows
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
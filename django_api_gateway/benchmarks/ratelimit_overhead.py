@@ -0,0 +1,139 @@
+"""
+Rate Limiter Overhead Benchmark
+Measures the latency the gateway rate limiter adds to each request
+
+Usage:
+    python -m benchmarks.ratelimit_overhead --decisions 50000
+    python -m benchmarks.ratelimit_overhead --redis redis://localhost:6379/2
+
+Three workloads go through the limiter built from GATEWAY_RATE_LIMIT:
+one hot client (leases grow and most decisions stay local), many clients
+hitting it once each (every decision reaches the bucket store), and a
+client over its limit (rejected locally until the next token is due).
+Without --redis the buckets live in process, so the shared-store numbers
+exclude the Redis round trip. With --threads above 1 the timings also
+include waits for the GIL, which show up in the max column.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from benchmarks.proxy_throughput import percentile
+
+TARGET_P99_US = 1000.0
+
+
+def build_limiter(redis_url):
+    from gateway_service.ratelimit import (
+        LocalBucketStore,
+        RateLimiter,
+        RateLimitRule,
+        RedisBucketStore,
+        get_rate_limit_settings,
+    )
+
+    rate_limit_settings = get_rate_limit_settings()
+    if redis_url:
+        import redis
+        connection = redis.Redis.from_url(redis_url)
+        for key in connection.scan_iter('gateway:ratelimit:*'):
+            connection.delete(key)
+        store = RedisBucketStore(connection)
+    else:
+        store = LocalBucketStore()
+
+    return RateLimiter(
+        rules=[RateLimitRule.from_settings(rule) for rule in rate_limit_settings['RULES']],
+        store=store,
+        local_batch=rate_limit_settings['LOCAL_BATCH'],
+        lease_seconds=rate_limit_settings['LEASE_SECONDS'],
+    )
+
+
+def run_workload(name, limiter, decisions, threads, client_for):
+    """Time limiter.check() from several threads; client_for(thread, i) picks the caller"""
+    samples = [[] for _ in range(threads)]
+    limited = [0] * threads
+    per_thread = decisions // threads
+
+    def worker(index):
+        local = samples[index]
+        for i in range(per_thread):
+            client_ip, user_id = client_for(index, i)
+            started = time.perf_counter()
+            result = limiter.check('user', 'api/vehicles/', 'GET', client_ip, user_id)
+            local.append(time.perf_counter() - started)
+            if not result.allowed:
+                limited[index] += 1
+
+    store_calls = limiter.store_calls
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [sample for thread_samples in samples for sample in thread_samples]
+    return {
+        'workload': name,
+        'decisions': len(latencies),
+        'limited': sum(limited),
+        'store_calls': limiter.store_calls - store_calls,
+        'per_sec': round(len(latencies) / elapsed) if elapsed else 0,
+        'p50_us': round(percentile(latencies, 50) * 1e6, 1),
+        'p99_us': round(percentile(latencies, 99) * 1e6, 1),
+        'max_us': round(max(latencies) * 1e6, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rate limiter overhead')
+    parser.add_argument('--decisions', type=int, default=50000)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--redis', default='', help='Redis URL for the shared buckets')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    workloads = [
+        # Same user and address every time: the lease fast path
+        ('hot_client', lambda thread, i: ('10.0.0.1', 42)),
+        # A new caller every time: one bucket store call per request
+        ('many_clients', lambda thread, i: (f'10.{thread}.{i // 250}.{i % 250}', None)),
+        # One address far over its limit: local rejections
+        ('over_limit', lambda thread, i: ('10.255.255.1', None)),
+    ]
+
+    rows = []
+    for name, client_for in workloads:
+        limiter = build_limiter(args.redis)
+        rows.append(run_workload(name, limiter, args.decisions, args.threads, client_for))
+
+    header = (
+        f"{'workload':<13} {'decisions':>9} {'limited':>8} {'store':>7} "
+        f"{'per_sec':>9} {'p50_us':>8} {'p99_us':>8} {'max_us':>9}"
+    )
+    print(f"store: {'redis ' + args.redis if args.redis else 'in-process'}")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(
+            f"{row['workload']:<13} {row['decisions']:>9} {row['limited']:>8} {row['store_calls']:>7} "
+            f"{row['per_sec']:>9} {row['p50_us']:>8} {row['p99_us']:>8} {row['max_us']:>9}"
+        )
+
+    worst = max(row['p99_us'] for row in rows)
+    print(f"worst p99 {worst} us: {'PASS' if worst < TARGET_P99_US else 'FAIL'} (target < {TARGET_P99_US:g} us)")
+    return rows
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,26 @@
+"""
+Benchmark Settings
+Gateway settings for local benchmarks: no Redis, no on-disk database
+"""
+
+from gateway_service.settings import *  # noqa: F401,F403
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+# Per-request proxy logging would dominate the measurements
+LOGGING['root']['level'] = 'WARNING'  # noqa: F405
+LOGGING['loggers']['gateway_service']['level'] = 'WARNING'  # noqa: F405
+
+# Benchmarks send far more traffic from one address than the limits allow
+GATEWAY_RATE_LIMIT = dict(GATEWAY_RATE_LIMIT, ENABLED=False)  # noqa: F405
@@ -0,0 +1,106 @@
+"""
+Stub Upstream Service
+Minimal asyncio HTTP/1.1 server with keep-alive, used as a fake microservice
+
+Usage:
+    python -m benchmarks.stub_upstream --port 8901 --delay-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+
+
+class StubUpstream:
+    """Answers every request with a JSON body after an optional delay"""
+
+    def __init__(self, delay_ms=0.0, body_bytes=0):
+        self.delay = delay_ms / 1000.0
+        padding = 'x' * body_bytes
+        self.body = json.dumps({'status': 'ok', 'service': 'stub', 'padding': padding}).encode()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', '0') or 0)
+                if length:
+                    await reader.readexactly(length)
+
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\n'
+                    b'Content-Type: application/json\r\n'
+                    b'Content-Length: ' + str(len(self.body)).encode() + b'\r\n'
+                    b'Connection: keep-alive\r\n'
+                    b'\r\n' + self.body
+                )
+                await writer.drain()
+
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+def run(host, port, delay_ms=0.0, body_bytes=0):
+    """Run a stub upstream in the current process until interrupted"""
+    asyncio.run(StubUpstream(delay_ms, body_bytes).serve(host, port))
+
+
+def start_in_background(port, delay_ms=0.0, body_bytes=0, host='127.0.0.1'):
+    """Start a stub upstream in a child process and return the process"""
+    process = multiprocessing.Process(
+        target=run,
+        args=(host, port, delay_ms, body_bytes),
+        daemon=True,
+    )
+    process.start()
+    wait_until_ready(host, port)
+    return process
+
+
+def wait_until_ready(host, port, timeout=10.0):
+    """Block until the stub accepts connections"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub upstream service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--delay-ms', type=float, default=0.0)
+    parser.add_argument('--body-bytes', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        run(args.host, args.port, args.delay_ms, args.body_bytes)
+    except KeyboardInterrupt:
+        pass
@@ -1,7 +1,12 @@
-"""Django ASGI application for API Gateway."""
+"""Django ASGI application for API Gateway.
+
+Serves the async proxy path, e.g.:
+    gunicorn -k uvicorn.workers.UvicornWorker gateway_service.asgi:application
+"""
 
 import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gateway_service.settings')
+os.environ.setdefault('GATEWAY_PROXY_MODE', 'async')
 application = get_asgi_application()
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Gateway Authentication
+Local verification of user service JWTs and signed claim propagation
+"""
+
+from django.conf import settings
+from django.core import signing
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+import threading
+
+from gateway_service.proxy import header_value
+
+
+DEFAULT_JWT_SETTINGS = {
+    'ENABLED': True,
+    'ALGORITHM': 'HS256',
+    'SIGNING_KEY': None,
+    'LEEWAY': 0,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'USER_ID_CLAIM': 'user_id',
+    'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_TYPE': 'access',
+    'FORWARDED_CLAIMS': ('user_id', 'jti', 'exp', 'iat'),
+    'CLAIMS_SECRET': None,
+    'CLAIMS_SALT': 'gateway.claims',
+}
+
+# Header carrying the verified claims to the services
+CLAIMS_HEADER = 'X-Gateway-Claims'
+
+
+def get_jwt_settings():
+    """Return the gateway JWT settings merged with their defaults"""
+    jwt_settings = dict(DEFAULT_JWT_SETTINGS)
+    jwt_settings.update(getattr(settings, 'GATEWAY_JWT', {}))
+    return jwt_settings
+
+
+class InvalidToken(Exception):
+    """Raised for a bearer token the gateway will not forward"""
+
+
+class TokenVerifier:
+    """Verifies access tokens with the user service's signing key.
+
+    Requests without credentials pass through untouched, requests with a
+    bad or expired token are rejected before any upstream call, and a
+    valid token's claims are forwarded in a header signed with the secret
+    shared with the services, so they can trust the identity without
+    decoding the token or loading the user again.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self.backend = TokenBackend(
+            options['ALGORITHM'],
+            signing_key=options['SIGNING_KEY'],
+            leeway=options['LEEWAY'],
+        )
+
+    def verify(self, raw_token):
+        """Return the claims of a valid access token or raise InvalidToken"""
+        try:
+            claims = self.backend.decode(raw_token)
+        except TokenBackendError as e:
+            raise InvalidToken(str(e))
+
+        if claims.get(self.options['TOKEN_TYPE_CLAIM']) != self.options['TOKEN_TYPE']:
+            raise InvalidToken('Token has wrong type')
+        if self.options['USER_ID_CLAIM'] not in claims:
+            raise InvalidToken('Token contained no recognizable user identification')
+        return claims
+
+    def raw_token(self, headers):
+        """Extract the bearer token from the Authorization header, if any"""
+        authorization = header_value(headers, 'authorization')
+        if not authorization:
+            return None
+
+        parts = authorization.split()
+        if not parts or parts[0] not in self.options['AUTH_HEADER_TYPES']:
+            # Some other scheme, left for the upstream service to judge
+            return None
+        if len(parts) != 2:
+            raise InvalidToken('Authorization header must contain two space-delimited values')
+        return parts[1]
+
+    def sign_claims(self, claims):
+        forwarded = {
+            name: claims[name]
+            for name in self.options['FORWARDED_CLAIMS']
+            if name in claims
+        }
+        return signing.dumps(
+            forwarded,
+            key=self.options['CLAIMS_SECRET'],
+            salt=self.options['CLAIMS_SALT'],
+        )
+
+    def authenticate(self, headers):
+        """Return (upstream headers, verified claims or None) for a request.
+
+        Raises InvalidToken when the request carries a bad bearer token.
+        """
+        headers = {
+            name: value
+            for name, value in (headers or {}).items()
+            if name.lower() != CLAIMS_HEADER.lower()
+        }
+
+        raw_token = self.raw_token(headers)
+        if raw_token is None:
+            return headers, None
+
+        claims = self.verify(raw_token)
+        headers[CLAIMS_HEADER] = self.sign_claims(claims)
+        return headers, claims
+
+
+_verifier = None
+_verifier_loaded = False
+_verifier_lock = threading.Lock()
+
+
+def get_token_verifier():
+    """Return the token verifier, or None when local verification is disabled"""
+    global _verifier, _verifier_loaded
+
+    if _verifier_loaded:
+        return _verifier
+
+    with _verifier_lock:
+        if not _verifier_loaded:
+            jwt_settings = get_jwt_settings()
+            if jwt_settings.pop('ENABLED'):
+                _verifier = TokenVerifier(**jwt_settings)
+            _verifier_loaded = True
+
+    return _verifier
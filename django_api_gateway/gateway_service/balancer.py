@@ -0,0 +1,248 @@
+"""
+Gateway Load Balancing
+Spreads proxied requests over several instances of the same service
+"""
+
+from django.conf import settings
+import itertools
+import logging
+import math
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BALANCER_SETTINGS = {
+    'STRATEGY': 'round_robin',
+    'EWMA_DECAY': 10.0,
+    'CONSECUTIVE_FAILURES': 3,
+    'EJECTION_SECONDS': 30,
+    'HEALTH_CHECK_INTERVAL': 10,
+    'HEALTH_CHECK_TIMEOUT': 2.0,
+}
+
+
+def get_balancer_settings():
+    """Return the load balancer settings merged with their defaults"""
+    balancer_settings = dict(DEFAULT_BALANCER_SETTINGS)
+    balancer_settings.update(getattr(settings, 'GATEWAY_LOAD_BALANCER', {}))
+    return balancer_settings
+
+
+class Instance:
+    """One upstream instance and the signals the strategies balance on"""
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.ewma_ms = 0.0
+        self.last_sample = None
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def is_available(self, now):
+        return self.healthy and now >= self.ejected_until
+
+    def snapshot(self, now):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'ejected': now < self.ejected_until,
+            'outstanding': self.outstanding,
+            'ewma_ms': round(self.ewma_ms, 2),
+            'requests': self.requests,
+            'failures': self.failures,
+        }
+
+
+class Balancer:
+    """Base balancer: instance bookkeeping, outlier ejection and health checks.
+
+    Instances that fail CONSECUTIVE_FAILURES calls in a row are ejected for
+    EJECTION_SECONDS; instances failing the periodic active health check are
+    left out until they pass again. If nothing is left, every instance is
+    tried rather than failing outright.
+    """
+
+    strategy = None
+
+    def __init__(self, service_name, urls, **options):
+        self.service_name = service_name
+        self.instances = [Instance(url) for url in urls]
+        self.options = options
+
+        self._lock = threading.Lock()
+        self._last_health_check = time.monotonic()
+        self._health_check_running = False
+
+    def pick(self, candidates):
+        """Choose one of the available instances"""
+        raise NotImplementedError
+
+    def acquire(self):
+        """Pick an instance for the next call and count it as outstanding"""
+        self.maybe_check_health()
+        now = time.monotonic()
+
+        with self._lock:
+            candidates = [i for i in self.instances if i.is_available(now)] or self.instances
+            instance = candidates[0] if len(candidates) == 1 else self.pick(candidates)
+            instance.outstanding += 1
+            instance.requests += 1
+            return instance
+
+    def release(self, instance, duration_ms=None, failed=False):
+        """Record the outcome of a call to an instance"""
+        now = time.monotonic()
+
+        with self._lock:
+            instance.outstanding = max(instance.outstanding - 1, 0)
+
+            if duration_ms is not None:
+                self._observe_latency(instance, duration_ms, now)
+
+            if failed:
+                instance.failures += 1
+                instance.consecutive_failures += 1
+                if instance.consecutive_failures >= self.options['CONSECUTIVE_FAILURES']:
+                    instance.ejected_until = now + self.options['EJECTION_SECONDS']
+                    instance.consecutive_failures = 0
+                    logger.warning(f"Ejecting {self.service_name} instance {instance.url}")
+            else:
+                instance.consecutive_failures = 0
+
+    def _observe_latency(self, instance, duration_ms, now):
+        """Fold a latency sample into the instance's time-decayed EWMA"""
+        if instance.last_sample is None:
+            instance.ewma_ms = duration_ms
+        else:
+            elapsed = max(now - instance.last_sample, 0.0)
+            weight = math.exp(-elapsed / self.options['EWMA_DECAY'])
+            instance.ewma_ms = instance.ewma_ms * weight + duration_ms * (1 - weight)
+        instance.last_sample = now
+
+    # Active health checks
+
+    def maybe_check_health(self):
+        """Start a background health check when one is due"""
+        if len(self.instances) < 2:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if self._health_check_running:
+                return
+            if now - self._last_health_check < self.options['HEALTH_CHECK_INTERVAL']:
+                return
+            self._health_check_running = True
+            self._last_health_check = now
+
+        threading.Thread(
+            target=self.check_health,
+            name=f'health-check-{self.service_name}',
+            daemon=True,
+        ).start()
+
+    def check_health(self):
+        """Probe every instance and update its health flag"""
+        from gateway_service.health import probe_services
+
+        try:
+            services = {instance.url: instance.url for instance in self.instances}
+            results = probe_services(
+                services,
+                self.options['HEALTH_CHECK_TIMEOUT'],
+                session_name=self.service_name,
+            )
+            with self._lock:
+                for instance in self.instances:
+                    healthy = results[instance.url]['status'] == 'healthy'
+                    if healthy != instance.healthy:
+                        state = 'healthy' if healthy else 'unhealthy'
+                        logger.warning(f"{self.service_name} instance {instance.url} is {state}")
+                    instance.healthy = healthy
+        except Exception as e:
+            logger.error(f"Health check of {self.service_name} failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._health_check_running = False
+
+    def snapshot(self):
+        """Describe the balancer for the status endpoint"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'strategy': self.strategy,
+                'instances': [instance.snapshot(now) for instance in self.instances],
+            }
+
+
+class RoundRobinBalancer(Balancer):
+    """Cycle through the available instances in order"""
+
+    strategy = 'round_robin'
+
+    def __init__(self, service_name, urls, **options):
+        super().__init__(service_name, urls, **options)
+        self._counter = itertools.count()
+
+    def pick(self, candidates):
+        return candidates[next(self._counter) % len(candidates)]
+
+
+class LeastOutstandingBalancer(Balancer):
+    """Send the call to the instance with the fewest requests in flight"""
+
+    strategy = 'least_outstanding'
+
+    def pick(self, candidates):
+        fewest = min(instance.outstanding for instance in candidates)
+        return random.choice([i for i in candidates if i.outstanding == fewest])
+
+
+class EwmaBalancer(Balancer):
+    """Latency-weighted: lowest EWMA latency scaled by requests in flight"""
+
+    strategy = 'ewma'
+
+    def pick(self, candidates):
+        # Instances without a sample yet score zero and get tried first
+        return min(
+            candidates,
+            key=lambda i: (i.ewma_ms * (i.outstanding + 1), i.outstanding, random.random())
+        )
+
+
+STRATEGIES = {
+    RoundRobinBalancer.strategy: RoundRobinBalancer,
+    LeastOutstandingBalancer.strategy: LeastOutstandingBalancer,
+    EwmaBalancer.strategy: EwmaBalancer,
+}
+
+
+_balancers = {}
+_balancers_lock = threading.Lock()
+
+
+def get_balancer(service_name, urls):
+    """Return this worker's balancer for a service"""
+    balancer = _balancers.get(service_name)
+    if balancer is not None:
+        return balancer
+
+    with _balancers_lock:
+        balancer = _balancers.get(service_name)
+        if balancer is None:
+            balancer_settings = get_balancer_settings()
+            strategy = balancer_settings.pop('STRATEGY')
+            if strategy not in STRATEGIES:
+                raise ValueError(f"Unknown load balancing strategy: {strategy}")
+            balancer = STRATEGIES[strategy](service_name, urls, **balancer_settings)
+            _balancers[service_name] = balancer
+
+    return balancer
@@ -0,0 +1,318 @@
+"""
+Gateway Circuit Breaker
+Per-service circuit breakers whose state is shared by every gateway worker
+through the Redis cache
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BREAKER_SETTINGS = {
+    'ENABLED': True,
+    'FAILURE_THRESHOLD': 5,
+    'SLOW_CALL_THRESHOLD': 10,
+    'SLOW_CALL_MS': 5000,
+    'WINDOW': 30,
+    'OPEN_SECONDS': 30,
+    'TRIAL_TIMEOUT': 30,
+    'LOCAL_TTL': 1.0,
+    'TRANSITION_HISTORY': 20,
+}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Permits handed out by CircuitBreaker.before_call()
+NORMAL_CALL = 'normal'
+TRIAL_CALL = 'trial'
+
+
+def get_breaker_settings():
+    """Return the circuit breaker settings merged with their defaults"""
+    breaker_settings = dict(DEFAULT_BREAKER_SETTINGS)
+    breaker_settings.update(getattr(settings, 'GATEWAY_CIRCUIT_BREAKER', {}))
+    return breaker_settings
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+    def __init__(self, service_name, retry_after):
+        self.service_name = service_name
+        self.retry_after = max(int(retry_after), 1)
+        super().__init__(f"Circuit open for service {service_name}")
+
+
+class CircuitBreaker:
+    """Circuit breaker for one upstream service.
+
+    Closed: calls flow; failures (connection errors, timeouts, 5xx) and
+    slow calls are counted in fixed windows, and crossing either threshold
+    opens the circuit.
+    Open: calls fail fast until OPEN_SECONDS have passed.
+    Half-open: a single worker wins the trial permit and sends one request;
+    success closes the circuit, failure re-opens it.
+
+    All state lives in the shared cache so every worker sees the same
+    circuit. Each worker memoizes the state for LOCAL_TTL seconds to keep
+    the healthy path down to one cache read per second.
+    """
+
+    def __init__(self, service_name, **options):
+        self.service_name = service_name
+        self.options = options
+        self.prefix = f'gateway:breaker:{service_name}'
+
+        self._local_state = None
+        self._local_expires = 0.0
+        self._lock = threading.Lock()
+
+    # Cache keys
+
+    @property
+    def state_key(self):
+        return f'{self.prefix}:state'
+
+    @property
+    def trial_key(self):
+        return f'{self.prefix}:trial'
+
+    @property
+    def transitions_key(self):
+        return f'{self.prefix}:transitions'
+
+    def counter_key(self, kind, now=None):
+        window = self.options['WINDOW']
+        bucket = int((now or time.time()) // window)
+        return f'{self.prefix}:{kind}:{bucket}'
+
+    # State
+
+    def _read_state(self):
+        """Return the shared state dict, or None when the circuit is closed"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._local_expires:
+                return self._local_state
+
+        state = cache.get(self.state_key)
+
+        with self._lock:
+            self._local_state = state
+            self._local_expires = now + self.options['LOCAL_TTL']
+        return state
+
+    def _remember(self, state):
+        with self._lock:
+            self._local_state = state
+            self._local_expires = time.monotonic() + self.options['LOCAL_TTL']
+
+    def _record_transition(self, from_state, to_state, reason):
+        logger.warning(f"Circuit breaker {self.service_name}: {from_state} -> {to_state} ({reason})")
+        transitions = cache.get(self.transitions_key) or []
+        transitions.append({
+            'from': from_state,
+            'to': to_state,
+            'reason': reason,
+            'timestamp': time.time(),
+        })
+        cache.set(self.transitions_key, transitions[-self.options['TRANSITION_HISTORY']:], None)
+
+    def _open(self, from_state, reason):
+        state = {'state': OPEN, 'since': time.time(), 'reason': reason}
+        if from_state == CLOSED:
+            # Only the first worker to cross the threshold records the change
+            if not cache.add(self.state_key, state, None):
+                self._remember(cache.get(self.state_key))
+                return
+        else:
+            cache.set(self.state_key, state, None)
+        self._remember(state)
+        self._record_transition(from_state, OPEN, reason)
+
+    def _close(self, reason):
+        cache.delete_many([
+            self.state_key,
+            self.trial_key,
+            self.counter_key('failures'),
+            self.counter_key('slow'),
+        ])
+        self._remember(None)
+        self._record_transition(HALF_OPEN, CLOSED, reason)
+
+    def _count(self, kind):
+        key = self.counter_key(kind)
+        cache.add(key, 0, self.options['WINDOW'] * 2)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.set(key, 1, self.options['WINDOW'] * 2)
+            return 1
+
+    # Call protocol
+
+    def before_call(self):
+        """Return a permit for the next call or raise CircuitOpenError"""
+        try:
+            state = self._read_state()
+            if state is None:
+                return NORMAL_CALL
+
+            opened_for = time.time() - state['since']
+            if state['state'] == OPEN and opened_for < self.options['OPEN_SECONDS']:
+                raise CircuitOpenError(self.service_name, self.options['OPEN_SECONDS'] - opened_for)
+
+            # Cool-down elapsed (or a previous trial timed out): one worker
+            # wins the trial permit, everyone else keeps failing fast
+            if cache.add(self.trial_key, 1, self.options['TRIAL_TIMEOUT']):
+                half_open = {'state': HALF_OPEN, 'since': time.time(), 'reason': 'trial request'}
+                cache.set(self.state_key, half_open, None)
+                self._remember(half_open)
+                self._record_transition(state['state'], HALF_OPEN, 'trial request')
+                return TRIAL_CALL
+
+            self._local_expires = 0.0
+            raise CircuitOpenError(self.service_name, self.options['TRIAL_TIMEOUT'])
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            # Never let a cache outage take the proxy down with it
+            logger.warning(f"Circuit breaker {self.service_name} unavailable: {str(e)}")
+            return NORMAL_CALL
+
+    def _local_permit(self):
+        """Answer before_call() from the local memo, or None if the cache is needed"""
+        with self._lock:
+            if time.monotonic() >= self._local_expires:
+                return None
+            state = self._local_state
+
+        if state is None:
+            return NORMAL_CALL
+
+        opened_for = time.time() - state['since']
+        if state['state'] == OPEN and opened_for < self.options['OPEN_SECONDS']:
+            raise CircuitOpenError(self.service_name, self.options['OPEN_SECONDS'] - opened_for)
+        return None
+
+    async def abefore_call(self):
+        """Async before_call(); only leaves the event loop on a memo miss"""
+        permit = self._local_permit()
+        if permit is not None:
+            return permit
+        return await sync_to_async(self.before_call, thread_sensitive=False)()
+
+    def record_success(self, permit, duration_ms):
+        """Record a completed call and its latency"""
+        try:
+            slow = duration_ms >= self.options['SLOW_CALL_MS']
+
+            if permit == TRIAL_CALL:
+                if slow:
+                    self._open(HALF_OPEN, f'slow trial request ({duration_ms:.0f} ms)')
+                else:
+                    self._close('trial request succeeded')
+                return
+
+            if slow and self._count('slow') >= self.options['SLOW_CALL_THRESHOLD']:
+                self._open(CLOSED, 'slow call threshold reached')
+        except Exception as e:
+            logger.warning(f"Circuit breaker {self.service_name} unavailable: {str(e)}")
+
+    def record_failure(self, permit, reason='upstream failure'):
+        """Record a failed call"""
+        try:
+            if permit == TRIAL_CALL:
+                self._open(HALF_OPEN, f'trial request failed: {reason}')
+                return
+
+            if self._count('failures') >= self.options['FAILURE_THRESHOLD']:
+                self._open(CLOSED, f'failure threshold reached: {reason}')
+        except Exception as e:
+            logger.warning(f"Circuit breaker {self.service_name} unavailable: {str(e)}")
+
+    async def arecord_success(self, permit, duration_ms):
+        """Async record_success(); fast normal calls need no cache write"""
+        if permit == NORMAL_CALL and duration_ms < self.options['SLOW_CALL_MS']:
+            return
+        await sync_to_async(self.record_success, thread_sensitive=False)(permit, duration_ms)
+
+    async def arecord_failure(self, permit, reason='upstream failure'):
+        """Async record_failure()"""
+        await sync_to_async(self.record_failure, thread_sensitive=False)(permit, reason)
+
+    def snapshot(self):
+        """Describe the breaker for the status endpoint"""
+        try:
+            state = cache.get(self.state_key)
+            counters = cache.get_many([self.counter_key('failures'), self.counter_key('slow')])
+            return {
+                'state': state['state'] if state else CLOSED,
+                'since': state['since'] if state else None,
+                'reason': state['reason'] if state else None,
+                'failures': counters.get(self.counter_key('failures'), 0),
+                'slow_calls': counters.get(self.counter_key('slow'), 0),
+                'transitions': cache.get(self.transitions_key) or [],
+            }
+        except Exception as e:
+            return {'state': 'unknown', 'error': str(e)}
+
+
+class DisabledCircuitBreaker:
+    """Stand-in used when GATEWAY_CIRCUIT_BREAKER['ENABLED'] is off"""
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+
+    def before_call(self):
+        return NORMAL_CALL
+
+    def record_success(self, permit, duration_ms):
+        pass
+
+    def record_failure(self, permit, reason='upstream failure'):
+        pass
+
+    async def abefore_call(self):
+        return NORMAL_CALL
+
+    async def arecord_success(self, permit, duration_ms):
+        pass
+
+    async def arecord_failure(self, permit, reason='upstream failure'):
+        pass
+
+    def snapshot(self):
+        return {'state': 'disabled'}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(service_name):
+    """Return this worker's breaker for a service"""
+    breaker = _breakers.get(service_name)
+    if breaker is not None:
+        return breaker
+
+    with _breakers_lock:
+        breaker = _breakers.get(service_name)
+        if breaker is None:
+            breaker_settings = get_breaker_settings()
+            if breaker_settings.pop('ENABLED'):
+                breaker = CircuitBreaker(service_name, **breaker_settings)
+            else:
+                breaker = DisabledCircuitBreaker(service_name)
+            _breakers[service_name] = breaker
+
+    return breaker
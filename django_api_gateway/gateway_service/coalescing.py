@@ -0,0 +1,306 @@
+"""
+Gateway Request Coalescing
+Single-flight for identical concurrent GETs: one upstream call, shared result
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+import weakref
+
+from gateway_service.proxy import request_fingerprint, request_principal
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_COALESCING_SETTINGS = {
+    'ENABLED': True,
+    'ROUTES': [],
+    'DISTRIBUTED': False,
+    'WAIT_TIMEOUT': 30.0,
+    'POLL_INTERVAL': 0.01,
+    'RESULT_TTL': 5,
+}
+
+
+def get_coalescing_settings():
+    """Return the request coalescing settings merged with their defaults"""
+    coalescing_settings = dict(DEFAULT_COALESCING_SETTINGS)
+    coalescing_settings.update(getattr(settings, 'GATEWAY_REQUEST_COALESCING', {}))
+    return coalescing_settings
+
+
+class Flight:
+    """An in-flight upstream call that later identical requests wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class RequestCoalescer:
+    """Single-flight for identical in-flight GETs.
+
+    Requests for the same service, path, query, Accept header and caller
+    credentials share one upstream call: the first becomes the leader and
+    every request arriving while it is in flight waits for its result
+    instead of going upstream. With DISTRIBUTED on, leadership is also
+    claimed through the shared cache so that workers coalesce with each
+    other; the leader publishes its result under a per-flight key that
+    waiting workers poll.
+
+    Results are dicts of status, headers and a buffered body. If a leader
+    fails or a wait exceeds WAIT_TIMEOUT, the waiting request makes its own
+    call rather than failing.
+    """
+
+    def __init__(self, routes, distributed=False, wait_timeout=30.0, poll_interval=0.01, result_ttl=5):
+        self.routes = [(route['SERVICE'], re.compile(route['PATH'])) for route in routes]
+        self.distributed = distributed
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+
+        self._flights = {}
+        self._async_flights = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.leaders = 0
+        self.local_saved = 0
+        self.remote_saved = 0
+        self.fallbacks = 0
+        self.errors = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def match(self, service_name, path):
+        """Whether GETs to this path are coalesced"""
+        return any(
+            service == service_name and pattern.search(path) is not None
+            for service, pattern in self.routes
+        )
+
+    def key(self, service_name, path, params, headers, generation=None):
+        """Identity of a request: same key, same upstream response.
+
+        GETs to an edge-cached route pass the route's cache generation, so
+        a fetch begun before a write is never shared with requests after it.
+        """
+        principal = request_principal(headers)
+        key = f'{principal}:{request_fingerprint(service_name, path, params, headers)}'
+        return key if generation is None else f'{key}:{generation}'
+
+    # Cross-worker leadership
+
+    def lock_key(self, key):
+        return f'gateway:coalesce:{key}'
+
+    def result_key(self, key, token):
+        return f'gateway:coalesce:{key}:{token}'
+
+    def _claim(self, key):
+        """Try to lead a flight across workers; returns (token, leader_token)"""
+        token = uuid.uuid4().hex
+        try:
+            if cache.add(self.lock_key(key), token, int(self.wait_timeout) + 1):
+                return token, None
+            return None, cache.get(self.lock_key(key))
+        except Exception as e:
+            logger.warning(f"Request coalescing unavailable: {str(e)}")
+            self._count('errors')
+            return token, None
+
+    def _publish(self, key, token, result):
+        try:
+            cache.set(self.result_key(key, token), result, self.result_ttl)
+            cache.delete(self.lock_key(key))
+        except Exception as e:
+            logger.warning(f"Could not publish coalesced result: {str(e)}")
+            self._count('errors')
+
+    def _release(self, key):
+        try:
+            cache.delete(self.lock_key(key))
+        except Exception:
+            pass
+
+    def _poll(self, key, leader_token):
+        """One poll for another worker's result; returns (result, still_in_flight)"""
+        try:
+            # The leader publishes before releasing the lock, so once the
+            # lock is gone the result is readable
+            in_flight = cache.get(self.lock_key(key)) == leader_token
+            return cache.get(self.result_key(key, leader_token)), in_flight
+        except Exception as e:
+            logger.warning(f"Request coalescing unavailable: {str(e)}")
+            self._count('errors')
+            return None, False
+
+    def _lead(self, key, fetch):
+        """Run fetch() as this worker's leader, coalescing with other workers"""
+        if not self.distributed:
+            self._count('leaders')
+            return fetch()
+
+        token, leader_token = self._claim(key)
+        if token is not None:
+            self._count('leaders')
+            try:
+                result = fetch()
+            except Exception:
+                self._release(key)
+                raise
+            self._publish(key, token, result)
+            return result
+
+        deadline = time.monotonic() + self.wait_timeout
+        while leader_token is not None and time.monotonic() < deadline:
+            result, in_flight = self._poll(key, leader_token)
+            if result is not None:
+                self._count('remote_saved')
+                return result
+            if not in_flight:
+                break
+            time.sleep(self.poll_interval)
+
+        self._count('fallbacks')
+        return fetch()
+
+    async def _alead(self, key, fetch):
+        """Async _lead(); fetch is a coroutine function"""
+        if not self.distributed:
+            self._count('leaders')
+            return await fetch()
+
+        token, leader_token = await sync_to_async(self._claim, thread_sensitive=False)(key)
+        if token is not None:
+            self._count('leaders')
+            try:
+                result = await fetch()
+            except Exception:
+                await sync_to_async(self._release, thread_sensitive=False)(key)
+                raise
+            await sync_to_async(self._publish, thread_sensitive=False)(key, token, result)
+            return result
+
+        deadline = time.monotonic() + self.wait_timeout
+        while leader_token is not None and time.monotonic() < deadline:
+            result, in_flight = await sync_to_async(self._poll, thread_sensitive=False)(key, leader_token)
+            if result is not None:
+                self._count('remote_saved')
+                return result
+            if not in_flight:
+                break
+            await asyncio.sleep(self.poll_interval)
+
+        self._count('fallbacks')
+        return await fetch()
+
+    # Single-flight
+
+    def run(self, key, fetch):
+        """Return fetch()'s result, sharing one call among identical requests"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+
+        if not leader:
+            if flight.event.wait(self.wait_timeout) and flight.result is not None:
+                self._count('local_saved')
+                return flight.result
+            self._count('fallbacks')
+            return fetch()
+
+        try:
+            flight.result = self._lead(key, fetch)
+            return flight.result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def arun(self, key, fetch):
+        """Async run(); flights are shared by the requests on the same event loop"""
+        flights = self._async_flights.setdefault(asyncio.get_running_loop(), {})
+        future = flights.get(key)
+
+        if future is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+                self._count('local_saved')
+                return result
+            except Exception:
+                self._count('fallbacks')
+                return await fetch()
+
+        future = flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._alead(key, fetch)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters fall back to their own call; nobody else reads this
+            future.exception()
+            raise
+        finally:
+            flights.pop(key, None)
+
+    def stats(self):
+        """Return coalescing counters for monitoring"""
+        with self._lock:
+            saved = self.local_saved + self.remote_saved
+            return {
+                'pid': os.getpid(),
+                'distributed': self.distributed,
+                'in_flight': len(self._flights) + sum(len(f) for f in list(self._async_flights.values())),
+                'leaders': self.leaders,
+                'saved_requests': saved,
+                'local_saved': self.local_saved,
+                'remote_saved': self.remote_saved,
+                'fallbacks': self.fallbacks,
+                'errors': self.errors,
+            }
+
+
+_coalescer = None
+_coalescer_pid = None
+_coalescer_lock = threading.Lock()
+
+
+def get_request_coalescer():
+    """Return this worker's request coalescer, or None when it is disabled"""
+    global _coalescer, _coalescer_pid
+
+    pid = os.getpid()
+    if _coalescer_pid == pid:
+        return _coalescer
+
+    with _coalescer_lock:
+        if _coalescer_pid != pid:
+            coalescing_settings = get_coalescing_settings()
+            if coalescing_settings['ENABLED']:
+                _coalescer = RequestCoalescer(
+                    routes=coalescing_settings['ROUTES'],
+                    distributed=coalescing_settings['DISTRIBUTED'],
+                    wait_timeout=coalescing_settings['WAIT_TIMEOUT'],
+                    poll_interval=coalescing_settings['POLL_INTERVAL'],
+                    result_ttl=coalescing_settings['RESULT_TTL'],
+                )
+            else:
+                _coalescer = None
+            _coalescer_pid = pid
+
+    return _coalescer
@@ -0,0 +1,156 @@
+"""
+Gateway Health Probing
+Concurrent health checks of the upstream microservices
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.cache import cache
+import requests
+import logging
+import time
+
+from gateway_service.upstream import get_upstream_pool
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_HEALTH_SETTINGS = {
+    'DEADLINE': 5.0,
+    'CACHE_TTL': 5,
+    'PATH': '/api/health/',
+}
+
+STATUS_CACHE_KEY = 'gateway:services:status'
+
+
+def get_health_settings():
+    """Return the health check settings merged with their defaults"""
+    health_settings = dict(DEFAULT_HEALTH_SETTINGS)
+    health_settings.update(getattr(settings, 'GATEWAY_HEALTH_CHECK', {}))
+    return health_settings
+
+
+def get_monitored_services():
+    """Return the services reported by the status endpoint.
+
+    A service running several instances is reported once per instance.
+    """
+    services = {}
+    for service_name, urls in {'user-service': settings.USER_SERVICE_URLS}.items():
+        if len(urls) == 1:
+            services[service_name] = urls[0]
+        else:
+            for url in urls:
+                services[f'{service_name} ({url})'] = url
+    return services
+
+
+def elapsed_ms(started):
+    """Milliseconds since a time.perf_counter() reading"""
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def probe_service(service_name, service_url, timeout, path=None, session_name=None):
+    """Call a service health endpoint and describe the outcome"""
+    health_url = f"{service_url}{path or get_health_settings()['PATH']}"
+    started = time.perf_counter()
+
+    try:
+        session = get_upstream_pool().get_session(session_name or service_name)
+        response = session.get(health_url, timeout=timeout)
+
+        if response.status_code == 200:
+            return {
+                'status': 'healthy',
+                'url': service_url,
+                'response_time_ms': elapsed_ms(started),
+                'data': response.json()
+            }
+        return {
+            'status': 'unhealthy',
+            'url': service_url,
+            'status_code': response.status_code,
+            'response_time_ms': elapsed_ms(started),
+        }
+    except requests.exceptions.Timeout:
+        return {
+            'status': 'timeout',
+            'url': service_url,
+            'error': 'Request timeout',
+            'response_time_ms': elapsed_ms(started),
+        }
+    except requests.exceptions.ConnectionError:
+        return {
+            'status': 'unreachable',
+            'url': service_url,
+            'error': 'Connection failed',
+            'response_time_ms': elapsed_ms(started),
+        }
+    except Exception as e:
+        return {
+            'status': 'error',
+            'url': service_url,
+            'error': str(e),
+            'response_time_ms': elapsed_ms(started),
+        }
+
+
+def probe_services(services, deadline, session_name=None):
+    """Probe every service concurrently, giving up on all of them at the deadline"""
+    if not services:
+        return {}
+
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=len(services), thread_name_prefix='health-probe')
+    futures = {
+        executor.submit(
+            probe_service, service_name, service_url, deadline, session_name=session_name
+        ): service_name
+        for service_name, service_url in services.items()
+    }
+
+    done, _ = wait(futures, timeout=deadline)
+    # Don't let a stuck probe hold the response past the deadline
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    status_info = {}
+    for future, service_name in futures.items():
+        if future in done:
+            status_info[service_name] = future.result()
+        else:
+            status_info[service_name] = {
+                'status': 'timeout',
+                'url': services[service_name],
+                'error': 'Deadline exceeded',
+                'response_time_ms': elapsed_ms(started),
+            }
+
+    return status_info
+
+
+def get_services_status():
+    """Return the probed status of every service, cached for a short TTL.
+
+    Returns (status_info, cached) so callers can tell a fresh probe from a
+    cached one.
+    """
+    health_settings = get_health_settings()
+
+    try:
+        cached = cache.get(STATUS_CACHE_KEY)
+    except Exception as e:
+        logger.warning(f"Service status cache unavailable: {str(e)}")
+        cached = None
+
+    if cached is not None:
+        return cached, True
+
+    status_info = probe_services(get_monitored_services(), health_settings['DEADLINE'])
+
+    try:
+        cache.set(STATUS_CACHE_KEY, status_info, health_settings['CACHE_TTL'])
+    except Exception as e:
+        logger.warning(f"Could not cache service status: {str(e)}")
+
+    return status_info, False
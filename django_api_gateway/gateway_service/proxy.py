@@ -0,0 +1,270 @@
+"""
+Gateway Proxy Helpers
+Request/response plumbing shared by the sync and async proxy views
+"""
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import status
+from urllib.parse import urlencode, urljoin
+import hashlib
+
+
+# Headers that only describe a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = frozenset([
+    'connection',
+    'keep-alive',
+    'proxy-authenticate',
+    'proxy-authorization',
+    'te',
+    'trailer',
+    'trailers',
+    'transfer-encoding',
+    'upgrade',
+])
+
+# Headers that no longer match once the gateway re-renders the body
+ENTITY_HEADERS = frozenset([
+    'content-length',
+    'content-encoding',
+])
+
+# Client headers the gateway sets itself rather than forwarding
+GATEWAY_OWNED_HEADERS = frozenset([
+    'host',
+    'content-length',
+    'content-type',
+    'user-agent',
+    'accept-encoding',
+    'x-gateway-claims',
+])
+
+BODY_METHODS = ('POST', 'PUT', 'PATCH')
+
+# Request headers that identify the caller to the upstream service
+PRINCIPAL_HEADERS = ('authorization', 'cookie')
+
+# Conditional headers the gateway never forwards on shared fetches
+CONDITIONAL_HEADERS = frozenset([
+    'if-none-match',
+    'if-modified-since',
+    'if-match',
+    'if-unmodified-since',
+    'if-range',
+])
+
+
+def get_service_urls():
+    """Return the upstream instance base URLs for each proxied service"""
+    return {
+        'user': settings.USER_SERVICE_URLS,
+    }
+
+
+def metrics_route(match):
+    """Label proxied requests per service for the request metrics.
+
+    Their paths are the upstream's business, and unknown service names
+    must not each add a label value.
+    """
+    if match.url_name not in ('service_proxy', 'service_proxy_root'):
+        return None
+    service_name = match.kwargs.get('service_name')
+    return f'proxy/{service_name}' if service_name in get_service_urls() else 'proxy/unknown'
+
+
+def get_upstream_timeout():
+    """Return the (connect, read) timeout in seconds for upstream calls"""
+    timeout = getattr(settings, 'GATEWAY_UPSTREAM_TIMEOUT', {})
+    return timeout.get('CONNECT', 3.05), timeout.get('READ', 30)
+
+
+def build_upstream_url(service_url, path):
+    """Join a service base URL and the proxied path"""
+    return urljoin(f"{service_url}/", path.lstrip('/'))
+
+
+def build_upstream_headers(headers=None):
+    """Return the headers sent to the upstream service"""
+    default_headers = {
+        'Content-Type': 'application/json',
+        'User-Agent': 'SmartTaxi-API-Gateway/1.0',
+    }
+
+    if headers:
+        default_headers.update(headers)
+
+    return default_headers
+
+
+def forwarded_request_headers(request, stream=False):
+    """Return the client's end-to-end headers to pass upstream.
+
+    Streamed bodies reach the client undecoded, so the upstream may only
+    compress them in an encoding the client itself accepts.
+    """
+    headers = {
+        name: value
+        for name, value in request.headers.items()
+        if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() not in GATEWAY_OWNED_HEADERS
+    }
+
+    if stream:
+        headers['Accept-Encoding'] = request.headers.get('Accept-Encoding', 'identity')
+
+    return headers
+
+
+def header_value(headers, name):
+    """Case-insensitive lookup in a plain header dict"""
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def request_principal(headers):
+    """Hash of the credentials a request was made with, or 'anonymous'"""
+    credentials = '\n'.join(header_value(headers, name) or '' for name in PRINCIPAL_HEADERS)
+    if not credentials.strip():
+        return 'anonymous'
+    return hashlib.sha256(credentials.encode()).hexdigest()
+
+
+def request_fingerprint(service_name, path, params, headers):
+    """Digest of what makes two GETs return the same response for a caller"""
+    query = urlencode(sorted((params or {}).items()), doseq=True)
+    variant = '\n'.join([service_name, path, query, header_value(headers, 'accept') or ''])
+    return hashlib.sha256(variant.encode()).hexdigest()
+
+
+def shared_fetch_headers(headers):
+    """Headers for a fetch whose result is replayed to other clients:
+    no conditionals and an uncompressed body"""
+    upstream = {
+        name: value
+        for name, value in (headers or {}).items()
+        if name.lower() not in CONDITIONAL_HEADERS and name.lower() != 'accept-encoding'
+    }
+    upstream['Accept-Encoding'] = 'identity'
+    return upstream
+
+
+def filter_response_headers(headers, keep_entity_headers=False):
+    """Drop hop-by-hop (and, for re-rendered bodies, entity) headers"""
+    excluded = HOP_BY_HOP_HEADERS
+    if not keep_entity_headers:
+        excluded = excluded | ENTITY_HEADERS
+
+    # Connection may name further hop-by-hop headers
+    connection = headers.get('connection', '')
+    listed = {name.strip().lower() for name in connection.split(',') if name.strip()}
+
+    return {
+        name: value
+        for name, value in headers.items()
+        if name.lower() not in excluded and name.lower() not in listed
+    }
+
+
+def _streaming_response(body, status_code, headers):
+    """Wrap an iterator of upstream bytes, preserving status and headers"""
+    response = StreamingHttpResponse(
+        body,
+        status=status_code,
+        content_type=headers.get('content-type', 'application/json'),
+    )
+    for name, value in filter_response_headers(headers, keep_entity_headers=True).items():
+        if name.lower() != 'content-type':
+            response[name] = value
+    return response
+
+
+def stream_response(upstream, chunk_size):
+    """Pass a streamed requests response through without decoding it"""
+    def body():
+        try:
+            yield from upstream.raw.stream(chunk_size, decode_content=False)
+        finally:
+            # Hands the connection back to the keep-alive pool
+            upstream.close()
+
+    return _streaming_response(body(), upstream.status_code, upstream.headers)
+
+
+def astream_response(upstream, chunk_size):
+    """Pass a streamed aiohttp response through without decoding it"""
+    async def body():
+        try:
+            async for chunk in upstream.content.iter_chunked(chunk_size):
+                yield chunk
+        finally:
+            upstream.release()
+
+    return _streaming_response(body(), upstream.status, upstream.headers)
+
+
+def replay_response(result):
+    """Build a client response from a buffered (status, headers, body) result"""
+    response = HttpResponse(result['body'], status=result['status'])
+    for name, value in filter_response_headers(result['headers'], keep_entity_headers=True).items():
+        if name.lower() != 'content-length':
+            response[name] = value
+    return response
+
+
+def service_not_found(service_name, service_urls):
+    """Payload and status for an unknown service name"""
+    return {
+        'error': f'Service {service_name} not found',
+        'available_services': list(service_urls.keys())
+    }, status.HTTP_404_NOT_FOUND
+
+
+def invalid_token(message):
+    """Payload and status for a bearer token rejected by the gateway"""
+    return {
+        'detail': 'Given token not valid for any token type',
+        'code': 'token_not_valid',
+        'message': message
+    }, status.HTTP_401_UNAUTHORIZED
+
+
+def rate_limited():
+    """Payload and status for a request over its rate limit"""
+    return {
+        'error': 'Too many requests',
+        'message': 'Rate limit exceeded, retry after the time given in Retry-After'
+    }, status.HTTP_429_TOO_MANY_REQUESTS
+
+
+def upstream_timeout():
+    """Payload and status for an upstream timeout"""
+    return {
+        'error': 'Service timeout',
+        'message': 'The requested service is taking too long to respond'
+    }, status.HTTP_504_GATEWAY_TIMEOUT
+
+
+def upstream_unavailable():
+    """Payload and status for an upstream connection failure"""
+    return {
+        'error': 'Service unavailable',
+        'message': 'Cannot connect to the requested service'
+    }, status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+def circuit_open(service_name):
+    """Payload and status for a call rejected by an open circuit breaker"""
+    return {
+        'error': 'Service unavailable',
+        'message': f'Service {service_name} is failing, requests are temporarily rejected'
+    }, status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+def proxy_error():
+    """Payload and status for any other proxying failure"""
+    return {
+        'error': 'Proxy error',
+        'message': 'An error occurred while processing your request'
+    }, status.HTTP_500_INTERNAL_SERVER_ERROR
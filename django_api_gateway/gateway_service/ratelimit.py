@@ -0,0 +1,487 @@
+"""
+Gateway Rate Limiting
+Token bucket rate limits shared by every gateway worker through Redis
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_RATE_LIMIT_SETTINGS = {
+    'ENABLED': True,
+    'RULES': [],
+    'LOCAL_BATCH': 20,
+    'LEASE_SECONDS': 1.0,
+    'TRUST_FORWARDED_FOR': False,
+}
+
+DEFAULT_RULE_SETTINGS = {
+    'KEY': 'ip',
+    'PERIOD': 60,
+    'BURST': None,
+    'SERVICE': None,
+    'PATH': None,
+    'METHODS': None,
+}
+
+# Leases kept per worker before expired ones are dropped
+MAX_LEASES = 10000
+
+# KEYS: one bucket per matching rule; ARGV: capacity, refill per second
+# and tokens wanted for each bucket in turn. All or nothing: when every
+# bucket holds a token, takes up to the wanted tokens (at least one) from
+# each; otherwise takes none. Returns {granted, tokens left, seconds until
+# the next token} per bucket, the wait being zero for buckets that could
+# have granted. Uses the Redis clock so workers on different hosts agree
+# on the refill.
+TOKEN_BUCKET_LUA = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local tokens = {}
+local allowed = true
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local refill = tonumber(ARGV[i * 3 - 1])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local level = tonumber(state[1])
+    local ts = tonumber(state[2])
+    if level == nil then
+        level = capacity
+        ts = now
+    end
+    tokens[i] = math.min(capacity, level + math.max(0, now - ts) * refill)
+    if tokens[i] < 1 then
+        allowed = false
+    end
+end
+
+local result = {}
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local refill = tonumber(ARGV[i * 3 - 1])
+    local wanted = tonumber(ARGV[i * 3])
+    local granted = 0
+    if allowed then
+        granted = math.min(wanted, math.floor(tokens[i]))
+    end
+    tokens[i] = tokens[i] - granted
+
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens[i]), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil((capacity - tokens[i]) / refill * 1000) + 1000)
+
+    local wait = 0
+    if granted == 0 and tokens[i] < 1 then
+        wait = (1 - tokens[i]) / refill
+    end
+    result[i] = {granted, tostring(tokens[i]), tostring(wait)}
+end
+return result
+"""
+
+
+def get_rate_limit_settings():
+    """Return the rate limit settings merged with their defaults"""
+    rate_limit_settings = dict(DEFAULT_RATE_LIMIT_SETTINGS)
+    rate_limit_settings.update(getattr(settings, 'GATEWAY_RATE_LIMIT', {}))
+    return rate_limit_settings
+
+
+class RateLimitRule:
+    """RATE requests per PERIOD seconds, with bursts of up to BURST.
+
+    KEY picks what a bucket is kept for: 'ip' (client address), 'user'
+    (verified user id, falling back to the address) or 'route' (one bucket
+    for everyone). SERVICE, PATH (a regex) and METHODS narrow the rule to
+    some requests.
+    """
+
+    def __init__(self, name, rate, period=60, key='ip', burst=None, service=None, path=None, methods=None):
+        if key not in ('ip', 'user', 'route'):
+            raise ValueError(f"Unknown rate limit key: {key}")
+        self.name = name
+        self.rate = rate
+        self.period = period
+        self.key = key
+        self.capacity = burst or rate
+        self.refill = rate / period
+        self.service = service
+        self.pattern = re.compile(path) if path else None
+        self.methods = {method.upper() for method in methods} if methods else None
+
+    @classmethod
+    def from_settings(cls, rule):
+        options = dict(DEFAULT_RULE_SETTINGS)
+        options.update(rule)
+        return cls(
+            options['NAME'],
+            options['RATE'],
+            period=options['PERIOD'],
+            key=options['KEY'],
+            burst=options['BURST'],
+            service=options['SERVICE'],
+            path=options['PATH'],
+            methods=options['METHODS'],
+        )
+
+    def matches(self, service_name, path, method):
+        if self.service is not None and service_name != self.service:
+            return False
+        if self.methods is not None and method not in self.methods:
+            return False
+        return self.pattern is None or self.pattern.search(path) is not None
+
+    def bucket_key(self, client_ip, user_id):
+        if self.key == 'route':
+            subject = 'all'
+        elif self.key == 'user' and user_id is not None:
+            subject = f'user:{user_id}'
+        else:
+            subject = f'ip:{client_ip}'
+        return f'gateway:ratelimit:{self.name}:{subject}'
+
+    @property
+    def policy(self):
+        return f'{self.capacity};w={self.period}'
+
+
+class Decision:
+    """Outcome of one rule for one request"""
+
+    def __init__(self, rule, allowed, remaining, retry_after=0.0):
+        self.rule = rule
+        self.allowed = allowed
+        self.remaining = max(int(remaining), 0)
+        self.retry_after = retry_after
+
+    @property
+    def reset(self):
+        """Seconds until the bucket is full again"""
+        return math.ceil((self.rule.capacity - self.remaining) / self.rule.refill)
+
+
+class RateLimitResult:
+    """Combined decisions of every rule that applied to a request"""
+
+    def __init__(self, decisions):
+        self.decisions = decisions
+
+    @property
+    def allowed(self):
+        return all(decision.allowed for decision in self.decisions)
+
+    @property
+    def retry_after(self):
+        return max(
+            (math.ceil(d.retry_after) for d in self.decisions if not d.allowed),
+            default=0,
+        ) or 1
+
+    def headers(self):
+        """RateLimit-* headers for the most constrained rule"""
+        if not self.decisions:
+            return {}
+        tightest = min(self.decisions, key=lambda d: (d.allowed, d.remaining))
+        headers = {
+            'RateLimit-Limit': str(tightest.rule.capacity),
+            'RateLimit-Remaining': str(tightest.remaining),
+            'RateLimit-Reset': str(tightest.reset),
+            'RateLimit-Policy': ', '.join(d.rule.policy for d in self.decisions),
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(self.retry_after)
+        return headers
+
+
+class RedisBucketStore:
+    """Token buckets kept in Redis and updated by one atomic Lua script"""
+
+    def __init__(self, connection):
+        self.script = connection.register_script(TOKEN_BUCKET_LUA)
+
+    def take(self, buckets):
+        """Take tokens from every (key, capacity, refill, wanted) bucket, or from none"""
+        keys = [key for key, _, _, _ in buckets]
+        args = [value for _, capacity, refill, wanted in buckets for value in (capacity, refill, wanted)]
+        return [
+            (int(granted), float(tokens), float(wait))
+            for granted, tokens, wait in self.script(keys=keys, args=args)
+        ]
+
+
+class LocalBucketStore:
+    """In-process token buckets, used when the cache is not Redis.
+
+    Limits then only hold per worker; fine for development and benchmarks.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets):
+        """Take tokens from every (key, capacity, refill, wanted) bucket, or from none"""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, capacity, refill, _ in buckets:
+                tokens, ts = self._buckets.get(key, (capacity, now))
+                levels.append(min(capacity, tokens + max(0.0, now - ts) * refill))
+            allowed = all(tokens >= 1 for tokens in levels)
+
+            results = []
+            for (key, _, refill, wanted), tokens in zip(buckets, levels):
+                granted = min(wanted, math.floor(tokens)) if allowed else 0
+                tokens -= granted
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / refill if granted == 0 and tokens < 1 else 0.0
+                results.append((granted, tokens, wait))
+        return results
+
+
+class Lease:
+    """Tokens a worker took from a shared bucket ahead of time"""
+
+    def __init__(self):
+        self.tokens = 0
+        self.remaining = 0.0
+        self.expires = 0.0
+        self.denied_until = 0.0
+        self.batch = 1
+
+
+class NeedsStore(Exception):
+    """The local leases can't answer; the shared bucket must be consulted"""
+
+
+class RateLimiter:
+    """Token bucket limiter with local pre-aggregation.
+
+    Each worker takes tokens from the shared bucket in batches and spends
+    them locally, so a busy client costs one Redis call per batch instead
+    of one per request. Batches double while a lease runs out before it
+    expires and halve when tokens are left over, so quiet clients take one
+    token at a time and the leased-but-unused tokens stay small. Once the
+    bucket is empty the worker rejects locally until the next token is due.
+    A request is charged only when every matching rule allows it, so a
+    rule that denies doesn't drain the others' buckets. Redis errors fail
+    open.
+    """
+
+    def __init__(self, rules, store, local_batch=20, lease_seconds=1.0, trust_forwarded_for=False):
+        self.rules = rules
+        self.store = store
+        self.local_batch = local_batch
+        self.lease_seconds = lease_seconds
+        self.trust_forwarded_for = trust_forwarded_for
+
+        self._leases = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.allowed = 0
+        self.limited = 0
+        self.local_decisions = 0
+        self.store_calls = 0
+        self.errors = 0
+
+    def client_ip(self, request):
+        if self.trust_forwarded_for:
+            forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+            if forwarded_for:
+                return forwarded_for.split(',')[0].strip()
+        return request.META.get('REMOTE_ADDR', 'unknown')
+
+    def _reserve_local(self, matched, now):
+        """Spend what this worker's leases can cover; call with the lock held.
+
+        Returns the local decisions, the leases a token was reserved from
+        and the (rule, key) pairs the shared buckets must answer. A local
+        denial puts the reserved tokens back and decides on its own.
+        """
+        decisions, reserved, shared = [], [], []
+        for rule, key in matched:
+            lease = self._leases.get(key)
+            if lease is not None and now < lease.denied_until:
+                self._refund(reserved)
+                return [Decision(rule, False, 0, lease.denied_until - now)], [], []
+            if lease is not None and lease.tokens > 0 and now < lease.expires:
+                lease.tokens -= 1
+                reserved.append(lease)
+                decisions.append(Decision(rule, True, lease.remaining + lease.tokens))
+            else:
+                shared.append((rule, key))
+        return decisions, reserved, shared
+
+    @staticmethod
+    def _refund(reserved):
+        for lease in reserved:
+            lease.tokens += 1
+
+    def _prune(self, now):
+        """Forget leases that no longer hold tokens or a denial.
+
+        When most are still live, the oldest quarter goes too so the next
+        new client doesn't scan the whole table again; their unspent tokens
+        are simply lost and a forgotten denial is re-learned from the store.
+        """
+        for key in [k for k, lease in self._leases.items() if now >= max(lease.expires, lease.denied_until)]:
+            del self._leases[key]
+        if len(self._leases) > MAX_LEASES * 3 // 4:
+            for key in list(self._leases)[:MAX_LEASES // 4]:
+                del self._leases[key]
+
+    def _take_shared(self, shared, reserved, now):
+        """Lease a batch of tokens from each shared bucket in one store call"""
+        with self._lock:
+            if len(self._leases) >= MAX_LEASES:
+                self._prune(now)
+            leases = []
+            buckets = []
+            for rule, key in shared:
+                lease = self._leases.setdefault(key, Lease())
+                if lease.tokens == 0 and now < lease.expires:
+                    # Ran dry before the lease expired: ask for more next time
+                    lease.batch = min(lease.batch * 2, self.local_batch)
+                else:
+                    lease.batch = max(lease.batch // 2, 1)
+                leases.append(lease)
+                buckets.append((key, rule.capacity, rule.refill, min(lease.batch, rule.capacity)))
+
+        try:
+            taken = self.store.take(buckets)
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable: {str(e)}")
+            with self._lock:
+                self.errors += 1
+            return [Decision(rule, True, rule.capacity) for rule, _ in shared]
+
+        decisions = []
+        with self._lock:
+            self.store_calls += 1
+            if not all(granted for granted, _, _ in taken):
+                self._refund(reserved)
+
+            for (rule, _), lease, (granted, remaining, wait) in zip(shared, leases, taken):
+                if granted:
+                    lease.tokens = granted - 1
+                    lease.remaining = remaining
+                    lease.expires = now + self.lease_seconds
+                    decisions.append(Decision(rule, True, remaining + lease.tokens))
+                elif wait:
+                    lease.tokens = 0
+                    lease.expires = 0.0
+                    lease.denied_until = now + wait
+                    decisions.append(Decision(rule, False, 0, wait))
+                else:
+                    # Had a token, but another rule denied the request
+                    decisions.append(Decision(rule, True, remaining))
+        return decisions
+
+    def _decide(self, service_name, path, method, client_ip, user_id, local_only):
+        now = time.monotonic()
+        matched = [
+            (rule, rule.bucket_key(client_ip, user_id))
+            for rule in self.rules
+            if rule.matches(service_name, path, method)
+        ]
+
+        with self._lock:
+            decisions, reserved, shared = self._reserve_local(matched, now)
+            if shared and local_only:
+                self._refund(reserved)
+                raise NeedsStore()
+            if matched and not shared:
+                self.local_decisions += 1
+
+        if shared:
+            decisions += self._take_shared(shared, reserved, now)
+
+        result = RateLimitResult(decisions)
+        with self._lock:
+            if result.allowed:
+                self.allowed += 1
+            else:
+                self.limited += 1
+        return result
+
+    def check(self, service_name, path, method, client_ip, user_id=None):
+        """Take a token from every matching rule's bucket"""
+        return self._decide(service_name, path, method, client_ip, user_id, local_only=False)
+
+    async def acheck(self, service_name, path, method, client_ip, user_id=None):
+        """Async check(); only leaves the event loop when a lease runs out"""
+        try:
+            return self._decide(service_name, path, method, client_ip, user_id, local_only=True)
+        except NeedsStore:
+            return await sync_to_async(self.check, thread_sensitive=False)(
+                service_name, path, method, client_ip, user_id
+            )
+
+    def stats(self):
+        """Return limiter counters for monitoring"""
+        with self._lock:
+            return {
+                'store': type(self.store).__name__,
+                'rules': [
+                    {'name': rule.name, 'key': rule.key, 'policy': rule.policy}
+                    for rule in self.rules
+                ],
+                'allowed': self.allowed,
+                'limited': self.limited,
+                'store_calls': self.store_calls,
+                'local_decisions': self.local_decisions,
+                'errors': self.errors,
+            }
+
+
+def build_bucket_store():
+    """Use Redis when the default cache is django-redis, else local buckets"""
+    try:
+        from django_redis import get_redis_connection
+        return RedisBucketStore(get_redis_connection('default'))
+    except NotImplementedError:
+        logger.warning("Cache is not Redis, rate limits are enforced per worker")
+        return LocalBucketStore()
+
+
+_limiter = None
+_limiter_pid = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return this worker's rate limiter, or None when rate limiting is off.
+
+    Rebuilt after a fork, so gunicorn workers started with --preload keep
+    their own leases and Redis connection rather than the master's.
+    """
+    global _limiter, _limiter_pid
+
+    pid = os.getpid()
+    if _limiter_pid == pid:
+        return _limiter
+
+    with _limiter_lock:
+        if _limiter_pid != pid:
+            _limiter = None
+            rate_limit_settings = get_rate_limit_settings()
+            if rate_limit_settings['ENABLED'] and rate_limit_settings['RULES']:
+                _limiter = RateLimiter(
+                    rules=[RateLimitRule.from_settings(rule) for rule in rate_limit_settings['RULES']],
+                    store=build_bucket_store(),
+                    local_batch=rate_limit_settings['LOCAL_BATCH'],
+                    lease_seconds=rate_limit_settings['LEASE_SECONDS'],
+                    trust_forwarded_for=rate_limit_settings['TRUST_FORWARDED_FOR'],
+                )
+            _limiter_pid = pid
+
+    return _limiter
@@ -0,0 +1,432 @@
+"""
+Gateway Response Cache
+Opt-in edge cache for idempotent GET responses, stored in the shared cache
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from service_metrics import record_cache
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+from gateway_service.proxy import (
+    filter_response_headers,
+    header_value,
+    replay_response,
+    request_fingerprint,
+    request_principal,
+)
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_RESPONSE_CACHE_SETTINGS = {
+    'ENABLED': False,
+    'ROUTES': [],
+    'MAX_BODY_BYTES': 1048576,
+    'REFRESH_LOCK_TIMEOUT': 10,
+}
+
+DEFAULT_ROUTE_SETTINGS = {
+    'TTL': 30,
+    'STALE_TTL': 0,
+    # Shared routes serve one copy to every caller; all others are keyed
+    # on the caller's credentials
+    'SHARED': False,
+}
+
+# X-Cache values
+HIT = 'HIT'
+STALE = 'STALE'
+MISS = 'MISS'
+BYPASS = 'BYPASS'
+
+# Response headers that are never replayed from the cache
+UNCACHED_RESPONSE_HEADERS = frozenset([
+    'age',
+    'date',
+    'etag',
+    'server-timing',
+    'x-cache',
+])
+
+
+def get_response_cache_settings():
+    """Return the response cache settings merged with their defaults"""
+    cache_settings = dict(DEFAULT_RESPONSE_CACHE_SETTINGS)
+    cache_settings.update(getattr(settings, 'GATEWAY_RESPONSE_CACHE', {}))
+    return cache_settings
+
+
+def cache_directives(value):
+    """Split a Cache-Control header into a set of lower-cased directive names"""
+    return {part.split('=', 1)[0].strip().lower() for part in (value or '').split(',') if part.strip()}
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+class CacheRoute:
+    """A cached route: a service plus a regex over the proxied path"""
+
+    def __init__(self, service, path, ttl, stale_ttl=0, shared=False):
+        self.service = service
+        self.pattern = re.compile(path)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.name = hashlib.sha256(f'{service}:{path}'.encode()).hexdigest()[:12]
+
+    @classmethod
+    def from_settings(cls, route):
+        options = dict(DEFAULT_ROUTE_SETTINGS)
+        options.update(route)
+        return cls(
+            options['SERVICE'],
+            options['PATH'],
+            ttl=options['TTL'],
+            stale_ttl=options['STALE_TTL'],
+            shared=options['SHARED'],
+        )
+
+    def matches(self, service_name, path):
+        return service_name == self.service and self.pattern.search(path) is not None
+
+    @property
+    def generation_key(self):
+        return f'gateway:response:{self.name}:generation'
+
+
+class ResponseCache:
+    """Edge cache for GET responses of the configured routes.
+
+    Entries are fresh for the route's TTL and may then be served stale for
+    STALE_TTL more seconds while a single request per key refreshes them in
+    the background. Unless a route is SHARED, the key includes a hash of the
+    caller's Authorization and Cookie headers, so a cached response is only
+    ever replayed to the credentials that fetched it. Any write to a cached
+    route bumps its generation and drops every entry of the route at once.
+    Entries carry the generation read before their fetch, so a response
+    fetched across a write is never served after it.
+    """
+
+    def __init__(self, routes, max_body_bytes, refresh_lock_timeout):
+        self.routes = routes
+        self.max_body_bytes = max_body_bytes
+        self.refresh_lock_timeout = refresh_lock_timeout
+
+        self._lock = threading.Lock()
+        self._refresh_tasks = set()
+
+        # Counters
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.refreshes = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def match(self, service_name, path):
+        """Return the cached route for a proxied path, or None"""
+        for route in self.routes:
+            if route.matches(service_name, path):
+                return route
+        return None
+
+    # Keys
+
+    def cache_key(self, route, service_name, path, params, headers):
+        """Key for a request, or None when the client asked to skip the cache"""
+        if cache_directives(header_value(headers, 'cache-control')) & {'no-cache', 'no-store'}:
+            return None
+
+        principal = 'shared' if route.shared else request_principal(headers)
+        digest = request_fingerprint(service_name, path, params, headers)
+        return f'gateway:response:{route.name}:{principal}:{digest}'
+
+    # Lookup and storage
+
+    def lookup(self, route, key):
+        """Return (entry or None, generation) for a key.
+
+        The generation is None when the cache is unavailable; pass it to
+        store() with the result fetched after this lookup.
+        """
+        try:
+            found = cache.get_many([key, route.generation_key])
+        except Exception as e:
+            logger.warning(f"Response cache unavailable: {str(e)}")
+            self._count('errors')
+            return None, None
+
+        generation = found.get(route.generation_key, 0)
+        entry = found.get(key)
+        if entry is None or entry['generation'] != generation:
+            return None, generation
+        return entry, generation
+
+    def storable(self, route, status_code, headers, body):
+        """Whether an upstream response may be cached for this route"""
+        if status_code != 200 or len(body) > self.max_body_bytes:
+            return False
+        if header_value(headers, 'set-cookie') or header_value(headers, 'content-encoding'):
+            return False
+
+        directives = cache_directives(header_value(headers, 'cache-control'))
+        if directives & {'no-store', 'no-cache'}:
+            return False
+        if route.shared and 'private' in directives:
+            return False
+
+        vary = {name.strip().lower() for name in (header_value(headers, 'vary') or '').split(',')}
+        return vary <= {'', 'accept', 'accept-encoding', 'authorization', 'cookie', 'origin'}
+
+    def store(self, route, key, result, generation):
+        """Cache a result fetched under a generation; returns the entry or None if not storable"""
+        status_code, headers, body = result['status'], result['headers'], result['body']
+        if generation is None or not self.storable(route, status_code, headers, body):
+            return None
+
+        headers = {
+            name: value
+            for name, value in filter_response_headers(headers).items()
+            if name.lower() not in UNCACHED_RESPONSE_HEADERS
+        }
+        etag = header_value(headers, 'etag') or f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        now = time.time()
+
+        try:
+            # A write invalidated the route during the fetch. Should one
+            # land after this check instead, the entry's old generation
+            # keeps lookup() from serving it.
+            if cache.get(route.generation_key, 0) != generation:
+                return None
+            entry = {
+                'status': status_code,
+                'headers': headers,
+                'body': body,
+                'etag': etag,
+                'stored_at': now,
+                'fresh_until': now + route.ttl,
+                'generation': generation,
+            }
+            cache.set(key, entry, route.ttl + route.stale_ttl)
+        except Exception as e:
+            logger.warning(f"Could not cache response: {str(e)}")
+            self._count('errors')
+            return None
+
+        self._count('stores')
+        return entry
+
+    def invalidate(self, route):
+        """Drop every cached response of a route"""
+        try:
+            cache.add(route.generation_key, 0, None)
+            cache.incr(route.generation_key)
+            self._count('invalidations')
+        except Exception as e:
+            logger.warning(f"Could not invalidate cached responses: {str(e)}")
+            self._count('errors')
+
+    # Responses
+
+    def respond(self, route, entry, request_headers, state):
+        """Build the client response for a cache entry"""
+        age = max(int(time.time() - entry['stored_at']), 0)
+        max_age = max(int(entry['fresh_until'] - time.time()), 0)
+
+        if etag_matches(header_value(request_headers, 'if-none-match'), entry['etag']):
+            self._count('not_modified')
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(entry['body'], status=entry['status'])
+            for name, value in entry['headers'].items():
+                response[name] = value
+
+        if 'cache-control' not in response:
+            scope = 'public' if route.shared else 'private'
+            response['Cache-Control'] = f'{scope}, max-age={max_age}'
+        if not route.shared:
+            vary = [name.strip() for name in response.get('Vary', '').split(',') if name.strip()]
+            missing = [name for name in ('Authorization', 'Cookie') if name.lower() not in map(str.lower, vary)]
+            response['Vary'] = ', '.join(vary + missing)
+        response['ETag'] = entry['etag']
+        response['Age'] = str(age)
+        response['X-Cache'] = state
+        return response
+
+    def serve(self, route, entry, request_headers):
+        """Answer from a cached entry; returns (response, needs_refresh)"""
+        if time.time() < entry['fresh_until']:
+            self._count('hits')
+            record_cache('response', True)
+            return self.respond(route, entry, request_headers, HIT), False
+
+        self._count('stale_hits')
+        record_cache('response', True)
+        return self.respond(route, entry, request_headers, STALE), True
+
+    def fill(self, route, key, result, request_headers, generation):
+        """Store a fetched result and answer the client from it"""
+        self._count('misses')
+        record_cache('response', False)
+        entry = self.store(route, key, result, generation)
+        if entry is not None:
+            return self.respond(route, entry, request_headers, MISS)
+
+        response = replay_response(result)
+        response['X-Cache'] = BYPASS
+        return response
+
+    def bypass(self, response):
+        """Mark a response fetched without consulting the cache"""
+        self._count('bypassed')
+        response['X-Cache'] = BYPASS
+        return response
+
+    # Background refresh
+
+    def begin_refresh(self, key):
+        """Claim the refresh of a stale key; only one worker wins"""
+        try:
+            return cache.add(f'{key}:refresh', 1, self.refresh_lock_timeout)
+        except Exception as e:
+            logger.warning(f"Response cache unavailable: {str(e)}")
+            return False
+
+    def end_refresh(self, key):
+        self._count('refreshes')
+        try:
+            cache.delete(f'{key}:refresh')
+        except Exception:
+            pass
+
+    def refresh_in_thread(self, key, refresh):
+        """Run refresh() on a daemon thread if this worker won the refresh"""
+        if not self.begin_refresh(key):
+            return
+
+        def run():
+            try:
+                refresh()
+            except Exception as e:
+                logger.error(f"Response cache refresh failed: {str(e)}")
+            finally:
+                self.end_refresh(key)
+
+        threading.Thread(target=run, name='response-cache-refresh', daemon=True).start()
+
+    # Async wrappers
+
+    async def alookup(self, route, key):
+        return await sync_to_async(self.lookup, thread_sensitive=False)(route, key)
+
+    async def astore(self, route, key, result, generation):
+        return await sync_to_async(self.store, thread_sensitive=False)(route, key, result, generation)
+
+    async def afill(self, route, key, result, request_headers, generation):
+        return await sync_to_async(self.fill, thread_sensitive=False)(
+            route, key, result, request_headers, generation
+        )
+
+    async def ainvalidate(self, route):
+        await sync_to_async(self.invalidate, thread_sensitive=False)(route)
+
+    async def arefresh_in_task(self, key, refresh):
+        """Schedule the refresh() coroutine function if this worker won the refresh"""
+        if not await sync_to_async(self.begin_refresh, thread_sensitive=False)(key):
+            return
+
+        async def run():
+            try:
+                await refresh()
+            except Exception as e:
+                logger.error(f"Response cache refresh failed: {str(e)}")
+            finally:
+                await sync_to_async(self.end_refresh, thread_sensitive=False)(key)
+
+        # Keep a reference so the task is not garbage collected mid-flight
+        task = asyncio.ensure_future(run())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    def stats(self):
+        """Return cache counters for monitoring"""
+        with self._lock:
+            served = self.hits + self.stale_hits
+            lookups = served + self.misses
+            return {
+                'pid': os.getpid(),
+                'routes': [
+                    {'service': route.service, 'path': route.pattern.pattern, 'ttl': route.ttl,
+                     'stale_ttl': route.stale_ttl, 'shared': route.shared}
+                    for route in self.routes
+                ],
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'bypassed': self.bypassed,
+                'stores': self.stores,
+                'refreshes': self.refreshes,
+                'invalidations': self.invalidations,
+                'errors': self.errors,
+                'hit_ratio': round(served / lookups, 4) if lookups else 0.0,
+            }
+
+
+_response_cache = None
+_response_cache_pid = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return this worker's response cache, or None when it is disabled"""
+    global _response_cache, _response_cache_pid
+
+    pid = os.getpid()
+    if _response_cache_pid == pid:
+        return _response_cache
+
+    with _response_cache_lock:
+        if _response_cache_pid != pid:
+            cache_settings = get_response_cache_settings()
+            if cache_settings['ENABLED']:
+                _response_cache = ResponseCache(
+                    routes=[CacheRoute.from_settings(route) for route in cache_settings['ROUTES']],
+                    max_body_bytes=cache_settings['MAX_BODY_BYTES'],
+                    refresh_lock_timeout=cache_settings['REFRESH_LOCK_TIMEOUT'],
+                )
+            else:
+                _response_cache = None
+            _response_cache_pid = pid
+
+    return _response_cache
@@ -37,6 +37,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'service_metrics.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -48,7 +49,21 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'gateway_service.urls'
-TEMPLATES = []
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
 WSGI_APPLICATION = 'gateway_service.wsgi.application'
 
 # Database (Gateway doesn't need its own database)
@@ -116,6 +131,159 @@ CORS_ALLOW_CREDENTIALS = True
 # Service URLs
 USER_SERVICE_URL = os.environ.get('USER_SERVICE_URL', 'http://localhost:8001')
 
+# Comma-separated user service instances to balance over (defaults to USER_SERVICE_URL)
+USER_SERVICE_URLS = [
+    url.strip()
+    for url in os.environ.get('USER_SERVICE_URLS', USER_SERVICE_URL).split(',')
+    if url.strip()
+]
+
+# Local verification of user service access tokens. Verified claims are
+# forwarded in a header signed with CLAIMS_SECRET, which the services share.
+GATEWAY_JWT = {
+    'ENABLED': os.environ.get('GATEWAY_JWT_ENABLED', 'True') == 'True',
+    'ALGORITHM': 'HS256',
+    'SIGNING_KEY': os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production'),
+    'LEEWAY': int(os.environ.get('JWT_LEEWAY', '0')),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'USER_ID_CLAIM': 'user_id',
+    'CLAIMS_SECRET': os.environ.get('GATEWAY_CLAIMS_SECRET', 'gateway-claims-secret-change-in-production'),
+}
+
+# Token bucket rate limits kept in Redis. KEY is 'ip', 'user' (verified
+# user id, else the client address) or 'route' (one bucket for everyone);
+# SERVICE, PATH (regex) and METHODS narrow a rule to some requests.
+# Workers lease up to LOCAL_BATCH tokens at a time to skip most Redis calls.
+GATEWAY_RATE_LIMIT = {
+    'ENABLED': os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True',
+    'LOCAL_BATCH': int(os.environ.get('RATE_LIMIT_LOCAL_BATCH', '20')),
+    'LEASE_SECONDS': float(os.environ.get('RATE_LIMIT_LEASE_SECONDS', '1')),
+    'TRUST_FORWARDED_FOR': os.environ.get('RATE_LIMIT_TRUST_FORWARDED_FOR', 'False') == 'True',
+    'RULES': [
+        {
+            'NAME': 'ip',
+            'KEY': 'ip',
+            'RATE': int(os.environ.get('RATE_LIMIT_PER_IP', '600')),
+            'PERIOD': 60,
+        },
+        {
+            'NAME': 'user',
+            'KEY': 'user',
+            'RATE': int(os.environ.get('RATE_LIMIT_PER_USER', '300')),
+            'PERIOD': 60,
+        },
+        {
+            'NAME': 'auth',
+            'KEY': 'ip',
+            'SERVICE': 'user',
+            'PATH': r'^api/auth/(login|register)/',
+            'METHODS': ['POST'],
+            'RATE': int(os.environ.get('RATE_LIMIT_AUTH_PER_IP', '10')),
+            'PERIOD': 60,
+        },
+    ],
+}
+
+# Load balancing across service instances
+GATEWAY_LOAD_BALANCER = {
+    # round_robin, least_outstanding or ewma
+    'STRATEGY': os.environ.get('LOAD_BALANCER_STRATEGY', 'round_robin'),
+    'EWMA_DECAY': float(os.environ.get('LOAD_BALANCER_EWMA_DECAY', '10')),
+    'CONSECUTIVE_FAILURES': int(os.environ.get('LOAD_BALANCER_CONSECUTIVE_FAILURES', '3')),
+    'EJECTION_SECONDS': int(os.environ.get('LOAD_BALANCER_EJECTION_SECONDS', '30')),
+    'HEALTH_CHECK_INTERVAL': int(os.environ.get('LOAD_BALANCER_HEALTH_CHECK_INTERVAL', '10')),
+    'HEALTH_CHECK_TIMEOUT': float(os.environ.get('LOAD_BALANCER_HEALTH_CHECK_TIMEOUT', '2')),
+}
+
+# Upstream connection pooling (per gateway worker)
+GATEWAY_UPSTREAM_POOL = {
+    'POOL_SIZE': int(os.environ.get('UPSTREAM_POOL_SIZE', '10')),
+    'MAX_PER_HOST': int(os.environ.get('UPSTREAM_POOL_MAX_PER_HOST', '20')),
+    'BLOCK': os.environ.get('UPSTREAM_POOL_BLOCK', 'False') == 'True',
+    'KEEPALIVE_TIMEOUT': float(os.environ.get('UPSTREAM_KEEPALIVE_TIMEOUT', '30')),
+    'ASYNC_MAX_CONNECTIONS': int(os.environ.get('UPSTREAM_ASYNC_MAX_CONNECTIONS', '1000')),
+}
+
+# Upstream call timeouts in seconds
+GATEWAY_UPSTREAM_TIMEOUT = {
+    'CONNECT': float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', '3.05')),
+    'READ': float(os.environ.get('UPSTREAM_READ_TIMEOUT', '30')),
+}
+
+# Per-service circuit breakers, shared by all workers through the cache
+GATEWAY_CIRCUIT_BREAKER = {
+    'ENABLED': os.environ.get('CIRCUIT_BREAKER_ENABLED', 'True') == 'True',
+    'FAILURE_THRESHOLD': int(os.environ.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD', '5')),
+    'SLOW_CALL_THRESHOLD': int(os.environ.get('CIRCUIT_BREAKER_SLOW_CALL_THRESHOLD', '10')),
+    'SLOW_CALL_MS': int(os.environ.get('CIRCUIT_BREAKER_SLOW_CALL_MS', '5000')),
+    'WINDOW': int(os.environ.get('CIRCUIT_BREAKER_WINDOW', '30')),
+    'OPEN_SECONDS': int(os.environ.get('CIRCUIT_BREAKER_OPEN_SECONDS', '30')),
+    'TRIAL_TIMEOUT': int(os.environ.get('CIRCUIT_BREAKER_TRIAL_TIMEOUT', '30')),
+    'LOCAL_TTL': 1.0,
+    'TRANSITION_HISTORY': 20,
+}
+
+# Stream upstream response bodies to clients as-is instead of decoding
+# and re-rendering them
+GATEWAY_STREAM_RESPONSES = os.environ.get('GATEWAY_STREAM_RESPONSES', 'True') == 'True'
+GATEWAY_STREAM_CHUNK_SIZE = int(os.environ.get('GATEWAY_STREAM_CHUNK_SIZE', '65536'))
+
+# Edge cache for GET responses, off unless enabled. Only the routes listed
+# here are cached; PATH is a regex over the proxied path. Entries are keyed
+# on the caller's credentials unless SHARED, and any write to a route drops
+# its entries. A cached route serves responses up to TTL seconds old, so
+# only list routes whose clients can accept that, e.g.
+#     {'SERVICE': 'user', 'PATH': r'^api/vehicles/', 'TTL': 15, 'STALE_TTL': 30}
+GATEWAY_RESPONSE_CACHE = {
+    'ENABLED': os.environ.get('RESPONSE_CACHE_ENABLED', 'False') == 'True',
+    'MAX_BODY_BYTES': int(os.environ.get('RESPONSE_CACHE_MAX_BODY_BYTES', '1048576')),
+    'REFRESH_LOCK_TIMEOUT': 10,
+    'ROUTES': [],
+}
+
+# Single-flight for identical concurrent GETs (same path, query and
+# caller). Cached routes are always coalesced on a miss; ROUTES adds
+# uncached ones, whose bodies are then buffered rather than streamed.
+# DISTRIBUTED also coalesces across workers through Redis.
+GATEWAY_REQUEST_COALESCING = {
+    'ENABLED': os.environ.get('REQUEST_COALESCING_ENABLED', 'True') == 'True',
+    'DISTRIBUTED': os.environ.get('REQUEST_COALESCING_DISTRIBUTED', 'False') == 'True',
+    'WAIT_TIMEOUT': float(os.environ.get('REQUEST_COALESCING_WAIT_TIMEOUT', '30')),
+    'POLL_INTERVAL': 0.01,
+    'RESULT_TTL': 5,
+    'ROUTES': [
+        {'SERVICE': 'user', 'PATH': r'^api/users/(list/)?$'},
+    ],
+}
+
+# Service status probing
+GATEWAY_HEALTH_CHECK = {
+    'DEADLINE': float(os.environ.get('HEALTH_CHECK_DEADLINE', '5')),
+    'CACHE_TTL': int(os.environ.get('HEALTH_CHECK_CACHE_TTL', '5')),
+    'PATH': '/api/health/',
+}
+
+# Proxy mode: 'sync' (DRF view, WSGI) or 'async' (async view, ASGI)
+GATEWAY_PROXY_MODE = os.environ.get('GATEWAY_PROXY_MODE', 'sync')
+
+# Per-route request metrics, scraped from /metrics. With gunicorn's
+# several workers, METRICS_MULTIPROCESS_DIR lets any worker report all.
+METRICS = {
+    'ENABLED': os.environ.get('METRICS_ENABLED', 'True') == 'True',
+    'SERVER_TIMING': DEBUG,
+    # Follows the user service's entries in relayed Server-Timing headers
+    'SERVER_TIMING_PREFIX': 'gateway',
+    # One route label per proxied service, not per proxied path
+    'ROUTE_LABELS': 'gateway_service.proxy.metrics_route',
+    # Scrapes from anywhere else are refused; see service_metrics
+    'ALLOWED_NETWORKS': os.environ.get(
+        'METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7'
+    ).split(','),
+    'TOKEN': os.environ.get('METRICS_TOKEN') or None,
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROCESS_DIR') or None,
+    'FLUSH_INTERVAL': 5.0,
+}
+
 # Logging
 LOGGING = {
     'version': 1,
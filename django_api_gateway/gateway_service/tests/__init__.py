@@ -0,0 +1 @@
+"""Gateway service tests"""
@@ -0,0 +1,124 @@
+"""Gateway Authentication Tests
+Only tokens signed with the user service's key get through, and only the
+gateway sets the claims header the services trust
+"""
+
+from unittest import mock
+import time
+import uuid
+
+from django.core import signing
+from django.http import HttpResponse
+from django.test import SimpleTestCase
+import jwt
+
+from gateway_service.auth import CLAIMS_HEADER, DEFAULT_JWT_SETTINGS, InvalidToken, TokenVerifier
+from gateway_service.views import ServiceProxyView
+
+SIGNING_KEY = 'signing-key-of-the-user-service-under-test'
+CLAIMS_SECRET = 'test-claims-secret'
+
+
+def make_verifier():
+    options = dict(DEFAULT_JWT_SETTINGS, SIGNING_KEY=SIGNING_KEY, CLAIMS_SECRET=CLAIMS_SECRET)
+    options.pop('ENABLED')
+    return TokenVerifier(**options)
+
+
+def make_token(key=SIGNING_KEY, lifetime=300, **claims):
+    now = int(time.time())
+    payload = {'token_type': 'access', 'user_id': 42, 'jti': uuid.uuid4().hex, 'iat': now, 'exp': now + lifetime}
+    payload.update(claims)
+    return jwt.encode({name: value for name, value in payload.items() if value is not None}, key, algorithm='HS256')
+
+
+class TokenVerifierTests(SimpleTestCase):
+
+    def setUp(self):
+        self.verifier = make_verifier()
+
+    def authenticate(self, token, **headers):
+        return self.verifier.authenticate({'Authorization': f'Bearer {token}', **headers})
+
+    def test_valid_token_forwards_signed_claims(self):
+        headers, claims = self.authenticate(make_token())
+
+        self.assertEqual(claims['user_id'], 42)
+        forwarded = signing.loads(headers[CLAIMS_HEADER], key=CLAIMS_SECRET, salt='gateway.claims')
+        self.assertEqual(forwarded['user_id'], 42)
+        self.assertEqual(set(forwarded), {'user_id', 'jti', 'exp', 'iat'})
+
+    def test_bad_signature_is_rejected(self):
+        with self.assertRaises(InvalidToken):
+            self.authenticate(make_token(key='someone-elses-signing-key-of-the-same-length'))
+
+    def test_expired_token_is_rejected(self):
+        with self.assertRaises(InvalidToken):
+            self.authenticate(make_token(lifetime=-1))
+
+    def test_refresh_token_is_rejected(self):
+        with self.assertRaisesMessage(InvalidToken, 'wrong type'):
+            self.authenticate(make_token(token_type='refresh'))
+
+    def test_token_without_user_id_is_rejected(self):
+        with self.assertRaisesMessage(InvalidToken, 'user identification'):
+            self.authenticate(make_token(user_id=None))
+
+    def test_malformed_header_is_rejected(self):
+        with self.assertRaises(InvalidToken):
+            self.verifier.authenticate({'Authorization': 'Bearer one two'})
+
+    def test_other_schemes_pass_through(self):
+        headers, claims = self.verifier.authenticate({'Authorization': 'Basic dXNlcjpwYXNz'})
+
+        self.assertIsNone(claims)
+        self.assertEqual(headers, {'Authorization': 'Basic dXNlcjpwYXNz'})
+
+    def test_client_claims_are_stripped_without_a_token(self):
+        forged = signing.dumps({'user_id': 1}, key=CLAIMS_SECRET, salt='gateway.claims')
+
+        headers, claims = self.verifier.authenticate({'x-gateway-claims': forged})
+
+        self.assertIsNone(claims)
+        self.assertEqual(headers, {})
+
+    def test_client_claims_are_replaced_with_a_token(self):
+        forged = signing.dumps({'user_id': 1}, key=CLAIMS_SECRET, salt='gateway.claims')
+
+        headers, _ = self.authenticate(make_token(), **{'X-Gateway-Claims': forged})
+
+        forwarded = signing.loads(headers[CLAIMS_HEADER], key=CLAIMS_SECRET, salt='gateway.claims')
+        self.assertEqual(forwarded['user_id'], 42)
+        self.assertEqual([name for name in headers if name.lower() == 'x-gateway-claims'], [CLAIMS_HEADER])
+
+
+class ProxyClaimsHeaderTests(SimpleTestCase):
+    """What the proxy view hands on to the upstream"""
+
+    def forwarded_headers(self, verifier, **extra):
+        with mock.patch('gateway_service.views.get_token_verifier', return_value=verifier), \
+                mock.patch.object(ServiceProxyView, 'route_request', return_value=HttpResponse()) as route:
+            self.client.get('/api/user/users/me/', HTTP_X_GATEWAY_CLAIMS='forged', **extra)
+        return route.call_args.args[4]
+
+    def test_client_claims_header_is_never_forwarded(self):
+        for verifier in (make_verifier(), None):
+            with self.subTest(verifier=verifier):
+                headers = self.forwarded_headers(verifier)
+                self.assertNotIn('x-gateway-claims', {name.lower() for name in headers})
+
+    def test_only_the_gateways_claims_are_forwarded(self):
+        headers = self.forwarded_headers(make_verifier(), HTTP_AUTHORIZATION=f'Bearer {make_token()}')
+
+        forwarded = signing.loads(headers[CLAIMS_HEADER], key=CLAIMS_SECRET, salt='gateway.claims')
+        self.assertEqual(forwarded['user_id'], 42)
+
+    def test_bad_token_is_answered_without_an_upstream_call(self):
+        with mock.patch('gateway_service.views.get_token_verifier', return_value=make_verifier()), \
+                mock.patch.object(ServiceProxyView, 'route_request') as route:
+            response = self.client.get(
+                '/api/user/users/me/', HTTP_AUTHORIZATION=f'Bearer {make_token(key="someone-elses-signing-key-of-the-same-length")}'
+            )
+
+        self.assertEqual(response.status_code, 401)
+        route.assert_not_called()
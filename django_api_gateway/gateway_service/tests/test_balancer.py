@@ -0,0 +1,251 @@
+"""Gateway Load Balancing Tests
+Strategy choice, outlier ejection and health checks, alone and through the proxy
+"""
+
+from collections import Counter
+from unittest import mock
+import socket
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from gateway_service import balancer as balancer_module
+from gateway_service.balancer import (
+    DEFAULT_BALANCER_SETTINGS,
+    EwmaBalancer,
+    LeastOutstandingBalancer,
+    RoundRobinBalancer,
+)
+
+URLS = ['http://10.0.0.1:8001', 'http://10.0.0.2:8001', 'http://10.0.0.3:8001']
+
+
+def make_balancer(balancer_class, urls=URLS, **options):
+    balancer_options = dict(DEFAULT_BALANCER_SETTINGS, **options)
+    balancer_options.pop('STRATEGY')
+    return balancer_class('user', urls, **balancer_options)
+
+
+class StrategyTests(SimpleTestCase):
+    """Each strategy picks the instance its signal says it should"""
+
+    def test_round_robin_spreads_evenly(self):
+        balancer = make_balancer(RoundRobinBalancer)
+        picks = Counter()
+        for _ in range(300):
+            instance = balancer.acquire()
+            picks[instance.url] += 1
+            balancer.release(instance, 10.0)
+        self.assertEqual(picks, {url: 100 for url in URLS})
+
+    def test_least_outstanding_prefers_idle_instance(self):
+        balancer = make_balancer(LeastOutstandingBalancer)
+        busy = [balancer.acquire() for _ in range(len(URLS))]
+        self.assertEqual({i.url for i in busy}, set(URLS))
+
+        # Finish the call on one instance: it is now the only idle one
+        balancer.release(busy[1], 10.0)
+        for _ in range(5):
+            instance = balancer.acquire()
+            self.assertIs(instance, busy[1])
+            balancer.release(instance, 10.0)
+
+    def test_least_outstanding_spreads_concurrent_calls(self):
+        balancer = make_balancer(LeastOutstandingBalancer)
+        in_flight = [balancer.acquire() for _ in range(len(URLS) * 4)]
+        self.assertEqual(Counter(i.url for i in in_flight), {url: 4 for url in URLS})
+
+    def test_ewma_prefers_lowest_latency(self):
+        balancer = make_balancer(EwmaBalancer)
+        fast, medium, slow = balancer.instances
+        for instance, latency in ((fast, 5.0), (medium, 20.0), (slow, 80.0)):
+            instance.outstanding += 1
+            balancer.release(instance, latency)
+
+        picks = Counter()
+        for _ in range(50):
+            instance = balancer.acquire()
+            picks[instance.url] += 1
+            balancer.release(instance, {fast: 5.0, medium: 20.0, slow: 80.0}[instance])
+        self.assertEqual(picks, {fast.url: 50})
+
+    def test_ewma_scales_latency_by_outstanding(self):
+        balancer = make_balancer(EwmaBalancer, urls=URLS[:2])
+        fast, slow = balancer.instances
+        for instance, latency in ((fast, 10.0), (slow, 25.0)):
+            instance.outstanding += 1
+            balancer.release(instance, latency)
+
+        # 10 ms with two calls queued scores 30, worse than an idle 25 ms
+        fast.outstanding = 2
+        self.assertIs(balancer.acquire(), slow)
+
+    def test_ewma_tries_unsampled_instances_first(self):
+        balancer = make_balancer(EwmaBalancer)
+        seen = set()
+        for _ in range(len(URLS)):
+            instance = balancer.acquire()
+            seen.add(instance.url)
+            balancer.release(instance, 10.0)
+        self.assertEqual(seen, set(URLS))
+
+
+class EjectionTests(SimpleTestCase):
+    """Failing instances are ejected for a while and come back afterwards"""
+
+    def setUp(self):
+        self.clock = 1000.0
+        patcher = mock.patch.object(balancer_module, 'time')
+        self.addCleanup(patcher.stop)
+        patcher.start().monotonic.side_effect = lambda: self.clock
+        self.balancer = make_balancer(RoundRobinBalancer)
+        self.bad = self.balancer.instances[0]
+
+    def record_failures(self, instance, times):
+        for _ in range(times):
+            instance.outstanding += 1
+            self.balancer.release(instance, failed=True)
+
+    def picks(self, count):
+        urls = Counter()
+        for _ in range(count):
+            instance = self.balancer.acquire()
+            urls[instance.url] += 1
+            self.balancer.release(instance, 10.0)
+        return urls
+
+    def test_ejects_after_consecutive_failures(self):
+        self.record_failures(self.bad, DEFAULT_BALANCER_SETTINGS['CONSECUTIVE_FAILURES'] - 1)
+        self.assertTrue(self.bad.is_available(self.clock))
+
+        self.record_failures(self.bad, 1)
+        self.assertNotIn(self.bad.url, self.picks(30))
+        self.assertTrue(self.balancer.snapshot()['instances'][0]['ejected'])
+
+    def test_success_resets_the_failure_streak(self):
+        streak = DEFAULT_BALANCER_SETTINGS['CONSECUTIVE_FAILURES'] - 1
+        self.record_failures(self.bad, streak)
+        self.bad.outstanding += 1
+        self.balancer.release(self.bad, 10.0)
+        self.record_failures(self.bad, streak)
+        self.assertIn(self.bad.url, self.picks(30))
+
+    def test_recovers_after_ejection_period(self):
+        self.record_failures(self.bad, DEFAULT_BALANCER_SETTINGS['CONSECUTIVE_FAILURES'])
+        self.clock += DEFAULT_BALANCER_SETTINGS['EJECTION_SECONDS'] - 1
+        self.assertNotIn(self.bad.url, self.picks(30))
+
+        self.clock += 1
+        self.assertEqual(self.picks(30), {url: 10 for url in URLS})
+
+    def test_falls_back_to_every_instance_when_all_are_ejected(self):
+        for instance in self.balancer.instances:
+            self.record_failures(instance, DEFAULT_BALANCER_SETTINGS['CONSECUTIVE_FAILURES'])
+        self.assertEqual(set(self.picks(30)), set(URLS))
+
+    def test_health_check_excludes_and_restores_instances(self):
+        def probe(status):
+            def probe_services(services, deadline, session_name=None):
+                return {
+                    url: {'status': status if url == self.bad.url else 'healthy'}
+                    for url in services
+                }
+            return probe_services
+
+        with mock.patch('gateway_service.health.probe_services', probe('unhealthy')):
+            self.balancer.check_health()
+        self.assertNotIn(self.bad.url, self.picks(30))
+
+        with mock.patch('gateway_service.health.probe_services', probe('healthy')):
+            self.balancer.check_health()
+        self.assertIn(self.bad.url, self.picks(30))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@override_settings(
+    GATEWAY_CIRCUIT_BREAKER={'ENABLED': False},
+    GATEWAY_RESPONSE_CACHE={'ENABLED': False},
+    GATEWAY_REQUEST_COALESCING={'ENABLED': False},
+    GATEWAY_UPSTREAM_TIMEOUT={'CONNECT': 0.5, 'READ': 5},
+)
+class StubProxyTestCase(SimpleTestCase):
+    """Proxies requests to local stub instances with the given latencies"""
+
+    delays = ()
+
+    def setUp(self):
+        from benchmarks.stub_upstream import start_in_background
+
+        self.stubs = []
+        self.urls = []
+        for delay in self.delays:
+            port = free_port()
+            self.stubs.append(start_in_background(port, delay))
+            self.urls.append(f'http://127.0.0.1:{port}')
+        self.addCleanup(self.stop_stubs)
+        self.addCleanup(balancer_module._balancers.clear)
+        self.factory = RequestFactory()
+
+    def stop_stubs(self):
+        for stub in self.stubs:
+            stub.terminate()
+            stub.join()
+
+    def proxy(self, strategy, count):
+        from gateway_service.views import ServiceProxyView
+
+        load_balancer = dict(DEFAULT_BALANCER_SETTINGS, STRATEGY=strategy)
+        view = ServiceProxyView.as_view()
+        statuses = Counter()
+        with override_settings(USER_SERVICE_URLS=self.urls, GATEWAY_LOAD_BALANCER=load_balancer):
+            balancer_module._balancers.clear()
+            for _ in range(count):
+                response = view(self.factory.get('/api/user/api/health/'), service_name='user', path='api/health/')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                    response.close()
+                else:
+                    response.render()
+                statuses[response.status_code] += 1
+            balancer = balancer_module.get_balancer('user', self.urls)
+        return statuses, {i.url: i for i in balancer.instances}
+
+
+class ProxyBalancingTests(StubProxyTestCase):
+    """Requests proxied over three equally fast stubs"""
+
+    delays = (1, 1, 1)
+
+    def test_round_robin_spreads_over_stubs(self):
+        statuses, instances = self.proxy('round_robin', 30)
+        self.assertEqual(statuses, {200: 30})
+        self.assertEqual([instances[url].requests for url in self.urls], [10, 10, 10])
+
+    def test_dead_stub_is_ejected(self):
+        self.stubs[0].terminate()
+        self.stubs[0].join()
+
+        statuses, instances = self.proxy('round_robin', 30)
+        dead = instances[self.urls[0]]
+        failures = DEFAULT_BALANCER_SETTINGS['CONSECUTIVE_FAILURES']
+        self.assertEqual(dead.requests, failures)
+        self.assertEqual(dead.failures, failures)
+        self.assertEqual(statuses, {200: 30 - failures, 503: failures})
+
+
+class ProxyEwmaTests(StubProxyTestCase):
+    """The EWMA strategy steers proxied traffic to the fastest stub"""
+
+    delays = (1, 40)
+
+    def test_ewma_prefers_fast_stub(self):
+        statuses, instances = self.proxy('ewma', 20)
+        self.assertEqual(statuses, {200: 20})
+        fast, slow = (instances[url] for url in self.urls)
+        self.assertGreater(fast.requests, 15)
+        self.assertLess(slow.ewma_ms, 1000)
+        self.assertGreater(slow.ewma_ms, fast.ewma_ms)
@@ -0,0 +1,214 @@
+"""Gateway Request Coalescing Tests
+Identical concurrent GETs share one upstream call, and nothing else does
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from gateway_service.coalescing import RequestCoalescer
+from gateway_service.proxy import request_fingerprint
+
+ROUTES = [{'SERVICE': 'user', 'PATH': r'^api/vehicles/'}]
+
+
+def result(body=b'[]'):
+    return {'status': 200, 'headers': {'Content-Type': 'application/json'}, 'body': body}
+
+
+class FingerprintTests(SimpleTestCase):
+
+    def test_query_values_cannot_forge_other_parameters(self):
+        self.assertNotEqual(
+            request_fingerprint('user', 'api/vehicles/', {'a': '1&b=2'}, {}),
+            request_fingerprint('user', 'api/vehicles/', {'a': '1', 'b': '2'}, {}),
+        )
+        self.assertNotEqual(
+            request_fingerprint('user', 'api/vehicles/', {'a': '1=2'}, {}),
+            request_fingerprint('user', 'api/vehicles/', {'a=1': '2'}, {}),
+        )
+
+    def test_parameter_order_does_not_matter(self):
+        self.assertEqual(
+            request_fingerprint('user', 'api/vehicles/', {'b': '2', 'a': '1'}, {}),
+            request_fingerprint('user', 'api/vehicles/', {'a': '1', 'b': '2'}, {}),
+        )
+
+    def test_accept_header_is_part_of_the_identity(self):
+        self.assertNotEqual(
+            request_fingerprint('user', 'api/vehicles/', {}, {'Accept': 'application/json'}),
+            request_fingerprint('user', 'api/vehicles/', {}, {'Accept': 'text/csv'}),
+        )
+
+
+class KeyTests(SimpleTestCase):
+
+    def setUp(self):
+        self.coalescer = RequestCoalescer(ROUTES)
+
+    def key(self, params=None, headers=None, generation=None):
+        return self.coalescer.key('user', 'api/vehicles/', params or {}, headers or {}, generation)
+
+    def test_match(self):
+        self.assertTrue(self.coalescer.match('user', 'api/vehicles/12/'))
+        self.assertFalse(self.coalescer.match('user', 'api/users/me/'))
+        self.assertFalse(self.coalescer.match('trip', 'api/vehicles/'))
+
+    def test_callers_never_share_a_key(self):
+        self.assertNotEqual(self.key(headers={'Authorization': 'Bearer alice'}), self.key())
+        self.assertNotEqual(
+            self.key(headers={'Authorization': 'Bearer alice'}),
+            self.key(headers={'Authorization': 'Bearer bob'}),
+        )
+        self.assertNotEqual(self.key(headers={'Cookie': 'sessionid=alice'}), self.key())
+
+    def test_colliding_queries_get_different_keys(self):
+        self.assertNotEqual(self.key({'a': '1&b=2'}), self.key({'a': '1', 'b': '2'}))
+
+    def test_cache_generations_get_different_keys(self):
+        self.assertNotEqual(self.key(generation=1), self.key(generation=2))
+        self.assertEqual(self.key(generation=1), self.key(generation=1))
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.coalescer = RequestCoalescer(ROUTES)
+        self.release = threading.Event()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def slow_fetch(self, body=b'[]'):
+        def fetch():
+            with self.calls_lock:
+                self.calls += 1
+            self.release.wait(5)
+            return result(body)
+        return fetch
+
+    def run_concurrently(self, keys_and_fetches):
+        with ThreadPoolExecutor(len(keys_and_fetches)) as pool:
+            futures = [pool.submit(self.coalescer.run, key, fetch) for key, fetch in keys_and_fetches]
+            # Let every request reach the coalescer before the leader answers
+            while self.coalescer.stats()['in_flight'] < len({key for key, _ in keys_and_fetches}):
+                time.sleep(0.001)
+            threading.Timer(0.05, self.release.set).start()
+            return [future.result(5) for future in futures]
+
+    def test_identical_requests_share_one_call(self):
+        results = self.run_concurrently([('same', self.slow_fetch())] * 8)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({result['body'] for result in results}, {b'[]'})
+        stats = self.coalescer.stats()
+        self.assertEqual((stats['leaders'], stats['local_saved'], stats['in_flight']), (1, 7, 0))
+
+    def test_different_keys_do_not_share(self):
+        results = self.run_concurrently([
+            ('alice', self.slow_fetch(b'["alice"]')),
+            ('bob', self.slow_fetch(b'["bob"]')),
+        ])
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual([result['body'] for result in results], [b'["alice"]', b'["bob"]'])
+
+    def test_waiters_make_their_own_call_when_the_leader_fails(self):
+        started = threading.Event()
+
+        def failing_fetch():
+            started.set()
+            self.release.wait(5)
+            raise ConnectionError('upstream down')
+
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(self.coalescer.run, 'same', failing_fetch)
+            started.wait(5)
+            waiter = pool.submit(self.coalescer.run, 'same', lambda: result(b'["own"]'))
+            threading.Timer(0.05, self.release.set).start()
+
+            with self.assertRaises(ConnectionError):
+                leader.result(5)
+            self.assertEqual(waiter.result(5)['body'], b'["own"]')
+        self.assertEqual(self.coalescer.stats()['fallbacks'], 1)
+
+    def test_sequential_requests_each_go_upstream(self):
+        self.release.set()
+        self.coalescer.run('same', self.slow_fetch())
+        self.coalescer.run('same', self.slow_fetch())
+
+        self.assertEqual(self.calls, 2)
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+
+    def test_identical_requests_share_one_call(self):
+        coalescer = RequestCoalescer(ROUTES)
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return result()
+
+        async def main():
+            return await asyncio.gather(*(coalescer.arun('same', fetch) for _ in range(8)))
+
+        results = async_to_sync(main)()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertEqual(coalescer.stats()['local_saved'], 7)
+
+
+class DistributedFlightTests(SimpleTestCase):
+    """Two coalescers sharing the cache stand in for two workers"""
+
+    def setUp(self):
+        cache.clear()
+        self.leader = RequestCoalescer(ROUTES, distributed=True, poll_interval=0.005)
+        self.follower = RequestCoalescer(ROUTES, distributed=True, poll_interval=0.005)
+
+    def test_follower_waits_for_the_leaders_result(self):
+        claimed, release = threading.Event(), threading.Event()
+
+        def leader_fetch():
+            claimed.set()
+            release.wait(5)
+            return result(b'["leader"]')
+
+        def follower_fetch():
+            raise AssertionError('the follower should not go upstream')
+
+        with ThreadPoolExecutor(2) as pool:
+            leading = pool.submit(self.leader.run, 'same', leader_fetch)
+            claimed.wait(5)
+            following = pool.submit(self.follower.run, 'same', follower_fetch)
+            threading.Timer(0.05, release.set).start()
+
+            self.assertEqual(leading.result(5)['body'], b'["leader"]')
+            self.assertEqual(following.result(5)['body'], b'["leader"]')
+        self.assertEqual(self.follower.stats()['remote_saved'], 1)
+
+    def test_follower_falls_back_when_the_leader_fails(self):
+        claimed, release = threading.Event(), threading.Event()
+
+        def leader_fetch():
+            claimed.set()
+            release.wait(5)
+            raise ConnectionError('upstream down')
+
+        with ThreadPoolExecutor(2) as pool:
+            leading = pool.submit(self.leader.run, 'same', leader_fetch)
+            claimed.wait(5)
+            following = pool.submit(self.follower.run, 'same', lambda: result(b'["own"]'))
+            threading.Timer(0.05, release.set).start()
+
+            with self.assertRaises(ConnectionError):
+                leading.result(5)
+            self.assertEqual(following.result(5)['body'], b'["own"]')
+        self.assertEqual(self.follower.stats()['fallbacks'], 1)
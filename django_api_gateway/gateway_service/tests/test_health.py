@@ -0,0 +1,165 @@
+"""Gateway Health Probing Tests
+Probes run concurrently, never outlast the deadline, and are cached briefly
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import json
+import socket
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from gateway_service import health
+from gateway_service.health import get_services_status, probe_services
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    """Answers the health check after the server's delay, with its status"""
+
+    def do_GET(self):
+        self.server.probes += 1
+        time.sleep(self.server.delay)
+        body = json.dumps({'status': 'healthy'}).encode()
+        try:
+            self.send_response(self.server.status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            # The gateway gave up on this probe
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeService(ThreadingHTTPServer):
+    # Don't wait for a probe the gateway gave up on when shutting down
+    daemon_threads = True
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class HealthProbeTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def start_service(self, delay=0.0, status=200):
+        server = FakeService(('127.0.0.1', 0), FakeServiceHandler)
+        server.delay, server.status, server.probes = delay, status, 0
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, f'http://127.0.0.1:{server.server_port}'
+
+
+class ProbeServicesTests(HealthProbeTestCase):
+
+    def test_probes_run_concurrently(self):
+        services = {f'service-{i}': self.start_service(delay=0.2)[1] for i in range(4)}
+
+        started = time.perf_counter()
+        status_info = probe_services(services, deadline=2.0)
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 0.6)
+        for status in status_info.values():
+            self.assertEqual(status['status'], 'healthy')
+            self.assertGreaterEqual(status['response_time_ms'], 200)
+            self.assertEqual(status['data'], {'status': 'healthy'})
+
+    def test_slow_service_does_not_hold_the_aggregate_past_the_deadline(self):
+        _, fast = self.start_service()
+        _, slow = self.start_service(delay=3.0)
+
+        started = time.perf_counter()
+        status_info = probe_services({'fast': fast, 'slow': slow}, deadline=0.3)
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(status_info['fast']['status'], 'healthy')
+        self.assertEqual(status_info['slow']['status'], 'timeout')
+        self.assertEqual(status_info['slow']['url'], slow)
+        self.assertLess(status_info['fast']['response_time_ms'], status_info['slow']['response_time_ms'])
+
+    def test_stuck_probe_is_abandoned_at_the_deadline(self):
+        _, fast = self.start_service()
+        probe_service = health.probe_service
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def probe(service_name, service_url, timeout, **kwargs):
+            if service_name == 'stuck':
+                # Ignores its timeout, e.g. stuck resolving a host name
+                release.wait(5)
+            return probe_service(service_name, service_url, timeout, **kwargs)
+
+        started = time.perf_counter()
+        with mock.patch.object(health, 'probe_service', side_effect=probe):
+            status_info = probe_services({'fast': fast, 'stuck': fast}, deadline=0.3)
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(status_info['fast']['status'], 'healthy')
+        self.assertEqual(status_info['stuck']['status'], 'timeout')
+        self.assertEqual(status_info['stuck']['error'], 'Deadline exceeded')
+        self.assertGreaterEqual(status_info['stuck']['response_time_ms'], 300)
+
+    def test_failing_and_unreachable_services(self):
+        _, failing = self.start_service(status=503)
+        unreachable = f'http://127.0.0.1:{unused_port()}'
+
+        status_info = probe_services({'failing': failing, 'unreachable': unreachable}, deadline=2.0)
+
+        self.assertEqual(status_info['failing']['status'], 'unhealthy')
+        self.assertEqual(status_info['failing']['status_code'], 503)
+        self.assertEqual(status_info['unreachable']['status'], 'unreachable')
+        self.assertIn('response_time_ms', status_info['unreachable'])
+
+    def test_no_services(self):
+        self.assertEqual(probe_services({}, deadline=1.0), {})
+
+
+class ServicesStatusCacheTests(HealthProbeTestCase):
+
+    def test_second_call_within_the_ttl_does_not_probe(self):
+        server, url = self.start_service()
+
+        with override_settings(USER_SERVICE_URLS=[url], GATEWAY_HEALTH_CHECK={'DEADLINE': 2.0, 'CACHE_TTL': 60}):
+            first, first_cached = get_services_status()
+            second, second_cached = get_services_status()
+
+        self.assertEqual((first_cached, second_cached), (False, True))
+        self.assertEqual(second, first)
+        self.assertEqual(first['user-service']['status'], 'healthy')
+        self.assertEqual(server.probes, 1)
+
+    def test_expired_status_is_probed_again(self):
+        server, url = self.start_service()
+
+        with override_settings(USER_SERVICE_URLS=[url], GATEWAY_HEALTH_CHECK={'DEADLINE': 2.0, 'CACHE_TTL': 60}):
+            get_services_status()
+            cache.clear()
+            _, cached = get_services_status()
+
+        self.assertFalse(cached)
+        self.assertEqual(server.probes, 2)
+
+    def test_each_instance_is_reported(self):
+        _, first = self.start_service()
+        _, second = self.start_service(status=500)
+
+        with override_settings(USER_SERVICE_URLS=[first, second], GATEWAY_HEALTH_CHECK={'DEADLINE': 2.0}):
+            status_info, _ = get_services_status()
+
+        self.assertEqual(status_info[f'user-service ({first})']['status'], 'healthy')
+        self.assertEqual(status_info[f'user-service ({second})']['status'], 'unhealthy')
@@ -0,0 +1,22 @@
+"""Gateway Metrics Route Tests
+Proxied requests are labelled per known service, never per path
+"""
+
+from django.test import SimpleTestCase
+from django.urls import resolve
+
+from gateway_service.proxy import metrics_route
+
+
+class MetricsRouteTests(SimpleTestCase):
+
+    def test_known_service_is_labelled_by_name(self):
+        self.assertEqual(metrics_route(resolve('/api/user/users/42/')), 'proxy/user')
+        self.assertEqual(metrics_route(resolve('/api/user/')), 'proxy/user')
+
+    def test_unknown_services_share_one_label(self):
+        self.assertEqual(metrics_route(resolve('/api/nope/anything')), 'proxy/unknown')
+        self.assertEqual(metrics_route(resolve('/api/other/')), 'proxy/unknown')
+
+    def test_other_routes_keep_their_pattern(self):
+        self.assertIsNone(metrics_route(resolve('/metrics')))
@@ -0,0 +1,80 @@
+"""Gateway Proxy Circuit Breaker Tests
+Every way out of forward_request settles the breaker permit exactly once
+"""
+
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from gateway_service.breaker import TRIAL_CALL
+from gateway_service.proxy import proxy_error
+from gateway_service.views import AsyncServiceProxyView, ServiceProxyView
+
+URLS = {'user': ['http://127.0.0.1:8001']}
+
+
+def trial_breaker():
+    breaker = mock.Mock()
+    breaker.before_call.return_value = TRIAL_CALL
+    breaker.abefore_call = mock.AsyncMock(return_value=TRIAL_CALL)
+    breaker.arecord_failure = mock.AsyncMock()
+    breaker.arecord_success = mock.AsyncMock()
+    return breaker
+
+
+class SyncProxyPermitTests(SimpleTestCase):
+
+    def setUp(self):
+        self.breaker = trial_breaker()
+
+    def forward(self, session):
+        view = ServiceProxyView()
+        view.service_urls = URLS
+        pool = mock.Mock()
+        pool.get_session.return_value = session
+        with mock.patch('gateway_service.views.get_circuit_breaker', return_value=self.breaker), \
+                mock.patch('gateway_service.views.get_upstream_pool', return_value=pool):
+            return view.forward_request('user', 'api/users/', 'GET', {}, {}, stream=False)
+
+    def test_unexpected_error_fails_the_trial(self):
+        session = mock.Mock()
+        session.request.side_effect = RuntimeError('boom')
+
+        response = self.forward(session)
+
+        self.assertEqual(response.status_code, proxy_error()[1])
+        self.breaker.record_failure.assert_called_once_with(TRIAL_CALL, 'proxy error')
+
+    def test_error_after_success_is_not_counted_twice(self):
+        session = mock.Mock()
+        session.request.return_value.status_code = 200
+        session.request.return_value.headers = {'content-type': 'application/json'}
+        session.request.return_value.json.side_effect = ValueError('bad json')
+
+        response = self.forward(session)
+
+        self.assertEqual(response.status_code, proxy_error()[1])
+        self.breaker.record_success.assert_called_once()
+        self.breaker.record_failure.assert_not_called()
+
+
+class AsyncProxyPermitTests(SimpleTestCase):
+
+    def setUp(self):
+        self.breaker = trial_breaker()
+
+    def test_unexpected_error_fails_the_trial(self):
+        view = AsyncServiceProxyView()
+        view.service_urls = URLS
+        session = mock.Mock()
+        session.request = mock.AsyncMock(side_effect=RuntimeError('boom'))
+        pool = mock.Mock()
+        pool.get_session.return_value = session
+
+        with mock.patch('gateway_service.views.get_circuit_breaker', return_value=self.breaker), \
+                mock.patch('gateway_service.views.get_async_upstream_pool', return_value=pool):
+            response = async_to_sync(view.forward_request)('user', 'api/users/', 'GET', {}, {}, stream=False)
+
+        self.assertEqual(response.status_code, proxy_error()[1])
+        self.breaker.arecord_failure.assert_awaited_once_with(TRIAL_CALL, 'proxy error')
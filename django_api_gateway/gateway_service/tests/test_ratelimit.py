@@ -0,0 +1,146 @@
+"""Gateway Rate Limiting Tests
+Requests are charged against every matching rule or against none
+"""
+
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+
+from gateway_service import ratelimit
+from gateway_service.ratelimit import (
+    LocalBucketStore,
+    RateLimiter,
+    RateLimitRule,
+    RedisBucketStore,
+)
+
+
+def redis_connection():
+    try:
+        from django_redis import get_redis_connection
+        connection = get_redis_connection('default')
+        connection.ping()
+        return connection
+    except Exception:
+        return None
+
+
+class BucketStoreTests:
+    """Shared by the in-process and Redis stores"""
+
+    def bucket(self, name, capacity, wanted=1):
+        return (f'gateway:ratelimit:test:{name}', capacity, capacity / 60, wanted)
+
+    def test_takes_from_every_bucket(self):
+        taken = self.store.take([self.bucket('a', 5, wanted=2), self.bucket('b', 3)])
+        self.assertEqual([granted for granted, _, _ in taken], [2, 1])
+        self.assertEqual([round(tokens) for _, tokens, _ in taken], [3, 2])
+
+    def test_takes_nothing_when_one_bucket_is_empty(self):
+        self.store.take([self.bucket('empty', 1)])
+
+        taken = self.store.take([self.bucket('full', 5), self.bucket('empty', 1)])
+
+        (full_granted, full_tokens, full_wait), (empty_granted, _, empty_wait) = taken
+        self.assertEqual((full_granted, empty_granted), (0, 0))
+        self.assertEqual(round(full_tokens), 5)
+        self.assertEqual(full_wait, 0)
+        self.assertGreater(empty_wait, 0)
+
+        # The full bucket was not charged for the denied request
+        (granted, tokens, _), = self.store.take([self.bucket('full', 5)])
+        self.assertEqual((granted, round(tokens)), (1, 4))
+
+
+class LocalBucketStoreTests(BucketStoreTests, SimpleTestCase):
+
+    def setUp(self):
+        self.store = LocalBucketStore()
+
+
+@skipUnless(redis_connection(), 'needs the default cache on a reachable Redis')
+class RedisBucketStoreTests(BucketStoreTests, SimpleTestCase):
+
+    def setUp(self):
+        connection = redis_connection()
+        self.store = RedisBucketStore(connection)
+        keys = list(connection.scan_iter('gateway:ratelimit:test:*'))
+        if keys:
+            connection.delete(*keys)
+
+
+class RateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.store = LocalBucketStore()
+        self.limiter = RateLimiter(
+            rules=[
+                RateLimitRule('ip', 100, key='ip'),
+                RateLimitRule('auth', 2, key='ip', path=r'^api/auth/login/', methods=['POST']),
+            ],
+            store=self.store,
+            local_batch=1,
+        )
+
+    def remaining(self, name):
+        key = f'gateway:ratelimit:{name}:ip:10.0.0.1'
+        (_, tokens, _), = self.store.take([(key, 100, 100 / 60, 0)])
+        return round(tokens)
+
+    def test_denied_request_does_not_charge_other_rules(self):
+        login = ('user', 'api/auth/login/', 'POST', '10.0.0.1')
+        self.assertTrue(self.limiter.check(*login).allowed)
+        self.assertTrue(self.limiter.check(*login).allowed)
+        self.assertEqual(self.remaining('ip'), 98)
+
+        for _ in range(5):
+            result = self.limiter.check(*login)
+            self.assertFalse(result.allowed)
+            self.assertEqual(result.headers()['RateLimit-Remaining'], '0')
+        self.assertEqual(self.remaining('ip'), 98)
+
+        # Requests the auth rule doesn't cover still get through
+        self.assertTrue(self.limiter.check('user', 'api/users/', 'GET', '10.0.0.1').allowed)
+
+    def test_local_lease_token_is_returned_on_denial(self):
+        limiter = RateLimiter(
+            rules=[RateLimitRule('ip', 100, key='ip'), RateLimitRule('auth', 1, key='ip', path=r'^api/auth/')],
+            store=self.store,
+            local_batch=4,
+        )
+        # Grow the ip rule's lease so it has tokens in hand
+        for _ in range(6):
+            limiter.check('user', 'api/users/', 'GET', '10.0.0.1')
+        lease = limiter._leases['gateway:ratelimit:ip:ip:10.0.0.1']
+        self.assertGreater(lease.tokens, 0)
+
+        self.assertTrue(limiter.check('user', 'api/auth/login/', 'POST', '10.0.0.1').allowed)
+        tokens = lease.tokens
+        self.assertFalse(limiter.check('user', 'api/auth/login/', 'POST', '10.0.0.1').allowed)
+        self.assertEqual(lease.tokens, tokens)
+
+    def test_store_errors_fail_open(self):
+        with mock.patch.object(self.store, 'take', side_effect=ConnectionError('down')):
+            result = self.limiter.check('user', 'api/auth/login/', 'POST', '10.0.0.1')
+        self.assertTrue(result.allowed)
+        self.assertEqual(self.limiter.stats()['errors'], 1)
+
+
+class GetRateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(ratelimit, _limiter=None, _limiter_pid=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rebuilt_after_fork(self):
+        rules = {'ENABLED': True, 'RULES': [{'NAME': 'ip', 'RATE': 10}]}
+        with self.settings(GATEWAY_RATE_LIMIT=rules):
+            with mock.patch.object(ratelimit.os, 'getpid', return_value=100):
+                parent = ratelimit.get_rate_limiter()
+                self.assertIs(ratelimit.get_rate_limiter(), parent)
+            with mock.patch.object(ratelimit.os, 'getpid', return_value=101):
+                child = ratelimit.get_rate_limiter()
+
+        self.assertIsNotNone(parent)
+        self.assertIsNot(child, parent)
@@ -0,0 +1,173 @@
+"""Gateway Response Cache Tests
+A cached response is only replayed to the credentials that fetched it, and
+never outlives a write to its route
+"""
+
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase
+
+from gateway_service.response_cache import BYPASS, HIT, MISS, CacheRoute, ResponseCache
+from gateway_service.views import AsyncServiceProxyView, ServiceProxyView
+
+PATH = 'api/vehicles/'
+
+
+def ok(body=b'[]', **headers):
+    return {'status': 200, 'headers': {'Content-Type': 'application/json', **headers}, 'body': body}
+
+
+class ResponseCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.route = CacheRoute('user', r'^api/vehicles/', ttl=30)
+        self.response_cache = ResponseCache([self.route], max_body_bytes=1024, refresh_lock_timeout=10)
+
+    def key(self, headers):
+        return self.response_cache.cache_key(self.route, 'user', PATH, {}, headers)
+
+    def fill(self, headers, result=None):
+        key = self.key(headers)
+        entry, generation = self.response_cache.lookup(self.route, key)
+        self.assertIsNone(entry)
+        return self.response_cache.store(self.route, key, result or ok(), generation)
+
+    def cached(self, headers):
+        entry, _ = self.response_cache.lookup(self.route, self.key(headers))
+        return entry
+
+
+class PrincipalTests(ResponseCacheTestCase):
+
+    def test_authorization_headers_miss_each_others_entries(self):
+        self.fill({'Authorization': 'Bearer alice'})
+
+        self.assertIsNotNone(self.cached({'Authorization': 'Bearer alice'}))
+        self.assertIsNone(self.cached({'Authorization': 'Bearer bob'}))
+        self.assertIsNone(self.cached({}))
+
+    def test_cookies_miss_each_others_entries(self):
+        self.fill({'Cookie': 'sessionid=alice'})
+
+        self.assertIsNotNone(self.cached({'Cookie': 'sessionid=alice'}))
+        self.assertIsNone(self.cached({'Cookie': 'sessionid=bob'}))
+        self.assertIsNone(self.cached({'Authorization': 'Bearer alice'}))
+
+    def test_anonymous_entry_is_not_served_to_a_user(self):
+        self.fill({})
+
+        self.assertIsNone(self.cached({'Authorization': 'Bearer alice'}))
+
+    def test_shared_route_serves_everyone(self):
+        self.route.shared = True
+        self.fill({'Authorization': 'Bearer alice'})
+
+        self.assertIsNotNone(self.cached({'Authorization': 'Bearer bob'}))
+
+
+class KeyTests(ResponseCacheTestCase):
+
+    def test_colliding_queries_get_different_keys(self):
+        self.assertNotEqual(
+            self.response_cache.cache_key(self.route, 'user', PATH, {'a': '1&b=2'}, {}),
+            self.response_cache.cache_key(self.route, 'user', PATH, {'a': '1', 'b': '2'}, {}),
+        )
+
+    def test_clients_may_skip_the_cache(self):
+        self.assertIsNone(self.key({'Cache-Control': 'no-cache'}))
+
+
+class StorableTests(ResponseCacheTestCase):
+
+    def test_set_cookie_responses_are_not_cached(self):
+        self.assertIsNone(self.fill({}, ok(**{'Set-Cookie': 'sessionid=alice'})))
+        self.assertIsNone(self.cached({}))
+
+    def test_no_store_responses_are_not_cached(self):
+        self.assertIsNone(self.fill({}, ok(**{'Cache-Control': 'no-store'})))
+        self.assertIsNone(self.cached({}))
+
+    def test_private_responses_are_not_cached_on_shared_routes(self):
+        self.route.shared = True
+        self.assertIsNone(self.fill({}, ok(**{'Cache-Control': 'private, max-age=60'})))
+
+    def test_errors_are_not_cached(self):
+        self.assertIsNone(self.fill({}, dict(ok(), status=500)))
+
+
+class InvalidationTests(ResponseCacheTestCase):
+
+    def test_write_drops_every_entry_of_the_route(self):
+        self.fill({'Authorization': 'Bearer alice'})
+        self.fill({'Authorization': 'Bearer bob'})
+
+        self.response_cache.invalidate(self.route)
+
+        self.assertIsNone(self.cached({'Authorization': 'Bearer alice'}))
+        self.assertIsNone(self.cached({'Authorization': 'Bearer bob'}))
+
+    def test_fetch_across_a_write_is_not_stored(self):
+        key = self.key({})
+        _, generation = self.response_cache.lookup(self.route, key)
+        self.response_cache.invalidate(self.route)
+
+        self.assertIsNone(self.response_cache.store(self.route, key, ok(), generation))
+        self.assertIsNone(self.cached({}))
+
+    def test_write_landing_while_storing_still_wins(self):
+        key = self.key({})
+        _, generation = self.response_cache.lookup(self.route, key)
+        backend = caches['default']
+        store = backend.set
+
+        def invalidate_then_set(*args, **kwargs):
+            self.response_cache.invalidate(self.route)
+            return store(*args, **kwargs)
+
+        with mock.patch.object(backend, 'set', side_effect=invalidate_then_set):
+            self.response_cache.store(self.route, key, ok(), generation)
+
+        self.assertIsNone(self.cached({}))
+
+
+class ProxyCacheRaceTests(ResponseCacheTestCase):
+    """The views read the generation before fetching, not after"""
+
+    def fetch_during_write(self, *args):
+        self.response_cache.invalidate(self.route)
+        return ok(b'["before the write"]')
+
+    def test_sync_fill_across_a_write_is_bypassed(self):
+        view = ServiceProxyView()
+        with mock.patch('gateway_service.views.get_request_coalescer', return_value=None), \
+                mock.patch.object(view, 'fetch_result', side_effect=self.fetch_during_write):
+            response = view.cached_request(self.response_cache, self.route, 'user', PATH, {}, {})
+
+        self.assertEqual(response['X-Cache'], BYPASS)
+        self.assertIsNone(self.cached({}))
+
+    def test_async_fill_across_a_write_is_bypassed(self):
+        view = AsyncServiceProxyView()
+
+        async def fetch_result(*args):
+            return self.fetch_during_write()
+
+        with mock.patch('gateway_service.views.get_request_coalescer', return_value=None), \
+                mock.patch.object(view, 'fetch_result', side_effect=fetch_result):
+            response = async_to_sync(view.cached_request)(self.response_cache, self.route, 'user', PATH, {}, {})
+
+        self.assertEqual(response['X-Cache'], BYPASS)
+        self.assertIsNone(self.cached({}))
+
+    def test_fill_then_hit(self):
+        view = ServiceProxyView()
+        with mock.patch('gateway_service.views.get_request_coalescer', return_value=None), \
+                mock.patch.object(view, 'fetch_result', return_value=ok()) as fetch_result:
+            first = view.cached_request(self.response_cache, self.route, 'user', PATH, {}, {})
+            second = view.cached_request(self.response_cache, self.route, 'user', PATH, {}, {})
+
+        self.assertEqual((first['X-Cache'], second['X-Cache']), (MISS, HIT))
+        fetch_result.assert_called_once()
@@ -0,0 +1,108 @@
+"""Gateway Upstream Pool Tests
+Shared sessions must not carry state between clients or close under them
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import threading
+
+from django.test import SimpleTestCase
+
+from gateway_service import upstream
+from gateway_service.upstream import UpstreamPool
+
+
+class CookieSettingHandler(BaseHTTPRequestHandler):
+    """Sets a session cookie and echoes back the Cookie header it received"""
+
+    def do_GET(self):
+        body = (self.headers.get('Cookie') or '').encode()
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'sessionid=first-client; Path=/')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SlowBodyHandler(BaseHTTPRequestHandler):
+    """Sends half of its body, then the rest once the server is released"""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '11')
+        self.end_headers()
+        self.wfile.write(b'first')
+        self.wfile.flush()
+        self.server.release.wait(5)
+        self.wfile.write(b'second')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UpstreamPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pool = UpstreamPool(pool_size=2, max_per_host=2, keepalive_timeout=30.0)
+        self.addCleanup(self.pool.close)
+
+    def test_session_does_not_keep_upstream_cookies(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), CookieSettingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_port}/'
+
+        first = self.pool.get_session('user').get(url)
+        self.assertEqual(first.headers['Set-Cookie'], 'sessionid=first-client; Path=/')
+
+        second = self.pool.get_session('user').get(url)
+        self.assertEqual(second.content, b'')
+        self.assertEqual(len(self.pool.get_session('user').cookies), 0)
+
+    def test_idle_session_is_closed_and_replaced(self):
+        clock = [100.0]
+        with mock.patch.object(upstream, 'time') as fake_time:
+            fake_time.monotonic.side_effect = lambda: clock[0]
+            idle = self.pool.get_session('user')
+            clock[0] += 31.0
+            with mock.patch.object(idle, 'close') as close:
+                fresh = self.pool.get_session('user')
+
+        self.assertIsNot(fresh, idle)
+        close.assert_called_once_with()
+        self.assertEqual(self.pool.stats()['misses'], 2)
+
+    def test_response_in_flight_survives_its_session_being_closed(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), SlowBodyHandler)
+        server.release = threading.Event()
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(server.release.set)
+        url = f'http://127.0.0.1:{server.server_port}/'
+
+        clock = [100.0]
+        with mock.patch.object(upstream, 'time') as fake_time:
+            fake_time.monotonic.side_effect = lambda: clock[0]
+            idle = self.pool.get_session('user')
+            response = idle.get(url, stream=True)
+            self.assertEqual(next(response.iter_content(5)), b'first')
+
+            clock[0] += 31.0
+            self.assertIsNot(self.pool.get_session('user'), idle)
+
+        # Closed: its host pools are gone
+        self.assertEqual(len(idle.get_adapter(url).poolmanager.pools), 0)
+        server.release.set()
+        self.assertEqual(b''.join(response.iter_content(5)), b'second')
+
+    def test_close_closes_pooled_sessions(self):
+        session = self.pool.get_session('user')
+        with mock.patch.object(session, 'close') as close:
+            self.pool.close()
+        close.assert_called_once_with()
+        self.assertEqual(self.pool.stats()['sessions'], [])
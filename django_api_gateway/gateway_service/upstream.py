@@ -0,0 +1,277 @@
+"""
+Gateway Upstream Connection Pooling
+Per-worker pool of persistent, keep-alive HTTP sessions to the microservices
+"""
+
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+import aiohttp
+import asyncio
+import requests
+import http.cookiejar
+import logging
+import os
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_SETTINGS = {
+    'POOL_SIZE': 10,
+    'MAX_PER_HOST': 20,
+    'BLOCK': False,
+    'KEEPALIVE_TIMEOUT': 30.0,
+    'ASYNC_MAX_CONNECTIONS': 1000,
+}
+
+
+def get_pool_settings():
+    """Return the upstream pool settings merged with their defaults"""
+    pool_settings = dict(DEFAULT_POOL_SETTINGS)
+    pool_settings.update(getattr(settings, 'GATEWAY_UPSTREAM_POOL', {}))
+    return pool_settings
+
+
+class UpstreamPool:
+    """Keep-alive sessions to upstream services, one per service name.
+
+    Each session owns a urllib3 connection pool per upstream host, so
+    consecutive proxied requests reuse an open TCP connection instead of
+    paying for a new connect/handshake every time.
+    """
+
+    def __init__(self, pool_size, max_per_host, block=False, keepalive_timeout=30.0):
+        self.pool_size = pool_size
+        self.max_per_host = max_per_host
+        self.block = block
+        self.keepalive_timeout = keepalive_timeout
+
+        self._sessions = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self._retired_connections = 0
+        self._retired_requests = 0
+
+    def _build_session(self):
+        """Create a session with a sized keep-alive adapter"""
+        session = requests.Session()
+        # The session is shared by every client of the worker: never keep an
+        # upstream Set-Cookie around for the next caller. Cookies still reach
+        # the client through the relayed response headers.
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.max_per_host,
+            pool_block=self.block,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _retire(self, service_name):
+        """Drop a session from the pool, keeping its counters"""
+        session = self._sessions.pop(service_name)
+        self._last_used.pop(service_name, None)
+        connections, requests_sent = self._session_counters(session)
+        self._retired_connections += connections
+        self._retired_requests += requests_sent
+        return session
+
+    def get_session(self, service_name):
+        """Return the keep-alive session for a service, creating it on demand"""
+        now = time.monotonic()
+        idle = None
+
+        with self._lock:
+            session = self._sessions.get(service_name)
+
+            if session is not None and now - self._last_used[service_name] > self.keepalive_timeout:
+                # Idle past the keep-alive timeout: the upstream has most
+                # likely dropped these sockets already, start afresh
+                logger.debug(f"Recycling idle upstream session for {service_name}")
+                idle = self._retire(service_name)
+                session = None
+
+            if session is None:
+                session = self._build_session()
+                self._sessions[service_name] = session
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            self._last_used[service_name] = now
+
+        if idle is not None:
+            # Only closes the pooled, idle sockets: a response another
+            # thread is still reading keeps its connection until released
+            idle.close()
+        return session
+
+    @staticmethod
+    def _session_counters(session):
+        """Sum opened connections and sent requests over a session's host pools"""
+        connections = 0
+        requests_sent = 0
+
+        for adapter in set(session.adapters.values()):
+            pools = getattr(adapter.poolmanager, 'pools', None)
+            if pools is None:
+                continue
+            for key in list(pools.keys()):
+                host_pool = pools.get(key)
+                if host_pool is None:
+                    continue
+                connections += host_pool.num_connections
+                requests_sent += host_pool.num_requests
+
+        return connections, requests_sent
+
+    def stats(self):
+        """Return pool counters for monitoring"""
+        with self._lock:
+            connections = self._retired_connections
+            requests_sent = self._retired_requests
+            for session in self._sessions.values():
+                session_connections, session_requests = self._session_counters(session)
+                connections += session_connections
+                requests_sent += session_requests
+
+            return {
+                'pid': os.getpid(),
+                'sessions': sorted(self._sessions.keys()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'connections_opened': connections,
+                'requests_sent': requests_sent,
+                'reuses': max(requests_sent - connections, 0),
+                'pool_size': self.pool_size,
+                'max_per_host': self.max_per_host,
+                'keepalive_timeout': self.keepalive_timeout,
+            }
+
+    def close(self):
+        """Close every session in the pool"""
+        with self._lock:
+            for service_name in list(self._sessions.keys()):
+                self._retire(service_name).close()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_upstream_pool():
+    """Return this worker's upstream pool.
+
+    The pool is created lazily and rebuilt after a fork, so gunicorn
+    workers started with --preload never share sockets with the master.
+    """
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            pool_settings = get_pool_settings()
+            _pool = UpstreamPool(
+                pool_size=pool_settings['POOL_SIZE'],
+                max_per_host=pool_settings['MAX_PER_HOST'],
+                block=pool_settings['BLOCK'],
+                keepalive_timeout=pool_settings['KEEPALIVE_TIMEOUT'],
+            )
+            _pool_pid = pid
+
+    return _pool
+
+
+class AsyncUpstreamPool:
+    """Keep-alive aiohttp sessions for the async proxy path.
+
+    aiohttp sessions are bound to the event loop that created them, so the
+    pool keeps one session per service for every running loop.
+    """
+
+    def __init__(self, max_connections, keepalive_timeout=30.0):
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self._sessions = weakref.WeakKeyDictionary()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def _build_session(self):
+        """Create a session with a sized keep-alive connector"""
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        # Bodies are either streamed through as-is or fetched with
+        # Accept-Encoding: identity, so never decompress here.
+        return aiohttp.ClientSession(
+            connector=connector,
+            auto_decompress=False,
+            # Shared by every client of the worker, so never store cookies
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+
+    def get_session(self, service_name):
+        """Return the keep-alive session for a service on the running loop"""
+        loop = asyncio.get_running_loop()
+        sessions = self._sessions.setdefault(loop, {})
+
+        session = sessions.get(service_name)
+        if session is None or session.closed:
+            session = self._build_session()
+            sessions[service_name] = session
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return session
+
+    def stats(self):
+        """Return pool counters for monitoring"""
+        return {
+            'pid': os.getpid(),
+            'sessions': sum(len(sessions) for sessions in list(self._sessions.values())),
+            'hits': self.hits,
+            'misses': self.misses,
+            'max_connections': self.max_connections,
+            'keepalive_timeout': self.keepalive_timeout,
+        }
+
+    async def aclose(self):
+        """Close the sessions owned by the running loop"""
+        sessions = self._sessions.pop(asyncio.get_running_loop(), {})
+        for session in sessions.values():
+            await session.close()
+
+
+_async_pool = None
+_async_pool_pid = None
+
+
+def get_async_upstream_pool():
+    """Return this worker's async upstream pool"""
+    global _async_pool, _async_pool_pid
+
+    pid = os.getpid()
+    if _async_pool is None or _async_pool_pid != pid:
+        pool_settings = get_pool_settings()
+        _async_pool = AsyncUpstreamPool(
+            max_connections=pool_settings['ASYNC_MAX_CONNECTIONS'],
+            keepalive_timeout=pool_settings['KEEPALIVE_TIMEOUT'],
+        )
+        _async_pool_pid = pid
+
+    return _async_pool
@@ -8,27 +8,36 @@ from django.urls import path, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from service_metrics import metrics_view
 from gateway_service.views import (
+    AsyncServiceProxyView,
     ServiceProxyView,
     ServiceStatusView,
     HealthCheckView,
     ServiceListView,
 )
 
+# The ASGI entry point serves the async proxy, WSGI keeps the DRF view
+if settings.GATEWAY_PROXY_MODE == 'async':
+    proxy_view = AsyncServiceProxyView.as_view()
+else:
+    proxy_view = ServiceProxyView.as_view()
+
 urlpatterns = [
     # Admin
     path('admin/', admin.site.urls),
     
     # Health check
     path('api/health/', HealthCheckView.as_view(), name='gateway_health'),
+    path('metrics', metrics_view, name='metrics'),
     
     # Service management
     path('api/services/status/', ServiceStatusView.as_view(), name='services_status'),
     path('api/services/list/', ServiceListView.as_view(), name='services_list'),
     
     # Service proxy - match any service and path
-    re_path(r'^api/(?P<service_name>[a-zA-Z0-9_-]+)/(?P<path>.*)$', ServiceProxyView.as_view(), name='service_proxy'),
-    re_path(r'^api/(?P<service_name>[a-zA-Z0-9_-]+)/$', ServiceProxyView.as_view(), name='service_proxy_root'),
+    re_path(r'^api/(?P<service_name>[a-zA-Z0-9_-]+)/(?P<path>.*)$', proxy_view, name='service_proxy'),
+    re_path(r'^api/(?P<service_name>[a-zA-Z0-9_-]+)/$', proxy_view, name='service_proxy_root'),
 ]
 
 # Serve static and media files in development
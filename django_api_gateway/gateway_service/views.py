@@ -7,12 +7,47 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
 from django.conf import settings
 from django.core.cache import cache
+from django.http import HttpResponse
+from django.views import View
+from service_metrics import record_upstream
+import aiohttp
+import asyncio
+import json
 import requests
 import logging
 import time
-from urllib.parse import urljoin
+
+from gateway_service.auth import InvalidToken, get_token_verifier
+from gateway_service.balancer import get_balancer
+from gateway_service.breaker import CircuitOpenError, get_circuit_breaker
+from gateway_service.coalescing import get_request_coalescer
+from gateway_service.health import get_services_status
+from gateway_service.proxy import (
+    BODY_METHODS,
+    astream_response,
+    build_upstream_headers,
+    build_upstream_url,
+    circuit_open,
+    filter_response_headers,
+    forwarded_request_headers,
+    get_service_urls,
+    get_upstream_timeout,
+    invalid_token,
+    proxy_error,
+    rate_limited,
+    replay_response,
+    service_not_found,
+    shared_fetch_headers,
+    stream_response,
+    upstream_timeout,
+    upstream_unavailable,
+)
+from gateway_service.ratelimit import get_rate_limiter
+from gateway_service.response_cache import get_response_cache
+from gateway_service.upstream import get_async_upstream_pool, get_upstream_pool
 
 logger = logging.getLogger(__name__)
 
@@ -23,47 +58,152 @@ class ServiceProxyView(APIView):
     permission_classes = [AllowAny]
     
     def __init__(self):
-        self.service_urls = {
-            'user': settings.USER_SERVICE_URL,
-        }
+        self.service_urls = get_service_urls()
+        self.stream_responses = settings.GATEWAY_STREAM_RESPONSES
     
     def proxy_request(self, service_name, path, method, data=None, headers=None):
         """Proxy request to a microservice"""
         if service_name not in self.service_urls:
-            return Response({
-                'error': f'Service {service_name} not found',
-                'available_services': list(self.service_urls.keys())
-            }, status=status.HTTP_404_NOT_FOUND)
+            payload, status_code = service_not_found(service_name, self.service_urls)
+            return Response(payload, status=status_code)
+        
+        claims = None
+        verifier = get_token_verifier()
+        if verifier is not None:
+            try:
+                headers, claims = verifier.authenticate(headers)
+            except InvalidToken as e:
+                payload, status_code = invalid_token(str(e))
+                return Response(payload, status=status_code, headers={'WWW-Authenticate': 'Bearer realm="api"'})
+        
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            limit = limiter.check(
+                service_name, path, method,
+                limiter.client_ip(self.request),
+                claims.get(verifier.options['USER_ID_CLAIM']) if claims else None,
+            )
+            if not limit.allowed:
+                logger.warning(f"Rate limited {method} {service_name}/{path}")
+                payload, status_code = rate_limited()
+                return Response(payload, status=status_code, headers=limit.headers())
+            response = self.route_request(service_name, path, method, data, headers)
+            for name, value in limit.headers().items():
+                response[name] = value
+            return response
+        
+        return self.route_request(service_name, path, method, data, headers)
+    
+    def route_request(self, service_name, path, method, data, headers):
+        """Serve a request from the edge cache, a shared fetch or the upstream"""
+        response_cache = get_response_cache()
+        route = response_cache.match(service_name, path) if response_cache else None
+        coalescer = get_request_coalescer()
         
-        # Build service URL
-        service_url = self.service_urls[service_name]
-        full_url = urljoin(f"{service_url}/", path.lstrip('/'))
+        if method == 'GET':
+            if route is not None:
+                return self.cached_request(response_cache, route, service_name, path, data, headers)
+            if coalescer is not None and coalescer.match(service_name, path):
+                return replay_response(self.shared_fetch(service_name, path, data, headers))
         
-        # Default headers
-        default_headers = {
-            'Content-Type': 'application/json',
-            'User-Agent': 'SmartTaxi-API-Gateway/1.0',
-        }
+        response = self.forward_request(service_name, path, method, data, headers, self.stream_responses)
+        if route is not None and response.status_code < 400:
+            response_cache.invalidate(route)
+        return response
+    
+    def cached_request(self, response_cache, route, service_name, path, data, headers):
+        """Answer a GET on a cached route from the edge cache when possible"""
+        key = response_cache.cache_key(route, service_name, path, data, headers)
+        if key is None:
+            return response_cache.bypass(
+                self.forward_request(service_name, path, 'GET', data, headers, self.stream_responses)
+            )
         
-        if headers:
-            default_headers.update(headers)
+        entry, generation = response_cache.lookup(route, key)
+        if entry is not None:
+            response, needs_refresh = response_cache.serve(route, entry, headers)
+            if needs_refresh:
+                def refresh():
+                    result = self.fetch_result(service_name, path, data, shared_fetch_headers(headers))
+                    response_cache.store(route, key, result, generation)
+                response_cache.refresh_in_thread(key, refresh)
+            return response
+        
+        result = self.shared_fetch(service_name, path, data, headers, generation)
+        return response_cache.fill(route, key, result, headers, generation)
+    
+    def shared_fetch(self, service_name, path, data, headers, generation=None):
+        """GET a result that identical in-flight requests may share"""
+        def fetch():
+            return self.fetch_result(service_name, path, data, shared_fetch_headers(headers))
+        
+        coalescer = get_request_coalescer()
+        if coalescer is None:
+            return fetch()
+        return coalescer.run(coalescer.key(service_name, path, data, headers, generation), fetch)
+    
+    def fetch_result(self, service_name, path, data, headers):
+        """GET a service path and buffer the response as a result dict"""
+        response = self.forward_request(service_name, path, 'GET', data, headers, stream=True)
+        if response.streaming:
+            try:
+                body = b''.join(response.streaming_content)
+            finally:
+                response.close()
+        else:
+            # Gateway error payloads are DRF responses that still need rendering
+            response = self.finalize_response(self.request, response)
+            response.render()
+            body = response.content
+        return {'status': response.status_code, 'headers': dict(response.items()), 'body': body}
+    
+    def forward_request(self, service_name, path, method, data, headers, stream):
+        """Send a request to a service instance and relay its response"""
+        # Fail fast while the service's circuit is open
+        breaker = get_circuit_breaker(service_name)
+        try:
+            permit = breaker.before_call()
+        except CircuitOpenError as e:
+            logger.warning(f"Circuit open, rejecting {method} {service_name}/{path}")
+            payload, status_code = circuit_open(service_name)
+            return Response(payload, status=status_code, headers={'Retry-After': str(e.retry_after)})
+        
+        # Pick a service instance and build its URL
+        balancer = get_balancer(service_name, self.service_urls[service_name])
+        instance = balancer.acquire()
+        full_url = build_upstream_url(instance.url, path)
+        failed, duration_ms = True, None
+        settled = False
         
         try:
             start_time = time.time()
             
-            # Make request to service
-            response = requests.request(
+            # Make request to service over the worker's keep-alive session
+            session = get_upstream_pool().get_session(service_name)
+            response = session.request(
                 method=method,
                 url=full_url,
-                json=data if method in ['POST', 'PUT', 'PATCH'] else None,
+                json=data if method in BODY_METHODS else None,
                 params=data if method == 'GET' else None,
-                headers=default_headers,
-                timeout=30
+                headers=build_upstream_headers(headers),
+                timeout=get_upstream_timeout(),
+                stream=stream
             )
             
             # Log request
             duration = time.time() - start_time
+            record_upstream(duration)
             logger.info(f"Proxy {method} {full_url} - {response.status_code} - {duration:.3f}s")
+            failed, duration_ms = response.status_code >= 500, duration * 1000
+            
+            if response.status_code >= 500:
+                breaker.record_failure(permit, f'HTTP {response.status_code}')
+            else:
+                breaker.record_success(permit, duration_ms)
+            settled = True
+            
+            if stream:
+                return stream_response(response, settings.GATEWAY_STREAM_CHUNK_SIZE)
             
             # Prepare response
             content_type = response.headers.get('content-type', 'application/json')
@@ -76,49 +216,346 @@ class ServiceProxyView(APIView):
             return Response(
                 response_data,
                 status=response.status_code,
-                headers=dict(response.headers)
+                headers=filter_response_headers(response.headers)
             )
             
         except requests.exceptions.Timeout:
             logger.error(f"Timeout proxying {method} {full_url}")
-            return Response({
-                'error': 'Service timeout',
-                'message': 'The requested service is taking too long to respond'
-            }, status=status.HTTP_504_GATEWAY_TIMEOUT)
+            breaker.record_failure(permit, 'timeout')
+            settled = True
+            payload, status_code = upstream_timeout()
+            return Response(payload, status=status_code)
             
         except requests.exceptions.ConnectionError:
             logger.error(f"Connection error proxying {method} {full_url}")
-            return Response({
-                'error': 'Service unavailable',
-                'message': 'Cannot connect to the requested service'
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            breaker.record_failure(permit, 'connection error')
+            settled = True
+            payload, status_code = upstream_unavailable()
+            return Response(payload, status=status_code)
             
         except Exception as e:
             logger.error(f"Error proxying {method} {full_url}: {str(e)}")
-            return Response({
-                'error': 'Proxy error',
-                'message': 'An error occurred while processing your request'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            payload, status_code = proxy_error()
+            return Response(payload, status=status_code)
+            
+        finally:
+            # Settle the permit on every way out, or a half-open trial
+            # stays taken until TRIAL_TIMEOUT
+            if not settled:
+                breaker.record_failure(permit, 'proxy error')
+            balancer.release(instance, duration_ms, failed)
+    
+    def forwarded_headers(self, request):
+        """Client headers passed through to the upstream service"""
+        return forwarded_request_headers(request, stream=self.stream_responses)
     
     def get(self, request, service_name, path=''):
         """Proxy GET requests"""
-        return self.proxy_request(service_name, path, 'GET', data=request.GET.dict())
+        return self.proxy_request(
+            service_name, path, 'GET',
+            data=request.GET.dict(), headers=self.forwarded_headers(request)
+        )
     
     def post(self, request, service_name, path=''):
         """Proxy POST requests"""
-        return self.proxy_request(service_name, path, 'POST', data=request.data)
+        return self.proxy_request(
+            service_name, path, 'POST',
+            data=request.data, headers=self.forwarded_headers(request)
+        )
     
     def put(self, request, service_name, path=''):
         """Proxy PUT requests"""
-        return self.proxy_request(service_name, path, 'PUT', data=request.data)
+        return self.proxy_request(
+            service_name, path, 'PUT',
+            data=request.data, headers=self.forwarded_headers(request)
+        )
     
     def patch(self, request, service_name, path=''):
         """Proxy PATCH requests"""
-        return self.proxy_request(service_name, path, 'PATCH', data=request.data)
+        return self.proxy_request(
+            service_name, path, 'PATCH',
+            data=request.data, headers=self.forwarded_headers(request)
+        )
     
     def delete(self, request, service_name, path=''):
         """Proxy DELETE requests"""
-        return self.proxy_request(service_name, path, 'DELETE', data=request.data)
+        return self.proxy_request(
+            service_name, path, 'DELETE',
+            data=request.data, headers=self.forwarded_headers(request)
+        )
+
+
+class AsyncServiceProxyView(View):
+    """Async proxy view served through the ASGI application.
+
+    Mirrors ServiceProxyView (status codes, headers, timeout and connection
+    error mapping) but awaits the upstream call on an aiohttp session, so an
+    in-flight request holds no worker thread.
+    """
+    
+    http_method_names = ['get', 'post', 'put', 'patch', 'delete', 'head', 'options']
+    renderer = JSONRenderer()
+    
+    @classmethod
+    def as_view(cls, **initkwargs):
+        """Exempt the view from CSRF checks like DRF's APIView does"""
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+    
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        self.service_urls = get_service_urls()
+        self.stream_responses = settings.GATEWAY_STREAM_RESPONSES
+    
+    def get_timeout(self):
+        """aiohttp equivalent of the sync (connect, read) timeout"""
+        connect, read = get_upstream_timeout()
+        return aiohttp.ClientTimeout(total=read, sock_connect=connect)
+    
+    def render(self, data, status_code, headers=None):
+        """Render a JSON payload the same way DRF's JSONRenderer does"""
+        response = HttpResponse(
+            self.renderer.render(data),
+            status=status_code,
+            content_type='application/json',
+        )
+        for name, value in (headers or {}).items():
+            if name.lower() != 'content-type':
+                response[name] = value
+        response['Allow'] = ', '.join(self._allowed_methods())
+        return response
+    
+    async def proxy_request(self, service_name, path, method, data=None, headers=None):
+        """Proxy request to a microservice"""
+        if service_name not in self.service_urls:
+            payload, status_code = service_not_found(service_name, self.service_urls)
+            return self.render(payload, status_code)
+        
+        claims = None
+        verifier = get_token_verifier()
+        if verifier is not None:
+            try:
+                headers, claims = verifier.authenticate(headers)
+            except InvalidToken as e:
+                payload, status_code = invalid_token(str(e))
+                return self.render(payload, status_code, headers={'WWW-Authenticate': 'Bearer realm="api"'})
+        
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            limit = await limiter.acheck(
+                service_name, path, method,
+                limiter.client_ip(self.request),
+                claims.get(verifier.options['USER_ID_CLAIM']) if claims else None,
+            )
+            if not limit.allowed:
+                logger.warning(f"Rate limited {method} {service_name}/{path}")
+                payload, status_code = rate_limited()
+                return self.render(payload, status_code, headers=limit.headers())
+            response = await self.route_request(service_name, path, method, data, headers)
+            for name, value in limit.headers().items():
+                response[name] = value
+            return response
+        
+        return await self.route_request(service_name, path, method, data, headers)
+    
+    async def route_request(self, service_name, path, method, data, headers):
+        """Serve a request from the edge cache, a shared fetch or the upstream"""
+        response_cache = get_response_cache()
+        route = response_cache.match(service_name, path) if response_cache else None
+        coalescer = get_request_coalescer()
+        
+        if method == 'GET':
+            if route is not None:
+                return await self.cached_request(response_cache, route, service_name, path, data, headers)
+            if coalescer is not None and coalescer.match(service_name, path):
+                return replay_response(await self.shared_fetch(service_name, path, data, headers))
+        
+        response = await self.forward_request(service_name, path, method, data, headers, self.stream_responses)
+        if route is not None and response.status_code < 400:
+            await response_cache.ainvalidate(route)
+        return response
+    
+    async def cached_request(self, response_cache, route, service_name, path, data, headers):
+        """Answer a GET on a cached route from the edge cache when possible"""
+        key = response_cache.cache_key(route, service_name, path, data, headers)
+        if key is None:
+            return response_cache.bypass(
+                await self.forward_request(service_name, path, 'GET', data, headers, self.stream_responses)
+            )
+        
+        entry, generation = await response_cache.alookup(route, key)
+        if entry is not None:
+            response, needs_refresh = response_cache.serve(route, entry, headers)
+            if needs_refresh:
+                async def refresh():
+                    result = await self.fetch_result(service_name, path, data, shared_fetch_headers(headers))
+                    await response_cache.astore(route, key, result, generation)
+                await response_cache.arefresh_in_task(key, refresh)
+            return response
+        
+        result = await self.shared_fetch(service_name, path, data, headers, generation)
+        return await response_cache.afill(route, key, result, headers, generation)
+    
+    async def shared_fetch(self, service_name, path, data, headers, generation=None):
+        """GET a result that identical in-flight requests may share"""
+        async def fetch():
+            return await self.fetch_result(service_name, path, data, shared_fetch_headers(headers))
+        
+        coalescer = get_request_coalescer()
+        if coalescer is None:
+            return await fetch()
+        return await coalescer.arun(coalescer.key(service_name, path, data, headers, generation), fetch)
+    
+    async def fetch_result(self, service_name, path, data, headers):
+        """GET a service path and buffer the response as a result dict"""
+        response = await self.forward_request(service_name, path, 'GET', data, headers, stream=True)
+        if response.streaming:
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        else:
+            body = response.content
+        return {'status': response.status_code, 'headers': dict(response.items()), 'body': body}
+    
+    async def forward_request(self, service_name, path, method, data, headers, stream):
+        """Send a request to a service instance and relay its response"""
+        # Fail fast while the service's circuit is open
+        breaker = get_circuit_breaker(service_name)
+        try:
+            permit = await breaker.abefore_call()
+        except CircuitOpenError as e:
+            logger.warning(f"Circuit open, rejecting {method} {service_name}/{path}")
+            payload, status_code = circuit_open(service_name)
+            return self.render(payload, status_code, headers={'Retry-After': str(e.retry_after)})
+        
+        # Pick a service instance and build its URL
+        balancer = get_balancer(service_name, self.service_urls[service_name])
+        instance = balancer.acquire()
+        full_url = build_upstream_url(instance.url, path)
+        failed, duration_ms = True, None
+        settled = False
+        
+        try:
+            start_time = time.time()
+            
+            session = get_async_upstream_pool().get_session(service_name)
+            response = await session.request(
+                method=method,
+                url=full_url,
+                json=data if method in BODY_METHODS else None,
+                params=data if method == 'GET' else None,
+                headers=build_upstream_headers(headers),
+                timeout=self.get_timeout()
+            )
+            
+            # Log request
+            duration = time.time() - start_time
+            record_upstream(duration)
+            logger.info(f"Proxy {method} {full_url} - {response.status} - {duration:.3f}s")
+            failed, duration_ms = response.status >= 500, duration * 1000
+            
+            if response.status >= 500:
+                await breaker.arecord_failure(permit, f'HTTP {response.status}')
+            else:
+                await breaker.arecord_success(permit, duration_ms)
+            settled = True
+            
+            if stream:
+                streamed = astream_response(response, settings.GATEWAY_STREAM_CHUNK_SIZE)
+                streamed['Allow'] = ', '.join(self._allowed_methods())
+                return streamed
+            
+            async with response:
+                body = await response.read()
+            
+            # Prepare response
+            content_type = response.headers.get('content-type', 'application/json')
+            
+            if 'application/json' in content_type:
+                response_data = json.loads(body)
+            else:
+                response_data = {'raw_response': body.decode(response.get_encoding(), errors='replace')}
+            
+            return self.render(
+                response_data,
+                response.status,
+                headers=filter_response_headers(response.headers)
+            )
+            
+        except asyncio.TimeoutError:
+            logger.error(f"Timeout proxying {method} {full_url}")
+            await breaker.arecord_failure(permit, 'timeout')
+            settled = True
+            payload, status_code = upstream_timeout()
+            return self.render(payload, status_code)
+            
+        except aiohttp.ClientConnectionError:
+            logger.error(f"Connection error proxying {method} {full_url}")
+            await breaker.arecord_failure(permit, 'connection error')
+            settled = True
+            payload, status_code = upstream_unavailable()
+            return self.render(payload, status_code)
+            
+        except Exception as e:
+            logger.error(f"Error proxying {method} {full_url}: {str(e)}")
+            payload, status_code = proxy_error()
+            return self.render(payload, status_code)
+            
+        finally:
+            # Settle the permit on every way out, or a half-open trial
+            # stays taken until TRIAL_TIMEOUT
+            if not settled:
+                await breaker.arecord_failure(permit, 'proxy error')
+            balancer.release(instance, duration_ms, failed)
+    
+    def parse_body(self, request):
+        """Decode a JSON request body, returning (data, error_response)"""
+        if not request.body:
+            return {}, None
+        try:
+            return json.loads(request.body), None
+        except ValueError as e:
+            return None, self.render({'detail': f'JSON parse error - {str(e)}'}, status.HTTP_400_BAD_REQUEST)
+    
+    def forwarded_headers(self, request):
+        """Client headers passed through to the upstream service"""
+        headers = forwarded_request_headers(request, stream=self.stream_responses)
+        if not self.stream_responses:
+            # The aiohttp sessions never decompress, so ask for a plain body
+            headers['Accept-Encoding'] = 'identity'
+        return headers
+    
+    async def get(self, request, service_name, path=''):
+        """Proxy GET requests"""
+        return await self.proxy_request(
+            service_name, path, 'GET',
+            data=request.GET.dict(), headers=self.forwarded_headers(request)
+        )
+    
+    async def post(self, request, service_name, path=''):
+        """Proxy POST requests"""
+        return await self.proxy_body_request(request, service_name, path, 'POST')
+    
+    async def put(self, request, service_name, path=''):
+        """Proxy PUT requests"""
+        return await self.proxy_body_request(request, service_name, path, 'PUT')
+    
+    async def patch(self, request, service_name, path=''):
+        """Proxy PATCH requests"""
+        return await self.proxy_body_request(request, service_name, path, 'PATCH')
+    
+    async def delete(self, request, service_name, path=''):
+        """Proxy DELETE requests"""
+        return await self.proxy_body_request(request, service_name, path, 'DELETE')
+    
+    async def proxy_body_request(self, request, service_name, path, method):
+        """Proxy a request whose JSON body is forwarded upstream"""
+        data, error_response = self.parse_body(request)
+        if error_response is not None:
+            return error_response
+        return await self.proxy_request(
+            service_name, path, method,
+            data=data, headers=self.forwarded_headers(request)
+        )
 
 
 class ServiceStatusView(APIView):
@@ -128,53 +565,28 @@ class ServiceStatusView(APIView):
     
     def get(self, request):
         """Get status of all services"""
-        services = {
-            'user-service': settings.USER_SERVICE_URL,
-        }
-        
-        status_info = {}
-        
-        for service_name, service_url in services.items():
-            try:
-                # Try to connect to service health endpoint
-                health_url = f"{service_url}/api/health/"
-                response = requests.get(health_url, timeout=5)
-                
-                if response.status_code == 200:
-                    status_info[service_name] = {
-                        'status': 'healthy',
-                        'url': service_url,
-                        'response_time': 'fast',
-                        'data': response.json()
-                    }
-                else:
-                    status_info[service_name] = {
-                        'status': 'unhealthy',
-                        'url': service_url,
-                        'status_code': response.status_code
-                    }
-            except requests.exceptions.Timeout:
-                status_info[service_name] = {
-                    'status': 'timeout',
-                    'url': service_url,
-                    'error': 'Request timeout'
-                }
-            except requests.exceptions.ConnectionError:
-                status_info[service_name] = {
-                    'status': 'unreachable',
-                    'url': service_url,
-                    'error': 'Connection failed'
-                }
-            except Exception as e:
-                status_info[service_name] = {
-                    'status': 'error',
-                    'url': service_url,
-                    'error': str(e)
-                }
+        status_info, cached = get_services_status()
+        response_cache = get_response_cache()
+        coalescer = get_request_coalescer()
+        limiter = get_rate_limiter()
         
         return Response({
             'gateway_status': 'healthy',
             'services': status_info,
+            'cached': cached,
+            'load_balancers': {
+                service_name: get_balancer(service_name, urls).snapshot()
+                for service_name, urls in get_service_urls().items()
+            },
+            'circuit_breakers': {
+                service_name: get_circuit_breaker(service_name).snapshot()
+                for service_name in get_service_urls()
+            },
+            'upstream_pool': get_upstream_pool().stats(),
+            'async_upstream_pool': get_async_upstream_pool().stats(),
+            'response_cache': response_cache.stats() if response_cache else {'enabled': False},
+            'request_coalescing': coalescer.stats() if coalescer else {'enabled': False},
+            'rate_limiter': limiter.stats() if limiter else {'enabled': False},
             'timestamp': time.time()
         })
 
@@ -207,6 +619,7 @@ class ServiceListView(APIView):
                 'user-service': {
                     'name': 'User Service',
                     'url': settings.USER_SERVICE_URL,
+                    'instances': settings.USER_SERVICE_URLS,
                     'endpoints': [
                         'POST /api/auth/register',
                         'POST /api/auth/login',
@@ -0,0 +1,570 @@
+"""Service Metrics
+Per-route latency, database, cache and upstream counters of a Django
+service, exported in Prometheus text format
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from bisect import bisect_left
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+import contextvars
+import glob
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_METRICS_SETTINGS = {
+    'ENABLED': True,
+    'LATENCY_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    'QUERY_BUCKETS': (0, 1, 2, 3, 5, 10, 20, 50, 100),
+    # Answer requests sending "X-Debug-Metrics: 1" with a Server-Timing header
+    'SERVER_TIMING': False,
+    # Names this service's Server-Timing entries (<prefix>, <prefix>-db...)
+    # so they stay apart from an upstream's; unprefixed: app, db...
+    'SERVER_TIMING_PREFIX': '',
+    # Dotted path to a function(resolver_match) returning a route label,
+    # or None for the default (the URL pattern)
+    'ROUTE_LABELS': None,
+    # /metrics only answers clients in these networks (REMOTE_ADDR, never
+    # X-Forwarded-For) and, when TOKEN is set, sending
+    # "Authorization: Bearer <TOKEN>"
+    'ALLOWED_NETWORKS': (
+        '127.0.0.0/8', '::1/128', '10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', 'fc00::/7',
+    ),
+    'TOKEN': None,
+    # Directory the gunicorn workers share their counters through; without
+    # one, /metrics only reports the worker that answers the scrape
+    'MULTIPROCESS_DIR': None,
+    'FLUSH_INTERVAL': 5.0,
+    'EXCLUDE_PATHS': ('/metrics',),
+}
+
+METRICS = {
+    'http_requests_total': ('counter', 'Requests served, by route, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Time to the response, by route and method'),
+    'http_request_db_queries': ('histogram', 'Database queries per request'),
+    'http_request_db_duration_seconds_total': ('counter', 'Time spent in database queries'),
+    'http_request_upstream_duration_seconds_total': ('counter', 'Time spent waiting on upstream services'),
+    'http_request_cache_hits_total': ('counter', 'Cache hits made while serving requests'),
+    'http_request_cache_misses_total': ('counter', 'Cache misses made while serving requests'),
+    'http_response_size_bytes_total': ('counter', 'Response body bytes sent'),
+    'cache_requests_total': ('counter', 'Cache lookups, by cache and result'),
+}
+
+
+def get_metrics_settings():
+    """Return the metrics settings merged with their defaults"""
+    metrics_settings = dict(DEFAULT_METRICS_SETTINGS)
+    metrics_settings.update(getattr(settings, 'METRICS', {}))
+    return metrics_settings
+
+
+class RequestStats:
+    """What one request cost, filled in while it is served"""
+
+    __slots__ = ('queries', 'db_seconds', 'upstream_seconds', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.upstream_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+# Follows the request into sync_to_async threads, unlike a thread local
+_current_request = contextvars.ContextVar('request_metrics', default=None)
+
+
+def current_request_stats():
+    """Stats of the request being served, or None outside a request"""
+    return _current_request.get()
+
+
+class _Shard:
+    """One thread's counters; only that thread ever writes to it"""
+
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    """Counters and histograms kept per thread, summed when scraped.
+
+    Recording touches only the calling thread's shard, so it takes no
+    lock. A scrape copies every shard (each copy is a single C call under
+    the GIL) and adds them up; it may miss a request still being recorded,
+    which the next scrape picks up.
+    """
+
+    def __init__(self, latency_buckets, query_buckets):
+        self.buckets = {
+            'http_request_duration_seconds': tuple(latency_buckets),
+            'http_request_db_queries': tuple(query_buckets),
+        }
+        self._local = threading.local()
+        self._shards = []
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            # list.append is atomic
+            self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels, amount=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = self.buckets[name]
+        histograms = self._shard().histograms
+        key = (name, labels)
+        counts = histograms.get(key)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the sum
+            counts = histograms[key] = [0] * (len(buckets) + 2)
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def record_request(self, method, route, status, seconds, stats):
+        labels = (('method', method), ('route', route))
+        self.inc('http_requests_total', labels + (('status', str(status)),))
+        self.observe('http_request_duration_seconds', labels, seconds)
+        self.observe('http_request_db_queries', labels, stats.queries)
+        if stats.db_seconds:
+            self.inc('http_request_db_duration_seconds_total', labels, stats.db_seconds)
+        if stats.upstream_seconds:
+            self.inc('http_request_upstream_duration_seconds_total', labels, stats.upstream_seconds)
+        if stats.cache_hits:
+            self.inc('http_request_cache_hits_total', labels, stats.cache_hits)
+        if stats.cache_misses:
+            self.inc('http_request_cache_misses_total', labels, stats.cache_misses)
+
+    def snapshot(self):
+        """Every shard summed: (counters, histograms) keyed by (name, labels)"""
+        counters = {}
+        histograms = {}
+        for shard in list(self._shards):
+            for key, value in shard.counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, counts in shard.histograms.copy().items():
+                merged = histograms.get(key)
+                if merged is None:
+                    histograms[key] = list(counts)
+                else:
+                    for i, count in enumerate(counts):
+                        merged[i] += count
+        return counters, histograms
+
+
+def _dump(counters, histograms):
+    return json.dumps({
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, counts] for (name, labels), counts in histograms.items()],
+    })
+
+
+def _merge(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, counts in data['histograms']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        merged = histograms.get(key)
+        if merged is None:
+            histograms[key] = list(counts)
+        elif len(merged) == len(counts):
+            for i, count in enumerate(counts):
+                merged[i] += count
+
+
+class MultiprocessStore:
+    """Per-worker snapshot files in a shared directory.
+
+    Each worker rewrites <pid>.json at most every FLUSH_INTERVAL seconds
+    and whenever it answers a scrape; the scrape adds up every file.
+    Files of workers that have exited (gunicorn recycles them) are folded
+    into archive.json so their counts are kept. Up to FLUSH_INTERVAL of a
+    worker's last counts can be lost when it exits.
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def flush(self, registry, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        # One thread writes; the others carry on
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = now
+            path = self._path(f'{os.getpid()}.json')
+            with open(f'{path}.tmp', 'w') as stream:
+                stream.write(_dump(*registry.snapshot()))
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {str(e)}")
+        finally:
+            self._flush_lock.release()
+
+    def collect(self, registry):
+        """Counts of every worker, this one up to date"""
+        self.flush(registry, force=True)
+        self._archive_dead_workers()
+
+        counters = {}
+        histograms = {}
+        for path in glob.glob(self._path('*.json')):
+            try:
+                with open(path) as stream:
+                    _merge(counters, histograms, json.load(stream))
+            except (OSError, ValueError):
+                continue
+        return counters, histograms
+
+    def _archive_dead_workers(self):
+        import fcntl
+
+        with open(self._path('archive.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = []
+            for path in glob.glob(self._path('*.json')):
+                name = os.path.basename(path)[:-len('.json')]
+                if not name.isdigit():
+                    continue
+                try:
+                    os.kill(int(name), 0)
+                except ProcessLookupError:
+                    dead.append(path)
+                except PermissionError:
+                    pass
+            if not dead:
+                return
+
+            counters = {}
+            histograms = {}
+            archive = self._path('archive.json')
+            for path in [archive] + dead:
+                try:
+                    with open(path) as stream:
+                        _merge(counters, histograms, json.load(stream))
+                except (OSError, ValueError):
+                    continue
+            with open(f'{archive}.tmp', 'w') as stream:
+                stream.write(_dump(counters, histograms))
+            os.replace(f'{archive}.tmp', archive)
+            for path in dead:
+                os.remove(path)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def render_prometheus(counters, histograms, buckets):
+    """The Prometheus text exposition format (version 0.0.4)"""
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), counts in histograms.items():
+        by_name.setdefault(name, []).append((labels, counts))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = METRICS.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets[name], value):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", _number(float(bound))),))} {cumulative}')
+            cumulative += value[-2]
+            lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+_registry = None
+_store = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics_registry():
+    """Return this worker's metrics registry"""
+    global _registry, _store
+
+    if _registry is not None:
+        return _registry
+
+    with _registry_lock:
+        if _registry is None:
+            metrics_settings = get_metrics_settings()
+            if metrics_settings['MULTIPROCESS_DIR']:
+                _store = MultiprocessStore(metrics_settings['MULTIPROCESS_DIR'], metrics_settings['FLUSH_INTERVAL'])
+            _registry = MetricsRegistry(metrics_settings['LATENCY_BUCKETS'], metrics_settings['QUERY_BUCKETS'])
+
+    return _registry
+
+
+def record_cache(cache_name, hit):
+    """Count a lookup in one of the service's caches"""
+    stats = _current_request.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+    get_metrics_registry().inc(
+        'cache_requests_total', (('cache', cache_name), ('result', 'hit' if hit else 'miss'))
+    )
+
+
+def record_upstream(seconds):
+    """Add time spent on an upstream call to the current request"""
+    stats = _current_request.get()
+    if stats is not None:
+        stats.upstream_seconds += seconds
+
+
+def _measure_query(execute, sql, params, many, context):
+    stats = _current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def _install_on_connection(connection, **kwargs):
+    if _measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_measure_query)
+
+
+def install_query_metrics():
+    """Time every query of every connection, now and future ones"""
+    connection_created.connect(_install_on_connection, dispatch_uid='service_metrics')
+    for connection in connections.all(initialized_only=True):
+        _install_on_connection(connection)
+
+
+def route_of(request, route_labels=None):
+    """The URL pattern that served a request, keeping label values few.
+
+    route_labels (see ROUTE_LABELS) may name the route itself, e.g. to
+    group catch-all patterns whose paths would each add a label value.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    if route_labels is not None:
+        label = route_labels(match)
+        if label:
+            return label
+    return match.route or match.view_name or 'unmatched'
+
+
+def _count_streamed(response, labels):
+    """Count a streamed body's bytes as they are sent"""
+    registry = get_metrics_registry()
+
+    if response.is_async:
+        content = response.streaming_content
+
+        async def counted():
+            size = 0
+            try:
+                async for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                registry.inc('http_response_size_bytes_total', labels, size)
+    else:
+        content = response.streaming_content
+
+        def counted():
+            size = 0
+            try:
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                registry.inc('http_response_size_bytes_total', labels, size)
+
+    response.streaming_content = counted()
+
+
+class RequestMetricsMiddleware:
+    """Records latency, queries, cache lookups, upstream time and response size per route.
+
+    Goes first in MIDDLEWARE so the time covers the whole stack. Latency
+    is measured to the response being returned; a streamed body is
+    counted as it is sent. With SERVER_TIMING on, a request carrying
+    "X-Debug-Metrics: 1" gets its own breakdown in a Server-Timing header,
+    after the upstream's own entries when it relayed some.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        metrics_settings = get_metrics_settings()
+        self.enabled = metrics_settings['ENABLED']
+        self.server_timing = metrics_settings['SERVER_TIMING']
+        self.timing_prefix = metrics_settings['SERVER_TIMING_PREFIX']
+        self.route_labels = (
+            import_string(metrics_settings['ROUTE_LABELS']) if metrics_settings['ROUTE_LABELS'] else None
+        )
+        self.exclude_paths = tuple(metrics_settings['EXCLUDE_PATHS'])
+        self.registry = get_metrics_registry()
+        if self.enabled:
+            install_query_metrics()
+
+    def _skip(self, request):
+        return not self.enabled or request.path.startswith(self.exclude_paths)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self._skip(request):
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        return self._record(request, response, time.perf_counter() - started, stats)
+
+    async def __acall__(self, request):
+        if self._skip(request):
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        return self._record(request, response, time.perf_counter() - started, stats)
+
+    def _record(self, request, response, seconds, stats):
+        route = route_of(request, self.route_labels)
+        self.registry.record_request(request.method, route, response.status_code, seconds, stats)
+
+        labels = (('method', request.method), ('route', route))
+        if response.streaming:
+            _count_streamed(response, labels)
+        else:
+            self.registry.inc('http_response_size_bytes_total', labels, len(response.content))
+
+        if self.server_timing and request.headers.get('X-Debug-Metrics') == '1':
+            self._add_server_timing(response, seconds, stats)
+
+        if _store is not None:
+            _store.flush(self.registry)
+        return response
+
+    def _timing_name(self, part=None):
+        if not self.timing_prefix:
+            return part or 'app'
+        return f'{self.timing_prefix}-{part}' if part else self.timing_prefix
+
+    def _add_server_timing(self, response, seconds, stats):
+        entries = [f'{self._timing_name()};dur={seconds * 1000:.2f}']
+        if stats.upstream_seconds:
+            entries.append(f'{self._timing_name("upstream")};dur={stats.upstream_seconds * 1000:.2f}')
+        entries.append(
+            f'{self._timing_name("db")};dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries"'
+        )
+        entries.append(
+            f'{self._timing_name("cache")};desc="{stats.cache_hits} hits {stats.cache_misses} misses"'
+        )
+        timing = ', '.join(entries)
+        upstream = response.get('Server-Timing')
+        response['Server-Timing'] = f'{upstream}, {timing}' if upstream else timing
+
+
+def client_allowed(remote_addr, networks):
+    """Whether an address lies in one of the networks"""
+    try:
+        address = ipaddress.ip_address(remote_addr)
+    except ValueError:
+        return False
+    if getattr(address, 'ipv4_mapped', None):
+        address = address.ipv4_mapped
+    return any(address in ipaddress.ip_network(network, strict=False) for network in networks)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, for ALLOWED_NETWORKS and TOKEN holders only"""
+    metrics_settings = get_metrics_settings()
+    if not client_allowed(request.META.get('REMOTE_ADDR', ''), metrics_settings['ALLOWED_NETWORKS']):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+
+    token = metrics_settings['TOKEN']
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f'Bearer {token}'):
+            return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+
+    registry = get_metrics_registry()
+    if _store is not None:
+        counters, histograms = _store.collect(registry)
+    else:
+        counters, histograms = registry.snapshot()
+    return HttpResponse(
+        render_prometheus(counters, histograms, registry.buckets),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1 @@
+"""Local benchmarks for the User Service"""
@@ -0,0 +1,195 @@
+"""
+Driver Location Benchmark
+Simulates moving drivers and times heartbeats and nearest-driver queries
+
+Usage:
+    python -m benchmarks.driver_locations --drivers 10000 --rounds 5
+    python -m benchmarks.driver_locations --redis redis://localhost:6379/3
+
+Drivers are spread over northern Algeria with random vehicles and move a
+few hundred metres per round. Each round sends every driver's heartbeat,
+then runs nearest-driver queries (unfiltered and filtered) from random
+points while a background thread keeps heartbeats flowing. A sample of
+queries is checked against a brute-force scan. With --redis a second
+locator sharing the store answers the queries, so the timings include
+the sync between workers.
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+TARGET_P99_MS = 10.0
+
+# Rough bounding box of the populated north
+LATITUDES = (34.5, 37.0)
+LONGITUDES = (-1.5, 8.5)
+
+VEHICLE_TYPES = ['sedan', 'hatchback', 'suv', 'van', 'pickup', 'other']
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_store(redis_url):
+    from user_service.locations import LocalLocationStore, RedisLocationStore
+
+    if not redis_url:
+        return LocalLocationStore()
+    import redis
+    connection = redis.Redis.from_url(redis_url)
+    connection.delete(RedisLocationStore.POSITIONS_KEY, RedisLocationStore.UPDATED_KEY)
+    return RedisLocationStore(connection)
+
+
+def make_drivers(count, rng):
+    now = time.time()
+    drivers = []
+    for driver_id in range(1, count + 1):
+        drivers.append({
+            'driver_id': driver_id,
+            'latitude': rng.uniform(*LATITUDES),
+            'longitude': rng.uniform(*LONGITUDES),
+            'available': rng.random() < 0.8,
+            'vehicle_id': driver_id,
+            'vehicle_type': rng.choice(VEHICLE_TYPES),
+            'seats': rng.choice([4, 4, 4, 5, 7, 8]),
+            'is_verified': rng.random() < 0.7,
+            'insurance_expiry': now + rng.uniform(-30, 330) * 86400,
+        })
+    return drivers
+
+
+def move(driver, rng):
+    # Up to ~300 m per step
+    driver['latitude'] = min(max(driver['latitude'] + rng.uniform(-0.003, 0.003), LATITUDES[0]), LATITUDES[1])
+    driver['longitude'] = min(max(driver['longitude'] + rng.uniform(-0.003, 0.003), LONGITUDES[0]), LONGITUDES[1])
+    if rng.random() < 0.02:
+        driver['available'] = not driver['available']
+
+
+def brute_force(locator, latitude, longitude, limit, radius_km, **filters):
+    """The answer nearest() should give, by scanning every position"""
+    from user_service.locations import haversine_km
+
+    now = time.time()
+    matches = []
+    for position in locator.index.positions.values():
+        if not position.available or position.updated_at < now - locator.ttl:
+            continue
+        if filters.get('vehicle_type') and position.vehicle_type != filters['vehicle_type']:
+            continue
+        if filters.get('min_seats') and position.seats < filters['min_seats']:
+            continue
+        if filters.get('verified_only') and not position.is_verified:
+            continue
+        if filters.get('insured_only') and not position.is_insured(now):
+            continue
+        distance = haversine_km(latitude, longitude, position.latitude, position.longitude)
+        if distance <= radius_km:
+            matches.append((distance, position.driver_id))
+    return [driver_id for _, driver_id in sorted(matches)[:limit]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Driver location index')
+    parser.add_argument('--drivers', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=2000, help='queries per round')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--radius-km', type=float, default=50.0)
+    parser.add_argument('--redis', default='', help='Redis URL for the shared store')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from user_service.locations import DriverLocator, DriverPosition
+
+    rng = random.Random(args.seed)
+    store = build_store(args.redis)
+    writer = DriverLocator(store)
+    # Another worker sharing the store; the same locator when there is none
+    reader = DriverLocator(store) if args.redis else writer
+
+    drivers = make_drivers(args.drivers, rng)
+    query_filters = [
+        ('any', {}),
+        ('van_7_seats', {'vehicle_type': 'van', 'min_seats': 7}),
+        ('verified_insured', {'verified_only': True, 'insured_only': True}),
+    ]
+    heartbeat_rates = []
+    latencies = {name: [] for name, _ in query_filters}
+    mismatches = 0
+    checked = 0
+
+    for round_number in range(args.rounds):
+        started = time.perf_counter()
+        for driver in drivers:
+            move(driver, rng)
+            writer.heartbeat(DriverPosition(**driver))
+        heartbeat_rates.append(len(drivers) / (time.perf_counter() - started))
+
+        # Keep drivers moving while the queries run
+        stop = threading.Event()
+
+        def keep_moving():
+            mover = random.Random(round_number)
+            while not stop.is_set():
+                driver = mover.choice(drivers)
+                move(driver, mover)
+                writer.heartbeat(DriverPosition(**driver))
+                time.sleep(0.0001)
+
+        background = threading.Thread(target=keep_moving, daemon=True)
+        background.start()
+        for i in range(args.queries):
+            name, filters = query_filters[i % len(query_filters)]
+            latitude, longitude = rng.uniform(*LATITUDES), rng.uniform(*LONGITUDES)
+            started = time.perf_counter()
+            reader.nearest(latitude, longitude, limit=args.limit, radius_km=args.radius_km, **filters)
+            latencies[name].append(time.perf_counter() - started)
+        stop.set()
+        background.join()
+
+        # Correctness on a quiet index
+        reader.sync(time.time() + reader.sync_interval)
+        for _ in range(20):
+            name, filters = rng.choice(query_filters)
+            latitude, longitude = rng.uniform(*LATITUDES), rng.uniform(*LONGITUDES)
+            found = [p.driver_id for _, p in reader.nearest(latitude, longitude, limit=args.limit, radius_km=args.radius_km, **filters)]
+            checked += 1
+            if found != brute_force(reader, latitude, longitude, args.limit, args.radius_km, **filters):
+                mismatches += 1
+
+    print(f"store: {type(store).__name__}, drivers: {args.drivers}, cells: {len(reader.index.cells)}")
+    print(f"heartbeats/s: {round(sum(heartbeat_rates) / len(heartbeat_rates))}")
+    header = f"{'query':<17} {'count':>6} {'p50_ms':>8} {'p99_ms':>8} {'max_ms':>8}"
+    print(header)
+    print('-' * len(header))
+    worst = 0.0
+    for name, samples in latencies.items():
+        p99 = percentile(samples, 99) * 1000
+        worst = max(worst, p99)
+        print(
+            f"{name:<17} {len(samples):>6} {percentile(samples, 50) * 1000:>8.3f} "
+            f"{p99:>8.3f} {max(samples) * 1000:>8.3f}"
+        )
+    print(f"brute-force mismatches: {mismatches}/{checked}")
+    passed = worst < TARGET_P99_MS and not mismatches
+    print(f"worst p99 {worst:.3f} ms: {'PASS' if passed else 'FAIL'} (target < {TARGET_P99_MS:g} ms)")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,99 @@
+"""
+Export Benchmark
+Streams the user export at growing table sizes and tracks peak memory
+
+Usage:
+    python -m benchmarks.exports --sizes 10000 50000 200000
+    DJANGO_SETTINGS_MODULE=user_service.settings DB_NAME=bench \\
+        python -m benchmarks.exports --sizes 1000000
+
+For each size the users table is grown to that many rows, then the
+export view's stream is drained into a byte counter as CSV, gzipped CSV
+and JSON Lines. Peak Python memory while streaming (tracemalloc) should
+stay flat as the table grows; rows per second shows the throughput.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+
+def seed(total, batch_size=10000):
+    """Grow the users table to total rows"""
+    from user_service.models import User, UserRole
+
+    start = User.objects.count()
+    for offset in range(start, total, batch_size):
+        users = User.objects.bulk_create([
+            User(
+                username=f'export{i}@example.dz',
+                email=f'export{i}@example.dz',
+                password='!',
+                first_name='Export',
+                last_name=f'User {i}',
+                city='Oran',
+                wilaya='Oran',
+                wilaya_ref_id=31,
+                license_number=f'EX{i:09d}',
+            )
+            for i in range(offset, min(offset + batch_size, total))
+        ])
+        ids = [user.pk for user in users] if users[0].pk else list(
+            User.objects.filter(email__in=[user.email for user in users]).values_list('pk', flat=True)
+        )
+        UserRole.objects.bulk_create([UserRole(user_id=pk, role='ROLE_USER') for pk in ids])
+    return max(start, total)
+
+
+def drain(file_format, compress):
+    """Stream the export; returns (seconds, bytes, peak bytes)"""
+    from user_service.exports import UserExport, get_export_settings, stream_export
+
+    export_settings = get_export_settings()
+    export = UserExport.from_params({}, export_settings['CHUNK_SIZE'])
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = 0
+    for chunk in stream_export(export, file_format, compress, export_settings['FLUSH_BYTES']):
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, size, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Streaming table export')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 200000])
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    # Query logging would grow with the row count
+    settings.DEBUG = False
+    call_command('migrate', verbosity=0, skip_checks=True)
+
+    header = f"{'rows':>8} {'format':<8} {'MB':>8} {'rows/s':>9} {'peak_MB':>8}"
+    print(connection.vendor)
+    print(header)
+    print('-' * len(header))
+    for total in sorted(args.sizes):
+        rows = seed(total)
+        for file_format, compress in (('csv', False), ('csv', True), ('jsonl', False)):
+            elapsed, size, peak = drain(file_format, compress)
+            label = file_format + ('.gz' if compress else '')
+            print(f"{rows:>8} {label:<8} {size / 1e6:>8.1f} {rows / elapsed:>9.0f} {peak / 1e6:>8.2f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
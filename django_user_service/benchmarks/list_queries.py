@@ -0,0 +1,129 @@
+"""
+List Query Budget
+Checks that the list endpoints run the same number of queries at any page size
+
+Usage:
+    python -m benchmarks.list_queries --users 300 --page-sizes 5,20,100
+
+Seeds users that each hold several roles and a mix of active and inactive
+vehicles, then serves one page per page size from the user list and the
+vehicle list (compact drivers and ?expand=drivers) and counts the SQL
+queries. Every page of an endpoint must cost the same, and the user list's
+role and vehicle_count must match what the per-row lookups return. Exits
+non-zero when either check fails.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+
+def seed(total):
+    """Create users with roles and vehicles; returns the requesting user"""
+    from user_service.models import User, UserRole, UserVehicle, Vehicle
+
+    users = User.objects.bulk_create(
+        User(username=f'user{i}', email=f'user{i}@example.dz', city='Oran', wilaya='Oran')
+        for i in range(total)
+    )
+    roles = ['ROLE_DRIVER', 'ROLE_USER', 'ROLE_MODERATOR']
+    UserRole.objects.bulk_create(
+        UserRole(user=user, role=roles[(i + j) % len(roles)])
+        for i, user in enumerate(users)
+        for j in range(i % 3)
+    )
+    vehicles = Vehicle.objects.bulk_create(
+        Vehicle(license_plate=f'{i:05d}-116-31', make='Renault', model='Symbol', is_active=i % 3 != 0)
+        for i in range(total * 2)
+    )
+    UserVehicle.objects.bulk_create(
+        UserVehicle(user=user, vehicle=vehicles[(i * 2 + j) % len(vehicles)])
+        for i, user in enumerate(users)
+        for j in range(i % 4)
+    )
+    return users[0]
+
+
+def expected_row(user):
+    """role and vehicle_count computed with the per-row lookups"""
+    user_role = user.user_roles.first()
+    return {
+        'role': user_role.role if user_role else None,
+        'vehicle_count': user.vehicles.filter(is_active=True).count(),
+    }
+
+
+def measure(view, path, params, requester):
+    """Serve one page; returns (rows, query count, seconds)"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    request = APIRequestFactory().get(path, params)
+    force_authenticate(request, user=requester)
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = view(request)
+        response.render()
+        elapsed = time.perf_counter() - started
+    return response.data['results'], len(queries.captured_queries), elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List endpoint query budget')
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--page-sizes', default='5,20,100')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+
+    from user_service.models import User, UserRole
+    from user_service.views import UserListView, VehicleViewSet
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    requester = seed(args.users)
+    UserRole.objects.create(user=requester, role='ROLE_ADMIN')
+
+    endpoints = [
+        ('users', UserListView.as_view(), '/api/users/list/', {}),
+        ('vehicles', VehicleViewSet.as_view({'get': 'list'}), '/api/vehicles/', {}),
+        ('vehicles+expand', VehicleViewSet.as_view({'get': 'list'}), '/api/vehicles/', {'expand': 'drivers'}),
+    ]
+    page_sizes = [int(size) for size in args.page_sizes.split(',')]
+    failed = False
+
+    print(f"{'endpoint':<16} {'page_size':>9} {'rows':>5} {'queries':>8} {'ms':>8}")
+    for name, view, path, params in endpoints:
+        counts = []
+        mismatches = 0
+        # Warm the requester's cached roles so every page sees the same cache
+        measure(view, path, params, requester)
+        for page_size in page_sizes:
+            rows, queries, elapsed = measure(view, path, dict(params, page_size=page_size), requester)
+            counts.append(queries)
+            print(f"{name:<16} {page_size:>9} {len(rows):>5} {queries:>8} {elapsed * 1000:>8.1f}")
+
+            if name == 'users':
+                users = User.objects.in_bulk([row['id'] for row in rows])
+                for row in rows:
+                    expected = expected_row(users[row['id']])
+                    if {key: row[key] for key in expected} != expected:
+                        mismatches += 1
+
+        constant = len(set(counts)) == 1
+        print(f"{name}: queries per page {'constant' if constant else 'GROW with page size'}"
+              + (f", {mismatches} rows differ from per-row lookups" if mismatches else ''))
+        failed = failed or not constant or bool(mismatches)
+
+    print('FAIL' if failed else 'PASS')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
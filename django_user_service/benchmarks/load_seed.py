@@ -0,0 +1,105 @@
+"""
+Load Test Seed
+Fills the load suite's database with users, drivers and vehicles
+
+Usage:
+    DJANGO_SETTINGS_MODULE=benchmarks.load_settings python -m benchmarks.load_seed --users 1000 --vehicles 300
+
+Migrates, empties the database, then bulk-creates an admin and --users
+users sharing one password (hashed once, so seeding stays fast with
+Argon2). Vehicle i belongs to user i modulo --users, who also gets
+ROLE_DRIVER. Prints what the suite needs to log in and address the
+vehicles as one line of JSON.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+PASSWORD = 'Load-Test-2024!'
+ADMIN_EMAIL = 'load-admin@bench.dz'
+USER_EMAIL = 'load{}@bench.dz'
+
+
+def seed(users, vehicles):
+    """Create the accounts and vehicles; returns [(vehicle id, owner index)]"""
+    from django.contrib.auth.hashers import make_password
+    from django.db import transaction
+
+    from user_service.models import User, UserRole, UserVehicle, Vehicle
+
+    password = make_password(PASSWORD)
+    wilayas = ['Alger', 'Oran', 'Constantine', 'Setif', 'Blida']
+
+    with transaction.atomic():
+        admin = User.objects.create(
+            username=ADMIN_EMAIL, email=ADMIN_EMAIL, password=password, first_name='Load', last_name='Admin',
+        )
+        # The post_save signal already gave it ROLE_USER
+        UserRole.objects.create(user=admin, role='ROLE_ADMIN')
+
+        created = User.objects.bulk_create(
+            (
+                User(
+                    username=USER_EMAIL.format(i), email=USER_EMAIL.format(i), password=password,
+                    first_name=f'User{i}', last_name='Load', city=wilayas[i % len(wilayas)],
+                    wilaya=wilayas[i % len(wilayas)], is_verified=i % 2 == 0,
+                )
+                for i in range(users)
+            ),
+            batch_size=1000,
+        )
+        drivers = {i % users for i in range(vehicles)}
+        UserRole.objects.bulk_create(
+            [UserRole(user=user, role='ROLE_USER') for user in created]
+            + [UserRole(user=created[i], role='ROLE_DRIVER') for i in sorted(drivers)],
+            batch_size=1000,
+        )
+
+        fleet = Vehicle.objects.bulk_create(
+            (
+                Vehicle(license_plate=f'{i:05d}-116-31', make='Renault', model='Symbol', seats=4 + i % 4)
+                for i in range(vehicles)
+            ),
+            batch_size=1000,
+        )
+        UserVehicle.objects.bulk_create(
+            (UserVehicle(user=created[i % users], vehicle=vehicle) for i, vehicle in enumerate(fleet)),
+            batch_size=1000,
+        )
+
+    return [(vehicle.pk, i % users) for i, vehicle in enumerate(fleet)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed the load test database')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--vehicles', type=int, default=300)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.load_settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+
+    started = time.perf_counter()
+    call_command('migrate', verbosity=0, skip_checks=True)
+    call_command('flush', interactive=False, verbosity=0, skip_checks=True)
+    vehicles = seed(args.users, args.vehicles)
+
+    print(json.dumps({
+        'users': args.users,
+        'password': PASSWORD,
+        'admin_email': ADMIN_EMAIL,
+        'user_email': USER_EMAIL,
+        'vehicles': vehicles,
+        'seconds': round(time.perf_counter() - started, 2),
+    }))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,57 @@
+"""
+Load Test Settings
+User service settings for the load suite: SQLite or a local Postgres, fake or local Redis
+
+Set by benchmarks/load_suite.py at the repository root:
+    LOAD_DIR       directory for the SQLite database
+    LOAD_DATABASE  sqlite (default) or postgres (DB_* as in user_service.settings)
+    LOAD_REDIS     fake (fakeredis, in process), local (REDIS_* as in
+                   user_service.settings) or none (local memory cache)
+"""
+
+import os
+import tempfile
+
+from benchmarks.settings import *  # noqa: F401,F403
+from user_service import settings as service_settings
+
+LOAD_DIR = os.environ.get('LOAD_DIR', tempfile.gettempdir())
+
+if os.environ.get('LOAD_DATABASE', 'sqlite') == 'postgres':
+    DATABASES = service_settings.DATABASES
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(LOAD_DIR, 'user_service.sqlite3'),
+            # Concurrent writers wait for the lock instead of failing
+            'OPTIONS': {'timeout': 30},
+        }
+    }
+
+LOAD_REDIS = os.environ.get('LOAD_REDIS', 'fake')
+if LOAD_REDIS == 'local':
+    CACHES = service_settings.CACHES
+elif LOAD_REDIS == 'fake':
+    import fakeredis
+
+    # Every connection of a worker reaches the same in-process server
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://fakeredis:6379/1',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'CONNECTION_POOL_KWARGS': {
+                    'connection_class': fakeredis.FakeConnection,
+                },
+            },
+        }
+    }
+
+# The suite talks to a real server
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+DEBUG = False
+
+# Each response carries its own query count and database time
+METRICS = dict(METRICS, SERVER_TIMING=True)  # noqa: F405
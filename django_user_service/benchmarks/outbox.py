@@ -0,0 +1,150 @@
+"""
+Outbox Benchmark
+Cost of writing outbox events and throughput of the relay per batch size
+
+Usage:
+    python -m benchmarks.outbox --users 200 --updates 2000 --batch-sizes 50,500,2000
+
+Seeds users and vehicles, then updates users one by one and counts the
+queries each change costs with its outbox event. The resulting backlog is
+relayed into the in-memory stream stand-in at each batch size, reporting
+events per second. Finally a publisher that fails every third batch,
+sometimes after appending, checks delivery: every event must arrive, and
+once duplicates are skipped each aggregate's events must arrive in order.
+Exits non-zero when that check fails.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+
+class FlakyPublisher:
+    """Fails every third batch, alternately before and after appending"""
+
+    def __init__(self, publisher):
+        self.publisher = publisher
+        self.calls = 0
+
+    def publish(self, entries):
+        self.calls += 1
+        if self.calls % 3 == 0:
+            if self.calls % 2 == 0:
+                self.publisher.publish(entries)
+            raise ConnectionError('simulated publish failure')
+        self.publisher.publish(entries)
+
+
+def seed(total):
+    """Create users and vehicles with drivers; returns the users"""
+    from user_service.models import User, UserVehicle, Vehicle
+
+    users = [
+        User.objects.create(username=f'user{i}@example.dz', email=f'user{i}@example.dz', city='Oran', wilaya='Oran')
+        for i in range(total)
+    ]
+    for i, user in enumerate(users[:total // 2]):
+        vehicle = Vehicle.objects.create(license_plate=f'{i:05d}-116-31', make='Renault', model='Symbol')
+        UserVehicle.objects.create(user=user, vehicle=vehicle)
+    return users
+
+
+def update_users(users, updates):
+    """Save users round-robin; returns (seconds per change, queries per change)"""
+    from django.db import connection
+
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        started = time.perf_counter()
+        for i in range(updates):
+            user = users[i % len(users)]
+            user.first_name = f'Name {i}'
+            user.save(update_fields=['first_name', 'updated_at'])
+        elapsed = time.perf_counter() - started
+    return elapsed / updates, queries / updates
+
+
+def relay_all(relay):
+    """Relay the backlog, retrying failed batches; returns seconds"""
+    started = time.perf_counter()
+    while True:
+        try:
+            if relay.relay_pending() == 0:
+                break
+        except ConnectionError:
+            continue
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Transactional outbox')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--batch-sizes', default='50,500,2000')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+
+    from user_service.models import OutboxEvent
+    from user_service.outbox import LocalStreamPublisher, OutboxRelay
+
+    call_command('migrate', verbosity=0, skip_checks=True)
+    users = seed(args.users)
+    seconds, queries = update_users(users, args.updates)
+    backlog = OutboxEvent.objects.filter(published_at__isnull=True).count()
+    print(f"user update with its event: {queries:.1f} queries, {seconds * 1000:.2f} ms; backlog {backlog} events")
+
+    header = f"{'batch_size':>10} {'events':>7} {'seconds':>8} {'events/s':>9}"
+    print(header)
+    print('-' * len(header))
+    for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+        OutboxEvent.objects.update(published_at=None)
+        relay = OutboxRelay(LocalStreamPublisher(max_length=10 ** 7), batch_size=batch_size)
+        elapsed = relay_all(relay)
+        print(f"{batch_size:>10} {relay.published:>7} {elapsed:>8.3f} {relay.published / elapsed:>9.0f}")
+
+    # At-least-once and per-aggregate order through failures
+    OutboxEvent.objects.update(published_at=None)
+    streams = LocalStreamPublisher(max_length=10 ** 7)
+    relay = OutboxRelay(FlakyPublisher(streams), batch_size=97)
+    relay_all(relay)
+
+    expected = set(OutboxEvent.objects.values_list('id', flat=True))
+    delivered = set()
+    duplicates = 0
+    out_of_order = 0
+    last_seen = {}
+    for aggregate_type in ('user', 'vehicle'):
+        for _, fields in streams.read(relay.stream_for(aggregate_type)):
+            event_id = fields['event_id']
+            if event_id in delivered:
+                duplicates += 1
+                continue
+            delivered.add(event_id)
+            key = (aggregate_type, fields['aggregate_id'])
+            if last_seen.get(key, 0) > event_id:
+                out_of_order += 1
+            last_seen[key] = event_id
+
+    missing = len(expected - delivered)
+    print(f"flaky publisher: {len(delivered)}/{len(expected)} delivered, {duplicates} duplicates, "
+          f"{missing} missing, {out_of_order} out of order")
+    failed = bool(missing or out_of_order)
+    print('FAIL' if failed else 'PASS')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,168 @@
+"""
+Password Hashing Benchmark
+Registrations and logins per second per core, before and after the hashing pool
+
+Usage:
+    python -m benchmarks.password_hashing --users 20
+    python -m benchmarks.password_hashing --users 50 --burst 64 --max-pending 8
+
+Each configuration registers --users accounts through UserRegistrationView
+and logs each of them in through the token endpoint, one request at a
+time, reporting requests/s per core and the CPU each request spends on its
+own thread (the time a gunicorn worker is held):
+
+- before: PBKDF2, Django's default, hashed on the request thread
+- argon2: the tuned Argon2id hasher, still on the request thread
+- pooled: the tuned Argon2id hasher in the hashing pool
+
+Logins of the accounts registered under "before" are then repeated with
+Argon2 to show they are rehashed once and cost Argon2 afterwards. Finally
+--burst threads hash at once against a pool admitting --max-pending, and
+the refused hashes are counted.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+
+PBKDF2 = 'django.contrib.auth.hashers.PBKDF2PasswordHasher'
+ARGON2 = 'user_service.passwords.TunedArgon2PasswordHasher'
+
+PASSWORD = 'Taxi-Wilaya-2024!'
+
+
+def post(view, path, data):
+    """Serve one POST; returns (response, wall seconds, request-thread CPU seconds)"""
+    from rest_framework.test import APIRequestFactory
+
+    request = APIRequestFactory().post(path, data, format='json')
+    cpu = time.thread_time()
+    started = time.perf_counter()
+    response = view(request)
+    response.render()
+    return response, time.perf_counter() - started, time.thread_time() - cpu
+
+
+def run(label, emails, register=True):
+    """Register (optionally) and log in every email; returns result rows"""
+    from rest_framework_simplejwt.views import TokenObtainPairView
+    from user_service.views import UserRegistrationView
+
+    rows = []
+    paths = []
+    if register:
+        paths.append(('register', UserRegistrationView.as_view(), '/api/auth/register/', lambda email: {
+            'email': email, 'password': PASSWORD, 'password_confirm': PASSWORD,
+            'first_name': 'Bench', 'last_name': 'User',
+        }))
+    paths.append(('login', TokenObtainPairView.as_view(), '/api/auth/login/', lambda email: {
+        'username': email, 'password': PASSWORD,
+    }))
+
+    for name, view, path, payload in paths:
+        wall = cpu = 0.0
+        for email in emails:
+            response, elapsed, thread_cpu = post(view, path, payload(email))
+            if response.status_code not in (200, 201):
+                raise SystemExit(f"{label} {name} failed: {response.status_code} {response.data}")
+            wall += elapsed
+            cpu += thread_cpu
+        # One request at a time keeps one core busy, wherever it hashes
+        rows.append((label, name, len(emails) / wall, cpu * 1000 / len(emails)))
+    return rows
+
+
+def burst(threads, max_pending):
+    """Hash from many threads at once; returns (hashed, refused, seconds)"""
+    from user_service.passwords import PasswordHashingBusy, PasswordHasherPool
+
+    pool = PasswordHasherPool(max_pending=max_pending, admission_timeout=0.5)
+    # One warning per refusal would bury the results
+    logging.getLogger('user_service.passwords').setLevel(logging.ERROR)
+    outcomes = []
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            pool.make_password(PASSWORD)
+            outcome = 'hashed'
+        except PasswordHashingBusy:
+            outcome = 'refused'
+        with lock:
+            outcomes.append(outcome)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return outcomes.count('hashed'), outcomes.count('refused'), elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Password hashing throughput')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--burst', type=int, default=32, help='threads hashing at once')
+    parser.add_argument('--max-pending', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+
+    from user_service.models import User
+    from user_service.passwords import get_password_hasher, reset_password_hasher
+
+    call_command('migrate', verbosity=0, skip_checks=True)
+
+    configs = [
+        ('before', [PBKDF2], False),
+        ('argon2', [ARGON2, PBKDF2], False),
+        ('pooled', [ARGON2, PBKDF2], True),
+    ]
+    rows = []
+    for label, hashers, offload in configs:
+        hashing = dict(settings.PASSWORD_HASHING, OFFLOAD=offload)
+        with override_settings(PASSWORD_HASHERS=hashers, PASSWORD_HASHING=hashing):
+            reset_password_hasher()
+            emails = [f'{label}{i}@bench.dz' for i in range(args.users)]
+            rows.extend(run(label, emails))
+    reset_password_hasher()
+
+    # Accounts hashed with PBKDF2 move to Argon2 on their next login
+    with override_settings(PASSWORD_HASHERS=[ARGON2, PBKDF2]):
+        emails = [f'before{i}@bench.dz' for i in range(args.users)]
+        rows.extend(run('rehash', emails, register=False))
+        rehashed = get_password_hasher().stats()['rehashed']
+        rows.extend(run('rehashed', emails, register=False))
+        argon2_users = User.objects.filter(email__in=emails, password__startswith='argon2').count()
+    reset_password_hasher()
+
+    cores = os.cpu_count() or 1
+    header = f"{'config':<9} {'path':<9} {'req/s/core':>10} {'thread_cpu_ms':>13}"
+    print(f"CPUs: {cores}, users per config: {args.users}")
+    print(header)
+    print('-' * len(header))
+    for label, name, rate, cpu_ms in rows:
+        print(f"{label:<9} {name:<9} {rate:>10.1f} {cpu_ms:>13.2f}")
+    print(f"rehashed on login: {rehashed}, now Argon2: {argon2_users}/{args.users}")
+
+    hashed, refused, elapsed = burst(args.burst, args.max_pending)
+    print(f"burst of {args.burst} with MAX_PENDING={args.max_pending}: "
+          f"{hashed} hashed, {refused} refused in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
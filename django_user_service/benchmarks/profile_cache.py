@@ -0,0 +1,142 @@
+"""
+Profile Cache Benchmark
+Compares profile reads with and without the read-through cache
+
+Usage:
+    python -m benchmarks.profile_cache --users 200 --reads 2000
+
+Seeds users that each hold a few roles and vehicles, then serves
+UserDetailView for random users, first cold and then from a warm cache,
+counting SQL queries and time per read. Afterwards it changes a user's
+role, a vehicle and the user row itself and checks the next read shows
+each change. Exits non-zero when a cached profile is stale.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+
+def seed(total):
+    """Create users with roles and vehicles; returns them"""
+    from user_service.models import User, UserRole, UserVehicle, Vehicle
+
+    users = User.objects.bulk_create(
+        User(username=f'user{i}', email=f'user{i}@example.dz', city='Oran', wilaya='Oran')
+        for i in range(total)
+    )
+    UserRole.objects.bulk_create(
+        UserRole(user=user, role=role)
+        for user in users
+        for role in ('ROLE_USER', 'ROLE_DRIVER')
+    )
+    vehicles = Vehicle.objects.bulk_create(
+        Vehicle(license_plate=f'{i:05d}-116-31', make='Renault', model='Symbol')
+        for i in range(total * 2)
+    )
+    UserVehicle.objects.bulk_create(
+        UserVehicle(user=user, vehicle=vehicles[i * 2 + j])
+        for i, user in enumerate(users)
+        for j in range(2)
+    )
+    return users
+
+
+def read(view, requester, user_id):
+    """Serve one profile; returns (data, query count, seconds)"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    request = APIRequestFactory().get(f'/api/users/{user_id}/')
+    force_authenticate(request, user=requester)
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = view(request, user_id=user_id)
+        response.render()
+        elapsed = time.perf_counter() - started
+    return response.data, len(queries.captured_queries), elapsed
+
+
+def run(view, requester, user_ids):
+    """Read every id once; returns (queries per read, ms per read)"""
+    queries = 0
+    elapsed = 0.0
+    for user_id in user_ids:
+        _, count, seconds = read(view, requester, user_id)
+        queries += count
+        elapsed += seconds
+    return queries / len(user_ids), elapsed * 1000 / len(user_ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile read-through cache')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--reads', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.core.cache import cache
+    from django.core.management import call_command
+
+    from user_service.models import UserRole, Vehicle
+    from user_service.profiles import get_profile_cache, profile_key
+    from user_service.views import UserDetailView
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    users = seed(args.users)
+    requester = users[0]
+    view = UserDetailView.as_view()
+
+    rng = random.Random(7)
+    user_ids = [rng.choice(users).pk for _ in range(args.reads)]
+
+    cache.clear()
+    # Warm the requester's cached roles only
+    read(view, requester, requester.pk)
+    cache.delete(profile_key(requester.pk))
+
+    print(f"{'pass':<8} {'queries/read':>12} {'ms/read':>8}")
+    cold_ids = list(dict.fromkeys(user_ids))
+    queries, ms = run(view, requester, cold_ids)
+    print(f"{'cold':<8} {queries:>12.2f} {ms:>8.3f}")
+    queries, ms = run(view, requester, user_ids)
+    print(f"{'warm':<8} {queries:>12.2f} {ms:>8.3f}")
+    print(get_profile_cache().stats())
+
+    # Every kind of change must reach the next read
+    user = users[1]
+    stale = []
+
+    UserRole.objects.create(user=user, role='ROLE_MODERATOR')
+    if 'ROLE_MODERATOR' not in read(view, requester, user.pk)[0]['roles']:
+        stale.append('role added')
+
+    vehicle = Vehicle.objects.filter(drivers=user).first()
+    vehicle.color = 'Blanc'
+    vehicle.save()
+    if 'Blanc' not in [item['color'] for item in read(view, requester, user.pk)[0]['vehicles']]:
+        stale.append('vehicle updated')
+
+    vehicle.deactivate()
+    if vehicle.pk in [item['id'] for item in read(view, requester, user.pk)[0]['vehicles']]:
+        stale.append('vehicle deactivated')
+
+    user.first_name = 'Amine'
+    user.save()
+    if read(view, requester, user.pk)[0]['first_name'] != 'Amine':
+        stale.append('user updated')
+
+    print(f"stale after: {', '.join(stale)}" if stale else 'no stale reads')
+    print('FAIL' if stale else 'PASS')
+    return 1 if stale else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,156 @@
+"""
+Request Metrics Benchmark
+Overhead of the metrics middleware and exactness of its cross-thread totals
+
+Usage:
+    python -m benchmarks.request_metrics --requests 5000 --threads 8
+
+Requests to an empty view and to the profile view (cache disabled, so
+every request queries) are served with and without RequestMetricsMiddleware,
+reporting the microseconds it adds per request. Then --threads threads
+serve --requests requests each through one registry while another thread
+keeps scraping /metrics; the final scrape must count every request, in
+both the counter and the histograms. The same is checked after a round
+trip through the multi-process snapshot files. Exits non-zero when a
+count is off.
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+
+def build_request(path, user=None):
+    from django.urls import ResolverMatch
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    request = APIRequestFactory().get(path)
+    if user is not None:
+        force_authenticate(request, user=user)
+    request.resolver_match = ResolverMatch(lambda: None, (), {}, route=path.lstrip('/'))
+    return request
+
+
+def time_requests(handler, request, total):
+    """Seconds per request"""
+    started = time.perf_counter()
+    for _ in range(total):
+        handler(request)
+    return (time.perf_counter() - started) / total
+
+
+def metric_total(text, sample):
+    """Sum of a sample's values across its label sets"""
+    return sum(float(value) for value in re.findall(rf'^{re.escape(sample)}(?:\{{[^}}]*\}})? (\S+)$', text, re.M))
+
+
+def check_totals(text, expected):
+    counted = {
+        'http_requests_total': metric_total(text, 'http_requests_total'),
+        'http_request_duration_seconds_count': metric_total(text, 'http_request_duration_seconds_count'),
+        'http_request_db_queries_count': metric_total(text, 'http_request_db_queries_count'),
+    }
+    return [f"{name} {value:.0f} != {expected}" for name, value in counted.items() if value != expected]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Request metrics middleware')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.http import HttpResponse
+    from django.test.utils import override_settings
+
+    import service_metrics as metrics
+    from user_service.models import User
+    from user_service.views import UserProfileView
+
+    call_command('migrate', verbosity=0, skip_checks=True)
+    user = User.objects.create(username='metrics@example.dz', email='metrics@example.dz', city='Oran', wilaya='Oran')
+    profile_view = UserProfileView.as_view()
+
+    def empty_view(request):
+        return HttpResponse(b'ok')
+
+    def profile(request):
+        response = profile_view(request)
+        response.render()
+        return response
+
+    header = f"{'view':<8} {'bare_us':>8} {'metered_us':>10} {'overhead_us':>11}"
+    print(header)
+    print('-' * len(header))
+    with override_settings(PROFILE_CACHE={'TIMEOUT': 0}):
+        for name, view, request in [
+            ('empty', empty_view, build_request('/bench/empty/')),
+            ('profile', profile, build_request('/api/users/me/', user)),
+        ]:
+            metered = metrics.RequestMetricsMiddleware(view)
+            time_requests(metered, request, 100)
+            bare = time_requests(view, request, args.requests)
+            with_metrics = time_requests(metered, request, args.requests)
+            print(f"{name:<8} {bare * 1e6:>8.1f} {with_metrics * 1e6:>10.1f} {(with_metrics - bare) * 1e6:>11.1f}")
+
+    # Exact totals across threads while scrapes run
+    metrics._registry = metrics.MetricsRegistry(
+        metrics.DEFAULT_METRICS_SETTINGS['LATENCY_BUCKETS'], metrics.DEFAULT_METRICS_SETTINGS['QUERY_BUCKETS']
+    )
+    metered = metrics.RequestMetricsMiddleware(empty_view)
+    scrape = build_request('/metrics')
+    stop = threading.Event()
+    scrapes = 0
+
+    def scraper():
+        nonlocal scrapes
+        while not stop.is_set():
+            metrics.metrics_view(scrape)
+            scrapes += 1
+
+    def worker():
+        request = build_request('/bench/empty/')
+        for _ in range(args.requests):
+            metered(request)
+
+    scraping = threading.Thread(target=scraper)
+    scraping.start()
+    workers = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    scraping.join()
+
+    expected = args.threads * args.requests
+    text = metrics.metrics_view(scrape).content.decode()
+    errors = check_totals(text, expected)
+    print(f"{args.threads} threads x {args.requests} requests in {elapsed:.2f}s with {scrapes} scrapes: "
+          f"{metric_total(text, 'http_requests_total'):.0f}/{expected} counted")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = metrics.MultiprocessStore(directory, flush_interval=5.0)
+        counters, histograms = store.collect(metrics._registry)
+        text = metrics.render_prometheus(counters, histograms, metrics._registry.buckets)
+        errors += [f"multiprocess: {error}" for error in check_totals(text, expected)]
+
+    for error in errors:
+        print(error)
+    print('FAIL' if errors else 'PASS')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
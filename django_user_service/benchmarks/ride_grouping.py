@@ -0,0 +1,173 @@
+"""
+Ride Grouping Benchmark
+Times the shared-ride grouping engine on a stream of synthetic trip requests
+
+Usage:
+    python -m benchmarks.ride_grouping --requests 50000
+    python -m benchmarks.ride_grouping --strategy optimal
+
+Requests go to routes between wilayas, with a few busy routes taking most
+of the traffic, depart over the next --hours and accept 30 minutes to 3
+hours of delay. Every origin has a pool of drivers with 4 to 8 seats.
+Requests are submitted one by one on a single thread, the way the API
+submits them, then the remaining ones are dispatched. Groups are checked
+for overbooking, incompatible windows and double-booked drivers.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+TARGET_REQUESTS_PER_SECOND = 2000
+
+BUSY_ROUTES = [(16, 31), (31, 16), (16, 25), (25, 16), (16, 19), (19, 16), (31, 13), (16, 15)]
+
+
+def make_requests(count, hours, rng, start):
+    from user_service.grouping import TripEntry
+
+    trips = []
+    for trip_id in range(1, count + 1):
+        if rng.random() < 0.6:
+            origin, destination = rng.choice(BUSY_ROUTES)
+        else:
+            origin, destination = rng.sample(range(1, 59), 2)
+        earliest = start + rng.uniform(0, hours * 3600)
+        latest = earliest + rng.choice([30, 60, 60, 120, 180]) * 60
+        seats = rng.choice([1, 1, 1, 1, 2, 2, 3])
+        trips.append(TripEntry(trip_id, trip_id, origin, destination, earliest, latest, seats))
+    return trips
+
+
+def make_driver_finder(engine, drivers_per_wilaya, rng, limit=20):
+    """Stand-in for the database lookup: up to limit drivers of the origin
+    who are not committed around the request's window"""
+    from user_service.grouping import DriverSlot
+
+    pools = {}
+    driver_id = 0
+    for wilaya in range(1, 59):
+        pool = []
+        for _ in range(drivers_per_wilaya):
+            driver_id += 1
+            pool.append(DriverSlot(driver_id, driver_id, rng.choice([4, 4, 5, 7, 8])))
+        pools[wilaya] = pool
+
+    def find(trip):
+        free = []
+        for slot in pools[trip.origin]:
+            if engine._is_free(slot, trip.earliest, trip.latest):
+                free.append(slot)
+                if len(free) == limit:
+                    break
+        return free
+
+    return find
+
+
+def check(engine, groups, trips):
+    """Return a list of invariant violations"""
+    problems = []
+    for group in groups:
+        members = group.members
+        if group.seats_taken > group.capacity:
+            problems.append(f"group {id(group)} overbooked")
+        if sum(trip.seats for trip in members) != group.seats_taken:
+            problems.append(f"group {id(group)} seat count")
+        if max(trip.earliest for trip in members) > min(trip.latest for trip in members):
+            problems.append(f"group {id(group)} has no common departure time")
+        if any(trip.origin != group.origin or trip.destination != group.destination for trip in members):
+            problems.append(f"group {id(group)} mixes routes")
+
+    for driver_groups in engine.driver_groups.values():
+        ordered = sorted(driver_groups, key=lambda group: group.window_start)
+        for first, second in zip(ordered, ordered[1:]):
+            if second.window_start - first.window_end < engine.turnaround:
+                problems.append(f"driver {first.driver_id} double-booked")
+
+    placed = sum(1 for trip in trips if trip.group is not None)
+    members = sum(len(group.members) for group in groups)
+    if placed != members:
+        problems.append(f"{placed} requests placed but groups list {members}")
+    return problems
+
+
+def run(strategy, trips, args):
+    from user_service.grouping import GroupingEngine
+
+    engine = GroupingEngine(strategy=strategy, min_fill=args.min_fill)
+    find_drivers = make_driver_finder(engine, args.drivers_per_wilaya, random.Random(args.seed))
+    now = trips[0].earliest - 3 * 3600
+
+    groups = {}
+    started = time.perf_counter()
+    for trip in trips:
+        group = engine.submit(trip, find_drivers=find_drivers, now=now)
+        if group is not None:
+            groups[group] = None
+    elapsed = time.perf_counter() - started
+    grouped_on_submit = sum(1 for trip in trips if trip.group is not None)
+
+    # Everything left, as if the departures had all come due
+    dispatch_started = time.perf_counter()
+    for group in engine.dispatch(now + args.hours * 3600, find_drivers):
+        groups[group] = None
+    dispatch_elapsed = time.perf_counter() - dispatch_started
+
+    groups = list(groups)
+    seats = sum(group.seats_taken for group in groups)
+    capacity = sum(group.capacity for group in groups)
+    return {
+        'strategy': strategy,
+        'rate': len(trips) / elapsed,
+        'grouped_on_submit': grouped_on_submit / len(trips),
+        'grouped': sum(1 for trip in trips if trip.group is not None) / len(trips),
+        'groups': len(groups),
+        'fill': seats / capacity if capacity else 0.0,
+        'dispatch_s': dispatch_elapsed,
+        'problems': check(engine, groups, trips),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Shared-ride grouping engine')
+    parser.add_argument('--requests', type=int, default=50000)
+    parser.add_argument('--hours', type=int, default=72, help='departures spread over this many hours')
+    parser.add_argument('--drivers-per-wilaya', type=int, default=500)
+    parser.add_argument('--min-fill', type=float, default=0.5)
+    parser.add_argument('--strategy', choices=['greedy', 'optimal', 'both'], default='both')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    strategies = ['greedy', 'optimal'] if args.strategy == 'both' else [args.strategy]
+    rows = []
+    for strategy in strategies:
+        trips = make_requests(args.requests, args.hours, random.Random(args.seed), start=1_800_000_000.0)
+        rows.append(run(strategy, trips, args))
+
+    header = f"{'strategy':<9} {'req/s':>9} {'submit%':>8} {'total%':>7} {'groups':>7} {'fill%':>6} {'dispatch_s':>11}"
+    print(f"{args.requests} requests over {args.hours}h, {args.drivers_per_wilaya} drivers per wilaya")
+    print(header)
+    print('-' * len(header))
+    passed = True
+    for row in rows:
+        print(
+            f"{row['strategy']:<9} {round(row['rate']):>9} {row['grouped_on_submit'] * 100:>8.1f} "
+            f"{row['grouped'] * 100:>7.1f} {row['groups']:>7} {row['fill'] * 100:>6.1f} {row['dispatch_s']:>11.2f}"
+        )
+        for problem in row['problems'][:10]:
+            print(f"  {problem}")
+        passed = passed and not row['problems'] and row['rate'] >= TARGET_REQUESTS_PER_SECOND
+    print(f"{'PASS' if passed else 'FAIL'} (target >= {TARGET_REQUESTS_PER_SECOND} req/s, no invariant violations)")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,166 @@
+"""
+User Search Benchmark
+Times the user list search over a large synthetic users table
+
+Usage:
+    python -m benchmarks.search_users --users 1000000
+    DJANGO_SETTINGS_MODULE=user_service.settings DB_NAME=bench \\
+        python -m benchmarks.search_users --users 1000000
+
+Seeds the users table up to --users rows (an existing dataset of that size
+is reused), then runs each search term the way UserListView does: the
+COUNT for the page-number response and the first page. On PostgreSQL
+every term is timed with the trigram indexes from migration 0002 and then
+again with them dropped inside a transaction that is rolled back, and the
+plan shows whether the indexes were used. SQLite has no trigram indexes,
+so only the fallback is timed there.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+FIRST_NAMES = [
+    'Amine', 'Yacine', 'Karim', 'Sofiane', 'Walid', 'Nadir', 'Riad', 'Farid',
+    'Amina', 'Yasmine', 'Lina', 'Sara', 'Meriem', 'Nour', 'Imane', 'Houda',
+]
+LAST_NAMES = [
+    'Benali', 'Bouzid', 'Khelifi', 'Saadi', 'Haddad', 'Mansouri', 'Belkacem', 'Rahmani',
+    'Cherif', 'Djebbar', 'Hamidi', 'Ouali', 'Zerrouki', 'Taleb', 'Meziane', 'Larbi',
+]
+WILAYAS = [
+    'Alger', 'Oran', 'Constantine', 'Annaba', 'Blida', 'Setif', 'Tlemcen', 'Bejaia',
+    'Batna', 'Biskra', 'Ouargla', 'Tizi Ouzou', 'Djelfa', 'Chlef', 'Mostaganem', 'Skikda',
+]
+
+# (label, term): a common surname, a rare email, one license number, no match
+SEARCH_TERMS = [
+    ('surname', 'mansouri'),
+    ('email', 'yasmine.taleb77'),
+    ('license', 'DZ00424242'),
+    ('miss', 'zzqxw'),
+]
+
+TRIGRAM_INDEXES = ['first_name', 'last_name', 'email', 'license_number', 'city', 'wilaya']
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed(total, batch_size):
+    """Grow the users table to total rows"""
+    from user_service.models import User
+
+    start = User.objects.count()
+    if start >= total:
+        return start
+
+    def build(i):
+        first = FIRST_NAMES[i % len(FIRST_NAMES)]
+        last = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        wilaya = WILAYAS[(i * 7) % len(WILAYAS)]
+        return User(
+            username=f'bench{i}',
+            email=f'{first}.{last}{i}@example.dz'.lower(),
+            password='!',
+            first_name=first,
+            last_name=last,
+            city=wilaya,
+            wilaya=wilaya,
+            license_number=f'DZ{i:08d}',
+        )
+
+    started = time.perf_counter()
+    for offset in range(start, total, batch_size):
+        User.objects.bulk_create([build(i) for i in range(offset, min(offset + batch_size, total))])
+    print(f"seeded {total - start} users in {time.perf_counter() - started:.1f}s")
+    return total
+
+
+def time_term(term, repeat):
+    """Run one search like UserListView; returns (latencies, matches, plan)"""
+    from user_service.models import User
+    from user_service.search import search_users
+
+    latencies = []
+    for _ in range(repeat):
+        queryset = search_users(User.objects.all(), term)
+        started = time.perf_counter()
+        matches = queryset.count()
+        list(queryset[:20])
+        latencies.append(time.perf_counter() - started)
+    return latencies, matches, search_users(User.objects.all(), term).explain()
+
+
+def run_terms(mode, repeat):
+    rows = []
+    for label, term in SEARCH_TERMS:
+        latencies, matches, plan = time_term(term, repeat)
+        rows.append({
+            'mode': mode,
+            'term': label,
+            'matches': matches,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'max_ms': round(max(latencies) * 1000, 1),
+            'trigram_index': '_trgm' in plan,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='User search over a large table')
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection, transaction
+
+    call_command('migrate', verbosity=0, skip_checks=True)
+    total = seed(args.users, args.batch_size)
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE users')
+        rows = run_terms('trigram', args.repeat)
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for column in TRIGRAM_INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS users_{column}_trgm')
+                rows += run_terms('no index', args.repeat)
+                raise Rollback()
+        except Rollback:
+            pass
+    else:
+        rows = run_terms('fallback', args.repeat)
+
+    header = f"{'mode':<9} {'term':<8} {'matches':>8} {'p50_ms':>9} {'max_ms':>9} {'trgm':>5}"
+    print(f"{connection.vendor}, {total} users")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(
+            f"{row['mode']:<9} {row['term']:<8} {row['matches']:>8} {row['p50_ms']:>9} "
+            f"{row['max_ms']:>9} {'yes' if row['trigram_index'] else 'no':>5}"
+        )
+    return rows
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,31 @@
+"""
+Benchmark Settings
+User service settings for local benchmarks: no Redis, no on-disk database
+"""
+
+from user_service.settings import *  # noqa: F401,F403
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+# Requests are built with the DRF test factory
+ALLOWED_HOSTS = ['testserver']
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+STATICFILES_DIRS = []
+
+# Per-request logging would dominate the measurements
+LOGGING['root']['level'] = 'WARNING'  # noqa: F405
+LOGGING['loggers']['django']['level'] = 'WARNING'  # noqa: F405
+LOGGING['loggers']['user_service']['level'] = 'WARNING'  # noqa: F405
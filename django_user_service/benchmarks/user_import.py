@@ -0,0 +1,128 @@
+"""
+User Import Benchmark
+Compares onboarding drivers one registration at a time with the bulk import
+
+Usage:
+    python -m benchmarks.user_import --rows 2000
+    python -m benchmarks.user_import --rows 20000 --hasher md5 --workers 4
+
+Registers --baseline-rows users through UserRegistrationView, one request
+each, then imports --rows users from a generated CSV through the import
+endpoint, and reports users per second and queries per user for both.
+--hasher md5 swaps in a cheap hasher to show the cost of everything but
+hashing; the default keeps the project's hashers, where hashing dominates
+and the process pool is what scales with cores.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+
+def make_csv(rows, offset):
+    buffer = io.StringIO()
+    buffer.write('email,password,first_name,last_name,phone_number,city,wilaya,license_number,roles\n')
+    for i in range(offset, offset + rows):
+        buffer.write(
+            f'driver{i}@coop.dz,Taxi-{i:06d}-pass,Driver,Number{i},+21355{i:07d},'
+            f'Blida,Blida,DZL{i:08d},ROLE_DRIVER\n'
+        )
+    return buffer.getvalue().encode()
+
+
+def run_registrations(rows):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory
+    from user_service.views import UserRegistrationView
+
+    factory = APIRequestFactory()
+    view = UserRegistrationView.as_view()
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        for i in range(rows):
+            password = f'Taxi-{i:06d}-pass'
+            response = view(factory.post('/api/auth/register/', {
+                'email': f'single{i}@coop.dz',
+                'password': password,
+                'password_confirm': password,
+                'first_name': 'Driver',
+                'last_name': f'Single{i}',
+                'city': 'Blida',
+                'wilaya': 'Blida',
+                'license_number': f'DZS{i:08d}',
+            }, format='json'))
+            assert response.status_code == 201, response.data
+    return time.perf_counter() - started, len(queries.captured_queries)
+
+
+def run_import(rows, admin):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from user_service.views import UserImportView
+
+    request = APIRequestFactory().post('/api/users/import/', {
+        'file': SimpleUploadedFile('coop.csv', make_csv(rows, 0)),
+    }, format='multipart')
+    force_authenticate(request, user=admin)
+    # The log holds 9000 queries; the registrations may have filled it
+    connection.queries_log.clear()
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        response = UserImportView.as_view()(request)
+        response.render()
+    elapsed = time.perf_counter() - started
+    report = json.loads(response.content)
+    assert report['created'] == rows, report
+    return elapsed, len(queries.captured_queries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk user import')
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--baseline-rows', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=0, help='hashing processes (0: one per CPU)')
+    parser.add_argument('--hasher', choices=['default', 'md5'], default='default')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import override_settings
+    from user_service.models import User, UserRole
+
+    overrides = {'USER_IMPORT': dict(settings.USER_IMPORT, HASH_WORKERS=args.workers)}
+    if args.hasher == 'md5':
+        overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+    with override_settings(**overrides):
+        call_command('migrate', verbosity=0, skip_checks=True)
+        admin = User.objects.create_user(username='admin@coop.dz', email='admin@coop.dz', password='!')
+        UserRole.objects.create(user=admin, role='ROLE_ADMIN')
+
+        single_s, single_queries = run_registrations(args.baseline_rows)
+        bulk_s, bulk_queries = run_import(args.rows, admin)
+
+    header = f"{'path':<14} {'users':>7} {'seconds':>9} {'users/s':>9} {'queries/user':>13}"
+    print(f"{connection.vendor}, hasher: {args.hasher}, CPUs: {os.cpu_count()}")
+    print(header)
+    print('-' * len(header))
+    for name, rows, elapsed, queries in (
+        ('registration', args.baseline_rows, single_s, single_queries),
+        ('bulk import', args.rows, bulk_s, bulk_queries),
+    ):
+        print(f"{name:<14} {rows:>7} {elapsed:>9.2f} {rows / elapsed:>9.1f} {queries / rows:>13.3f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
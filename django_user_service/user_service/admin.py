@@ -5,7 +5,7 @@ Django admin interface configuration
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
-from .models import User, Vehicle, UserRole, UserVehicle
+from .models import User, Vehicle, UserRole, UserVehicle, Wilaya, Commune, RideGroup, TripRequest, OutboxEvent
 
 
 @admin.register(User)
@@ -60,9 +60,9 @@ class UserAdmin(BaseUserAdmin):
                 'license_number',
             )
         }),
+        # is_active is already under Permissions
         ('Status', {
             'fields': (
-                'is_active',
                 'is_verified',
             )
         }),
@@ -268,7 +268,157 @@ class UserVehicleAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('user', 'vehicle')
 
 
+@admin.register(Wilaya)
+class WilayaAdmin(admin.ModelAdmin):
+    """Wilaya reference admin interface"""
+    
+    list_display = (
+        'code',
+        'name',
+    )
+    
+    search_fields = (
+        'name',
+    )
+
+
+@admin.register(Commune)
+class CommuneAdmin(admin.ModelAdmin):
+    """Commune reference admin interface"""
+    
+    list_display = (
+        'name',
+        'wilaya',
+    )
+    
+    list_filter = (
+        'wilaya',
+    )
+    
+    search_fields = (
+        'name',
+        'wilaya__name',
+    )
+    
+    list_select_related = (
+        'wilaya',
+    )
+
+
 # Customize admin site header
 admin.site.site_header = "Smart Inter-Wilaya Taxi - User Service"
 admin.site.site_title = "Smart Taxi User Admin"
-admin.site.index_title = "User Service Administration"
\ No newline at end of file
+admin.site.index_title = "User Service Administration"
+
+
+@admin.register(RideGroup)
+class RideGroupAdmin(admin.ModelAdmin):
+    """Ride group admin interface"""
+    
+    list_display = (
+        'id',
+        'origin',
+        'destination',
+        'window_start',
+        'driver',
+        'vehicle',
+        'seats_taken',
+        'capacity',
+        'status',
+    )
+    
+    list_filter = (
+        'status',
+        'origin',
+        'destination',
+    )
+    
+    search_fields = (
+        'driver__email',
+        'vehicle__license_plate',
+    )
+    
+    readonly_fields = (
+        'id',
+        'created_at',
+        'updated_at',
+    )
+    
+    def get_queryset(self, request):
+        """Optimize queryset with select_related"""
+        return super().get_queryset(request).select_related('origin', 'destination', 'driver', 'vehicle')
+
+
+@admin.register(TripRequest)
+class TripRequestAdmin(admin.ModelAdmin):
+    """Trip request admin interface"""
+    
+    list_display = (
+        'id',
+        'passenger',
+        'origin',
+        'destination',
+        'earliest_departure',
+        'seats',
+        'status',
+        'group',
+    )
+    
+    list_filter = (
+        'status',
+        'origin',
+        'destination',
+    )
+    
+    search_fields = (
+        'passenger__email',
+    )
+    
+    readonly_fields = (
+        'id',
+        'created_at',
+        'updated_at',
+    )
+    
+    def get_queryset(self, request):
+        """Optimize queryset with select_related"""
+        return super().get_queryset(request).select_related('passenger', 'origin', 'destination', 'group')
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    """Outbox event admin interface (read only)"""
+    
+    list_display = (
+        'id',
+        'event_type',
+        'aggregate_type',
+        'aggregate_id',
+        'created_at',
+        'published_at',
+    )
+    
+    list_filter = (
+        'aggregate_type',
+        'event_type',
+    )
+    
+    search_fields = (
+        'aggregate_id',
+    )
+    
+    readonly_fields = (
+        'id',
+        'aggregate_type',
+        'aggregate_id',
+        'event_type',
+        'payload',
+        'created_at',
+        'published_at',
+    )
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
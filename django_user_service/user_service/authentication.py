@@ -0,0 +1,165 @@
+"""User Service Authentication
+Trusts the identity the API gateway has already verified
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication
+from service_metrics import record_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def load_active_user(user_id):
+    """Fetch the user behind verified claims, refusing inactive accounts"""
+    try:
+        return User.objects.get(pk=user_id, is_active=True)
+    except User.DoesNotExist:
+        raise exceptions.AuthenticationFailed('User not found', code='user_not_found')
+
+
+def active_key(user_id):
+    return f'user_service:active:{user_id}'
+
+
+def active_version_key(user_id):
+    return f'user_service:active:{user_id}:version'
+
+
+def is_active_user(user_id):
+    """Whether a user still exists and is active.
+
+    Cached like the role sets (see permissions.load_roles): an entry only
+    counts while the user's version is current, and saving or deleting the
+    user bumps it (see invalidate_active_user). Cache errors fall back to
+    the database.
+    """
+    key = active_key(user_id)
+    version_key = active_version_key(user_id)
+
+    try:
+        found = cache.get_many([key, version_key])
+    except Exception as e:
+        logger.warning(f"Active user cache unavailable: {str(e)}")
+        found = None
+
+    if found is not None:
+        version = found.get(version_key, 0)
+        entry = found.get(key)
+        if entry is not None and entry['version'] == version:
+            record_cache('active_user', True)
+            return entry['active']
+    record_cache('active_user', False)
+
+    # The version was read first: a deactivation that commits after this
+    # query bumps it past the one stored with the entry
+    active = User.objects.filter(pk=user_id, is_active=True).exists()
+
+    if found is not None:
+        timeout = getattr(settings, 'GATEWAY_CLAIMS', {}).get('ACTIVE_CACHE_TIMEOUT', 300)
+        try:
+            cache.set(key, {'version': version, 'active': active}, timeout)
+        except Exception as e:
+            logger.warning(f"Could not cache active user: {str(e)}")
+
+    return active
+
+
+def invalidate_active_user(user_id):
+    """Make the cached active flag of a user stale"""
+    version_key = active_version_key(user_id)
+    try:
+        cache.add(version_key, 0, None)
+        cache.incr(version_key)
+    except Exception as e:
+        logger.warning(f"Could not invalidate cached active user: {str(e)}")
+
+
+class GatewayUser(SimpleLazyObject):
+    """request.user built from gateway claims.
+
+    The id and authentication flags come straight from the claims; the User
+    row is only loaded the first time a view touches any other attribute,
+    so read endpoints that just need to know who is calling never query it.
+    """
+
+    def __init__(self, claims):
+        user_id = claims[settings.SIMPLE_JWT['USER_ID_CLAIM']]
+        super().__init__(lambda: load_active_user(user_id))
+        # Bypass LazyObject.__setattr__, which would load the user
+        self.__dict__['claims'] = claims
+        self.__dict__['user_id'] = user_id
+
+    @property
+    def id(self):
+        return self.__dict__['user_id']
+
+    @property
+    def pk(self):
+        return self.__dict__['user_id']
+
+    def __bool__(self):
+        return True
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+
+class GatewayClaimsAuthentication(BaseAuthentication):
+    """Authenticate from the signed claims header set by the API gateway.
+
+    The gateway has already checked the JWT signature and expiry, so the
+    token is not decoded again. Read requests get a lazy GatewayUser and
+    skip the user lookup, but the user must still pass the cached
+    is_active_user check: a deactivated or deleted user is refused from
+    the commit that changes them, even while their token is unexpired.
+    Writes load the active user up front. Requests without the header
+    fall through to JWTAuthentication.
+    """
+
+    def authenticate(self, request):
+        gateway_claims = getattr(settings, 'GATEWAY_CLAIMS', {})
+        signed = request.META.get(gateway_claims.get('HEADER', 'HTTP_X_GATEWAY_CLAIMS'))
+        if not signed:
+            return None
+
+        try:
+            claims = signing.loads(
+                signed,
+                key=gateway_claims['SECRET'],
+                salt=gateway_claims.get('SALT', 'gateway.claims'),
+                max_age=gateway_claims.get('MAX_AGE', 30),
+            )
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Gateway claims expired', code='claims_expired')
+        except signing.BadSignature:
+            logger.warning("Rejected gateway claims with a bad signature")
+            raise exceptions.AuthenticationFailed('Invalid gateway claims', code='claims_invalid')
+
+        if settings.SIMPLE_JWT['USER_ID_CLAIM'] not in claims:
+            raise exceptions.AuthenticationFailed('Invalid gateway claims', code='claims_invalid')
+
+        user_id = claims[settings.SIMPLE_JWT['USER_ID_CLAIM']]
+        if request.method in SAFE_METHODS:
+            if not is_active_user(user_id):
+                raise exceptions.AuthenticationFailed('User not found', code='user_not_found')
+            return GatewayUser(claims), claims
+
+        return load_active_user(user_id), claims
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
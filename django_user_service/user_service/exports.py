@@ -0,0 +1,233 @@
+"""User Service Exports
+Full table dumps streamed as CSV or JSON Lines, optionally gzipped, in constant memory
+"""
+
+from django.conf import settings
+import csv
+import datetime
+import json
+import zlib
+
+from .models import User, Vehicle, UserRole, UserVehicle
+from .search import filter_users
+
+
+DEFAULT_EXPORT_SETTINGS = {
+    'CHUNK_SIZE': 2000,
+    # Bytes gathered before a piece of the response is sent
+    'FLUSH_BYTES': 64 * 1024,
+}
+
+FORMATS = ('csv', 'jsonl')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+# (column, field) pairs read with values_list
+USER_COLUMNS = [
+    ('id', 'id'),
+    ('email', 'email'),
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('phone_number', 'phone_number'),
+    ('address', 'address'),
+    ('city', 'city'),
+    ('wilaya', 'wilaya'),
+    ('wilaya_code', 'wilaya_ref_id'),
+    ('commune_id', 'commune_ref_id'),
+    ('license_number', 'license_number'),
+    ('is_active', 'is_active'),
+    ('is_verified', 'is_verified'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+VEHICLE_COLUMNS = [
+    ('id', 'id'),
+    ('license_plate', 'license_plate'),
+    ('make', 'make'),
+    ('model', 'model'),
+    ('year_of_manufacture', 'year_of_manufacture'),
+    ('vehicle_type', 'vehicle_type'),
+    ('color', 'color'),
+    ('seats', 'seats'),
+    ('is_active', 'is_active'),
+    ('is_verified', 'is_verified'),
+    ('insurance_number', 'insurance_number'),
+    ('insurance_expiry', 'insurance_expiry'),
+    ('registration_number', 'registration_number'),
+    ('registration_expiry', 'registration_expiry'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+
+def get_export_settings():
+    """Return the export settings merged with their defaults"""
+    export_settings = dict(DEFAULT_EXPORT_SETTINGS)
+    export_settings.update(getattr(settings, 'EXPORTS', {}))
+    return export_settings
+
+
+class Export:
+    """Rows of one table, read through a server-side cursor.
+
+    Rows come from values_list(...).iterator(chunk_size), ordered by id,
+    so no model instances are built and at most one chunk is held at a
+    time. The many-to-many column (roles, driver ids) is filled with one
+    query per chunk.
+    """
+
+    name = None
+    columns = []
+    related_column = None
+
+    def __init__(self, queryset, chunk_size=2000):
+        self.queryset = queryset
+        self.chunk_size = chunk_size
+
+    @property
+    def headers(self):
+        return [column for column, _ in self.columns] + [self.related_column]
+
+    def related(self, ids):
+        """{id: [values]} for the related column of a chunk of rows"""
+        raise NotImplementedError
+
+    def rows(self):
+        rows = (
+            self.queryset
+            .order_by('pk')
+            .values_list(*(field for _, field in self.columns))
+            .iterator(chunk_size=self.chunk_size)
+        )
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                yield from self._with_related(chunk)
+                chunk = []
+        if chunk:
+            yield from self._with_related(chunk)
+
+    def _with_related(self, chunk):
+        related = self.related([row[0] for row in chunk])
+        for row in chunk:
+            yield row + (related.get(row[0], []),)
+
+
+class UserExport(Export):
+    """Users with their role names"""
+
+    name = 'users'
+    columns = USER_COLUMNS
+    related_column = 'roles'
+
+    @classmethod
+    def from_params(cls, params, chunk_size=2000):
+        """Users matching the UserListView filters"""
+        return cls(filter_users(User.objects.all(), params), chunk_size)
+
+    def related(self, ids):
+        roles = {}
+        for user_id, role in UserRole.objects.filter(user_id__in=ids).order_by('role').values_list('user_id', 'role'):
+            roles.setdefault(user_id, []).append(role)
+        return roles
+
+
+class VehicleExport(Export):
+    """Vehicles with the ids of their drivers"""
+
+    name = 'vehicles'
+    columns = VEHICLE_COLUMNS
+    related_column = 'driver_ids'
+
+    @classmethod
+    def from_params(cls, params, chunk_size=2000):
+        """Vehicles matching is_active, is_verified and vehicle_type"""
+        queryset = Vehicle.objects.all()
+        for param in ('is_active', 'is_verified'):
+            value = params.get(param)
+            if value is not None:
+                queryset = queryset.filter(**{param: value.lower() == 'true'})
+        vehicle_type = params.get('vehicle_type')
+        if vehicle_type:
+            queryset = queryset.filter(vehicle_type=vehicle_type)
+        return cls(queryset, chunk_size)
+
+    def related(self, ids):
+        drivers = {}
+        for vehicle_id, user_id in UserVehicle.objects.filter(vehicle_id__in=ids).order_by('user_id').values_list('vehicle_id', 'user_id'):
+            drivers.setdefault(vehicle_id, []).append(user_id)
+        return drivers
+
+
+EXPORTS = {
+    UserExport.name: UserExport,
+    VehicleExport.name: VehicleExport,
+}
+
+
+def _cell(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return ';'.join(str(item) for item in value)
+    return value
+
+
+class _Line:
+    """File-like sink that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(headers, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def encode_jsonl(headers, rows):
+    for row in rows:
+        record = {}
+        for header, value in zip(headers, row):
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                value = value.isoformat()
+            record[header] = value
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def stream_export(export, file_format='csv', compress=False, flush_bytes=64 * 1024):
+    """Yield the export encoded as bytes, in pieces of about flush_bytes"""
+    encode = encode_csv if file_format == 'csv' else encode_jsonl
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    pending = []
+    size = 0
+    for text in encode(export.headers, export.rows()):
+        data = text.encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data)
+            if not data:
+                continue
+        pending.append(data)
+        size += len(data)
+        if size >= flush_bytes:
+            yield b''.join(pending)
+            pending = []
+            size = 0
+
+    if compressor is not None:
+        pending.append(compressor.flush())
+    if pending:
+        yield b''.join(pending)
+
+
+def export_filename(name, file_format, compress, today=None):
+    today = today or datetime.date.today()
+    return f"{name}-{today:%Y%m%d}.{file_format}{'.gz' if compress else ''}"
@@ -0,0 +1,596 @@
+"""User Service Ride Grouping
+Shared rides: trip requests bucketed by route and departure window, packed into vehicles
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_RIDE_GROUPING_SETTINGS = {
+    'STRATEGY': 'greedy',
+    'WINDOW_MINUTES': 60,
+    'DEFAULT_TOLERANCE_MINUTES': 60,
+    'MAX_TOLERANCE_MINUTES': 360,
+    'MAX_SEATS': 8,
+    'MIN_FILL': 0.5,
+    'DISPATCH_LEAD_MINUTES': 120,
+    'DRIVER_TURNAROUND_MINUTES': 480,
+    'MAX_DRIVER_CANDIDATES': 20,
+}
+
+STRATEGIES = ('greedy', 'optimal')
+
+
+def get_ride_grouping_settings():
+    """Return the ride grouping settings merged with their defaults"""
+    grouping_settings = dict(DEFAULT_RIDE_GROUPING_SETTINGS)
+    grouping_settings.update(getattr(settings, 'RIDE_GROUPING', {}))
+    return grouping_settings
+
+
+class TripEntry:
+    """A trip request as the engine sees it; times are epoch seconds"""
+
+    __slots__ = ('id', 'passenger_id', 'origin', 'destination', 'earliest', 'latest', 'seats', 'group')
+
+    def __init__(self, id, passenger_id, origin, destination, earliest, latest, seats=1):
+        self.id = id
+        self.passenger_id = passenger_id
+        self.origin = origin
+        self.destination = destination
+        self.earliest = earliest
+        self.latest = latest
+        self.seats = seats
+        self.group = None
+
+
+class GroupEntry:
+    """A vehicle on a route and the departure window its members share.
+
+    members only lists requests placed by this engine; groups loaded from
+    the database start with their seat count and no members.
+    """
+
+    __slots__ = (
+        'id', 'origin', 'destination', 'window_start', 'window_end',
+        'driver_id', 'vehicle_id', 'capacity', 'seats_taken', 'members',
+    )
+
+    def __init__(self, id, origin, destination, window_start, window_end,
+                 driver_id, vehicle_id, capacity, seats_taken=0):
+        self.id = id
+        self.origin = origin
+        self.destination = destination
+        self.window_start = window_start
+        self.window_end = window_end
+        self.driver_id = driver_id
+        self.vehicle_id = vehicle_id
+        self.capacity = capacity
+        self.seats_taken = seats_taken
+        self.members = []
+
+    @property
+    def seats_left(self):
+        return self.capacity - self.seats_taken
+
+    @property
+    def is_full(self):
+        return self.seats_taken >= self.capacity
+
+    def overlaps(self, start, end):
+        return max(self.window_start, start) <= min(self.window_end, end)
+
+    def fits(self, trip):
+        return self.seats_left >= trip.seats and self.overlaps(trip.earliest, trip.latest)
+
+
+class DriverSlot:
+    """A driver free to take a group, in the vehicle they would drive"""
+
+    __slots__ = ('driver_id', 'vehicle_id', 'capacity')
+
+    def __init__(self, driver_id, vehicle_id, capacity):
+        self.driver_id = driver_id
+        self.vehicle_id = vehicle_id
+        self.capacity = capacity
+
+
+class RouteBucket:
+    """Pending requests and open groups of one route and departure window.
+
+    Both are dicts used as insertion-ordered sets, so iteration is oldest
+    first and removal is O(1).
+    """
+
+    __slots__ = ('pending', 'groups')
+
+    def __init__(self):
+        self.pending = {}
+        self.groups = {}
+
+
+class GroupingEngine:
+    """Places trip requests into shared rides.
+
+    Requests and groups live in buckets keyed by (origin, destination,
+    departure window): requests by their earliest departure, groups by
+    the start of their shared window. A departure range only overlaps
+    entries in the buckets from max_span before it to its end, so each
+    placement touches a handful of small buckets whatever the total load.
+
+    A request first joins the open group that it fills most tightly.
+    Otherwise it waits, and a new group is formed around it when a driver
+    is free and enough compatible requests are waiting to fill min_fill
+    of the vehicle, or when its departure is within dispatch_lead. The
+    greedy strategy takes compatible requests oldest first; the optimal
+    one fills the vehicle with as many seats as any compatible set of
+    requests can.
+
+    A driver or vehicle committed to a group is not offered another one
+    departing within turnaround of it, the time to reach the destination
+    and come back.
+
+    Not thread-safe: callers serialize access to a route.
+    """
+
+    def __init__(self, window_seconds=3600, max_span=6 * 3600, strategy='greedy',
+                 min_fill=0.5, dispatch_lead=2 * 3600, turnaround=8 * 3600):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown grouping strategy: {strategy}")
+        self.window_seconds = window_seconds
+        self.max_span = max_span
+        self.strategy = strategy
+        self.min_fill = min_fill
+        self.dispatch_lead = dispatch_lead
+        self.turnaround = turnaround
+
+        self.buckets = {}
+        # Groups each driver and vehicle is committed to
+        self.driver_groups = {}
+        self.vehicle_groups = {}
+
+    def _window(self, timestamp):
+        return int(timestamp // self.window_seconds)
+
+    def _bucket(self, origin, destination, timestamp):
+        key = (origin, destination, self._window(timestamp))
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = RouteBucket()
+        return bucket
+
+    def _buckets_over(self, origin, destination, earliest, latest):
+        """Existing buckets that can hold entries overlapping [earliest, latest]"""
+        for window in range(self._window(earliest - self.max_span), self._window(latest) + 1):
+            bucket = self.buckets.get((origin, destination, window))
+            if bucket is not None:
+                yield bucket
+
+    def _discard(self, origin, destination, timestamp, attribute, entry):
+        key = (origin, destination, self._window(timestamp))
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            getattr(bucket, attribute).pop(entry, None)
+            if not bucket.pending and not bucket.groups:
+                del self.buckets[key]
+
+    # Loading
+
+    def add_pending(self, trip):
+        """Hold a request until a group takes it"""
+        self._bucket(trip.origin, trip.destination, trip.earliest).pending[trip] = None
+
+    def add_group(self, group):
+        """Track a group; full groups only reserve their driver and vehicle"""
+        self.driver_groups.setdefault(group.driver_id, []).append(group)
+        self.vehicle_groups.setdefault(group.vehicle_id, []).append(group)
+        if not group.is_full:
+            self._bucket(group.origin, group.destination, group.window_start).groups[group] = None
+
+    # Placement
+
+    def submit(self, trip, find_drivers=None, now=None):
+        """Place a new request; returns the group it ended up in, or None.
+
+        find_drivers(trip) returns the DriverSlots that could take a new
+        group formed around trip; it is only called when one is needed.
+        """
+        group = self._best_group(trip)
+        if group is not None:
+            self._join(group, trip)
+            return group
+
+        self.add_pending(trip)
+        if find_drivers is None:
+            return None
+        return self._form_group(trip, find_drivers, now)
+
+    def dispatch(self, now, find_drivers):
+        """Group requests departing within dispatch_lead, however few seats
+        they fill; returns the groups changed"""
+        due = [
+            trip
+            for bucket in list(self.buckets.values())
+            for trip in bucket.pending
+            if trip.earliest - now <= self.dispatch_lead
+        ]
+        due.sort(key=lambda trip: trip.earliest)
+
+        changed = []
+        for trip in due:
+            if trip.group is not None:
+                continue
+            group = self._best_group(trip)
+            if group is not None:
+                self._discard(trip.origin, trip.destination, trip.earliest, 'pending', trip)
+                self._join(group, trip)
+            else:
+                group = self._form_group(trip, find_drivers, now, force=True)
+            if group is not None and group not in changed:
+                changed.append(group)
+        return changed
+
+    def _best_group(self, trip):
+        best = None
+        best_score = None
+        for bucket in self._buckets_over(trip.origin, trip.destination, trip.earliest, trip.latest):
+            for group in bucket.groups:
+                if group.fits(trip):
+                    score = (group.seats_left - trip.seats, group.window_start)
+                    if best_score is None or score < best_score:
+                        best, best_score = group, score
+        return best
+
+    def _join(self, group, trip):
+        old_start = group.window_start
+        group.window_start = max(group.window_start, trip.earliest)
+        group.window_end = min(group.window_end, trip.latest)
+        group.seats_taken += trip.seats
+        group.members.append(trip)
+        trip.group = group
+
+        if group.is_full or self._window(old_start) != self._window(group.window_start):
+            self._discard(group.origin, group.destination, old_start, 'groups', group)
+            if not group.is_full:
+                self._bucket(group.origin, group.destination, group.window_start).groups[group] = None
+
+    def _is_free(self, slot, start, end):
+        start, end = start - self.turnaround, end + self.turnaround
+        for group in self.driver_groups.get(slot.driver_id, ()):
+            if group.overlaps(start, end):
+                return False
+        for group in self.vehicle_groups.get(slot.vehicle_id, ()):
+            if group.overlaps(start, end):
+                return False
+        return True
+
+    def _form_group(self, anchor, find_drivers, now, force=False):
+        candidates = [
+            trip
+            for bucket in self._buckets_over(anchor.origin, anchor.destination, anchor.earliest, anchor.latest)
+            for trip in bucket.pending
+            if trip is not anchor and trip.earliest <= anchor.latest and trip.latest >= anchor.earliest
+        ]
+
+        slots = [slot for slot in find_drivers(anchor) if slot.capacity >= anchor.seats]
+        slots = [slot for slot in slots if self._is_free(slot, anchor.earliest, anchor.latest)]
+        if not slots:
+            return None
+
+        # The smallest vehicle that takes every waiting seat, else the largest
+        demand = anchor.seats + sum(trip.seats for trip in candidates)
+        fitting = [slot for slot in slots if slot.capacity >= demand]
+        if fitting:
+            slot = min(fitting, key=lambda slot: slot.capacity)
+        else:
+            slot = max(slots, key=lambda slot: slot.capacity)
+
+        if self.strategy == 'optimal':
+            members = self._select_optimal(anchor, candidates, slot.capacity)
+        else:
+            members = self._select_greedy(anchor, candidates, slot.capacity)
+
+        seats = sum(trip.seats for trip in members)
+        start = max(trip.earliest for trip in members)
+        end = min(trip.latest for trip in members)
+        imminent = force or (now is not None and start - now <= self.dispatch_lead)
+        if seats < self.min_fill * slot.capacity and not imminent:
+            return None
+
+        group = GroupEntry(None, anchor.origin, anchor.destination, start, end,
+                           slot.driver_id, slot.vehicle_id, slot.capacity)
+        for trip in members:
+            self._discard(trip.origin, trip.destination, trip.earliest, 'pending', trip)
+            group.seats_taken += trip.seats
+            group.members.append(trip)
+            trip.group = group
+        self.add_group(group)
+        return group
+
+    def _select_greedy(self, anchor, candidates, capacity):
+        """The anchor, then compatible requests oldest first while seats remain"""
+        members = [anchor]
+        seats, start, end = anchor.seats, anchor.earliest, anchor.latest
+        for trip in candidates:
+            if seats == capacity:
+                break
+            if seats + trip.seats <= capacity and max(start, trip.earliest) <= min(end, trip.latest):
+                members.append(trip)
+                seats += trip.seats
+                start, end = max(start, trip.earliest), min(end, trip.latest)
+        return members
+
+    def _select_optimal(self, anchor, candidates, capacity):
+        """The anchor plus the compatible requests filling the most seats.
+
+        Any compatible set can leave at the latest earliest-departure of its
+        members, which lies in the anchor's window, so trying each of those
+        times as the departure and packing what accepts it covers every set.
+        """
+        departures = sorted({anchor.earliest} | {
+            trip.earliest for trip in candidates if anchor.earliest <= trip.earliest <= anchor.latest
+        })
+        best = [anchor]
+        best_seats = anchor.seats
+        for departure in departures:
+            accepting = [trip for trip in candidates if trip.earliest <= departure <= trip.latest]
+            chosen = self._pack(accepting, capacity - anchor.seats)
+            seats = anchor.seats + sum(trip.seats for trip in chosen)
+            if seats > best_seats:
+                best, best_seats = [anchor] + chosen, seats
+            if best_seats == capacity:
+                break
+        return best
+
+    def _pack(self, trips, capacity):
+        """Subset of trips with the most seats not above capacity.
+
+        Subset-sum over seat counts; each total keeps the first subset that
+        reached it, which favours older requests.
+        """
+        reachable = {0: []}
+        for trip in trips:
+            for total in sorted(reachable, reverse=True):
+                combined = total + trip.seats
+                if combined <= capacity and combined not in reachable:
+                    reachable[combined] = reachable[total] + [trip]
+            if capacity in reachable:
+                break
+        return reachable[max(reachable)]
+
+
+def build_grouping_engine():
+    """Return an empty engine configured from settings"""
+    grouping_settings = get_ride_grouping_settings()
+    return GroupingEngine(
+        window_seconds=grouping_settings['WINDOW_MINUTES'] * 60,
+        max_span=grouping_settings['MAX_TOLERANCE_MINUTES'] * 60,
+        strategy=grouping_settings['STRATEGY'],
+        min_fill=grouping_settings['MIN_FILL'],
+        dispatch_lead=grouping_settings['DISPATCH_LEAD_MINUTES'] * 60,
+        turnaround=grouping_settings['DRIVER_TURNAROUND_MINUTES'] * 60,
+    )
+
+
+def _from_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def trip_entry(trip):
+    """Engine entry for a TripRequest"""
+    return TripEntry(
+        trip.pk,
+        trip.passenger_id,
+        trip.origin_id,
+        trip.destination_id,
+        trip.earliest_departure.timestamp(),
+        trip.latest_departure.timestamp(),
+        trip.seats,
+    )
+
+
+def load_route(engine, origin, destination, earliest, latest, exclude=None):
+    """Load the open groups and pending requests of a route that overlap
+    [earliest, latest] into the engine"""
+    from .models import RideGroup, TripRequest
+
+    groups = RideGroup.objects.filter(
+        status__in=[RideGroup.STATUS_OPEN, RideGroup.STATUS_FULL],
+        origin_id=origin,
+        destination_id=destination,
+        window_start__lte=latest,
+        window_end__gte=earliest,
+    )
+    for group in groups:
+        engine.add_group(GroupEntry(
+            group.pk, origin, destination,
+            group.window_start.timestamp(), group.window_end.timestamp(),
+            group.driver_id, group.vehicle_id, group.capacity, group.seats_taken,
+        ))
+
+    pending = TripRequest.objects.filter(
+        status=TripRequest.STATUS_PENDING,
+        origin_id=origin,
+        destination_id=destination,
+        earliest_departure__lte=latest,
+        latest_departure__gte=earliest,
+    ).order_by('created_at', 'pk')
+    if exclude is not None:
+        pending = pending.exclude(pk=exclude)
+    for trip in pending:
+        engine.add_pending(trip_entry(trip))
+
+
+def find_drivers(origin, window_start, window_end, limit):
+    """Drivers of the origin wilaya free over the window, with a usable vehicle.
+
+    A driver qualifies through UserVehicle with an active, verified and
+    insured vehicle, and must not drive another open or full group within
+    DRIVER_TURNAROUND_MINUTES of the window.
+    """
+    from .models import RideGroup, UserVehicle
+
+    turnaround = timedelta(minutes=get_ride_grouping_settings()['DRIVER_TURNAROUND_MINUTES'])
+    busy = RideGroup.objects.filter(
+        status__in=[RideGroup.STATUS_OPEN, RideGroup.STATUS_FULL],
+        window_start__lte=window_end + turnaround,
+        window_end__gte=window_start - turnaround,
+    )
+    rows = (
+        UserVehicle.objects
+        .filter(
+            user__is_active=True,
+            user__wilaya_ref=origin,
+            user__user_roles__role='ROLE_DRIVER',
+            vehicle__is_active=True,
+            vehicle__is_verified=True,
+            vehicle__insurance_expiry__gt=timezone.now(),
+        )
+        .exclude(user__in=busy.values('driver'))
+        .exclude(vehicle__in=busy.values('vehicle'))
+        .order_by('user_id', 'vehicle_id')
+        .values_list('user_id', 'vehicle_id', 'vehicle__seats')[:limit]
+    )
+    return [DriverSlot(driver_id, vehicle_id, seats) for driver_id, vehicle_id, seats in rows]
+
+
+def _lock_origin(origin):
+    """Serialize grouping for routes leaving a wilaya, across workers.
+
+    The drivers a group can take also come from the origin wilaya, so
+    this lock covers both the seats and the drivers being handed out.
+    """
+    from .models import Wilaya
+
+    list(Wilaya.objects.select_for_update().filter(code=origin).values_list('code', flat=True))
+
+
+def _driver_finder(limit):
+    def find(trip):
+        return find_drivers(trip.origin, _from_timestamp(trip.earliest), _from_timestamp(trip.latest), limit)
+    return find
+
+
+def save_group(group):
+    """Write an engine group and the requests placed in it"""
+    from .models import RideGroup, TripRequest
+
+    status = RideGroup.STATUS_FULL if group.is_full else RideGroup.STATUS_OPEN
+    if group.id is None:
+        ride_group = RideGroup.objects.create(
+            origin_id=group.origin,
+            destination_id=group.destination,
+            window_start=_from_timestamp(group.window_start),
+            window_end=_from_timestamp(group.window_end),
+            driver_id=group.driver_id,
+            vehicle_id=group.vehicle_id,
+            capacity=group.capacity,
+            seats_taken=group.seats_taken,
+            status=status,
+        )
+        group.id = ride_group.pk
+    else:
+        RideGroup.objects.filter(pk=group.id).update(
+            window_start=_from_timestamp(group.window_start),
+            window_end=_from_timestamp(group.window_end),
+            seats_taken=group.seats_taken,
+            status=status,
+            updated_at=timezone.now(),
+        )
+
+    TripRequest.objects.filter(
+        pk__in=[trip.id for trip in group.members],
+        status=TripRequest.STATUS_PENDING,
+    ).update(status=TripRequest.STATUS_GROUPED, group_id=group.id, updated_at=timezone.now())
+
+
+def submit_trip_request(trip):
+    """Save a new TripRequest and place it in a shared ride when one fits
+    or can be formed; returns the request, refreshed"""
+    grouping_settings = get_ride_grouping_settings()
+    engine = build_grouping_engine()
+
+    with transaction.atomic():
+        _lock_origin(trip.origin_id)
+        trip.save()
+        load_route(
+            engine, trip.origin_id, trip.destination_id,
+            trip.earliest_departure, trip.latest_departure, exclude=trip.pk,
+        )
+        group = engine.submit(
+            trip_entry(trip),
+            find_drivers=_driver_finder(grouping_settings['MAX_DRIVER_CANDIDATES']),
+            now=time.time(),
+        )
+        if group is not None:
+            save_group(group)
+            logger.info(f"Trip request {trip.pk} placed in ride group {group.id}")
+
+    trip.refresh_from_db()
+    return trip
+
+
+def cancel_trip_request(trip):
+    """Cancel a request, giving its seats back to its group.
+
+    A group nobody is left in is cancelled and frees its driver. The
+    group's window stays as narrowed by the cancelled request.
+    """
+    from .models import RideGroup, TripRequest
+
+    with transaction.atomic():
+        _lock_origin(trip.origin_id)
+        trip = TripRequest.objects.select_for_update().get(pk=trip.pk)
+        if trip.status == TripRequest.STATUS_CANCELLED:
+            return trip
+
+        if trip.status == TripRequest.STATUS_GROUPED and trip.group_id is not None:
+            group = RideGroup.objects.select_for_update().get(pk=trip.group_id)
+            if group.status in (RideGroup.STATUS_OPEN, RideGroup.STATUS_FULL):
+                group.seats_taken = max(group.seats_taken - trip.seats, 0)
+                group.status = RideGroup.STATUS_OPEN if group.seats_taken else RideGroup.STATUS_CANCELLED
+                group.save(update_fields=['seats_taken', 'status', 'updated_at'])
+
+        trip.status = TripRequest.STATUS_CANCELLED
+        trip.save(update_fields=['status', 'updated_at'])
+
+    return trip
+
+
+def dispatch_due_requests(now=None):
+    """Group every pending request departing within DISPATCH_LEAD_MINUTES,
+    even into vehicles below MIN_FILL; returns the number of groups changed"""
+    from .models import TripRequest
+
+    grouping_settings = get_ride_grouping_settings()
+    now = timezone.now() if now is None else now
+    horizon = now + timedelta(minutes=grouping_settings['DISPATCH_LEAD_MINUTES'])
+
+    routes = (
+        TripRequest.objects
+        .filter(status=TripRequest.STATUS_PENDING, earliest_departure__lte=horizon, latest_departure__gte=now)
+        .values_list('origin_id', 'destination_id')
+        .distinct()
+    )
+
+    changed = 0
+    for origin, destination in list(routes):
+        engine = build_grouping_engine()
+        with transaction.atomic():
+            _lock_origin(origin)
+            load_route(engine, origin, destination, now, horizon + timedelta(minutes=grouping_settings['MAX_TOLERANCE_MINUTES']))
+            groups = engine.dispatch(
+                now.timestamp(),
+                _driver_finder(grouping_settings['MAX_DRIVER_CANDIDATES']),
+            )
+            for group in groups:
+                save_group(group)
+        changed += len(groups)
+
+    return changed
@@ -0,0 +1,349 @@
+"""User Service Bulk Import
+Create many users from CSV or JSON Lines: set-based validation, pooled hashing, chunked loading
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, connection, transaction
+import csv
+import io
+import json
+import logging
+import os
+
+from .models import User, UserRole, OutboxEvent
+from .outbox import user_payload
+from .passwords import _init_hash_worker
+from .places import get_place_directory
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_USER_IMPORT_SETTINGS = {
+    'CHUNK_SIZE': 1000,
+    'MAX_ROWS': 50000,
+    # 0 uses one process per CPU
+    'HASH_WORKERS': 0,
+    # Smaller imports hash in the calling process
+    'POOL_THRESHOLD': 200,
+    'USE_COPY': True,
+}
+
+FORMATS = ('csv', 'jsonl')
+
+DEFAULT_ROLE = 'ROLE_USER'
+
+
+def get_user_import_settings():
+    """Return the user import settings merged with their defaults"""
+    import_settings = dict(DEFAULT_USER_IMPORT_SETTINGS)
+    import_settings.update(getattr(settings, 'USER_IMPORT', {}))
+    return import_settings
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be read as the declared format"""
+
+
+def guess_format(filename, default='csv'):
+    """Import format from a file name's extension"""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, file_format):
+    """Yield (line number, dict) for each record of a text stream.
+
+    Blank values are dropped so optional fields read as absent. A line
+    that is not a JSON object is yielded as None for the caller to report.
+    """
+    if file_format not in FORMATS:
+        raise ImportFormatError(f"Unsupported import format: {file_format}")
+
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames or 'email' not in reader.fieldnames:
+            raise ImportFormatError("CSV header must include an email column.")
+        for row in reader:
+            yield reader.line_num, {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and value is not None and value.strip() != ''
+            }
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            yield line_number, None
+            continue
+        yield line_number, {
+            key: value.strip() if isinstance(value, str) else value
+            for key, value in record.items()
+            if value is not None and value != ''
+        }
+
+
+def hash_passwords(passwords, workers=0, pool_threshold=200):
+    """make_password over a list, in a process pool when the list is large.
+
+    A None password hashes to an unusable one, as with set_unusable_password.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < pool_threshold:
+        return [make_password(password) for password in passwords]
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+class ImportReport:
+    """Outcome of an import, row by row for the failures"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.total = 0
+        self.created = 0
+        self.errors = []
+
+    def fail(self, row, errors, email=None):
+        self.errors.append({'row': row, 'email': email, 'errors': errors})
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'valid': self.total - len(self.errors) if self.dry_run else self.created,
+            'created': self.created,
+            'failed': len(self.errors),
+            'dry_run': self.dry_run,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
+
+
+class UserImporter:
+    """Validates and loads user records.
+
+    Each record goes through UserImportSerializer for field rules, without
+    its per-row uniqueness queries: emails and license numbers are checked
+    against each other in memory and against the users table one IN query
+    per chunk. Valid rows get their passwords hashed (in a process pool for
+    large imports), their places resolved, and are written a chunk per
+    transaction with bulk_create, or COPY on PostgreSQL, together with
+    their roles. A chunk the database rejects is retried row by row so
+    the failure is pinned to its row.
+    """
+
+    def __init__(self, chunk_size=1000, max_rows=50000, hash_workers=0, pool_threshold=200, use_copy=True):
+        self.chunk_size = chunk_size
+        self.max_rows = max_rows
+        self.hash_workers = hash_workers
+        self.pool_threshold = pool_threshold
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+
+    @classmethod
+    def from_settings(cls, **overrides):
+        import_settings = get_user_import_settings()
+        options = {
+            'chunk_size': import_settings['CHUNK_SIZE'],
+            'max_rows': import_settings['MAX_ROWS'],
+            'hash_workers': import_settings['HASH_WORKERS'],
+            'pool_threshold': import_settings['POOL_THRESHOLD'],
+            'use_copy': import_settings['USE_COPY'],
+        }
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**options)
+
+    def run(self, rows, dry_run=False):
+        """Import (line number, record) pairs; returns an ImportReport"""
+        report = ImportReport(dry_run=dry_run)
+        valid = self.validate(rows, report)
+        if dry_run or not valid:
+            return report
+
+        passwords = hash_passwords(
+            [data.pop('password', None) for _, data in valid],
+            workers=self.hash_workers,
+            pool_threshold=self.pool_threshold,
+        )
+        places = get_place_directory()
+        for (_, data), password in zip(valid, passwords):
+            data['password'] = password
+            data['wilaya_ref_id'], data['commune_ref_id'] = places.resolve(data.get('city'), data.get('wilaya'))
+
+        for start in range(0, len(valid), self.chunk_size):
+            self.load_chunk(valid[start:start + self.chunk_size], report)
+
+        logger.info(f"User import: {report.created} created, {len(report.errors)} failed")
+        return report
+
+    def validate(self, rows, report):
+        """Rows that pass every check, as (line number, validated data)"""
+        from rest_framework.serializers import ValidationError
+        from .serializers import UserImportSerializer
+
+        # One instance for every row: building the fields costs more than
+        # validating them
+        serializer = UserImportSerializer()
+        candidates = []
+        emails = {}
+        licenses = {}
+        for line_number, record in rows:
+            report.total += 1
+            if report.total > self.max_rows:
+                report.total -= 1
+                report.fail(line_number, {'non_field_errors': [f"Imports are limited to {self.max_rows} rows."]})
+                break
+            if record is None:
+                report.fail(line_number, {'non_field_errors': ["Line is not a JSON object."]})
+                continue
+
+            try:
+                data = dict(serializer.run_validation(record))
+            except ValidationError as e:
+                report.fail(line_number, e.detail, record.get('email'))
+                continue
+
+            errors = {}
+            if data['email'] in emails:
+                errors['email'] = [f"Duplicate of row {emails[data['email']]}."]
+            license_number = data.get('license_number')
+            if license_number and license_number in licenses:
+                errors['license_number'] = [f"Duplicate of row {licenses[license_number]}."]
+            if errors:
+                report.fail(line_number, errors, data['email'])
+                continue
+
+            emails[data['email']] = line_number
+            if license_number:
+                licenses[license_number] = line_number
+            candidates.append((line_number, data))
+
+        taken_emails = set()
+        taken_licenses = set()
+        for start in range(0, len(candidates), self.chunk_size):
+            chunk = candidates[start:start + self.chunk_size]
+            taken_emails.update(User.objects.filter(
+                email__in=[data['email'] for _, data in chunk]
+            ).values_list('email', flat=True))
+            chunk_licenses = [data['license_number'] for _, data in chunk if data.get('license_number')]
+            if chunk_licenses:
+                taken_licenses.update(User.objects.filter(
+                    license_number__in=chunk_licenses
+                ).values_list('license_number', flat=True))
+
+        valid = []
+        for line_number, data in candidates:
+            errors = {}
+            if data['email'] in taken_emails:
+                errors['email'] = ["A user with this email already exists."]
+            if data.get('license_number') in taken_licenses:
+                errors['license_number'] = ["This license number is already registered."]
+            if errors:
+                report.fail(line_number, errors, data['email'])
+            else:
+                valid.append((line_number, data))
+        return valid
+
+    def build_user(self, data):
+        fields = {key: value for key, value in data.items() if key != 'roles'}
+        user = User(username=fields['email'], **fields)
+        # What save() and the auto_now fields would fill in
+        for field in User._meta.concrete_fields:
+            if not field.primary_key:
+                setattr(user, field.attname, field.pre_save(user, add=True))
+        return user
+
+    def load_chunk(self, chunk, report):
+        """Write one chunk in a transaction, falling back to row by row"""
+        try:
+            with transaction.atomic():
+                self.insert([self.build_user(data) for _, data in chunk], [data for _, data in chunk])
+            report.created += len(chunk)
+            return
+        except IntegrityError as e:
+            logger.warning(f"User import chunk rejected, retrying row by row: {str(e)}")
+
+        for line_number, data in chunk:
+            try:
+                with transaction.atomic():
+                    self.insert([self.build_user(data)], [data])
+                report.created += 1
+            except IntegrityError as e:
+                report.fail(line_number, {'non_field_errors': [f"Could not be saved: {str(e)}"]}, data['email'])
+
+    def insert(self, users, rows):
+        if self.use_copy:
+            self.copy_users(users)
+        else:
+            User.objects.bulk_create(users)
+
+        ids = dict(User.objects.filter(email__in=[user.email for user in users]).values_list('email', 'id'))
+        UserRole.objects.bulk_create([
+            UserRole(user_id=ids[user.email], role=role)
+            for user, data in zip(users, rows)
+            for role in data.get('roles') or [DEFAULT_ROLE]
+        ])
+
+        # bulk_create sends no signals: the outbox events are written here,
+        # in the chunk's transaction
+        events = []
+        for user, data in zip(users, rows):
+            user.pk = ids[user.email]
+            events.append(OutboxEvent(
+                aggregate_type=OutboxEvent.AGGREGATE_USER, aggregate_id=user.pk,
+                event_type='user.created', payload=user_payload(user),
+            ))
+            events.extend(
+                OutboxEvent(
+                    aggregate_type=OutboxEvent.AGGREGATE_USER, aggregate_id=user.pk,
+                    event_type='user.role_added', payload={'user_id': user.pk, 'role': role},
+                )
+                for role in data.get('roles') or [DEFAULT_ROLE]
+            )
+        OutboxEvent.objects.bulk_create(events)
+
+    def copy_users(self, users):
+        """COPY users into the table in PostgreSQL's text format"""
+        fields = [field for field in User._meta.concrete_fields if not field.primary_key]
+        buffer = io.StringIO()
+        for user in users:
+            buffer.write('\t'.join(
+                _copy_value(field.get_db_prep_save(getattr(user, field.attname), connection))
+                for field in fields
+            ))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(User._meta.db_table)} ({columns}) FROM STDIN',
+                buffer,
+            )
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
@@ -0,0 +1,417 @@
+"""User Service Driver Locations
+Live driver positions in an in-memory grid index, mirrored through Redis
+"""
+
+from django.conf import settings
+import heapq
+import json
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_DRIVER_LOCATION_SETTINGS = {
+    'CELL_DEGREES': 0.05,
+    'TTL': 60,
+    'SYNC_INTERVAL': 1.0,
+    'DEFAULT_RADIUS_KM': 50,
+    'MAX_RADIUS_KM': 500,
+    'MAX_RESULTS': 50,
+    'VEHICLE_CACHE_SECONDS': 60,
+}
+
+KM_PER_DEGREE = 111.195
+EARTH_RADIUS_KM = 6371.0088
+
+# Heartbeats written this long before the last sync are fetched again,
+# covering clock differences between workers and writes still in flight
+SYNC_OVERLAP = 2.0
+
+
+def get_driver_location_settings():
+    """Return the driver location settings merged with their defaults"""
+    location_settings = dict(DEFAULT_DRIVER_LOCATION_SETTINGS)
+    location_settings.update(getattr(settings, 'DRIVER_LOCATIONS', {}))
+    return location_settings
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class DriverPosition:
+    """A driver's last heartbeat and the vehicle they are driving"""
+
+    __slots__ = (
+        'driver_id', 'latitude', 'longitude', 'available', 'updated_at',
+        'vehicle_id', 'vehicle_type', 'seats', 'is_verified', 'insurance_expiry',
+    )
+
+    def __init__(self, driver_id, latitude, longitude, available=True, updated_at=None,
+                 vehicle_id=None, vehicle_type=None, seats=None, is_verified=False, insurance_expiry=None):
+        self.driver_id = driver_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.available = available
+        self.updated_at = time.time() if updated_at is None else updated_at
+        self.vehicle_id = vehicle_id
+        self.vehicle_type = vehicle_type
+        self.seats = seats
+        self.is_verified = is_verified
+        # Epoch seconds, or None when the vehicle has no insurance on file
+        self.insurance_expiry = insurance_expiry
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def is_insured(self, now):
+        return self.insurance_expiry is not None and self.insurance_expiry > now
+
+
+class GridIndex:
+    """Positions bucketed into CELL_DEGREES-square cells.
+
+    Nearest queries walk rings of cells outwards from the query point and
+    stop once no unvisited cell can hold anything closer than what has
+    been found, so only the neighbourhood of the query is ever touched.
+    Not thread-safe; DriverLocator holds the lock.
+    """
+
+    def __init__(self, cell_degrees):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def cell_of(self, latitude, longitude):
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    def upsert(self, position):
+        current = self.positions.get(position.driver_id)
+        if current is not None:
+            self._unlink(current)
+        self.positions[position.driver_id] = position
+        self.cells.setdefault(self.cell_of(position.latitude, position.longitude), {})[position.driver_id] = position
+
+    def remove(self, driver_id):
+        current = self.positions.pop(driver_id, None)
+        if current is not None:
+            self._unlink(current)
+
+    def _unlink(self, position):
+        cell = self.cell_of(position.latitude, position.longitude)
+        bucket = self.cells.get(cell)
+        if bucket is not None:
+            bucket.pop(position.driver_id, None)
+            if not bucket:
+                del self.cells[cell]
+
+    def _ring(self, row, col, ring):
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+    def nearest(self, latitude, longitude, limit, radius_km, accept):
+        """Up to limit (distance_km, position) pairs within radius_km, closest first"""
+        row, col = self.cell_of(latitude, longitude)
+
+        # Narrowest cell side (east-west, at the highest latitude in range)
+        widest_lat = min(abs(latitude) + radius_km / KM_PER_DEGREE, 89.0)
+        cell_km = self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+        max_ring = int(math.ceil(radius_km / cell_km)) + 1
+
+        found = []  # max-heap on distance: (-distance, driver_id, position)
+        for ring in range(max_ring + 1):
+            # Anything in this ring is at least ring - 1 whole cells away
+            bound = (ring - 1) * cell_km
+            if bound > radius_km or (len(found) == limit and bound >= -found[0][0]):
+                break
+            for cell in self._ring(row, col, ring):
+                bucket = self.cells.get(cell)
+                if not bucket:
+                    continue
+                for position in bucket.values():
+                    if not accept(position):
+                        continue
+                    distance = haversine_km(latitude, longitude, position.latitude, position.longitude)
+                    if distance > radius_km:
+                        continue
+                    if len(found) < limit:
+                        heapq.heappush(found, (-distance, position.driver_id, position))
+                    elif distance < -found[0][0]:
+                        heapq.heapreplace(found, (-distance, position.driver_id, position))
+
+        return sorted(((-d, p) for d, _, p in found), key=lambda pair: pair[0])
+
+
+class RedisLocationStore:
+    """Positions shared by every worker: a hash of the latest heartbeat per
+    driver and a sorted set of when each was written"""
+
+    POSITIONS_KEY = 'user_service:drivers:positions'
+    UPDATED_KEY = 'user_service:drivers:updated'
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def save(self, position):
+        pipeline = self.connection.pipeline(transaction=False)
+        pipeline.hset(self.POSITIONS_KEY, position.driver_id, json.dumps(position.to_dict()))
+        pipeline.zadd(self.UPDATED_KEY, {position.driver_id: position.updated_at})
+        pipeline.execute()
+
+    def changed_since(self, since):
+        driver_ids = self.connection.zrangebyscore(self.UPDATED_KEY, since, '+inf')
+        if not driver_ids:
+            return []
+        return [
+            DriverPosition.from_dict(json.loads(raw))
+            for raw in self.connection.hmget(self.POSITIONS_KEY, driver_ids)
+            if raw is not None
+        ]
+
+    def prune(self, before):
+        driver_ids = self.connection.zrangebyscore(self.UPDATED_KEY, '-inf', before)
+        if driver_ids:
+            pipeline = self.connection.pipeline(transaction=False)
+            pipeline.hdel(self.POSITIONS_KEY, *driver_ids)
+            pipeline.zremrangebyscore(self.UPDATED_KEY, '-inf', before)
+            pipeline.execute()
+
+
+class LocalLocationStore:
+    """No shared store: used when the cache is not Redis.
+
+    Each worker then only sees the heartbeats it received itself; fine for
+    development and benchmarks.
+    """
+
+    def save(self, position):
+        pass
+
+    def changed_since(self, since):
+        return []
+
+    def prune(self, before):
+        pass
+
+
+class DriverLocator:
+    """Where available drivers are, and which of them are nearest.
+
+    Heartbeats update this worker's grid index and are written to the
+    shared store; other workers pull them in at most every SYNC_INTERVAL
+    seconds. Positions older than TTL count as offline. Vehicle details
+    are captured with each heartbeat so matching never touches the
+    database.
+    """
+
+    def __init__(self, store, cell_degrees=0.05, ttl=60, sync_interval=1.0, vehicle_cache_seconds=60):
+        self.store = store
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self.vehicle_cache_seconds = vehicle_cache_seconds
+
+        self.index = GridIndex(cell_degrees)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        self._last_prune = 0.0
+        self._vehicles = {}
+
+        # Counters
+        self.heartbeats = 0
+        self.queries = 0
+        self.synced = 0
+        self.errors = 0
+
+    def _apply(self, position):
+        current = self.index.positions.get(position.driver_id)
+        if current is None or current.updated_at <= position.updated_at:
+            self.index.upsert(position)
+
+    def heartbeat(self, position):
+        """Record a driver's position"""
+        with self._lock:
+            self._apply(position)
+            self.heartbeats += 1
+        try:
+            self.store.save(position)
+        except Exception as e:
+            logger.warning(f"Driver location store unavailable: {str(e)}")
+            with self._lock:
+                self.errors += 1
+
+    def go_offline(self, driver_id):
+        """Stop matching a driver until their next available heartbeat"""
+        with self._lock:
+            current = self.index.positions.get(driver_id)
+        if current is not None:
+            offline = DriverPosition.from_dict(dict(current.to_dict(), available=False, updated_at=time.time()))
+            self.heartbeat(offline)
+
+    def sync(self, now=None):
+        """Pull other workers' heartbeats and drop stale positions"""
+        now = time.time() if now is None else now
+        if now - self._last_sync < self.sync_interval:
+            return
+        # One thread syncs; the others answer from the current index
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            since, self._last_sync = self._last_sync, now
+            try:
+                changed = self.store.changed_since(since - SYNC_OVERLAP)
+            except Exception as e:
+                logger.warning(f"Driver location store unavailable: {str(e)}")
+                with self._lock:
+                    self.errors += 1
+                changed = []
+
+            expired = now - self.ttl
+            with self._lock:
+                for position in changed:
+                    self._apply(position)
+                self.synced += len(changed)
+                if now - self._last_prune >= self.ttl:
+                    for driver_id in [d for d, p in self.index.positions.items() if p.updated_at < expired]:
+                        self.index.remove(driver_id)
+
+            if now - self._last_prune >= self.ttl:
+                self._last_prune = now
+                try:
+                    self.store.prune(expired)
+                except Exception as e:
+                    logger.warning(f"Could not prune driver locations: {str(e)}")
+        finally:
+            self._sync_lock.release()
+
+    def nearest(self, latitude, longitude, limit=10, radius_km=50, vehicle_type=None,
+                min_seats=None, verified_only=False, insured_only=False):
+        """Nearest available drivers as (distance_km, DriverPosition) pairs"""
+        now = time.time()
+        self.sync(now)
+        fresh_after = now - self.ttl
+
+        def accept(position):
+            if not position.available or position.updated_at < fresh_after:
+                return False
+            if vehicle_type is not None and position.vehicle_type != vehicle_type:
+                return False
+            if min_seats is not None and (position.seats or 0) < min_seats:
+                return False
+            if verified_only and not position.is_verified:
+                return False
+            return not insured_only or position.is_insured(now)
+
+        with self._lock:
+            self.queries += 1
+            return self.index.nearest(latitude, longitude, limit, radius_km, accept)
+
+    def vehicle_details(self, driver_id, vehicle_id):
+        """Matching attributes of a driver's active vehicle, or None.
+
+        Cached per worker for VEHICLE_CACHE_SECONDS so steady heartbeats
+        don't query; vehicle changes evict the entry (see forget_vehicle).
+        """
+        key = (driver_id, vehicle_id)
+        now = time.monotonic()
+        cached = self._vehicles.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        from .models import Vehicle
+
+        vehicle = (
+            Vehicle.objects.filter(pk=vehicle_id, drivers=driver_id, is_active=True)
+            .only('id', 'vehicle_type', 'seats', 'is_verified', 'insurance_expiry')
+            .first()
+        )
+        details = None
+        if vehicle is not None:
+            details = {
+                'vehicle_id': vehicle.id,
+                'vehicle_type': vehicle.vehicle_type,
+                'seats': vehicle.seats,
+                'is_verified': vehicle.is_verified,
+                'insurance_expiry': vehicle.insurance_expiry.timestamp() if vehicle.insurance_expiry else None,
+            }
+        self._vehicles[key] = (now + self.vehicle_cache_seconds, details)
+        return details
+
+    def forget_vehicle(self, vehicle_id):
+        """Drop cached vehicle details; positions pick up changes on their next heartbeat"""
+        for key in [key for key in list(self._vehicles) if key[1] == vehicle_id]:
+            self._vehicles.pop(key, None)
+
+    def stats(self):
+        """Return locator counters for monitoring"""
+        with self._lock:
+            return {
+                'store': type(self.store).__name__,
+                'drivers': len(self.index),
+                'cells': len(self.index.cells),
+                'heartbeats': self.heartbeats,
+                'queries': self.queries,
+                'synced': self.synced,
+                'errors': self.errors,
+            }
+
+
+def build_location_store():
+    """Use Redis when the default cache is django-redis, else stay local"""
+    try:
+        from django_redis import get_redis_connection
+        return RedisLocationStore(get_redis_connection('default'))
+    except NotImplementedError:
+        logger.warning("Cache is not Redis, driver locations are kept per worker")
+        return LocalLocationStore()
+
+
+_locator = None
+_locator_lock = threading.Lock()
+
+
+def get_driver_locator():
+    """Return this worker's driver locator"""
+    global _locator
+
+    if _locator is not None:
+        return _locator
+
+    with _locator_lock:
+        if _locator is None:
+            location_settings = get_driver_location_settings()
+            _locator = DriverLocator(
+                store=build_location_store(),
+                cell_degrees=location_settings['CELL_DEGREES'],
+                ttl=location_settings['TTL'],
+                sync_interval=location_settings['SYNC_INTERVAL'],
+                vehicle_cache_seconds=location_settings['VEHICLE_CACHE_SECONDS'],
+            )
+
+    return _locator
+
+
+def forget_vehicle(vehicle_id):
+    """Drop cached details of a vehicle, if the locator is running"""
+    if _locator is not None:
+        _locator.forget_vehicle(vehicle_id)
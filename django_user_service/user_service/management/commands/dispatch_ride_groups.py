@@ -0,0 +1,15 @@
+"""User Service Management Commands
+Group trip requests whose departure is close
+"""
+
+from django.core.management.base import BaseCommand
+from user_service.grouping import dispatch_due_requests
+
+
+class Command(BaseCommand):
+    help = 'Group pending trip requests departing soon, even into partly filled vehicles'
+    
+    def handle(self, *args, **options):
+        """Dispatch due trip requests"""
+        changed = dispatch_due_requests()
+        self.stdout.write(self.style.SUCCESS(f'{changed} ride groups formed or filled'))
@@ -0,0 +1,57 @@
+"""User Service Management Commands
+Stream a full table export to a file or stdout
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from user_service.exports import EXPORTS, FORMATS, export_filename, get_export_settings, stream_export
+import sys
+
+
+class Command(BaseCommand):
+    help = 'Export users or vehicles as CSV or JSON Lines'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(EXPORTS), help='Table to export')
+        parser.add_argument('--file-format', choices=FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output')
+        parser.add_argument(
+            '--output',
+            help='File to write (default: <table>-<date>.<format>[.gz]; "-" for stdout)',
+        )
+        parser.add_argument(
+            '--filter',
+            action='append',
+            default=[],
+            metavar='NAME=VALUE',
+            help='List filter, as in the API (city, wilaya, is_active, is_verified, search, vehicle_type)',
+        )
+        parser.add_argument('--chunk-size', type=int, help='Rows fetched per round trip')
+    
+    def handle(self, *args, **options):
+        """Export a table"""
+        params = {}
+        for item in options['filter']:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Filters are NAME=VALUE, got: {item}")
+            params[name] = value
+        
+        export_settings = get_export_settings()
+        export = EXPORTS[options['table']].from_params(
+            params, options['chunk_size'] or export_settings['CHUNK_SIZE']
+        )
+        chunks = stream_export(export, options['file_format'], options['gzip'], export_settings['FLUSH_BYTES'])
+        
+        output = options['output'] or export_filename(export.name, options['file_format'], options['gzip'])
+        if output == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        
+        written = 0
+        with open(output, 'wb') as stream:
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {output}"))
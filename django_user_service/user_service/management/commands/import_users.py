@@ -0,0 +1,65 @@
+"""User Service Management Commands
+Bulk-create users from a CSV or JSON Lines file
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from user_service.imports import FORMATS, ImportFormatError, UserImporter, guess_format, read_rows
+import json
+
+
+class Command(BaseCommand):
+    help = 'Import users from a CSV or JSON Lines file'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format (default: from the extension)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate only, create nothing',
+        )
+        parser.add_argument('--chunk-size', type=int, help='Rows per transaction')
+        parser.add_argument('--workers', type=int, help='Password hashing processes')
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Load with bulk_create even on PostgreSQL',
+        )
+        parser.add_argument(
+            '--errors',
+            help='Write the per-row error report to this JSON Lines file',
+        )
+    
+    def handle(self, *args, **options):
+        """Import users"""
+        importer = UserImporter.from_settings(
+            chunk_size=options['chunk_size'],
+            hash_workers=options['workers'],
+            use_copy=False if options['no_copy'] else None,
+        )
+        
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                rows = read_rows(stream, options['format'] or guess_format(options['path']))
+                report = importer.run(rows, dry_run=options['dry_run']).to_dict()
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+        
+        if options['errors']:
+            with open(options['errors'], 'w') as output:
+                for error in report['errors']:
+                    output.write(json.dumps(error) + '\n')
+        else:
+            for error in report['errors'][:20]:
+                self.stdout.write(self.style.WARNING(f"Row {error['row']} ({error['email']}): {error['errors']}"))
+            if len(report['errors']) > 20:
+                self.stdout.write(self.style.WARNING(f"... {len(report['errors']) - 20} more, see --errors"))
+        
+        verb = 'would be created' if options['dry_run'] else 'created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['total']} rows: {report['valid']} {verb}, {report['failed']} failed"
+        ))
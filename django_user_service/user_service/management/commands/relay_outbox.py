@@ -0,0 +1,58 @@
+"""User Service Management Commands
+Publish outbox events to Redis Streams
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from user_service.outbox import LeaseLost, OutboxRelay, RelayLease, get_outbox_settings
+import signal
+import threading
+
+
+class Command(BaseCommand):
+    help = 'Relay outbox events to Redis Streams until stopped'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Publish the current backlog and exit')
+        parser.add_argument('--batch-size', type=int, help='Events per batch')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to wait when the backlog is empty')
+        parser.add_argument('--shard', type=int, default=0, help='Shard this relay publishes')
+        parser.add_argument('--shards', type=int, default=1, help='Relays splitting the events by aggregate id')
+    
+    def handle(self, *args, **options):
+        """Relay outbox events"""
+        if not 0 <= options['shard'] < options['shards']:
+            raise CommandError("--shard must be between 0 and --shards - 1")
+        
+        outbox_settings = get_outbox_settings()
+        relay = OutboxRelay.from_settings(
+            batch_size=options['batch_size'],
+            shard=options['shard'],
+            shards=options['shards'],
+        )
+        
+        lease = RelayLease.for_shard(f"{options['shard']}-{options['shards']}", outbox_settings['LEASE_SECONDS'])
+        
+        if options['once']:
+            if not lease.acquire():
+                raise CommandError("Another relay is publishing this shard")
+            try:
+                published = relay.relay_pending(lease)
+            except LeaseLost:
+                raise CommandError("Lost the lease to another relay")
+            finally:
+                lease.release()
+            self.stdout.write(self.style.SUCCESS(f'{published} events published'))
+            return
+        
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        
+        self.stdout.write(f"Relaying shard {options['shard']}/{options['shards']}")
+        relay.run(
+            stop,
+            poll_interval=options['poll_interval'] or outbox_settings['POLL_INTERVAL'],
+            lease=lease,
+            retention_hours=outbox_settings['RETENTION_HOURS'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Stopped: {relay.stats()}"))
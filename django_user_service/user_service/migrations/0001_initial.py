@@ -0,0 +1,182 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:03
+
+from django.conf import settings
+import django.contrib.auth.models
+import django.contrib.auth.validators
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('email', models.EmailField(help_text="User's unique email address", max_length=254, unique=True, validators=[django.core.validators.EmailValidator()])),
+                ('phone_number', models.CharField(blank=True, help_text="User's phone number", max_length=20, null=True, validators=[django.core.validators.RegexValidator(message="Phone number must be entered in the format: '+999999999'. Up to 15 digits allowed.", regex='^\\+?1?\\d{9,15}$')])),
+                ('address', models.CharField(blank=True, help_text="User's physical address", max_length=200, null=True)),
+                ('city', models.CharField(blank=True, help_text="User's city", max_length=100, null=True)),
+                ('wilaya', models.CharField(blank=True, help_text="User's wilaya (Algerian province)", max_length=100, null=True)),
+                ('license_number', models.CharField(blank=True, help_text="Driver's license number", max_length=50, null=True, unique=True)),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active')),
+                ('is_verified', models.BooleanField(default=False, help_text="Designates whether the user's identity has been verified")),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Date and time when the user was created')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Date and time when the user was last updated')),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'verbose_name': 'User',
+                'verbose_name_plural': 'Users',
+                'db_table': 'users',
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserVehicle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Date and time when the association was created')),
+                ('user', models.ForeignKey(help_text='User associated with the vehicle', on_delete=django.db.models.deletion.CASCADE, related_name='user_vehicles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Vehicle Association',
+                'verbose_name_plural': 'User Vehicle Associations',
+                'db_table': 'user_vehicles',
+            },
+        ),
+        migrations.CreateModel(
+            name='Vehicle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('license_plate', models.CharField(help_text="Vehicle's license plate number", max_length=20, unique=True)),
+                ('make', models.CharField(help_text='Vehicle manufacturer (e.g., Renault, Peugeot)', max_length=100)),
+                ('model', models.CharField(help_text='Vehicle model (e.g., Symbol, 206)', max_length=100)),
+                ('year_of_manufacture', models.PositiveIntegerField(blank=True, help_text='Year the vehicle was manufactured', null=True)),
+                ('vehicle_type', models.CharField(choices=[('sedan', 'Sedan'), ('hatchback', 'Hatchback'), ('suv', 'SUV'), ('van', 'Van'), ('pickup', 'Pickup Truck'), ('other', 'Other')], default='sedan', help_text='Type of vehicle', max_length=50)),
+                ('color', models.CharField(blank=True, help_text='Vehicle color', max_length=20, null=True)),
+                ('seats', models.PositiveIntegerField(default=4, help_text='Number of seats in the vehicle')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this vehicle is active in the fleet')),
+                ('is_verified', models.BooleanField(default=False, help_text='Designates whether this vehicle has been verified')),
+                ('insurance_number', models.CharField(blank=True, help_text='Insurance policy number', max_length=100, null=True)),
+                ('insurance_expiry', models.DateTimeField(blank=True, help_text='Insurance policy expiry date', null=True)),
+                ('registration_number', models.CharField(blank=True, help_text='Vehicle registration number', max_length=100, null=True)),
+                ('registration_expiry', models.DateTimeField(blank=True, help_text='Vehicle registration expiry date', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Date and time when the vehicle was created')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Date and time when the vehicle was last updated')),
+                ('drivers', models.ManyToManyField(blank=True, help_text='Users who are associated with this vehicle', related_name='vehicles', through='user_service.UserVehicle', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Vehicle',
+                'verbose_name_plural': 'Vehicles',
+                'db_table': 'vehicles',
+            },
+        ),
+        migrations.AddField(
+            model_name='uservehicle',
+            name='vehicle',
+            field=models.ForeignKey(help_text='Vehicle associated with the user', on_delete=django.db.models.deletion.CASCADE, related_name='user_vehicles', to='user_service.vehicle'),
+        ),
+        migrations.CreateModel(
+            name='UserRole',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('ROLE_USER', 'User'), ('ROLE_ADMIN', 'Administrator'), ('ROLE_DRIVER', 'Driver'), ('ROLE_MODERATOR', 'Moderator')], help_text='Role assigned to the user', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Date and time when the role was assigned')),
+                ('user', models.ForeignKey(help_text='User assigned this role', on_delete=django.db.models.deletion.CASCADE, related_name='user_roles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Role',
+                'verbose_name_plural': 'User Roles',
+                'db_table': 'user_roles',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['license_plate'], name='vehicles_license_b08e3c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['is_active'], name='vehicles_is_acti_fa11c1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['is_verified'], name='vehicles_is_veri_01a26c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['vehicle_type'], name='vehicles_vehicle_d54349_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['created_at', 'id'], name='vehicles_created_175451_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uservehicle',
+            index=models.Index(fields=['user'], name='user_vehicl_user_id_f17eee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uservehicle',
+            index=models.Index(fields=['vehicle'], name='user_vehicl_vehicle_b54058_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='uservehicle',
+            unique_together={('user', 'vehicle')},
+        ),
+        migrations.AddIndex(
+            model_name='userrole',
+            index=models.Index(fields=['user'], name='user_roles_user_id_05df60_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userrole',
+            index=models.Index(fields=['role'], name='user_roles_role_582040_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='userrole',
+            unique_together={('user', 'role')},
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['email'], name='users_email_4b85f2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['city', 'wilaya'], name='users_city_1f89f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active'], name='users_is_acti_847b48_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_verified'], name='users_is_veri_63cd6e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['license_number'], name='users_license_0bc40e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at', 'id'], name='users_created_1b562c_idx'),
+        ),
+    ]
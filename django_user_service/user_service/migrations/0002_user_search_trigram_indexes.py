@@ -0,0 +1,44 @@
+"""Trigram indexes for user search on PostgreSQL.
+
+Django's icontains compiles to UPPER(column::text) LIKE UPPER('%term%'),
+so each index is a GIN pg_trgm index on that exact expression; the
+existing search, city and wilaya filters then use them without any query
+change. Indexes are built CONCURRENTLY so a large users table stays
+writable. Other databases skip this migration's SQL.
+"""
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_COLUMNS = ['first_name', 'last_name', 'email', 'license_number', 'city', 'wilaya']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS users_{column}_trgm '
+            f'ON users USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS users_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('user_service', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_service', '0002_user_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Wilaya',
+            fields=[
+                ('code', models.PositiveSmallIntegerField(help_text='Official wilaya code (1-58)', primary_key=True, serialize=False)),
+                ('name', models.CharField(help_text='Wilaya name', max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Wilaya',
+                'verbose_name_plural': 'Wilayas',
+                'db_table': 'wilayas',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Commune',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Commune name', max_length=100)),
+                ('wilaya', models.ForeignKey(help_text='Wilaya the commune belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='communes', to='user_service.wilaya')),
+            ],
+            options={
+                'verbose_name': 'Commune',
+                'verbose_name_plural': 'Communes',
+                'db_table': 'communes',
+                'ordering': ['wilaya_id', 'name'],
+                'unique_together': {('wilaya', 'name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='commune_ref',
+            field=models.ForeignKey(blank=True, db_column='commune_id', help_text='Commune the city text resolves to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='users', to='user_service.commune'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='wilaya_ref',
+            field=models.ForeignKey(blank=True, db_column='wilaya_code', help_text='Wilaya the wilaya text resolves to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='users', to='user_service.wilaya'),
+        ),
+    ]
@@ -0,0 +1,118 @@
+"""Point existing users at the wilaya and commune their text names.
+
+Text that matches nothing (typos, unknown communes) leaves the reference
+null; the city and wilaya strings themselves are not changed. The matching
+rules are frozen here as they were when this migration was written (see
+places.PlaceDirectory), so later changes to them do not alter it.
+"""
+
+from django.db import migrations
+import re
+import unicodedata
+
+BATCH_SIZE = 2000
+
+# Other spellings seen in user input, already normalized
+WILAYA_ALIASES = {
+    'algiers': 16,
+    'alger centre': 16,
+    'el djazair': 16,
+    'wahran': 31,
+    'qacentina': 25,
+    'bougie': 6,
+    'bejaya': 6,
+    'tizi': 15,
+    'bba': 34,
+    'sba': 22,
+    'sidi belabbes': 22,
+    'el asnam': 2,
+    'tamanghasset': 11,
+    'el golea': 58,
+}
+
+
+def normalize_place(name):
+    """Fold case, accents, apostrophes and separators so spellings compare equal"""
+    if not name:
+        return ''
+    text = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower()
+    text = re.sub(r"['`]", '', text)
+    return re.sub(r'[\s\-_.,]+', ' ', text).strip()
+
+
+class PlaceDirectory:
+    """Lookup tables over the historical Wilaya and Commune rows"""
+
+    def __init__(self, wilayas, communes):
+        self.wilaya_names = {}
+        for wilaya in wilayas:
+            self.wilaya_names[normalize_place(wilaya.name)] = wilaya.code
+            self.wilaya_names[str(wilaya.code)] = wilaya.code
+            self.wilaya_names[f'{wilaya.code:02d}'] = wilaya.code
+        for alias, code in WILAYA_ALIASES.items():
+            self.wilaya_names.setdefault(alias, code)
+
+        self.communes = {}
+        self.commune_names = {}
+        self.commune_wilayas = {}
+        for commune in communes:
+            self.communes[(commune.wilaya_id, normalize_place(commune.name))] = commune.id
+            self.commune_names.setdefault(normalize_place(commune.name), set()).add(commune.id)
+            self.commune_wilayas[commune.id] = commune.wilaya_id
+
+    def wilaya_code(self, name):
+        return self.wilaya_names.get(normalize_place(name))
+
+    def commune_id(self, name, wilaya_code=None):
+        key = normalize_place(name)
+        if not key:
+            return None
+        if wilaya_code is not None:
+            return self.communes.get((wilaya_code, key))
+        matches = self.commune_names.get(key, ())
+        return next(iter(matches)) if len(matches) == 1 else None
+
+    def resolve(self, city, wilaya):
+        wilaya_code = self.wilaya_code(wilaya)
+        commune_id = self.commune_id(city, wilaya_code)
+        if wilaya_code is None:
+            if commune_id is not None:
+                wilaya_code = self.commune_wilayas[commune_id]
+            else:
+                wilaya_code = self.wilaya_code(city)
+        return wilaya_code, commune_id
+
+
+def map_user_places(apps, schema_editor):
+    User = apps.get_model('user_service', 'User')
+    Wilaya = apps.get_model('user_service', 'Wilaya')
+    Commune = apps.get_model('user_service', 'Commune')
+
+    places = PlaceDirectory(Wilaya.objects.all(), Commune.objects.all())
+    users = User.objects.exclude(city__isnull=True, wilaya__isnull=True).only('id', 'city', 'wilaya').order_by('id')
+
+    last_id = 0
+    while True:
+        batch = list(users.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        for user in batch:
+            user.wilaya_ref_id, user.commune_ref_id = places.resolve(user.city, user.wilaya)
+        User.objects.bulk_update(batch, ['wilaya_ref', 'commune_ref'])
+        last_id = batch[-1].id
+
+
+def unmap_user_places(apps, schema_editor):
+    User = apps.get_model('user_service', 'User')
+    User.objects.update(wilaya_ref=None, commune_ref=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_service', '0004_seed_wilayas'),
+    ]
+
+    operations = [
+        migrations.RunPython(map_user_places, unmap_user_places),
+    ]
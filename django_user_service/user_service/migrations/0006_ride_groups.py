@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_service', '0005_map_user_places'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField(help_text='Earliest departure time acceptable to every member')),
+                ('window_end', models.DateTimeField(help_text='Latest departure time acceptable to every member')),
+                ('capacity', models.PositiveSmallIntegerField(help_text='Passenger seats offered by the vehicle')),
+                ('seats_taken', models.PositiveSmallIntegerField(default=0, help_text='Seats booked by the members')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('full', 'Full'), ('departed', 'Departed'), ('cancelled', 'Cancelled')], default='open', help_text='Group status', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Date and time when the group was formed')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Date and time when the group was last updated')),
+                ('destination', models.ForeignKey(help_text='Wilaya the group travels to', on_delete=django.db.models.deletion.PROTECT, related_name='arriving_groups', to='user_service.wilaya')),
+                ('driver', models.ForeignKey(help_text='Driver assigned to the group', on_delete=django.db.models.deletion.PROTECT, related_name='driven_groups', to=settings.AUTH_USER_MODEL)),
+                ('origin', models.ForeignKey(help_text='Wilaya the group departs from', on_delete=django.db.models.deletion.PROTECT, related_name='departing_groups', to='user_service.wilaya')),
+                ('vehicle', models.ForeignKey(help_text='Vehicle the group travels in', on_delete=django.db.models.deletion.PROTECT, related_name='ride_groups', to='user_service.vehicle')),
+            ],
+            options={
+                'verbose_name': 'Ride Group',
+                'verbose_name_plural': 'Ride Groups',
+                'db_table': 'ride_groups',
+            },
+        ),
+        migrations.CreateModel(
+            name='TripRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('earliest_departure', models.DateTimeField(help_text='Earliest acceptable departure time')),
+                ('latest_departure', models.DateTimeField(help_text='Latest acceptable departure time')),
+                ('seats', models.PositiveSmallIntegerField(default=1, help_text='Number of seats requested')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('grouped', 'Grouped'), ('cancelled', 'Cancelled')], default='pending', help_text='Request status', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Date and time when the request was submitted')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Date and time when the request was last updated')),
+                ('destination', models.ForeignKey(help_text='Wilaya to travel to', on_delete=django.db.models.deletion.PROTECT, related_name='arriving_requests', to='user_service.wilaya')),
+                ('group', models.ForeignKey(blank=True, help_text='Group the request was placed in', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='requests', to='user_service.ridegroup')),
+                ('origin', models.ForeignKey(help_text='Wilaya to depart from', on_delete=django.db.models.deletion.PROTECT, related_name='departing_requests', to='user_service.wilaya')),
+                ('passenger', models.ForeignKey(help_text='Passenger requesting the trip', on_delete=django.db.models.deletion.CASCADE, related_name='trip_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trip Request',
+                'verbose_name_plural': 'Trip Requests',
+                'db_table': 'trip_requests',
+                'indexes': [models.Index(fields=['origin', 'destination', 'status', 'earliest_departure'], name='trip_reques_origin__e6608d_idx'), models.Index(fields=['passenger', 'created_at'], name='trip_reques_passeng_9fa48f_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ridegroup',
+            index=models.Index(fields=['origin', 'destination', 'status', 'window_start'], name='ride_groups_origin__35d1d9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ridegroup',
+            index=models.Index(fields=['driver', 'status'], name='ride_groups_driver__c988a7_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_service', '0006_ride_groups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aggregate_type', models.CharField(choices=[('user', 'User'), ('vehicle', 'Vehicle')], help_text='Kind of entity the event is about', max_length=20)),
+                ('aggregate_id', models.BigIntegerField(help_text='Id of the entity the event is about')),
+                ('event_type', models.CharField(help_text='What happened, e.g. user.updated', max_length=50)),
+                ('payload', models.JSONField(default=dict, help_text='Event body')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Date and time when the change was made')),
+                ('published_at', models.DateTimeField(blank=True, help_text='Date and time when the relay published the event', null=True)),
+            ],
+            options={
+                'verbose_name': 'Outbox Event',
+                'verbose_name_plural': 'Outbox Events',
+                'db_table': 'outbox_events',
+                'indexes': [models.Index(condition=models.Q(('published_at__isnull', True)), fields=['id'], name='outbox_unpublished_idx'), models.Index(fields=['published_at'], name='outbox_published_at_idx')],
+            },
+        ),
+    ]
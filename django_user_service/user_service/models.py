@@ -3,12 +3,76 @@ Django models for the Smart Inter-Wilaya Taxi Platform
 """
 
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, router, transaction
 from django.core.validators import RegexValidator, EmailValidator
 from django.utils import timezone
 
 
-class User(AbstractUser):
+class Wilaya(models.Model):
+    """Algerian province, keyed by its official code"""
+    
+    code = models.PositiveSmallIntegerField(
+        primary_key=True,
+        help_text="Official wilaya code (1-58)"
+    )
+    
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        help_text="Wilaya name"
+    )
+    
+    class Meta:
+        db_table = 'wilayas'
+        verbose_name = 'Wilaya'
+        verbose_name_plural = 'Wilayas'
+        ordering = ['code']
+    
+    def __str__(self):
+        return f"{self.code:02d} - {self.name}"
+
+
+class Commune(models.Model):
+    """Municipality within a wilaya"""
+    
+    wilaya = models.ForeignKey(
+        Wilaya,
+        on_delete=models.CASCADE,
+        related_name='communes',
+        help_text="Wilaya the commune belongs to"
+    )
+    
+    name = models.CharField(
+        max_length=100,
+        help_text="Commune name"
+    )
+    
+    class Meta:
+        db_table = 'communes'
+        verbose_name = 'Commune'
+        verbose_name_plural = 'Communes'
+        ordering = ['wilaya_id', 'name']
+        unique_together = ('wilaya', 'name')
+    
+    def __str__(self):
+        return f"{self.name} ({self.wilaya.name})"
+
+
+class TransactionalSaveMixin:
+    """Save inside a transaction, so post_save handlers commit with the row.
+
+    signals.py writes outbox events from post_save; outside an atomic block
+    the row would otherwise commit on its own first. Deletes already run in
+    one (see Collector.delete).
+    """
+    
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class User(TransactionalSaveMixin, AbstractUser):
     """Custom User model extending Django's AbstractUser for smart taxi drivers"""
     
     # Phone number validation
@@ -53,6 +117,27 @@ class User(AbstractUser):
         help_text="User's wilaya (Algerian province)"
     )
     
+    # Reference places resolved from the city and wilaya text on save
+    wilaya_ref = models.ForeignKey(
+        Wilaya,
+        on_delete=models.SET_NULL,
+        db_column='wilaya_code',
+        related_name='users',
+        blank=True,
+        null=True,
+        help_text="Wilaya the wilaya text resolves to"
+    )
+    
+    commune_ref = models.ForeignKey(
+        Commune,
+        on_delete=models.SET_NULL,
+        db_column='commune_id',
+        related_name='users',
+        blank=True,
+        null=True,
+        help_text="Commune the city text resolves to"
+    )
+    
     license_number = models.CharField(
         max_length=50,
         unique=True,
@@ -93,6 +178,7 @@ class User(AbstractUser):
             models.Index(fields=['is_active']),
             models.Index(fields=['is_verified']),
             models.Index(fields=['license_number']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
@@ -126,7 +212,7 @@ class User(AbstractUser):
         self.save(update_fields=['is_verified'])
 
 
-class Vehicle(models.Model):
+class Vehicle(TransactionalSaveMixin, models.Model):
     """Vehicle model for taxi fleet management"""
     
     VEHICLE_TYPES = [
@@ -248,6 +334,7 @@ class Vehicle(models.Model):
             models.Index(fields=['is_active']),
             models.Index(fields=['is_verified']),
             models.Index(fields=['vehicle_type']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
@@ -286,7 +373,7 @@ class Vehicle(models.Model):
         return timezone.now() > self.registration_expiry
 
 
-class UserRole(models.Model):
+class UserRole(TransactionalSaveMixin, models.Model):
     """User role assignment model for role-based access control"""
     
     ROLE_CHOICES = [
@@ -328,7 +415,7 @@ class UserRole(models.Model):
         return f"{self.user.username} - {self.get_role_display()}"
 
 
-class UserVehicle(models.Model):
+class UserVehicle(TransactionalSaveMixin, models.Model):
     """Junction table for User-Vehicle many-to-many relationship"""
     
     user = models.ForeignKey(
@@ -361,4 +448,252 @@ class UserVehicle(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.vehicle.license_plate}"
\ No newline at end of file
+        return f"{self.user.username} - {self.vehicle.license_plate}"
+
+class RideGroup(models.Model):
+    """Passengers sharing one vehicle on a wilaya-to-wilaya route"""
+    
+    STATUS_OPEN = 'open'
+    STATUS_FULL = 'full'
+    STATUS_DEPARTED = 'departed'
+    STATUS_CANCELLED = 'cancelled'
+    
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'Open'),
+        (STATUS_FULL, 'Full'),
+        (STATUS_DEPARTED, 'Departed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    
+    origin = models.ForeignKey(
+        Wilaya,
+        on_delete=models.PROTECT,
+        related_name='departing_groups',
+        help_text="Wilaya the group departs from"
+    )
+    
+    destination = models.ForeignKey(
+        Wilaya,
+        on_delete=models.PROTECT,
+        related_name='arriving_groups',
+        help_text="Wilaya the group travels to"
+    )
+    
+    # Departure times every member accepts
+    window_start = models.DateTimeField(
+        help_text="Earliest departure time acceptable to every member"
+    )
+    
+    window_end = models.DateTimeField(
+        help_text="Latest departure time acceptable to every member"
+    )
+    
+    driver = models.ForeignKey(
+        User,
+        on_delete=models.PROTECT,
+        related_name='driven_groups',
+        help_text="Driver assigned to the group"
+    )
+    
+    vehicle = models.ForeignKey(
+        Vehicle,
+        on_delete=models.PROTECT,
+        related_name='ride_groups',
+        help_text="Vehicle the group travels in"
+    )
+    
+    capacity = models.PositiveSmallIntegerField(
+        help_text="Passenger seats offered by the vehicle"
+    )
+    
+    seats_taken = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Seats booked by the members"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_OPEN,
+        help_text="Group status"
+    )
+    
+    # Audit fields
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="Date and time when the group was formed"
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        help_text="Date and time when the group was last updated"
+    )
+    
+    class Meta:
+        db_table = 'ride_groups'
+        verbose_name = 'Ride Group'
+        verbose_name_plural = 'Ride Groups'
+        indexes = [
+            models.Index(fields=['origin', 'destination', 'status', 'window_start']),
+            models.Index(fields=['driver', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.origin_id:02d} -> {self.destination_id:02d} at {self.window_start:%Y-%m-%d %H:%M} ({self.seats_taken}/{self.capacity})"
+    
+    @property
+    def seats_left(self):
+        """Seats still free in the vehicle"""
+        return self.capacity - self.seats_taken
+
+
+class TripRequest(models.Model):
+    """A passenger's request for seats on a wilaya-to-wilaya trip"""
+    
+    STATUS_PENDING = 'pending'
+    STATUS_GROUPED = 'grouped'
+    STATUS_CANCELLED = 'cancelled'
+    
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_GROUPED, 'Grouped'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    
+    passenger = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='trip_requests',
+        help_text="Passenger requesting the trip"
+    )
+    
+    origin = models.ForeignKey(
+        Wilaya,
+        on_delete=models.PROTECT,
+        related_name='departing_requests',
+        help_text="Wilaya to depart from"
+    )
+    
+    destination = models.ForeignKey(
+        Wilaya,
+        on_delete=models.PROTECT,
+        related_name='arriving_requests',
+        help_text="Wilaya to travel to"
+    )
+    
+    earliest_departure = models.DateTimeField(
+        help_text="Earliest acceptable departure time"
+    )
+    
+    latest_departure = models.DateTimeField(
+        help_text="Latest acceptable departure time"
+    )
+    
+    seats = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Number of seats requested"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        help_text="Request status"
+    )
+    
+    group = models.ForeignKey(
+        RideGroup,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='requests',
+        help_text="Group the request was placed in"
+    )
+    
+    # Audit fields
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="Date and time when the request was submitted"
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        help_text="Date and time when the request was last updated"
+    )
+    
+    class Meta:
+        db_table = 'trip_requests'
+        verbose_name = 'Trip Request'
+        verbose_name_plural = 'Trip Requests'
+        indexes = [
+            models.Index(fields=['origin', 'destination', 'status', 'earliest_departure']),
+            models.Index(fields=['passenger', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.passenger.username}: {self.origin_id:02d} -> {self.destination_id:02d} ({self.seats} seats)"
+
+
+class OutboxEvent(models.Model):
+    """A domain event, written in the transaction of the change it records.
+
+    The outbox relay publishes unpublished events in id order and then
+    stamps published_at, so every committed change is delivered at least
+    once and events of one aggregate arrive in the order they were written.
+    """
+    
+    AGGREGATE_USER = 'user'
+    AGGREGATE_VEHICLE = 'vehicle'
+    
+    AGGREGATE_CHOICES = [
+        (AGGREGATE_USER, 'User'),
+        (AGGREGATE_VEHICLE, 'Vehicle'),
+    ]
+    
+    aggregate_type = models.CharField(
+        max_length=20,
+        choices=AGGREGATE_CHOICES,
+        help_text="Kind of entity the event is about"
+    )
+    
+    aggregate_id = models.BigIntegerField(
+        help_text="Id of the entity the event is about"
+    )
+    
+    event_type = models.CharField(
+        max_length=50,
+        help_text="What happened, e.g. user.updated"
+    )
+    
+    payload = models.JSONField(
+        default=dict,
+        help_text="Event body"
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="Date and time when the change was made"
+    )
+    
+    published_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text="Date and time when the relay published the event"
+    )
+    
+    class Meta:
+        db_table = 'outbox_events'
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        indexes = [
+            # The relay's scan: only the backlog is indexed
+            models.Index(
+                fields=['id'],
+                condition=models.Q(published_at__isnull=True),
+                name='outbox_unpublished_idx',
+            ),
+            models.Index(fields=['published_at'], name='outbox_published_at_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.id} {self.event_type} {self.aggregate_type}:{self.aggregate_id}"
@@ -0,0 +1,362 @@
+"""User Service Outbox
+Domain events written with each change and relayed in batches to Redis Streams
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Mod
+from django.utils import timezone
+import datetime
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_OUTBOX_SETTINGS = {
+    # Events go to <STREAM_PREFIX>:<aggregate type>
+    'STREAM_PREFIX': 'user_service:events',
+    'BATCH_SIZE': 500,
+    'POLL_INTERVAL': 1.0,
+    # Streams are trimmed to about this many entries
+    'MAX_STREAM_LENGTH': 100000,
+    # A relay that stops renewing its lease is replaced after this long
+    'LEASE_SECONDS': 30,
+    # Published events are kept this long, then deleted
+    'RETENTION_HOURS': 24,
+}
+
+
+def get_outbox_settings():
+    """Return the outbox settings merged with their defaults"""
+    outbox_settings = dict(DEFAULT_OUTBOX_SETTINGS)
+    outbox_settings.update(getattr(settings, 'OUTBOX', {}))
+    return outbox_settings
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def user_payload(user):
+    """What consumers get to know about a user"""
+    return {
+        'id': user.pk,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'city': user.city,
+        'wilaya': user.wilaya,
+        'wilaya_code': user.wilaya_ref_id,
+        'commune_id': user.commune_ref_id,
+        'is_active': user.is_active,
+        'is_verified': user.is_verified,
+        'updated_at': _iso(user.updated_at),
+    }
+
+
+def vehicle_payload(vehicle):
+    """What consumers get to know about a vehicle"""
+    return {
+        'id': vehicle.pk,
+        'license_plate': vehicle.license_plate,
+        'vehicle_type': vehicle.vehicle_type,
+        'seats': vehicle.seats,
+        'is_active': vehicle.is_active,
+        'is_verified': vehicle.is_verified,
+        'insurance_expiry': _iso(vehicle.insurance_expiry),
+        'updated_at': _iso(vehicle.updated_at),
+    }
+
+
+def record_event(aggregate_type, aggregate_id, event_type, payload):
+    """Add an event to the outbox, in the caller's transaction"""
+    return OutboxEvent.objects.create(
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        event_type=event_type,
+        payload=payload,
+    )
+
+
+class RedisStreamPublisher:
+    """Appends events to Redis Streams, a batch per MULTI/EXEC.
+
+    A batch is appended whole or not at all, so a retried batch never
+    lands behind part of itself.
+    """
+
+    def __init__(self, connection, max_length):
+        self.connection = connection
+        self.max_length = max_length
+
+    def publish(self, entries):
+        """Append (stream, fields) pairs in order"""
+        pipeline = self.connection.pipeline(transaction=True)
+        for stream, fields in entries:
+            pipeline.xadd(stream, fields, maxlen=self.max_length, approximate=True)
+        pipeline.execute()
+
+
+class LocalStreamPublisher:
+    """In-memory stand-in for Redis Streams: used when the cache is not Redis.
+
+    Entries only live in this process; fine for development, benchmarks
+    and for checking what the relay would have sent.
+    """
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        self.streams = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def publish(self, entries):
+        with self._lock:
+            for stream, fields in entries:
+                entry_id = f"{int(time.time() * 1000)}-{next(self._sequence)}"
+                entries_of_stream = self.streams.setdefault(stream, [])
+                entries_of_stream.append((entry_id, dict(fields)))
+                if len(entries_of_stream) > self.max_length:
+                    del entries_of_stream[:len(entries_of_stream) - self.max_length]
+
+    def read(self, stream):
+        """Every (entry id, fields) pair of a stream, oldest first"""
+        with self._lock:
+            return list(self.streams.get(stream, []))
+
+
+def build_event_publisher(max_length):
+    """Use Redis when the default cache is django-redis, else stay local"""
+    try:
+        from django_redis import get_redis_connection
+        return RedisStreamPublisher(get_redis_connection('default'), max_length)
+    except NotImplementedError:
+        logger.warning("Cache is not Redis, outbox events are published in memory")
+        return LocalStreamPublisher(max_length)
+
+
+# KEYS[1]: lease; ARGV: owner token, lease milliseconds. Extends the
+# lease if the token holds it, takes it if nobody does; 1 when held.
+LEASE_ACQUIRE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+# KEYS[1]: lease; ARGV[1]: owner token. Deletes the lease only if held.
+LEASE_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLost(Exception):
+    """The relay's lease expired or went to another relay"""
+
+
+class RelayLease:
+    """Lease making one relay the publisher of its shard.
+
+    Two relays on the same events could publish an aggregate's events out
+    of order, so a standby relay only takes over once the lease expires.
+    On Redis, taking and renewing is one compare-and-extend script, so a
+    relay can't extend a lease that expired and went to another relay in
+    between. Other caches fall back to add/get/touch, which is only safe
+    with a single relay per shard.
+    """
+
+    def __init__(self, name, seconds, connection=None):
+        self.key = f'user_service:outbox:lease:{name}'
+        self.seconds = seconds
+        self.token = uuid.uuid4().hex
+        self.connection = connection
+        if connection is not None:
+            self.redis_key = cache.make_key(self.key)
+            self._acquire_script = connection.register_script(LEASE_ACQUIRE_LUA)
+            self._release_script = connection.register_script(LEASE_RELEASE_LUA)
+
+    @classmethod
+    def for_shard(cls, name, seconds):
+        """Lease kept in Redis when the default cache is django-redis"""
+        try:
+            from django_redis import get_redis_connection
+            return cls(name, seconds, get_redis_connection('default'))
+        except NotImplementedError:
+            return cls(name, seconds)
+
+    def acquire(self):
+        """Take or renew the lease; False while another relay holds it"""
+        try:
+            if self.connection is not None:
+                milliseconds = int(self.seconds * 1000)
+                return bool(self._acquire_script(keys=[self.redis_key], args=[self.token, milliseconds]))
+            if cache.add(self.key, self.token, self.seconds):
+                return True
+            if cache.get(self.key) == self.token:
+                cache.touch(self.key, self.seconds)
+                return True
+        except Exception as e:
+            logger.warning(f"Outbox lease unavailable: {str(e)}")
+        return False
+
+    def release(self):
+        try:
+            if self.connection is not None:
+                self._release_script(keys=[self.redis_key], args=[self.token])
+            elif cache.get(self.key) == self.token:
+                cache.delete(self.key)
+        except Exception:
+            pass
+
+
+class OutboxRelay:
+    """Publishes outbox events in id order, a batch at a time.
+
+    Each batch is read, appended to the streams, then stamped published.
+    A failure in between leaves the batch unpublished and it is sent again,
+    so delivery is at least once: consumers skip event ids they have seen.
+    Events are split across shards by aggregate id, so every event of an
+    aggregate goes through the same relay, in order.
+    """
+
+    def __init__(self, publisher, batch_size=500, stream_prefix='user_service:events', shard=0, shards=1):
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.stream_prefix = stream_prefix
+        self.shard = shard
+        self.shards = shards
+
+        # Counters
+        self.published = 0
+        self.batches = 0
+        self.errors = 0
+
+    @classmethod
+    def from_settings(cls, publisher=None, **overrides):
+        """Relay configured from OUTBOX, with per-run overrides"""
+        outbox_settings = get_outbox_settings()
+        options = {
+            'batch_size': outbox_settings['BATCH_SIZE'],
+            'stream_prefix': outbox_settings['STREAM_PREFIX'],
+        }
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        if publisher is None:
+            publisher = build_event_publisher(outbox_settings['MAX_STREAM_LENGTH'])
+        return cls(publisher, **options)
+
+    def stream_for(self, aggregate_type):
+        return f'{self.stream_prefix}:{aggregate_type}'
+
+    def backlog(self):
+        """Unpublished events of this relay's shard"""
+        queryset = OutboxEvent.objects.filter(published_at__isnull=True)
+        if self.shards > 1:
+            queryset = queryset.annotate(shard=Mod('aggregate_id', self.shards)).filter(shard=self.shard)
+        return queryset
+
+    def relay_batch(self, lease=None):
+        """Publish the oldest unpublished batch; returns how many events it held.
+
+        With a lease, it is renewed right before publishing and LeaseLost
+        raised instead if another relay has taken over.
+        """
+        events = list(
+            self.backlog()
+            .order_by('id')
+            .values_list('id', 'aggregate_type', 'aggregate_id', 'event_type', 'payload', 'created_at')
+            [:self.batch_size]
+        )
+        if not events:
+            return 0
+
+        if lease is not None and not lease.acquire():
+            raise LeaseLost()
+
+        self.publisher.publish([
+            (self.stream_for(aggregate_type), {
+                'event_id': event_id,
+                'aggregate_type': aggregate_type,
+                'aggregate_id': aggregate_id,
+                'event_type': event_type,
+                'payload': json.dumps(payload),
+                'created_at': _iso(created_at),
+            })
+            for event_id, aggregate_type, aggregate_id, event_type, payload, created_at in events
+        ])
+        OutboxEvent.objects.filter(pk__in=[event[0] for event in events]).update(published_at=timezone.now())
+
+        self.published += len(events)
+        self.batches += 1
+        return len(events)
+
+    def relay_pending(self, lease=None):
+        """Publish batches until the backlog is empty; returns the event count"""
+        total = 0
+        while True:
+            count = self.relay_batch(lease)
+            total += count
+            if count < self.batch_size:
+                return total
+
+    def prune(self, retention_hours):
+        """Delete events published more than retention_hours ago"""
+        cutoff = timezone.now() - datetime.timedelta(hours=retention_hours)
+        deleted, _ = OutboxEvent.objects.filter(published_at__lt=cutoff).delete()
+        return deleted
+
+    def run(self, stop, poll_interval=1.0, lease=None, retention_hours=24):
+        """Relay until stop (a threading.Event) is set.
+
+        Full batches are followed at once by the next; otherwise the relay
+        sleeps poll_interval. Errors are logged and retried after a pause.
+        A relay that loses its lease publishes nothing until it gets the
+        lease back.
+        """
+        last_prune = 0.0
+        while not stop.is_set():
+            if lease is not None and not lease.acquire():
+                stop.wait(poll_interval)
+                continue
+
+            try:
+                count = self.relay_batch(lease)
+                now = time.monotonic()
+                if now - last_prune >= 3600:
+                    last_prune = now
+                    self.prune(retention_hours)
+            except LeaseLost:
+                logger.warning("Outbox relay lost its lease, standing by")
+                count = 0
+            except Exception as e:
+                logger.error(f"Outbox relay failed: {str(e)}")
+                self.errors += 1
+                count = 0
+
+            if count < self.batch_size:
+                stop.wait(poll_interval)
+
+        if lease is not None:
+            lease.release()
+
+    def stats(self):
+        """Return relay counters for monitoring"""
+        return {
+            'shard': f'{self.shard}/{self.shards}',
+            'published': self.published,
+            'batches': self.batches,
+            'errors': self.errors,
+        }
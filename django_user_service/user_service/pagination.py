@@ -0,0 +1,147 @@
+"""User Service Pagination
+Page-number and keyset (cursor) pagination for list endpoints
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+import json
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    """Standard pagination for list endpoints"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on (created_at, id), newest first.
+
+    Each page is one indexed range query: there is no COUNT and no OFFSET,
+    so deep pages cost the same as the first one and rows inserted while
+    a client pages through are neither skipped nor repeated. Cursors are
+    opaque base64 tokens holding the boundary row's created_at and id.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        if position is None:
+            reverse = False
+        else:
+            created_at, pk, reverse = position
+            if reverse:
+                queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+            else:
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+        ordering = ('created_at', 'pk') if reverse else ('-created_at', '-pk')
+        # One extra row tells whether there is another page
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Return (created_at, id, reverse) from the request's cursor, or None"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            created_at = parse_datetime(payload['c'])
+            if created_at is None:
+                raise ValueError(payload['c'])
+            return created_at, int(payload['i']), bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse=False):
+        payload = {'c': row.created_at.isoformat(), 'i': row.pk}
+        if reverse:
+            payload['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Past the last row: go back to the start
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ListPagination(BasePagination):
+    """Page numbers by default; keyset cursors for ?pagination=cursor or ?cursor=.
+
+    Both modes order by (created_at, id), newest first, so the admin UI's
+    page numbers and exports walking cursors see the same stable order.
+    Page numbers keep an ordering the view already chose (such as search
+    rank); cursors always walk (created_at, id).
+    """
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == 'cursor' or KeysetPagination.cursor_query_param in request.query_params:
+            self.paginator = KeysetPagination()
+        else:
+            self.paginator = StandardResultsSetPagination()
+            if not queryset.ordered:
+                queryset = queryset.order_by('-created_at', '-pk')
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
@@ -0,0 +1,290 @@
+"""User Service Passwords
+Password hashing off the request thread: a bounded process pool with admission control
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    get_hasher,
+    identify_hasher,
+    is_password_usable,
+    make_password,
+)
+from rest_framework import exceptions
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PASSWORD_HASHING_SETTINGS = {
+    # Hash in a process pool; False hashes on the request thread
+    'OFFLOAD': True,
+    # Hashing processes per gunicorn worker. Every gunicorn worker starts
+    # its own pool, so the host runs SERVER_WORKERS x WORKERS of them; 0
+    # splits the CPUs between the gunicorn workers.
+    'WORKERS': 0,
+    # gunicorn workers on this host, from WEB_CONCURRENCY in settings
+    'SERVER_WORKERS': 1,
+    # Hashes queued or running in this worker before new ones are refused
+    'MAX_PENDING': 16,
+    # Seconds a request waits for a free slot before getting a 503
+    'ADMISSION_TIMEOUT': 2.0,
+    # Argon2id cost: OWASP's baseline of 19 MiB, 2 passes, 1 lane. One
+    # lane, because the pool already runs one hash per core.
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 19456,
+    'ARGON2_PARALLELISM': 1,
+}
+
+
+def get_password_hashing_settings():
+    """Return the password hashing settings merged with their defaults"""
+    hashing_settings = dict(DEFAULT_PASSWORD_HASHING_SETTINGS)
+    hashing_settings.update(getattr(settings, 'PASSWORD_HASHING', {}))
+    return hashing_settings
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with the cost from PASSWORD_HASHING.
+
+    Hashes made with other parameters still verify, and must_update
+    flags them so they are rehashed on the next login.
+    """
+
+    @property
+    def time_cost(self):
+        return get_password_hashing_settings()['ARGON2_TIME_COST']
+
+    @property
+    def memory_cost(self):
+        return get_password_hashing_settings()['ARGON2_MEMORY_COST']
+
+    @property
+    def parallelism(self):
+        return get_password_hashing_settings()['ARGON2_PARALLELISM']
+
+
+class PasswordHashingBusy(exceptions.APIException):
+    """Too many hashes are waiting; the client should retry shortly"""
+
+    status_code = 503
+    default_detail = 'Too many sign-ins in progress, please retry shortly.'
+    default_code = 'password_hashing_busy'
+
+
+def _init_hash_worker():
+    # Spawned workers start without settings; forked ones already have them
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def verify_password(password, encoded):
+    """(is_correct, must_update) for a raw password against a stored hash.
+
+    check_password without the setter, so the answer can come back from
+    another process and the rehash be saved by the caller.
+    """
+    if password is None or not is_password_usable(encoded):
+        return False, False
+
+    preferred = get_hasher('default')
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        # encoded is gibberish or uses a hasher that's no longer installed
+        return False, False
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = hasher.verify(password, encoded)
+
+    # Close the timing gap to the default work factor, as check_password does
+    if not is_correct and not hasher_changed and must_update:
+        hasher.harden_runtime(password, encoded)
+
+    return is_correct, must_update
+
+
+class PasswordHasherPool:
+    """Runs make_password and password checks in a process pool.
+
+    Hashing is pure CPU: on the request thread it holds a gunicorn worker
+    for the whole hash, and a sign-up spike queues every other request
+    behind it. The pools of all gunicorn workers together run about one
+    hashing process per core, and a semaphore bounds how many hashes may
+    wait for each pool. A request that cannot get a slot within
+    admission_timeout is refused with PasswordHashingBusy rather than
+    joining an ever longer queue.
+    """
+
+    def __init__(self, workers=0, max_pending=16, admission_timeout=2.0, offload=True):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.admission_timeout = admission_timeout
+        self.offload = offload
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+
+        # Counters
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self.inline = 0
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_hash_worker)
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.admission_timeout):
+            self._count('rejected')
+            logger.warning("Password hashing is saturated, refusing request")
+            raise PasswordHashingBusy()
+
+        self._count('pending')
+        try:
+            if not self.offload:
+                return fn(*args)
+            try:
+                return self._get_executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                logger.error("Password hashing pool broke, hashing inline")
+                self._discard_executor()
+                self._count('inline')
+                return fn(*args)
+        finally:
+            self._count('pending', -1)
+            self._slots.release()
+
+    def _discard_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def make_password(self, password):
+        """make_password in the pool"""
+        encoded = self._run(make_password, password)
+        self._count('hashed')
+        return encoded
+
+    def verify_password(self, password, encoded):
+        """verify_password in the pool; returns (is_correct, must_update)"""
+        result = self._run(verify_password, password, encoded)
+        self._count('verified')
+        return result
+
+    def check_user_password(self, user, password):
+        """Whether password is the user's, rehashing it if the hash is outdated"""
+        is_correct, must_update = self.verify_password(password, user.password)
+        if is_correct and must_update:
+            user.password = self.make_password(password)
+            user.save(update_fields=['password'])
+            self._count('rehashed')
+        return is_correct
+
+    def stats(self):
+        """Return hashing counters for monitoring"""
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'offload': self.offload,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self.pending,
+                'hashed': self.hashed,
+                'verified': self.verified,
+                'rehashed': self.rehashed,
+                'rejected': self.rejected,
+                'inline': self.inline,
+            }
+
+    def shutdown(self):
+        self._discard_executor()
+
+
+_hasher_pool = None
+_hasher_pool_lock = threading.Lock()
+
+
+def default_hashing_workers(server_workers):
+    """Hashing processes per gunicorn worker that add up to one per CPU"""
+    return max((os.cpu_count() or 1) // max(server_workers, 1), 1)
+
+
+def get_password_hasher():
+    """Return this worker's password hashing pool"""
+    global _hasher_pool
+
+    if _hasher_pool is not None:
+        return _hasher_pool
+
+    with _hasher_pool_lock:
+        if _hasher_pool is None:
+            hashing_settings = get_password_hashing_settings()
+            _hasher_pool = PasswordHasherPool(
+                workers=hashing_settings['WORKERS'] or default_hashing_workers(hashing_settings['SERVER_WORKERS']),
+                max_pending=hashing_settings['MAX_PENDING'],
+                admission_timeout=hashing_settings['ADMISSION_TIMEOUT'],
+                offload=hashing_settings['OFFLOAD'],
+            )
+
+    return _hasher_pool
+
+
+def reset_password_hasher():
+    """Drop the pool so the next hash picks up changed settings"""
+    global _hasher_pool
+
+    with _hasher_pool_lock:
+        pool, _hasher_pool = _hasher_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def hash_password(password):
+    """Hash a raw password through the pool"""
+    return get_password_hasher().make_password(password)
+
+
+def check_user_password(user, password):
+    """Check a user's password through the pool, rehashing outdated hashes"""
+    return get_password_hasher().check_user_password(user, password)
+
+
+class PooledPasswordBackend(ModelBackend):
+    """ModelBackend whose password checks run in the hashing pool"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash once anyway so unknown users take as long as known ones
+            hash_password(password)
+            return None
+        if check_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
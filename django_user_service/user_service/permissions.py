@@ -0,0 +1,131 @@
+"""User Service Permissions
+Role-based permissions backed by a cached per-user role set
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+from service_metrics import record_cache
+import logging
+
+from .models import UserRole
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_ROLE_CACHE_SETTINGS = {
+    'TIMEOUT': 300,
+}
+
+
+def get_role_cache_settings():
+    """Return the role cache settings merged with their defaults"""
+    role_cache_settings = dict(DEFAULT_ROLE_CACHE_SETTINGS)
+    role_cache_settings.update(getattr(settings, 'ROLE_CACHE', {}))
+    return role_cache_settings
+
+
+def roles_key(user_id):
+    return f'user_service:roles:{user_id}'
+
+
+def roles_version_key(user_id):
+    return f'user_service:roles:{user_id}:version'
+
+
+def load_roles(user_id):
+    """Return the set of role names a user holds.
+
+    The set is cached together with the user's role version, and an entry
+    only counts as a hit while that version is current, so bumping the
+    version (see invalidate_roles) drops it everywhere at once. Cache
+    errors fall back to the database.
+    """
+    key = roles_key(user_id)
+    version_key = roles_version_key(user_id)
+
+    try:
+        found = cache.get_many([key, version_key])
+    except Exception as e:
+        logger.warning(f"Role cache unavailable: {str(e)}")
+        found = None
+
+    if found is not None:
+        version = found.get(version_key, 0)
+        entry = found.get(key)
+        if entry is not None and entry['version'] == version:
+            record_cache('roles', True)
+            return entry['roles']
+    record_cache('roles', False)
+
+    # The version was read first: a role change that commits after this
+    # query bumps it past the one stored with the entry
+    roles = frozenset(UserRole.objects.filter(user_id=user_id).values_list('role', flat=True))
+
+    if found is not None:
+        try:
+            cache.set(key, {'version': version, 'roles': roles}, get_role_cache_settings()['TIMEOUT'])
+        except Exception as e:
+            logger.warning(f"Could not cache roles: {str(e)}")
+
+    return roles
+
+
+def invalidate_roles(user_id):
+    """Make every cached role set of a user stale"""
+    version_key = roles_version_key(user_id)
+    try:
+        cache.add(version_key, 0, None)
+        cache.incr(version_key)
+    except Exception as e:
+        logger.warning(f"Could not invalidate cached roles: {str(e)}")
+
+
+def request_roles(request):
+    """Roles of the requesting user, resolved at most once per request"""
+    roles = getattr(request, '_user_roles', None)
+    if roles is None:
+        user = request.user
+        roles = load_roles(user.pk) if user and user.is_authenticated else frozenset()
+        request._user_roles = roles
+    return roles
+
+
+def has_role(request, *roles):
+    """Whether the requesting user holds any of the given roles"""
+    return not request_roles(request).isdisjoint(roles)
+
+
+class HasRole(BasePermission):
+    """Allow users holding any of required_roles"""
+
+    required_roles = ()
+    message = {'error': 'Insufficient permissions'}
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and has_role(request, *self.required_roles))
+
+
+class IsAdmin(HasRole):
+    """Allow administrators only"""
+
+    required_roles = ('ROLE_ADMIN',)
+
+
+class IsDriver(HasRole):
+    """Allow drivers only"""
+
+    required_roles = ('ROLE_DRIVER',)
+
+
+class IsDriverOrAdmin(HasRole):
+    """Allow drivers and administrators"""
+
+    required_roles = ('ROLE_DRIVER', 'ROLE_ADMIN')
+
+
+class IsAdminOrReadOnly(IsAdmin):
+    """Allow reads to anyone the view lets in, writes to administrators"""
+
+    def has_permission(self, request, view):
+        return request.method in SAFE_METHODS or super().has_permission(request, view)
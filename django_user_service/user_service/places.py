@@ -0,0 +1,177 @@
+"""User Service Places
+Algerian wilayas and communes, resolved from free text without queries
+"""
+
+from django.core.cache import cache
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# The 58 wilayas with their official codes
+WILAYAS = [
+    (1, 'Adrar'), (2, 'Chlef'), (3, 'Laghouat'), (4, 'Oum El Bouaghi'),
+    (5, 'Batna'), (6, 'Béjaïa'), (7, 'Biskra'), (8, 'Béchar'),
+    (9, 'Blida'), (10, 'Bouira'), (11, 'Tamanrasset'), (12, 'Tébessa'),
+    (13, 'Tlemcen'), (14, 'Tiaret'), (15, 'Tizi Ouzou'), (16, 'Alger'),
+    (17, 'Djelfa'), (18, 'Jijel'), (19, 'Sétif'), (20, 'Saïda'),
+    (21, 'Skikda'), (22, 'Sidi Bel Abbès'), (23, 'Annaba'), (24, 'Guelma'),
+    (25, 'Constantine'), (26, 'Médéa'), (27, 'Mostaganem'), (28, "M'Sila"),
+    (29, 'Mascara'), (30, 'Ouargla'), (31, 'Oran'), (32, 'El Bayadh'),
+    (33, 'Illizi'), (34, 'Bordj Bou Arréridj'), (35, 'Boumerdès'), (36, 'El Tarf'),
+    (37, 'Tindouf'), (38, 'Tissemsilt'), (39, 'El Oued'), (40, 'Khenchela'),
+    (41, 'Souk Ahras'), (42, 'Tipaza'), (43, 'Mila'), (44, 'Aïn Defla'),
+    (45, 'Naâma'), (46, 'Aïn Témouchent'), (47, 'Ghardaïa'), (48, 'Relizane'),
+    (49, 'Timimoun'), (50, 'Bordj Badji Mokhtar'), (51, 'Ouled Djellal'), (52, 'Béni Abbès'),
+    (53, 'In Salah'), (54, 'In Guezzam'), (55, 'Touggourt'), (56, 'Djanet'),
+    (57, "El M'Ghair"), (58, 'El Meniaa'),
+]
+
+# Other spellings seen in user input, already normalized
+WILAYA_ALIASES = {
+    'algiers': 16,
+    'alger centre': 16,
+    'el djazair': 16,
+    'wahran': 31,
+    'qacentina': 25,
+    'bougie': 6,
+    'bejaya': 6,
+    'tizi': 15,
+    'bba': 34,
+    'sba': 22,
+    'sidi belabbes': 22,
+    'el asnam': 2,
+    'tamanghasset': 11,
+    'el golea': 58,
+}
+
+
+def normalize_place(name):
+    """Fold case, accents, apostrophes and separators so spellings compare equal"""
+    if not name:
+        return ''
+    text = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower()
+    text = re.sub(r"['`]", '', text)
+    return re.sub(r'[\s\-_.,]+', ' ', text).strip()
+
+
+class PlaceDirectory:
+    """Lookup tables over the Wilaya and Commune rows.
+
+    Built once from the reference tables; every lookup afterwards is a
+    dict access. Migration 0005 keeps its own frozen copy.
+    """
+
+    def __init__(self, wilayas, communes):
+        self.wilaya_names = {}
+        for wilaya in wilayas:
+            self.wilaya_names[normalize_place(wilaya.name)] = wilaya.code
+            self.wilaya_names[str(wilaya.code)] = wilaya.code
+            self.wilaya_names[f'{wilaya.code:02d}'] = wilaya.code
+        for alias, code in WILAYA_ALIASES.items():
+            self.wilaya_names.setdefault(alias, code)
+
+        self.communes = {}
+        self.commune_names = {}
+        self.commune_wilayas = {}
+        for commune in communes:
+            self.communes[(commune.wilaya_id, normalize_place(commune.name))] = commune.id
+            self.commune_names.setdefault(normalize_place(commune.name), set()).add(commune.id)
+            self.commune_wilayas[commune.id] = commune.wilaya_id
+
+    def wilaya_code(self, name):
+        """Official code of the wilaya a string names, or None"""
+        return self.wilaya_names.get(normalize_place(name))
+
+    def commune_id(self, name, wilaya_code=None):
+        """Commune a string names, within the wilaya when one is known.
+
+        Without a wilaya the name must be unique across the country.
+        """
+        key = normalize_place(name)
+        if not key:
+            return None
+        if wilaya_code is not None:
+            return self.communes.get((wilaya_code, key))
+        matches = self.commune_names.get(key, ())
+        return next(iter(matches)) if len(matches) == 1 else None
+
+    def resolve(self, city, wilaya):
+        """(wilaya code, commune id) for a user's city and wilaya text.
+
+        Without a usable wilaya, a city that names a commune settles it,
+        and failing that a city that is itself a wilaya name ("Algiers").
+        """
+        wilaya_code = self.wilaya_code(wilaya)
+        commune_id = self.commune_id(city, wilaya_code)
+        if wilaya_code is None:
+            if commune_id is not None:
+                wilaya_code = self.commune_wilayas[commune_id]
+            else:
+                wilaya_code = self.wilaya_code(city)
+        return wilaya_code, commune_id
+
+
+PLACES_VERSION_KEY = 'user_service:places:version'
+
+# How long a process trusts its directory before re-reading the version
+VERSION_CHECK_SECONDS = 5.0
+
+_directory = None
+_directory_version = None
+_checked_until = 0.0
+_directory_lock = threading.Lock()
+
+
+def places_version():
+    """Shared version of the reference tables, or None if the cache is down"""
+    try:
+        return cache.get(PLACES_VERSION_KEY, 0)
+    except Exception as e:
+        logger.warning(f"Place directory version unavailable: {str(e)}")
+        return None
+
+
+def get_place_directory():
+    """Return this process's place directory, loading it on first use.
+
+    The directory is stamped with the shared places version and reloaded
+    once reset_place_directory bumps it in any process. The version is
+    re-read at most every VERSION_CHECK_SECONDS, so lookups stay free of
+    cache calls in between.
+    """
+    global _directory, _directory_version, _checked_until
+
+    now = time.monotonic()
+    if _directory is not None and now < _checked_until:
+        return _directory
+
+    # Read before loading: a change committing during the load bumps the
+    # version past the one stored with the directory
+    version = places_version()
+
+    with _directory_lock:
+        if _directory is None or (version is not None and version != _directory_version):
+            from .models import Commune, Wilaya
+            _directory = PlaceDirectory(
+                Wilaya.objects.only('code', 'name'),
+                Commune.objects.only('id', 'wilaya', 'name'),
+            )
+            _directory_version = version
+        _checked_until = now + VERSION_CHECK_SECONDS
+        return _directory
+
+
+def reset_place_directory():
+    """Make every process reload the directory on its next version check"""
+    global _directory
+    try:
+        cache.add(PLACES_VERSION_KEY, 0, None)
+        cache.incr(PLACES_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Could not invalidate the place directory: {str(e)}")
+    with _directory_lock:
+        _directory = None
@@ -0,0 +1,251 @@
+"""User Service Profiles
+Read-through cache of rendered user profiles, versioned per user
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from service_metrics import record_cache
+import logging
+import os
+import threading
+import time
+
+from .models import User, Vehicle
+from .serializers import UserProfileSerializer
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PROFILE_CACHE_SETTINGS = {
+    'TIMEOUT': 300,
+    # How long one worker may hold the right to rebuild a profile
+    'LOCK_TIMEOUT': 5,
+    # How long other workers wait for that rebuild before doing their own
+    'LOCK_WAIT': 1.0,
+    'LOCK_POLL': 0.05,
+}
+
+
+def get_profile_cache_settings():
+    """Return the profile cache settings merged with their defaults"""
+    profile_cache_settings = dict(DEFAULT_PROFILE_CACHE_SETTINGS)
+    profile_cache_settings.update(getattr(settings, 'PROFILE_CACHE', {}))
+    return profile_cache_settings
+
+
+def profile_key(user_id):
+    return f'user_service:profile:{user_id}'
+
+
+def profile_version_key(user_id):
+    return f'user_service:profile:{user_id}:version'
+
+
+def profile_lock_key(user_id, version):
+    return f'user_service:profile:{user_id}:lock:{version}'
+
+
+def profile_queryset():
+    """Users with everything UserProfileSerializer reads, in three queries"""
+    return User.objects.prefetch_related(
+        'user_roles',
+        Prefetch(
+            'vehicles',
+            queryset=Vehicle.objects.filter(is_active=True),
+            to_attr='active_vehicles',
+        ),
+    )
+
+
+def render_profile(user):
+    """The UserProfileSerializer payload of a user, as a plain dict"""
+    return dict(UserProfileSerializer(user).data)
+
+
+class ProfileCache:
+    """Rendered profiles keyed by user id.
+
+    Like the role cache, an entry is stored with the user's profile
+    version and only counts as a hit while that version is current, so
+    invalidate() drops it everywhere by bumping the version. On a miss,
+    one worker per version takes a short lock and rebuilds the entry
+    while the others poll for it, so an invalidated popular profile is
+    rendered once rather than by every request in flight. Cache errors
+    fall back to the database.
+    """
+
+    def __init__(self, timeout, lock_timeout, lock_wait, lock_poll):
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.lock_poll = lock_poll
+
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.waited_hits = 0
+        self.lock_timeouts = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _lookup(self, user_id):
+        """(version, profile or None), or None when the cache is unavailable"""
+        key = profile_key(user_id)
+        version_key = profile_version_key(user_id)
+        try:
+            found = cache.get_many([key, version_key])
+        except Exception as e:
+            logger.warning(f"Profile cache unavailable: {str(e)}")
+            self._count('errors')
+            return None
+        version = found.get(version_key, 0)
+        entry = found.get(key)
+        if entry is not None and entry['version'] == version:
+            return version, entry['profile']
+        return version, None
+
+    def get(self, user_id, user=None):
+        """Return a user's profile payload, or None if there is no such user.
+
+        user, when the caller already has the instance (request.user),
+        saves the user query on a miss.
+        """
+        found = self._lookup(user_id)
+        if found is None:
+            return self._build(user_id, user)
+
+        version, profile = found
+        if profile is not None:
+            self._count('hits')
+            record_cache('profile', True)
+            return profile
+
+        self._count('misses')
+        record_cache('profile', False)
+        lock_key = profile_lock_key(user_id, version)
+        try:
+            locked = cache.add(lock_key, 1, self.lock_timeout)
+        except Exception as e:
+            logger.warning(f"Could not lock profile rebuild: {str(e)}")
+            self._count('errors')
+            return self._build(user_id, user)
+
+        if not locked:
+            profile = self._wait(user_id, version)
+            if profile is not None:
+                self._count('waited_hits')
+                return profile
+            self._count('lock_timeouts')
+            return self._build(user_id, user)
+
+        try:
+            # The version was read first: a change that commits after this
+            # render bumps it past the one stored with the entry
+            profile = self._build(user_id, user)
+            if profile is not None:
+                try:
+                    cache.set(profile_key(user_id), {'version': version, 'profile': profile}, self.timeout)
+                except Exception as e:
+                    logger.warning(f"Could not cache profile: {str(e)}")
+                    self._count('errors')
+            return profile
+        finally:
+            try:
+                cache.delete(lock_key)
+            except Exception:
+                pass
+
+    def _wait(self, user_id, version):
+        """Poll for the entry another worker is rebuilding"""
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll)
+            found = self._lookup(user_id)
+            if found is None or found[0] != version:
+                # Cache gone, or invalidated again while we waited
+                return None
+            if found[1] is not None:
+                return found[1]
+        return None
+
+    def _build(self, user_id, user=None):
+        if user is None:
+            user = profile_queryset().filter(pk=user_id).first()
+            if user is None:
+                return None
+        return render_profile(user)
+
+    def invalidate(self, user_id):
+        """Make every cached profile of a user stale"""
+        version_key = profile_version_key(user_id)
+        try:
+            cache.add(version_key, 0, None)
+            cache.incr(version_key)
+            self._count('invalidations')
+        except Exception as e:
+            logger.warning(f"Could not invalidate cached profile: {str(e)}")
+            self._count('errors')
+
+    def stats(self):
+        """Return cache counters for monitoring"""
+        with self._lock:
+            served = self.hits + self.waited_hits
+            lookups = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waited_hits': self.waited_hits,
+                'lock_timeouts': self.lock_timeouts,
+                'invalidations': self.invalidations,
+                'errors': self.errors,
+                'hit_ratio': round(served / lookups, 4) if lookups else 0.0,
+            }
+
+
+_profile_cache = None
+_profile_cache_lock = threading.Lock()
+
+
+def get_profile_cache():
+    """Return this worker's profile cache"""
+    global _profile_cache
+
+    if _profile_cache is not None:
+        return _profile_cache
+
+    with _profile_cache_lock:
+        if _profile_cache is None:
+            profile_cache_settings = get_profile_cache_settings()
+            _profile_cache = ProfileCache(
+                timeout=profile_cache_settings['TIMEOUT'],
+                lock_timeout=profile_cache_settings['LOCK_TIMEOUT'],
+                lock_wait=profile_cache_settings['LOCK_WAIT'],
+                lock_poll=profile_cache_settings['LOCK_POLL'],
+            )
+
+    return _profile_cache
+
+
+def load_profile(user_id, user=None):
+    """A user's profile payload through the cache, or None if there is no such user"""
+    return get_profile_cache().get(user_id, user)
+
+
+def invalidate_profile(user_id):
+    """Make every cached profile of a user stale"""
+    get_profile_cache().invalidate(user_id)
+
+
+def invalidate_profiles(user_ids):
+    """Make the cached profiles of several users stale"""
+    profile_cache = get_profile_cache()
+    for user_id in user_ids:
+        profile_cache.invalidate(user_id)
@@ -0,0 +1,73 @@
+"""User Service Search
+User list filters and free-text search, ranked by trigram similarity on PostgreSQL
+"""
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Greatest
+
+from .places import get_place_directory
+
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'license_number')
+
+
+def search_users(queryset, term):
+    """Users with term in any search field.
+
+    Matching is the same substring test on every database. On PostgreSQL
+    the trigram indexes from migration 0002 serve it, and results come
+    best match first by their highest trigram similarity; elsewhere the
+    queryset's order is left alone.
+    """
+    matches = Q()
+    for field in SEARCH_FIELDS:
+        matches |= Q(**{f'{field}__icontains': term})
+    queryset = queryset.filter(matches)
+
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset
+
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    return queryset.annotate(
+        search_rank=Greatest(*(TrigramSimilarity(field, term) for field in SEARCH_FIELDS)),
+    ).order_by('-search_rank', '-created_at', '-pk')
+
+
+def filter_users(queryset, params):
+    """Apply the user list query parameters to a queryset.
+
+    city and wilaya naming reference places become exact integer lookups,
+    other text falls back to a substring match; is_active and is_verified
+    take true/false; search goes through search_users.
+    """
+    city = params.get('city')
+    wilaya = params.get('wilaya')
+    is_active = params.get('is_active')
+    is_verified = params.get('is_verified')
+    search = params.get('search')
+
+    # Names of reference places become exact integer lookups
+    places = get_place_directory()
+    wilaya_code = places.wilaya_code(wilaya) if wilaya else None
+    if wilaya_code is not None:
+        queryset = queryset.filter(wilaya_ref=wilaya_code)
+    elif wilaya:
+        queryset = queryset.filter(wilaya__icontains=wilaya)
+
+    commune_id = places.commune_id(city, wilaya_code) if city else None
+    if commune_id is not None:
+        queryset = queryset.filter(commune_ref=commune_id)
+    elif city:
+        queryset = queryset.filter(city__icontains=city)
+
+    if is_active is not None:
+        queryset = queryset.filter(is_active=is_active.lower() == 'true')
+
+    if is_verified is not None:
+        queryset = queryset.filter(is_verified=is_verified.lower() == 'true')
+
+    if search:
+        queryset = search_users(queryset, search)
+
+    return queryset
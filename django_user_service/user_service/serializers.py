@@ -5,8 +5,13 @@ Django REST Framework serializers for the Smart Inter-Wilaya Taxi Platform
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
-from .models import User, Vehicle, UserRole, UserVehicle
-from datetime import datetime
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.utils import timezone
+from .models import User, Vehicle, UserRole, UserVehicle, RideGroup, TripRequest
+from .grouping import get_ride_grouping_settings
+from .passwords import check_user_password, hash_password
+from .places import get_place_directory
+from datetime import datetime, timedelta
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -65,16 +70,72 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         validated_data.pop('password_confirm')
         password = validated_data.pop('password')
         
-        user = User.objects.create_user(**validated_data)
-        user.set_password(password)
+        # One hash, in the hashing pool, and one insert; the default role
+        # comes from the create_user_profile signal
+        user = User(username=validated_data['email'], **validated_data)
+        user.password = hash_password(password)
         user.save()
-        
-        # Assign default user role
-        UserRole.objects.create(user=user, role='ROLE_USER')
-        
         return user
 
 
+class UserImportSerializer(serializers.ModelSerializer):
+    """Serializer for one record of a bulk user import
+    
+    Uniqueness is left to UserImporter, which checks the whole file with
+    set-based queries. Without a password the account gets an unusable
+    one until the user resets it. Roles are a list or a string separated
+    by ";" or ",", with or without the ROLE_ prefix; every imported user
+    also gets ROLE_USER.
+    """
+    
+    password = serializers.CharField(
+        write_only=True,
+        required=False,
+        validators=[validate_password],
+    )
+    
+    roles = serializers.JSONField(required=False)
+    
+    class Meta:
+        model = User
+        fields = [
+            'email',
+            'password',
+            'first_name',
+            'last_name',
+            'phone_number',
+            'address',
+            'city',
+            'wilaya',
+            'license_number',
+            'roles',
+        ]
+        extra_kwargs = {
+            'email': {'validators': []},
+            'license_number': {'validators': []},
+            'first_name': {'required': True},
+            'last_name': {'required': True},
+        }
+    
+    def validate_email(self, value):
+        return value.lower()
+    
+    def validate_roles(self, value):
+        """Accept role lists or delimited strings of known roles"""
+        if isinstance(value, str):
+            value = [role.strip() for role in value.replace(',', ';').split(';')]
+        if not isinstance(value, list) or not all(isinstance(role, str) for role in value):
+            raise serializers.ValidationError("Roles must be a list of role names.")
+        
+        known = {choice for choice, _ in UserRole.ROLE_CHOICES}
+        roles = {role.upper() for role in value if role}
+        roles = {role if role.startswith('ROLE_') else f'ROLE_{role}' for role in roles}
+        unknown = sorted(roles - known)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown roles: {', '.join(unknown)}.")
+        return sorted(roles | {'ROLE_USER'})
+
+
 class UserLoginSerializer(serializers.Serializer):
     """Serializer for user login requests"""
     
@@ -95,7 +156,7 @@ class UserLoginSerializer(serializers.Serializer):
         except User.DoesNotExist:
             raise serializers.ValidationError("Invalid email or password.")
         
-        if not user.check_password(password):
+        if not check_user_password(user, password):
             raise serializers.ValidationError("Invalid email or password.")
         
         if not user.is_active:
@@ -109,6 +170,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
     """Serializer for user profile responses"""
     
     full_name = serializers.ReadOnlyField()
+    wilaya_code = serializers.IntegerField(source='wilaya_ref_id', read_only=True)
     roles = serializers.SerializerMethodField()
     vehicles = serializers.SerializerMethodField()
     
@@ -124,6 +186,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'address',
             'city',
             'wilaya',
+            'wilaya_code',
             'license_number',
             'is_active',
             'is_verified',
@@ -147,7 +210,10 @@ class UserProfileSerializer(serializers.ModelSerializer):
     
     def get_vehicles(self, obj):
         """Get user's vehicles"""
-        vehicles = obj.vehicles.filter(is_active=True)
+        if hasattr(obj, 'active_vehicles'):
+            vehicles = obj.active_vehicles
+        else:
+            vehicles = obj.vehicles.filter(is_active=True)
         return [
             {
                 'id': vehicle.id,
@@ -189,6 +255,7 @@ class UserListSerializer(serializers.ModelSerializer):
     """Serializer for user list responses"""
     
     full_name = serializers.ReadOnlyField()
+    wilaya_code = serializers.IntegerField(source='wilaya_ref_id', read_only=True)
     role = serializers.SerializerMethodField()
     vehicle_count = serializers.SerializerMethodField()
     
@@ -200,6 +267,7 @@ class UserListSerializer(serializers.ModelSerializer):
             'full_name',
             'city',
             'wilaya',
+            'wilaya_code',
             'is_active',
             'is_verified',
             'created_at',
@@ -207,18 +275,51 @@ class UserListSerializer(serializers.ModelSerializer):
             'vehicle_count',
         ]
     
+    @staticmethod
+    def annotate_queryset(queryset):
+        """Annotate the role and vehicle count so a page loads in one query"""
+        primary_role = UserRole.objects.filter(user=OuterRef('pk')).order_by('pk').values('role')[:1]
+        return queryset.annotate(
+            primary_role=Subquery(primary_role),
+            active_vehicle_count=Count('vehicles', filter=Q(vehicles__is_active=True)),
+        )
+    
     def get_role(self, obj):
         """Get user's primary role"""
+        if hasattr(obj, 'primary_role'):
+            return obj.primary_role
         user_role = obj.user_roles.first()
         return user_role.role if user_role else None
     
     def get_vehicle_count(self, obj):
         """Get count of active vehicles"""
+        if hasattr(obj, 'active_vehicle_count'):
+            return obj.active_vehicle_count
         return obj.vehicles.filter(is_active=True).count()
 
 
+class DriverSummarySerializer(serializers.ModelSerializer):
+    """Compact driver representation nested in vehicle lists"""
+    
+    full_name = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = User
+        fields = [
+            'id',
+            'email',
+            'full_name',
+            'phone_number',
+            'is_verified',
+        ]
+
+
 class VehicleSerializer(serializers.ModelSerializer):
-    """Serializer for vehicle responses"""
+    """Serializer for vehicle responses
+    
+    Drivers are nested as full profiles unless the context sets
+    compact_drivers, in which case DriverSummarySerializer is used.
+    """
     
     drivers = UserProfileSerializer(many=True, read_only=True)
     full_name = serializers.ReadOnlyField()
@@ -253,6 +354,12 @@ class VehicleSerializer(serializers.ModelSerializer):
             'updated_at',
         ]
     
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.context.get('compact_drivers'):
+            fields['drivers'] = DriverSummarySerializer(many=True, read_only=True)
+        return fields
+    
     def get_is_expired(self, obj):
         """Check if vehicle documents are expired"""
         from django.utils import timezone
@@ -350,7 +457,7 @@ class PasswordChangeSerializer(serializers.Serializer):
     def validate_old_password(self, value):
         """Validate old password"""
         user = self.context['request'].user
-        if not user.check_password(value):
+        if not check_user_password(user, value):
             raise serializers.ValidationError("Old password is incorrect.")
         return value
     
@@ -363,7 +470,7 @@ class PasswordChangeSerializer(serializers.Serializer):
     def save(self):
         """Update user's password"""
         user = self.context['request'].user
-        user.set_password(self.validated_data['new_password'])
+        user.password = hash_password(self.validated_data['new_password'])
         user.save()
         return user
 
@@ -379,6 +486,187 @@ class UserRoleUpdateSerializer(serializers.Serializer):
     ])
 
 
+class DriverHeartbeatSerializer(serializers.Serializer):
+    """Serializer for driver position heartbeats"""
+    
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    vehicle_id = serializers.IntegerField(help_text="Vehicle the driver is driving")
+    available = serializers.BooleanField(default=True)
+
+
+class NearbyDriversSerializer(serializers.Serializer):
+    """Serializer for nearest available driver queries"""
+    
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(min_value=0.1, required=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+    vehicle_type = serializers.ChoiceField(choices=Vehicle.VEHICLE_TYPES, required=False)
+    seats = serializers.IntegerField(min_value=1, required=False)
+    verified = serializers.BooleanField(default=False)
+    insured = serializers.BooleanField(default=False)
+
+
+class TripRequestCreateSerializer(serializers.ModelSerializer):
+    """Serializer for submitting trip requests
+    
+    Origin and destination take a wilaya name or code. Without a latest
+    departure, the request accepts DEFAULT_TOLERANCE_MINUTES of delay.
+    """
+    
+    origin = serializers.CharField(help_text="Origin wilaya name or code")
+    destination = serializers.CharField(help_text="Destination wilaya name or code")
+    latest_departure = serializers.DateTimeField(required=False)
+    
+    class Meta:
+        model = TripRequest
+        fields = [
+            'origin',
+            'destination',
+            'earliest_departure',
+            'latest_departure',
+            'seats',
+        ]
+    
+    def validate_origin(self, value):
+        return self._wilaya_code(value)
+    
+    def validate_destination(self, value):
+        return self._wilaya_code(value)
+    
+    def _wilaya_code(self, value):
+        code = get_place_directory().wilaya_code(value)
+        if code is None:
+            raise serializers.ValidationError("Unknown wilaya.")
+        return code
+    
+    def validate_seats(self, value):
+        max_seats = get_ride_grouping_settings()['MAX_SEATS']
+        if not 1 <= value <= max_seats:
+            raise serializers.ValidationError(f"Seats must be between 1 and {max_seats}.")
+        return value
+    
+    def validate(self, attrs):
+        grouping_settings = get_ride_grouping_settings()
+        if attrs['origin'] == attrs['destination']:
+            raise serializers.ValidationError("Origin and destination must be different wilayas.")
+        
+        earliest = attrs['earliest_departure']
+        if earliest < timezone.now():
+            raise serializers.ValidationError("Earliest departure must be in the future.")
+        
+        latest = attrs.get('latest_departure')
+        if latest is None:
+            latest = earliest + timedelta(minutes=grouping_settings['DEFAULT_TOLERANCE_MINUTES'])
+        if latest < earliest:
+            raise serializers.ValidationError("Latest departure must not be before earliest departure.")
+        if latest - earliest > timedelta(minutes=grouping_settings['MAX_TOLERANCE_MINUTES']):
+            raise serializers.ValidationError(
+                f"Departure window cannot exceed {grouping_settings['MAX_TOLERANCE_MINUTES']} minutes."
+            )
+        attrs['latest_departure'] = latest
+        
+        attrs['origin_id'] = attrs.pop('origin')
+        attrs['destination_id'] = attrs.pop('destination')
+        return attrs
+
+
+class RideGroupSerializer(serializers.ModelSerializer):
+    """Serializer for ride group state
+    
+    Passengers are listed only when the context sets show_passengers
+    (the group's driver and administrators).
+    """
+    
+    origin = serializers.IntegerField(source='origin_id', read_only=True)
+    destination = serializers.IntegerField(source='destination_id', read_only=True)
+    seats_left = serializers.ReadOnlyField()
+    driver = DriverSummarySerializer(read_only=True)
+    vehicle = serializers.SerializerMethodField()
+    passengers = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = RideGroup
+        fields = [
+            'id',
+            'origin',
+            'destination',
+            'window_start',
+            'window_end',
+            'capacity',
+            'seats_taken',
+            'seats_left',
+            'status',
+            'driver',
+            'vehicle',
+            'passengers',
+            'created_at',
+            'updated_at',
+        ]
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get('show_passengers'):
+            fields.pop('passengers')
+        return fields
+    
+    def get_vehicle(self, obj):
+        """Get the group's vehicle"""
+        vehicle = obj.vehicle
+        return {
+            'id': vehicle.id,
+            'license_plate': vehicle.license_plate,
+            'make': vehicle.make,
+            'model': vehicle.model,
+            'color': vehicle.color,
+            'vehicle_type': vehicle.vehicle_type,
+        }
+    
+    def get_passengers(self, obj):
+        """Get the passengers riding in the group"""
+        return [
+            {
+                'trip_request_id': trip.id,
+                'passenger_id': trip.passenger_id,
+                'full_name': trip.passenger.full_name,
+                'phone_number': trip.passenger.phone_number,
+                'seats': trip.seats,
+            }
+            for trip in obj.requests.all()
+            if trip.status == TripRequest.STATUS_GROUPED
+        ]
+
+
+class TripRequestSerializer(serializers.ModelSerializer):
+    """Serializer for trip request responses"""
+    
+    origin = serializers.IntegerField(source='origin_id', read_only=True)
+    destination = serializers.IntegerField(source='destination_id', read_only=True)
+    group = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = TripRequest
+        fields = [
+            'id',
+            'origin',
+            'destination',
+            'earliest_departure',
+            'latest_departure',
+            'seats',
+            'status',
+            'group',
+            'created_at',
+            'updated_at',
+        ]
+    
+    def get_group(self, obj):
+        """Get the group the request rides in, if any"""
+        if obj.status != TripRequest.STATUS_GROUPED or obj.group is None:
+            return None
+        return RideGroupSerializer(obj.group, context=self.context).data
+
+
 class HealthCheckSerializer(serializers.Serializer):
     """Serializer for health check responses"""
     
@@ -387,4 +675,5 @@ class HealthCheckSerializer(serializers.Serializer):
     version = serializers.CharField()
     timestamp = serializers.DateTimeField()
     database = serializers.CharField()
-    cache = serializers.CharField()
\ No newline at end of file
+    cache = serializers.CharField()
+    profile_cache = serializers.DictField(required=False)
\ No newline at end of file
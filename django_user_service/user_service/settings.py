@@ -25,6 +25,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -41,6 +42,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'service_metrics.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -81,7 +83,7 @@ DATABASES = {
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '5432'),
         'OPTIONS': {
-            'charset': 'utf8',
+            'client_encoding': 'UTF8',
         },
     }
 }
@@ -101,6 +103,9 @@ CACHES = {
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
 
+# Custom user model
+AUTH_USER_MODEL = 'user_service.User'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -117,6 +122,34 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# New hashes use the first hasher; the others still verify older hashes,
+# which are rehashed on the next successful login
+PASSWORD_HASHERS = [
+    'user_service.passwords.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+# Password checks run in the hashing pool
+AUTHENTICATION_BACKENDS = [
+    'user_service.passwords.PooledPasswordBackend',
+]
+
+# Password hashing pool and Argon2 cost. WORKERS is per gunicorn worker,
+# and each gunicorn worker runs its own pool: the host runs WEB_CONCURRENCY
+# x WORKERS hashing processes. 0 divides the CPUs between the gunicorn
+# workers, which gunicorn also starts WEB_CONCURRENCY of.
+PASSWORD_HASHING = {
+    'OFFLOAD': os.environ.get('PASSWORD_HASHING_OFFLOAD', 'true').lower() == 'true',
+    'WORKERS': int(os.environ.get('PASSWORD_HASHING_WORKERS', '0')),
+    'SERVER_WORKERS': int(os.environ.get('WEB_CONCURRENCY', '1')),
+    'MAX_PENDING': int(os.environ.get('PASSWORD_HASHING_MAX_PENDING', '16')),
+    'ADMISSION_TIMEOUT': 2.0,
+    'ARGON2_TIME_COST': int(os.environ.get('ARGON2_TIME_COST', '2')),
+    'ARGON2_MEMORY_COST': int(os.environ.get('ARGON2_MEMORY_COST', '19456')),
+    'ARGON2_PARALLELISM': 1,
+}
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -138,6 +171,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'user_service.authentication.GatewayClaimsAuthentication',
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -184,6 +218,96 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Claims forwarded by the API gateway once it has verified the JWT.
+# SECRET must match the gateway's GATEWAY_CLAIMS_SECRET. Reads check a
+# cached is_active flag that saving or deleting the user invalidates, so
+# deactivation takes effect at once; ACTIVE_CACHE_TIMEOUT bounds the rest.
+GATEWAY_CLAIMS = {
+    'SECRET': os.environ.get('GATEWAY_CLAIMS_SECRET', 'gateway-claims-secret-change-in-production'),
+    'SALT': 'gateway.claims',
+    'HEADER': 'HTTP_X_GATEWAY_CLAIMS',
+    'MAX_AGE': int(os.environ.get('GATEWAY_CLAIMS_MAX_AGE', '30')),
+    'ACTIVE_CACHE_TIMEOUT': int(os.environ.get('ACTIVE_USER_CACHE_TIMEOUT', '300')),
+}
+
+# Cached role sets used by the role-based permissions. Role changes
+# invalidate them immediately; TIMEOUT only bounds how long they linger.
+ROLE_CACHE = {
+    'TIMEOUT': int(os.environ.get('ROLE_CACHE_TIMEOUT', '300')),
+}
+
+# Read-through cache of rendered user profiles. Saves to users, their
+# roles and their vehicles invalidate entries; TIMEOUT bounds the rest.
+PROFILE_CACHE = {
+    'TIMEOUT': int(os.environ.get('PROFILE_CACHE_TIMEOUT', '300')),
+    'LOCK_TIMEOUT': 5,
+    'LOCK_WAIT': 1.0,
+    'LOCK_POLL': 0.05,
+}
+
+# Live driver positions and nearest-driver matching
+DRIVER_LOCATIONS = {
+    'CELL_DEGREES': 0.05,
+    'TTL': int(os.environ.get('DRIVER_LOCATION_TTL', '60')),
+    'SYNC_INTERVAL': float(os.environ.get('DRIVER_LOCATION_SYNC_INTERVAL', '1.0')),
+    'DEFAULT_RADIUS_KM': 50,
+    'MAX_RADIUS_KM': 500,
+    'MAX_RESULTS': 50,
+    'VEHICLE_CACHE_SECONDS': 60,
+}
+
+# Bulk user import
+USER_IMPORT = {
+    'CHUNK_SIZE': 1000,
+    'MAX_ROWS': int(os.environ.get('USER_IMPORT_MAX_ROWS', '50000')),
+    'HASH_WORKERS': int(os.environ.get('USER_IMPORT_HASH_WORKERS', '0')),
+    'POOL_THRESHOLD': 200,
+    'USE_COPY': True,
+}
+
+# Streaming table exports
+EXPORTS = {
+    'CHUNK_SIZE': int(os.environ.get('EXPORT_CHUNK_SIZE', '2000')),
+    'FLUSH_BYTES': 64 * 1024,
+}
+
+# Shared-ride grouping of trip requests
+RIDE_GROUPING = {
+    'STRATEGY': os.environ.get('RIDE_GROUPING_STRATEGY', 'greedy'),
+    'WINDOW_MINUTES': 60,
+    'DEFAULT_TOLERANCE_MINUTES': 60,
+    'MAX_TOLERANCE_MINUTES': 360,
+    'MAX_SEATS': 8,
+    'MIN_FILL': float(os.environ.get('RIDE_GROUPING_MIN_FILL', '0.5')),
+    'DISPATCH_LEAD_MINUTES': 120,
+    'DRIVER_TURNAROUND_MINUTES': int(os.environ.get('RIDE_GROUPING_DRIVER_TURNAROUND_MINUTES', '480')),
+    'MAX_DRIVER_CANDIDATES': 20,
+}
+
+# Transactional outbox and its relay to Redis Streams
+OUTBOX = {
+    'STREAM_PREFIX': 'user_service:events',
+    'BATCH_SIZE': int(os.environ.get('OUTBOX_BATCH_SIZE', '500')),
+    'POLL_INTERVAL': float(os.environ.get('OUTBOX_POLL_INTERVAL', '1.0')),
+    'MAX_STREAM_LENGTH': int(os.environ.get('OUTBOX_MAX_STREAM_LENGTH', '100000')),
+    'LEASE_SECONDS': 30,
+    'RETENTION_HOURS': int(os.environ.get('OUTBOX_RETENTION_HOURS', '24')),
+}
+
+# Per-route request metrics, scraped from /metrics. With gunicorn's
+# several workers, METRICS_MULTIPROCESS_DIR lets any worker report all.
+METRICS = {
+    'ENABLED': os.environ.get('METRICS_ENABLED', 'True') == 'True',
+    'SERVER_TIMING': DEBUG,
+    # Scrapes from anywhere else are refused; see service_metrics
+    'ALLOWED_NETWORKS': os.environ.get(
+        'METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7'
+    ).split(','),
+    'TOKEN': os.environ.get('METRICS_TOKEN') or None,
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROCESS_DIR') or None,
+    'FLUSH_INTERVAL': 5.0,
+}
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
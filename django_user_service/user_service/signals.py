@@ -2,15 +2,47 @@
 Django signal handlers for the user service
 """
 
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import User, Vehicle, UserRole, UserVehicle
+from .models import User, Vehicle, UserRole, UserVehicle, Wilaya, Commune, OutboxEvent
+from .authentication import invalidate_active_user
+from .locations import forget_vehicle
+from .outbox import record_event, user_payload, vehicle_payload
+from .permissions import invalidate_roles
+from .profiles import invalidate_profile, invalidate_profiles
+from .places import get_place_directory, reset_place_directory
 import logging
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+# Saves touching only these fields are not news to other services
+UNPUBLISHED_USER_FIELDS = frozenset({'last_login', 'password'})
+
+
+@receiver(pre_save, sender=User)
+def resolve_user_places(sender, instance, raw=False, **kwargs):
+    """Point the user at the wilaya and commune their text names"""
+    if raw:
+        return
+    instance.wilaya_ref_id, instance.commune_ref_id = get_place_directory().resolve(
+        instance.city, instance.wilaya
+    )
+
+
+# Connected ahead of create_user_profile, so user.created precedes the
+# default role's user.role_added in the outbox
+@receiver(post_save, sender=User)
+def record_user_change(sender, instance, created, update_fields=None, **kwargs):
+    """Add user.created or user.updated to the outbox"""
+    if created or not update_fields or not UNPUBLISHED_USER_FIELDS.issuperset(update_fields):
+        record_event(
+            OutboxEvent.AGGREGATE_USER, instance.pk,
+            'user.created' if created else 'user.updated', user_payload(instance),
+        )
+
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -23,24 +55,47 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
     """Handle user profile updates"""
     logger.debug(f"User profile updated: {instance.email}")
+    # After commit, so no request can re-cache the profile from before the change
+    transaction.on_commit(lambda: invalidate_profile(instance.pk))
+    if not update_fields or 'is_active' in update_fields:
+        transaction.on_commit(lambda: invalidate_active_user(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def handle_user_delete(sender, instance, **kwargs):
+    """Drop the cached profile of a deleted user"""
+    user_id = instance.pk
+    record_event(OutboxEvent.AGGREGATE_USER, user_id, 'user.deleted', {'id': user_id})
+    transaction.on_commit(lambda: invalidate_profile(user_id))
+    transaction.on_commit(lambda: invalidate_active_user(user_id))
 
 
 @receiver(post_save, sender=Vehicle)
 def handle_vehicle_update(sender, instance, created, **kwargs):
     """Handle vehicle creation and updates"""
+    record_event(
+        OutboxEvent.AGGREGATE_VEHICLE, instance.pk,
+        'vehicle.created' if created else 'vehicle.updated', vehicle_payload(instance),
+    )
     if created:
         logger.info(f"New vehicle created: {instance.license_plate}")
     else:
         logger.debug(f"Vehicle updated: {instance.license_plate}")
+        forget_vehicle(instance.pk)
+        # Driver profiles list their active vehicles
+        driver_ids = list(UserVehicle.objects.filter(vehicle_id=instance.pk).values_list('user_id', flat=True))
+        transaction.on_commit(lambda: invalidate_profiles(driver_ids))
 
 
 @receiver(post_delete, sender=Vehicle)
 def handle_vehicle_delete(sender, instance, **kwargs):
     """Handle vehicle deletion"""
     logger.info(f"Vehicle deleted: {instance.license_plate}")
+    record_event(OutboxEvent.AGGREGATE_VEHICLE, instance.pk, 'vehicle.deleted', {'id': instance.pk})
+    forget_vehicle(instance.pk)
 
 
 @receiver(post_save, sender=UserRole)
@@ -50,12 +105,25 @@ def handle_user_role_change(sender, instance, created, **kwargs):
         logger.info(f"Role '{instance.role}' assigned to user: {instance.user.email}")
     else:
         logger.info(f"Role '{instance.role}' updated for user: {instance.user.email}")
+    record_event(
+        OutboxEvent.AGGREGATE_USER, instance.user_id, 'user.role_added',
+        {'user_id': instance.user_id, 'role': instance.role},
+    )
+    # After commit, so no request can re-cache the roles from before the change
+    transaction.on_commit(lambda: invalidate_roles(instance.user_id))
+    transaction.on_commit(lambda: invalidate_profile(instance.user_id))
 
 
 @receiver(post_delete, sender=UserRole)
 def handle_user_role_deletion(sender, instance, **kwargs):
     """Handle user role deletion"""
     logger.info(f"Role '{instance.role}' removed from user: {instance.user.email}")
+    record_event(
+        OutboxEvent.AGGREGATE_USER, instance.user_id, 'user.role_removed',
+        {'user_id': instance.user_id, 'role': instance.role},
+    )
+    transaction.on_commit(lambda: invalidate_roles(instance.user_id))
+    transaction.on_commit(lambda: invalidate_profile(instance.user_id))
 
 
 @receiver(post_save, sender=UserVehicle)
@@ -65,9 +133,28 @@ def handle_user_vehicle_association(sender, instance, created, **kwargs):
         logger.info(f"User {instance.user.email} associated with vehicle {instance.vehicle.license_plate}")
     else:
         logger.info(f"User-vehicle association updated: {instance.user.email} - {instance.vehicle.license_plate}")
+    record_event(
+        OutboxEvent.AGGREGATE_VEHICLE, instance.vehicle_id, 'vehicle.driver_added',
+        {'vehicle_id': instance.vehicle_id, 'user_id': instance.user_id},
+    )
+    transaction.on_commit(lambda: invalidate_profile(instance.user_id))
 
 
 @receiver(post_delete, sender=UserVehicle)
 def handle_user_vehicle_dissociation(sender, instance, **kwargs):
     """Handle user-vehicle dissociation"""
-    logger.info(f"User {instance.user.email} dissociated from vehicle {instance.vehicle.license_plate}")
\ No newline at end of file
+    logger.info(f"User {instance.user.email} dissociated from vehicle {instance.vehicle.license_plate}")
+    record_event(
+        OutboxEvent.AGGREGATE_VEHICLE, instance.vehicle_id, 'vehicle.driver_removed',
+        {'vehicle_id': instance.vehicle_id, 'user_id': instance.user_id},
+    )
+    transaction.on_commit(lambda: invalidate_profile(instance.user_id))
+
+
+@receiver(post_save, sender=Wilaya)
+@receiver(post_delete, sender=Wilaya)
+@receiver(post_save, sender=Commune)
+@receiver(post_delete, sender=Commune)
+def handle_place_change(sender, instance, **kwargs):
+    """Reload the place directory after reference data changes"""
+    transaction.on_commit(reset_place_directory)
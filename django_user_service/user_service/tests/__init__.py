@@ -0,0 +1 @@
+"""User service tests"""
@@ -0,0 +1,206 @@
+"""User Service Export Tests
+Exports stream chunk by chunk and select exactly what the list endpoint does
+"""
+
+from unittest import mock
+import csv
+import gzip
+import io
+import json
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from user_service import places
+from user_service.exports import UserExport, stream_export
+from user_service.models import Commune, User, UserRole, Wilaya
+
+
+class CountingExport:
+    """Stands in for an Export, counting the rows pulled from it"""
+
+    headers = ['id', 'name']
+
+    def __init__(self, total):
+        self.total = total
+        self.pulled = 0
+
+    def rows(self):
+        for i in range(self.total):
+            self.pulled += 1
+            yield (i, f'row {i}')
+
+
+class StreamExportTests(SimpleTestCase):
+
+    def test_first_piece_is_sent_before_the_rows_are_all_read(self):
+        export = CountingExport(10000)
+        pieces = stream_export(export, 'csv', flush_bytes=1024)
+
+        first = next(pieces)
+
+        self.assertTrue(first.startswith(b'id,name\r\n'))
+        self.assertLess(export.pulled, 200)
+
+    def test_pieces_stay_near_the_flush_size(self):
+        export = CountingExport(10000)
+
+        pieces = list(stream_export(export, 'jsonl', flush_bytes=4096))
+
+        self.assertGreater(len(pieces), 10)
+        self.assertLess(max(len(piece) for piece in pieces[:-1]), 4096 + 100)
+        lines = b''.join(pieces).decode().splitlines()
+        self.assertEqual(len(lines), 10000)
+        self.assertEqual(json.loads(lines[-1]), {'id': 9999, 'name': 'row 9999'})
+
+    def test_gzip_streams_too(self):
+        export = CountingExport(50000)
+        pieces = stream_export(export, 'csv', compress=True, flush_bytes=1024)
+
+        first = next(pieces)
+        self.assertLess(export.pulled, export.total)
+
+        data = gzip.decompress(first + b''.join(pieces)).decode()
+        self.assertEqual(len(data.splitlines()), 50001)
+
+
+class ExportRowsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.dz') for i in range(7)
+        )
+        UserRole.objects.bulk_create(UserRole(user=user, role='ROLE_USER') for user in cls.users)
+        UserRole.objects.create(user=cls.users[0], role='ROLE_DRIVER')
+
+    def test_rows_are_read_a_chunk_at_a_time(self):
+        export = UserExport(User.objects.all(), chunk_size=3)
+        related = export.related
+        chunks = []
+
+        def record(ids):
+            chunks.append(ids)
+            return related(ids)
+
+        export.related = record
+        rows = export.rows()
+
+        # One query for the rows and one for the first chunk's roles
+        with self.assertNumQueries(2):
+            next(rows)
+        self.assertEqual(len(chunks), 1)
+
+        rest = list(rows)
+        self.assertEqual(len(rest), 6)
+        self.assertEqual([len(ids) for ids in chunks], [3, 3, 1])
+
+    def test_rows_are_pulled_from_the_cursor_as_they_go(self):
+        pulled = []
+
+        def cursor(chunk_size):
+            for user in self.users:
+                pulled.append(user.pk)
+                yield (user.pk,)
+
+        queryset = mock.Mock()
+        queryset.order_by.return_value.values_list.return_value.iterator.side_effect = cursor
+        export = UserExport(queryset, chunk_size=3)
+        export.related = lambda ids: {}
+
+        rows = export.rows()
+        next(rows)
+
+        queryset.order_by.return_value.values_list.return_value.iterator.assert_called_once_with(chunk_size=3)
+        self.assertEqual(len(pulled), 3)
+        self.assertEqual(len(list(rows)), 6)
+
+    def test_rows_are_tuples_in_id_order_with_their_roles(self):
+        rows = list(UserExport(User.objects.order_by('-email'), chunk_size=3).rows())
+
+        self.assertEqual([row[0] for row in rows], sorted(user.pk for user in self.users))
+        self.assertIsInstance(rows[0], tuple)
+        self.assertEqual(rows[0][-1], ['ROLE_DRIVER', 'ROLE_USER'])
+        self.assertEqual(rows[1][-1], ['ROLE_USER'])
+
+
+class ExportFilterTests(TestCase):
+    """The export and the list endpoint go through filter_users alike"""
+
+    @classmethod
+    def setUpTestData(cls):
+        oran = Wilaya.objects.get_or_create(code=31, defaults={'name': 'Oran'})[0]
+        Commune.objects.create(wilaya=oran, name='Bir El Djir')
+        places.reset_place_directory()
+
+        people = [
+            ('amina', 'Amina', 'Haddad', 'Bir El Djir', 'Oran', True, True),
+            ('karim', 'Karim', 'Belkacem', 'Oran', 'Oran', True, False),
+            ('yacine', 'Yacine', 'Haddad', 'Alger', 'Alger', True, True),
+            ('lina', 'Lina', 'Mansouri', 'Bir El Djir', 'Oran', False, False),
+            ('sofiane', 'Sofiane', 'Khelifi', 'Tamanrasset', 'Tamanrasset', True, False),
+            ('nadia', 'Nadia', 'Bensalem', 'Somewhere', 'Unknown', True, True),
+        ]
+        for username, first_name, last_name, city, wilaya, is_active, is_verified in people:
+            User.objects.create(
+                username=username, email=f'{username}@example.dz', first_name=first_name,
+                last_name=last_name, city=city, wilaya=wilaya, is_active=is_active, is_verified=is_verified,
+            )
+        cls.admin = User.objects.create(username='admin', email='admin@example.dz', city='Alger', wilaya='Alger')
+        UserRole.objects.create(user=cls.admin, role='ROLE_ADMIN')
+
+    def setUp(self):
+        cache.clear()
+        places.reset_place_directory()
+        self.addCleanup(places.reset_place_directory)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def exported(self, params, file_format='csv'):
+        response = self.client.get('/api/users/export/', dict(params, file_format=file_format))
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        if file_format == 'csv':
+            return [int(row['id']) for row in csv.DictReader(io.StringIO(content))]
+        return [json.loads(line)['id'] for line in content.splitlines()]
+
+    def listed(self, params):
+        response = self.client.get('/api/users/list/', dict(params, page_size=100))
+        self.assertEqual(response.status_code, 200)
+        return [user['id'] for user in response.data['results']]
+
+    def test_same_users_as_the_list_endpoint(self):
+        for params in (
+            {},
+            {'wilaya': 'Oran'},
+            {'wilaya': 'oran', 'city': 'Bir El Djir'},
+            {'wilaya': 'Unk'},
+            {'city': 'tamanr'},
+            {'is_active': 'false'},
+            {'is_verified': 'true', 'wilaya': 'Alger'},
+            {'search': 'haddad'},
+            {'search': 'haddad', 'is_verified': 'true', 'wilaya': 'Oran'},
+        ):
+            with self.subTest(params=params):
+                listed = self.listed(params)
+                self.assertEqual(self.exported(params), sorted(listed))
+                self.assertEqual(self.exported(params, 'jsonl'), sorted(listed))
+
+    def test_filters_narrow_the_export(self):
+        self.assertEqual(len(self.exported({})), 7)
+        self.assertEqual(len(self.exported({'wilaya': 'Oran'})), 3)
+        self.assertEqual(len(self.exported({'wilaya': 'Oran', 'city': 'Bir El Djir', 'is_active': 'true'})), 1)
+
+    def test_gzipped_export_has_the_same_rows(self):
+        response = self.client.get('/api/users/export/', {'wilaya': 'Oran', 'gzip': 'true'})
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        ids = [int(row['id']) for row in csv.DictReader(io.StringIO(content))]
+        self.assertEqual(ids, self.exported({'wilaya': 'Oran'}))
+
+    def test_unknown_format_is_refused(self):
+        response = self.client.get('/api/users/export/', {'file_format': 'xml'})
+
+        self.assertEqual(response.status_code, 400)
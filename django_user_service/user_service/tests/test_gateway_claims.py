@@ -0,0 +1,110 @@
+"""User Service Gateway Claims Tests
+Only claims signed by the gateway authenticate, and never for an inactive user
+"""
+
+from unittest import mock
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from rest_framework import exceptions
+
+from user_service.authentication import GatewayClaimsAuthentication, GatewayUser
+from user_service.models import User
+
+
+def sign(claims, key=None):
+    return signing.dumps(
+        claims,
+        key=key or settings.GATEWAY_CLAIMS['SECRET'],
+        salt=settings.GATEWAY_CLAIMS['SALT'],
+    )
+
+
+class GatewayClaimsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='amina', email='amina@example.dz', city='Oran', wilaya='Oran')
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.authentication = GatewayClaimsAuthentication()
+
+    def authenticate(self, signed, method='get'):
+        request = getattr(self.factory, method)('/api/users/me/', HTTP_X_GATEWAY_CLAIMS=signed)
+        return self.authentication.authenticate(request)
+
+    def assertRefused(self, signed, code, method='get'):
+        with self.assertRaises(exceptions.AuthenticationFailed) as raised:
+            self.authenticate(signed, method)
+        self.assertEqual(raised.exception.get_codes(), code)
+
+    def test_requests_without_claims_fall_through(self):
+        self.assertIsNone(self.authentication.authenticate(self.factory.get('/api/users/me/')))
+
+    def test_bad_signature_is_refused(self):
+        self.assertRefused(sign({'user_id': self.user.pk}, key='not-the-gateway'), 'claims_invalid')
+        self.assertRefused('garbage', 'claims_invalid')
+
+    def test_expired_claims_are_refused(self):
+        signed_at = time.time() - settings.GATEWAY_CLAIMS['MAX_AGE'] - 1
+        with mock.patch('django.core.signing.time.time', return_value=signed_at):
+            signed = sign({'user_id': self.user.pk})
+
+        self.assertRefused(signed, 'claims_expired')
+
+    def test_claims_without_user_id_are_refused(self):
+        self.assertRefused(sign({'jti': 'abc'}), 'claims_invalid')
+
+    def test_read_gets_a_lazy_user_checked_from_the_cache(self):
+        user, claims = self.authenticate(sign({'user_id': self.user.pk}))
+        self.assertIsInstance(user, GatewayUser)
+        self.assertEqual(claims['user_id'], self.user.pk)
+
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(sign({'user_id': self.user.pk}))
+            self.assertEqual(user.pk, self.user.pk)
+
+    def test_deactivated_user_loses_read_access_at_commit(self):
+        signed = sign({'user_id': self.user.pk})
+        self.authenticate(signed)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+
+        self.assertRefused(signed, 'user_not_found')
+        self.assertRefused(signed, 'user_not_found', method='post')
+
+    def test_deleted_user_loses_read_access_at_commit(self):
+        signed = sign({'user_id': self.user.pk})
+        self.authenticate(signed)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertRefused(signed, 'user_not_found')
+
+    def test_login_does_not_drop_the_cached_check(self):
+        signed = sign({'user_id': self.user.pk})
+        self.authenticate(signed)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['last_login'])
+
+        with self.assertNumQueries(0):
+            self.authenticate(signed)
+
+    def test_deactivated_user_is_refused_by_the_views(self):
+        signed = sign({'user_id': self.user.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        response = self.client.get('/api/users/me/', HTTP_X_GATEWAY_CLAIMS=signed)
+
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,240 @@
+"""User Service Ride Grouping Tests
+Requests share a vehicle only when their seats fit and their departure windows meet
+"""
+
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from user_service.grouping import cancel_trip_request, dispatch_due_requests, submit_trip_request
+from user_service.models import RideGroup, TripRequest, User, UserRole, UserVehicle, Vehicle
+
+ALGER, ORAN = 16, 31
+
+RIDE_GROUPING = {
+    'STRATEGY': 'greedy',
+    'WINDOW_MINUTES': 60,
+    'DEFAULT_TOLERANCE_MINUTES': 60,
+    'MAX_TOLERANCE_MINUTES': 360,
+    'MAX_SEATS': 8,
+    'MIN_FILL': 0.5,
+    'DISPATCH_LEAD_MINUTES': 120,
+    'DRIVER_TURNAROUND_MINUTES': 480,
+    'MAX_DRIVER_CANDIDATES': 20,
+}
+
+
+@override_settings(RIDE_GROUPING=RIDE_GROUPING)
+class GroupingTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.passengers = [
+            User.objects.create(username=f'passenger{i}', email=f'passenger{i}@example.dz', city='Oran', wilaya='Oran')
+            for i in range(6)
+        ]
+        cls.driver = User.objects.create(username='driver', email='driver@example.dz', city='Alger', wilaya='Alger')
+        UserRole.objects.create(user=cls.driver, role='ROLE_DRIVER')
+        cls.vehicle = Vehicle.objects.create(
+            license_plate='00123-116-16', make='Renault', model='Symbol', seats=4,
+            is_verified=True, insurance_expiry=timezone.now() + timedelta(days=365),
+        )
+        UserVehicle.objects.create(user=cls.driver, vehicle=cls.vehicle)
+
+    def setUp(self):
+        # Tomorrow at 08:00, well before dispatch would force anything
+        self.morning = (timezone.now() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+
+    def submit(self, passenger, seats=1, start=0, end=60):
+        """A request departing between start and end minutes after 08:00"""
+        return submit_trip_request(TripRequest(
+            passenger=self.passengers[passenger],
+            origin_id=ALGER,
+            destination_id=ORAN,
+            earliest_departure=self.morning + timedelta(minutes=start),
+            latest_departure=self.morning + timedelta(minutes=end),
+            seats=seats,
+        ))
+
+
+class CapacityTests(GroupingTestCase):
+
+    def test_group_forms_once_enough_seats_wait(self):
+        first = self.submit(0)
+        self.assertEqual(first.status, TripRequest.STATUS_PENDING)
+
+        second = self.submit(1, seats=2)
+
+        first.refresh_from_db()
+        self.assertEqual(second.status, TripRequest.STATUS_GROUPED)
+        self.assertEqual(first.group_id, second.group_id)
+        group = second.group
+        self.assertEqual((group.driver_id, group.vehicle_id), (self.driver.pk, self.vehicle.pk))
+        self.assertEqual((group.capacity, group.seats_taken, group.status), (4, 3, RideGroup.STATUS_OPEN))
+
+    def test_requests_fill_the_vehicle_but_never_overflow_it(self):
+        group = self.submit(0, seats=2).group
+
+        # Two seats left: a party of three waits, a pair fills the vehicle, a single then waits
+        self.assertEqual(self.submit(1, seats=3).status, TripRequest.STATUS_PENDING)
+        self.assertEqual(self.submit(2, seats=2).group_id, group.pk)
+        self.assertEqual(self.submit(3).status, TripRequest.STATUS_PENDING)
+
+        group.refresh_from_db()
+        self.assertEqual((group.seats_taken, group.status), (4, RideGroup.STATUS_FULL))
+        self.assertEqual(sum(group.requests.values_list('seats', flat=True)), 4)
+
+    def test_small_request_waits_without_a_busy_driver(self):
+        self.submit(0, seats=4)
+
+        # The only driver is taken, so nothing can be formed around this one
+        later = self.submit(1, seats=2, start=120, end=180)
+
+        self.assertEqual(later.status, TripRequest.STATUS_PENDING)
+        self.assertEqual(RideGroup.objects.count(), 1)
+
+
+class WindowTests(GroupingTestCase):
+
+    def test_overlapping_request_joins_and_narrows_the_window(self):
+        group = self.submit(0, seats=2, start=0, end=60).group
+
+        joined = self.submit(1, start=30, end=120)
+
+        self.assertEqual(joined.group_id, group.pk)
+        group.refresh_from_db()
+        self.assertEqual(group.window_start, self.morning + timedelta(minutes=30))
+        self.assertEqual(group.window_end, self.morning + timedelta(minutes=60))
+
+    def test_disjoint_request_does_not_join(self):
+        group = self.submit(0, seats=2, start=0, end=60).group
+
+        later = self.submit(1, start=90, end=150)
+
+        self.assertEqual(later.status, TripRequest.STATUS_PENDING)
+        group.refresh_from_db()
+        self.assertEqual(group.seats_taken, 2)
+
+    def test_narrowed_window_turns_away_what_the_original_would_take(self):
+        self.submit(0, seats=2, start=0, end=60)
+        self.submit(1, start=45, end=120)
+
+        # Fits 08:00-09:00 but not the shared 08:45-09:00
+        early = self.submit(2, start=0, end=30)
+
+        self.assertEqual(early.status, TripRequest.STATUS_PENDING)
+
+    def test_other_routes_do_not_mix(self):
+        group = self.submit(0, seats=2).group
+
+        reverse = submit_trip_request(TripRequest(
+            passenger=self.passengers[1], origin_id=ORAN, destination_id=ALGER,
+            earliest_departure=self.morning, latest_departure=self.morning + timedelta(hours=1),
+        ))
+
+        self.assertEqual(reverse.status, TripRequest.STATUS_PENDING)
+        group.refresh_from_db()
+        self.assertEqual(group.seats_taken, 2)
+
+
+class CancellationTests(GroupingTestCase):
+
+    def test_cancelling_frees_seats_for_the_next_request(self):
+        group = self.submit(0, seats=2).group
+        leaving = self.submit(1, seats=2)
+        group.refresh_from_db()
+        self.assertEqual(group.status, RideGroup.STATUS_FULL)
+
+        cancelled = cancel_trip_request(leaving)
+
+        self.assertEqual(cancelled.status, TripRequest.STATUS_CANCELLED)
+        group.refresh_from_db()
+        self.assertEqual((group.seats_taken, group.status), (2, RideGroup.STATUS_OPEN))
+        self.assertEqual(self.submit(2, seats=2).group_id, group.pk)
+
+    def test_cancelling_the_last_member_frees_the_driver(self):
+        only = self.submit(0, seats=2)
+
+        cancel_trip_request(only)
+
+        only.group.refresh_from_db()
+        self.assertEqual((only.group.seats_taken, only.group.status), (0, RideGroup.STATUS_CANCELLED))
+        regrouped = self.submit(1, seats=2)
+        self.assertNotEqual(regrouped.group_id, only.group_id)
+        self.assertEqual(regrouped.group.driver_id, self.driver.pk)
+
+    def test_cancelling_twice_gives_seats_back_once(self):
+        group = self.submit(0, seats=2).group
+        leaving = self.submit(1)
+
+        cancel_trip_request(leaving)
+        cancel_trip_request(leaving)
+
+        group.refresh_from_db()
+        self.assertEqual(group.seats_taken, 2)
+
+    def test_cancelled_request_is_not_grouped_later(self):
+        waiting = self.submit(0)
+        cancel_trip_request(waiting)
+
+        self.assertEqual(self.submit(1).status, TripRequest.STATUS_PENDING)
+        self.assertEqual(RideGroup.objects.count(), 0)
+
+
+class DispatchTests(GroupingTestCase):
+
+    def test_lone_request_is_dispatched_at_the_deadline(self):
+        lone = self.submit(0)
+        self.assertEqual(lone.status, TripRequest.STATUS_PENDING)
+
+        self.assertEqual(dispatch_due_requests(now=self.morning - timedelta(hours=3)), 0)
+        lone.refresh_from_db()
+        self.assertEqual(lone.status, TripRequest.STATUS_PENDING)
+
+        self.assertEqual(dispatch_due_requests(now=self.morning - timedelta(hours=1)), 1)
+        lone.refresh_from_db()
+        self.assertEqual(lone.status, TripRequest.STATUS_GROUPED)
+        self.assertEqual((lone.group.seats_taken, lone.group.capacity), (1, 4))
+
+    def test_due_requests_are_dispatched_together(self):
+        # Two seats are not enough to form a group early
+        with self.settings(RIDE_GROUPING=dict(RIDE_GROUPING, MIN_FILL=0.75)):
+            first = self.submit(0, start=0, end=60)
+            second = self.submit(1, start=30, end=90)
+            later = self.submit(2, start=600, end=660)
+            self.assertEqual(first.status, TripRequest.STATUS_PENDING)
+
+            self.assertEqual(dispatch_due_requests(now=self.morning - timedelta(hours=1)), 1)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        later.refresh_from_db()
+        self.assertIsNotNone(first.group_id)
+        self.assertEqual(first.group_id, second.group_id)
+        self.assertEqual(later.status, TripRequest.STATUS_PENDING)
+
+    def test_due_request_takes_seats_freed_in_an_open_group(self):
+        group = self.submit(0, seats=2).group
+        leaving = self.submit(1, seats=2)
+        waiting = self.submit(2)
+        self.assertEqual(waiting.status, TripRequest.STATUS_PENDING)
+        cancel_trip_request(leaving)
+
+        self.assertEqual(dispatch_due_requests(now=self.morning - timedelta(hours=1)), 1)
+
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.group_id, group.pk)
+        self.assertEqual(RideGroup.objects.count(), 1)
+
+    def test_due_request_does_not_join_a_group_it_cannot_meet(self):
+        group = self.submit(0, seats=2, start=0, end=60).group
+        # Dispatch loads the whole horizon, groups included that this one misses
+        later = self.submit(1, start=90, end=150)
+
+        self.assertEqual(dispatch_due_requests(now=self.morning - timedelta(minutes=30)), 0)
+
+        later.refresh_from_db()
+        self.assertEqual(later.status, TripRequest.STATUS_PENDING)
+        group.refresh_from_db()
+        self.assertEqual(group.seats_taken, 2)
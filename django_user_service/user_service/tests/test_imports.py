@@ -0,0 +1,219 @@
+"""User Service Bulk Import Tests
+Bad rows are reported by line, and a rejected chunk leaves nothing half-written
+"""
+
+from unittest import mock
+import io
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from user_service.imports import ImportFormatError, ImportReport, UserImporter, read_rows
+from user_service.models import OutboxEvent, User, UserRole
+
+HEADER = 'email,first_name,last_name,city,wilaya,license_number,roles\n'
+
+
+def csv_rows(*lines):
+    return read_rows(io.StringIO(HEADER + ''.join(line + '\n' for line in lines)), 'csv')
+
+
+def person(i, **fields):
+    row = {
+        'email': f'user{i}@example.dz', 'first_name': 'Amina', 'last_name': f'Haddad{i}',
+        'city': 'Oran', 'wilaya': 'Oran', 'license_number': '', 'roles': '',
+    }
+    row.update(fields)
+    return ','.join(row[column] for column in HEADER.strip().split(','))
+
+
+class ImportTestCase(TestCase):
+
+    def run_import(self, rows, dry_run=False, **options):
+        options.setdefault('chunk_size', 3)
+        return UserImporter(**options).run(rows, dry_run=dry_run).to_dict()
+
+    def errors_by_row(self, report):
+        return {error['row']: error['errors'] for error in report['errors']}
+
+
+class RowValidationTests(ImportTestCase):
+
+    def test_invalid_rows_are_reported_by_line_and_the_rest_created(self):
+        report = self.run_import(csv_rows(
+            person(1),
+            person(2, email='not-an-email'),
+            person(3, first_name=''),
+            person(4, roles='pilot'),
+            person(5),
+        ))
+
+        self.assertEqual((report['total'], report['created'], report['failed']), (5, 2, 3))
+        errors = self.errors_by_row(report)
+        self.assertEqual(sorted(errors), [3, 4, 5])
+        self.assertIn('email', errors[3])
+        self.assertIn('first_name', errors[4])
+        self.assertIn('roles', errors[5])
+        self.assertEqual(
+            set(User.objects.values_list('email', flat=True)),
+            {'user1@example.dz', 'user5@example.dz'},
+        )
+
+    def test_weak_password_is_rejected(self):
+        rows = [(1, {'email': 'weak@example.dz', 'first_name': 'Amina', 'last_name': 'Haddad', 'password': '123'})]
+
+        report = self.run_import(rows)
+
+        self.assertEqual(report['created'], 0)
+        self.assertIn('password', report['errors'][0]['errors'])
+
+    def test_lines_that_are_not_json_objects(self):
+        stream = io.StringIO('{"email": "user1@example.dz", "first_name": "Amina", "last_name": "Haddad"}\n'
+                             '["user2@example.dz"]\n'
+                             '{not json\n')
+
+        report = self.run_import(read_rows(stream, 'jsonl'))
+
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(sorted(self.errors_by_row(report)), [2, 3])
+
+    def test_csv_without_an_email_column_is_refused(self):
+        with self.assertRaises(ImportFormatError):
+            list(read_rows(io.StringIO('first_name,last_name\nAmina,Haddad\n'), 'csv'))
+
+    def test_row_limit(self):
+        report = self.run_import(csv_rows(*(person(i) for i in range(4))), max_rows=3)
+
+        self.assertEqual((report['total'], report['created']), (3, 3))
+        self.assertIn('limited to 3 rows', report['errors'][0]['errors']['non_field_errors'][0])
+
+    def test_dry_run_writes_nothing(self):
+        report = self.run_import(csv_rows(person(1), person(2, email='bad')), dry_run=True)
+
+        self.assertEqual((report['valid'], report['created'], report['failed']), (1, 0, 1))
+        self.assertFalse(User.objects.exists())
+
+    def test_roles_and_outbox_events_are_written_with_the_users(self):
+        self.run_import(csv_rows(person(1, roles='driver'), person(2)))
+
+        driver = User.objects.get(email='user1@example.dz')
+        self.assertEqual(set(driver.user_roles.values_list('role', flat=True)), {'ROLE_USER', 'ROLE_DRIVER'})
+        self.assertEqual(driver.wilaya_ref_id, 31)
+        self.assertFalse(driver.has_usable_password())
+        self.assertEqual(OutboxEvent.objects.filter(event_type='user.created').count(), 2)
+
+
+class DuplicateTests(ImportTestCase):
+
+    def test_duplicate_emails_within_the_file(self):
+        report = self.run_import(csv_rows(
+            person(1),
+            person(2, email='USER1@example.dz'),
+            person(3),
+        ))
+
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(self.errors_by_row(report), {3: {'email': ['Duplicate of row 2.']}})
+
+    def test_duplicate_license_numbers_within_the_file(self):
+        report = self.run_import(csv_rows(person(1, license_number='L-1'), person(2, license_number='L-1')))
+
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(self.errors_by_row(report), {3: {'license_number': ['Duplicate of row 2.']}})
+
+    def test_emails_and_licenses_already_registered(self):
+        User.objects.create(username='taken', email='user1@example.dz', license_number='L-2')
+
+        report = self.run_import(csv_rows(person(1), person(2, license_number='L-2'), person(3)))
+
+        self.assertEqual(report['created'], 1)
+        errors = self.errors_by_row(report)
+        self.assertEqual(errors[2], {'email': ['A user with this email already exists.']})
+        self.assertEqual(errors[3], {'license_number': ['This license number is already registered.']})
+
+    def test_existing_users_are_checked_in_one_query_per_chunk(self):
+        rows = list(csv_rows(*(person(i) for i in range(6))))
+        importer = UserImporter(chunk_size=3)
+
+        with self.assertNumQueries(2):
+            importer.validate(rows, ImportReport())
+
+
+class ChunkRollbackTests(ImportTestCase):
+
+    def test_row_the_database_rejects_fails_alone(self):
+        # Same username as the second row's email: only the insert can tell
+        User.objects.create(username='user2@example.dz', email='someone@example.dz')
+
+        with self.assertLogs('user_service.imports', 'WARNING'):
+            report = self.run_import(csv_rows(person(1), person(2), person(3), person(4)))
+
+        self.assertEqual((report['created'], report['failed']), (3, 1))
+        self.assertEqual(list(self.errors_by_row(report)), [3])
+        self.assertFalse(User.objects.filter(email='user2@example.dz').exists())
+        self.assertFalse(OutboxEvent.objects.filter(payload__email='user2@example.dz').exists())
+
+    def test_chunk_failing_after_its_users_were_written_is_rolled_back(self):
+        create_events = OutboxEvent.objects.bulk_create
+        calls = []
+
+        def fail_first_chunk(events, *args, **kwargs):
+            calls.append(len(events))
+            if len(calls) == 1:
+                raise IntegrityError('outbox rejected the chunk')
+            return create_events(events, *args, **kwargs)
+
+        with mock.patch.object(OutboxEvent.objects, 'bulk_create', side_effect=fail_first_chunk), \
+                self.assertLogs('user_service.imports', 'WARNING'):
+            report = self.run_import(csv_rows(*(person(i) for i in range(5))))
+
+        # The first chunk's users and roles went away with its transaction,
+        # so its row-by-row retry creates each of them exactly once
+        self.assertEqual((report['created'], report['failed']), (5, 0))
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(UserRole.objects.count(), 5)
+        self.assertEqual(OutboxEvent.objects.filter(event_type='user.created').count(), 5)
+
+    def test_rows_rejected_on_retry_leave_no_roles_or_events(self):
+        create_events = OutboxEvent.objects.bulk_create
+
+        def reject_user1(events, *args, **kwargs):
+            if any(event.payload.get('email') == 'user1@example.dz' for event in events):
+                raise IntegrityError('outbox rejected user1')
+            return create_events(events, *args, **kwargs)
+
+        with mock.patch.object(OutboxEvent.objects, 'bulk_create', side_effect=reject_user1), \
+                self.assertLogs('user_service.imports', 'WARNING'):
+            report = self.run_import(csv_rows(*(person(i) for i in range(3))))
+
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        self.assertFalse(User.objects.filter(email='user1@example.dz').exists())
+        self.assertEqual(UserRole.objects.count(), 2)
+
+
+class ImportViewTests(TestCase):
+
+    def setUp(self):
+        admin = User.objects.create(username='admin', email='admin@example.dz')
+        UserRole.objects.create(user=admin, role='ROLE_ADMIN')
+        self.client = APIClient()
+        self.client.force_authenticate(user=admin)
+
+    def upload(self, name, content):
+        return self.client.post(
+            '/api/users/import/', {'file': SimpleUploadedFile(name, content.encode())}, format='multipart',
+        )
+
+    def test_report_of_a_partly_valid_file(self):
+        response = self.upload('users.csv', HEADER + person(1) + '\n' + person(2, email='bad') + '\n')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 3)
+
+    def test_unreadable_file_is_a_bad_request(self):
+        response = self.upload('users.csv', 'first_name\nAmina\n')
+
+        self.assertEqual(response.status_code, 400)
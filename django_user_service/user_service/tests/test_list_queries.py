@@ -0,0 +1,78 @@
+"""User Service List Query Tests
+The list endpoints run a fixed number of queries, whatever the page size
+"""
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from user_service.models import User, UserRole, UserVehicle, Vehicle
+
+
+class ListQueryBudgetTests(TestCase):
+    """Guards the annotated user list and the prefetched vehicle list against N+1 queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.dz', city='Oran', wilaya='Oran')
+            for i in range(40)
+        )
+        roles = ['ROLE_DRIVER', 'ROLE_USER', 'ROLE_MODERATOR']
+        UserRole.objects.bulk_create(
+            UserRole(user=user, role=roles[(i + j) % len(roles)])
+            for i, user in enumerate(users)
+            for j in range(i % 3)
+        )
+        vehicles = Vehicle.objects.bulk_create(
+            Vehicle(license_plate=f'{i:05d}-116-31', make='Renault', model='Symbol', is_active=i % 3 != 0)
+            for i in range(80)
+        )
+        UserVehicle.objects.bulk_create(
+            UserVehicle(user=user, vehicle=vehicles[(i * 2 + j) % len(vehicles)])
+            for i, user in enumerate(users)
+            for j in range(i % 4)
+        )
+        cls.admin = users[0]
+        UserRole.objects.create(user=cls.admin, role='ROLE_ADMIN')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        # Warm the admin's roles and the place directory, so every page
+        # below only runs its own queries
+        self.client.get('/api/users/list/')
+        self.client.get('/api/vehicles/')
+
+    def assertPageQueries(self, path, params, queries):
+        for page_size in (5, 30):
+            with self.subTest(path=path, page_size=page_size), self.assertNumQueries(queries):
+                response = self.client.get(path, dict(params, page_size=page_size))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_user_list(self):
+        # Count, then the annotated page
+        self.assertPageQueries('/api/users/list/', {}, 2)
+
+    def test_user_list_cursor(self):
+        # One page query, no count
+        self.assertPageQueries('/api/users/list/', {'pagination': 'cursor'}, 1)
+
+    def test_user_list_annotations_match_rows(self):
+        response = self.client.get('/api/users/list/', {'page_size': 40})
+        users = User.objects.in_bulk([row['id'] for row in response.data['results']])
+        for row in response.data['results']:
+            user = users[row['id']]
+            first_role = user.user_roles.first()
+            self.assertEqual(row['role'], first_role.role if first_role else None)
+            self.assertEqual(row['vehicle_count'], user.vehicles.filter(is_active=True).count())
+
+    def test_vehicle_list(self):
+        # Count, page, compact drivers
+        self.assertPageQueries('/api/vehicles/', {}, 3)
+
+    def test_vehicle_list_expanded_drivers(self):
+        # Count, page, drivers with their roles and vehicles
+        self.assertPageQueries('/api/vehicles/', {'expand': 'drivers'}, 5)
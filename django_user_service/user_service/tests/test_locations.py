@@ -0,0 +1,221 @@
+"""User Service Driver Location Tests
+The grid index finds the same drivers as a full scan, touching only nearby cells
+"""
+
+from unittest import mock
+import random
+import time
+
+from django.test import SimpleTestCase
+
+from user_service import locations
+from user_service.locations import DriverLocator, DriverPosition, GridIndex, LocalLocationStore, haversine_km
+
+# Algiers
+LATITUDE, LONGITUDE = 36.7538, 3.0588
+
+
+def brute_force(positions, latitude, longitude, limit, radius_km, accept=lambda position: True):
+    pairs = [
+        (haversine_km(latitude, longitude, position.latitude, position.longitude), position)
+        for position in positions if accept(position)
+    ]
+    pairs = sorted((pair for pair in pairs if pair[0] <= radius_km), key=lambda pair: pair[0])
+    return pairs[:limit]
+
+
+def ids(pairs):
+    return [position.driver_id for _, position in pairs]
+
+
+class GridIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.random = random.Random(2024)
+
+    def scatter(self, index, count, spread):
+        positions = []
+        for driver_id in range(count):
+            position = DriverPosition(
+                driver_id,
+                LATITUDE + self.random.uniform(-spread, spread),
+                LONGITUDE + self.random.uniform(-spread, spread),
+                updated_at=0,
+            )
+            index.upsert(position)
+            positions.append(position)
+        return positions
+
+    def assertSameAsBruteForce(self, index, positions, latitude, longitude, limit, radius_km, accept=None):
+        accept = accept or (lambda position: True)
+        found = index.nearest(latitude, longitude, limit, radius_km, accept)
+        expected = brute_force(positions, latitude, longitude, limit, radius_km, accept)
+
+        self.assertEqual(ids(found), ids(expected))
+        for (distance, _), (expected_distance, _) in zip(found, expected):
+            self.assertAlmostEqual(distance, expected_distance)
+
+    def test_matches_a_full_scan_over_random_positions(self):
+        index = GridIndex(0.05)
+        positions = self.scatter(index, 2000, spread=1.0)
+
+        for _ in range(50):
+            latitude = LATITUDE + self.random.uniform(-1.2, 1.2)
+            longitude = LONGITUDE + self.random.uniform(-1.2, 1.2)
+            limit = self.random.choice((1, 5, 20))
+            radius_km = self.random.choice((2, 10, 50, 200))
+            with self.subTest(latitude=latitude, longitude=longitude, limit=limit, radius_km=radius_km):
+                self.assertSameAsBruteForce(index, positions, latitude, longitude, limit, radius_km)
+
+    def test_matches_a_full_scan_with_a_filter(self):
+        index = GridIndex(0.05)
+        positions = self.scatter(index, 1000, spread=0.5)
+
+        def accept(position):
+            return position.driver_id % 7 == 0
+
+        for _ in range(20):
+            latitude = LATITUDE + self.random.uniform(-0.5, 0.5)
+            longitude = LONGITUDE + self.random.uniform(-0.5, 0.5)
+            with self.subTest(latitude=latitude, longitude=longitude):
+                self.assertSameAsBruteForce(index, positions, latitude, longitude, 10, 40, accept)
+
+    def test_matches_a_full_scan_far_from_the_equator(self):
+        # Cells narrow east-west with latitude, so more rings are needed
+        index = GridIndex(0.05)
+        positions = []
+        for driver_id in range(500):
+            position = DriverPosition(
+                driver_id, 69.6 + self.random.uniform(-0.3, 0.3), 18.9 + self.random.uniform(-0.8, 0.8),
+                updated_at=0,
+            )
+            index.upsert(position)
+            positions.append(position)
+
+        for _ in range(20):
+            latitude, longitude = 69.6 + self.random.uniform(-0.3, 0.3), 18.9 + self.random.uniform(-0.8, 0.8)
+            with self.subTest(latitude=latitude, longitude=longitude):
+                self.assertSameAsBruteForce(index, positions, latitude, longitude, 5, 30)
+
+    def test_radius_excludes_drivers_beyond_it(self):
+        index = GridIndex(0.05)
+        # Roughly 5.6 km and 11.1 km north
+        index.upsert(DriverPosition('near', LATITUDE + 0.05, LONGITUDE))
+        index.upsert(DriverPosition('far', LATITUDE + 0.1, LONGITUDE))
+
+        self.assertEqual(ids(index.nearest(LATITUDE, LONGITUDE, 10, 8, lambda position: True)), ['near'])
+        self.assertEqual(ids(index.nearest(LATITUDE, LONGITUDE, 10, 12, lambda position: True)), ['near', 'far'])
+        self.assertEqual(index.nearest(LATITUDE, LONGITUDE, 10, 5, lambda position: True), [])
+
+    def test_ring_walk_stops_once_nothing_closer_can_remain(self):
+        index = GridIndex(0.05)
+        # A driver in the query's own cell and a crowd in every direction
+        # a few cells out, all inside the radius
+        index.upsert(DriverPosition('here', LATITUDE + 0.001, LONGITUDE + 0.001))
+        crowd = self.scatter(index, 500, spread=0.5)
+        crowd = [
+            position for position in crowd
+            if haversine_km(LATITUDE, LONGITUDE, position.latitude, position.longitude) > 12
+        ]
+
+        with mock.patch.object(locations, 'haversine_km', wraps=haversine_km) as measured:
+            found = index.nearest(LATITUDE, LONGITUDE, 1, 100, lambda position: True)
+
+        self.assertEqual(ids(found), ['here'])
+        # Only the first rings were opened; none of the distant crowd was measured
+        measured_points = {call.args[2:] for call in measured.call_args_list}
+        self.assertFalse(measured_points & {(position.latitude, position.longitude) for position in crowd})
+        self.assertLess(measured.call_count, 50)
+
+    def test_upsert_moves_a_driver_between_cells(self):
+        index = GridIndex(0.05)
+        index.upsert(DriverPosition('moving', LATITUDE, LONGITUDE))
+        index.upsert(DriverPosition('moving', LATITUDE + 1, LONGITUDE + 1))
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(len(index.cells), 1)
+        self.assertEqual(index.nearest(LATITUDE, LONGITUDE, 1, 10, lambda position: True), [])
+
+        index.remove('moving')
+        self.assertEqual((len(index), index.cells), (0, {}))
+
+
+class DriverLocatorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.locator = DriverLocator(LocalLocationStore(), ttl=60)
+        self.now = time.time()
+
+    def driver(self, driver_id, **fields):
+        fields.setdefault('updated_at', self.now)
+        self.locator.heartbeat(DriverPosition(driver_id, LATITUDE + 0.01, LONGITUDE, **fields))
+
+    def nearest(self, **filters):
+        return sorted(ids(self.locator.nearest(LATITUDE, LONGITUDE, **filters)))
+
+    def test_stale_positions_are_not_matched(self):
+        self.driver('fresh')
+        self.driver('stale', updated_at=self.now - 61)
+
+        self.assertEqual(self.nearest(), ['fresh'])
+
+    def test_sync_drops_expired_positions(self):
+        self.driver('fresh')
+        self.driver('stale', updated_at=self.now - 61)
+
+        self.locator.sync(self.now)
+
+        self.assertEqual(set(self.locator.index.positions), {'fresh'})
+
+    def test_unavailable_and_offline_drivers_are_not_matched(self):
+        self.driver('busy', available=False)
+        self.driver('leaving')
+        self.driver('waiting')
+
+        self.locator.go_offline('leaving')
+
+        self.assertEqual(self.nearest(), ['waiting'])
+
+    def test_older_heartbeat_does_not_overwrite_a_newer_one(self):
+        self.driver('driver')
+        self.driver('driver', available=False, updated_at=self.now - 5)
+
+        self.assertEqual(self.nearest(), ['driver'])
+
+    def test_vehicle_type_filter(self):
+        self.driver('car', vehicle_type='car')
+        self.driver('van', vehicle_type='van')
+
+        self.assertEqual(self.nearest(vehicle_type='van'), ['van'])
+
+    def test_seats_filter(self):
+        self.driver('four', seats=4)
+        self.driver('seven', seats=7)
+        self.driver('unknown')
+
+        self.assertEqual(self.nearest(min_seats=5), ['seven'])
+        self.assertEqual(self.nearest(min_seats=4), ['four', 'seven'])
+
+    def test_verified_filter(self):
+        self.driver('verified', is_verified=True)
+        self.driver('unverified')
+
+        self.assertEqual(self.nearest(verified_only=True), ['verified'])
+        self.assertEqual(self.nearest(), ['unverified', 'verified'])
+
+    def test_insured_filter(self):
+        self.driver('insured', insurance_expiry=self.now + 86400)
+        self.driver('lapsed', insurance_expiry=self.now - 86400)
+        self.driver('uninsured')
+
+        self.assertEqual(self.nearest(insured_only=True), ['insured'])
+
+    def test_filters_combine(self):
+        self.driver('match', vehicle_type='van', seats=8, is_verified=True, insurance_expiry=self.now + 86400)
+        self.driver('unverified', vehicle_type='van', seats=8, insurance_expiry=self.now + 86400)
+        self.driver('small', vehicle_type='van', seats=4, is_verified=True, insurance_expiry=self.now + 86400)
+
+        self.assertEqual(
+            self.nearest(vehicle_type='van', min_seats=6, verified_only=True, insured_only=True),
+            ['match'],
+        )
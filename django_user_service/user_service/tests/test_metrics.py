@@ -0,0 +1,71 @@
+"""User Service Metrics Tests
+/metrics answers internal networks and token holders only
+"""
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from service_metrics import RequestMetricsMiddleware, metrics_view, record_upstream
+
+
+class MetricsAccessTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def scrape(self, remote_addr, **headers):
+        return metrics_view(self.factory.get('/metrics', REMOTE_ADDR=remote_addr, **headers))
+
+    def test_internal_networks_may_scrape(self):
+        for remote_addr in ('127.0.0.1', '10.1.2.3', '172.20.0.5', '192.168.1.10', '::1', '::ffff:10.0.0.7'):
+            with self.subTest(remote_addr=remote_addr):
+                self.assertEqual(self.scrape(remote_addr).status_code, 200)
+
+    def test_public_clients_are_refused(self):
+        for remote_addr in ('203.0.113.9', '2001:db8::1', '::ffff:203.0.113.9', ''):
+            with self.subTest(remote_addr=remote_addr):
+                self.assertEqual(self.scrape(remote_addr).status_code, 403)
+
+    def test_forwarded_for_is_not_trusted(self):
+        response = self.scrape('203.0.113.9', HTTP_X_FORWARDED_FOR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS={'ALLOWED_NETWORKS': ['203.0.113.0/24']})
+    def test_allowed_networks_are_configurable(self):
+        self.assertEqual(self.scrape('203.0.113.9').status_code, 200)
+        self.assertEqual(self.scrape('10.0.0.1').status_code, 403)
+
+    @override_settings(METRICS={'TOKEN': 's3cret'})
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.scrape('10.0.0.1').status_code, 401)
+        self.assertEqual(self.scrape('10.0.0.1', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.scrape('10.0.0.1', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.assertEqual(self.scrape('203.0.113.9', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 403)
+
+
+class ServerTimingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def timing(self, view):
+        middleware = RequestMetricsMiddleware(view)
+        response = middleware(self.factory.get('/api/users/', HTTP_X_DEBUG_METRICS='1'))
+        return [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+
+    @override_settings(METRICS={'SERVER_TIMING': True})
+    def test_unprefixed_names(self):
+        self.assertEqual(self.timing(lambda request: HttpResponse('ok')), ['app', 'db', 'cache'])
+
+    @override_settings(METRICS={'SERVER_TIMING': True, 'SERVER_TIMING_PREFIX': 'gateway'})
+    def test_prefixed_names_follow_the_upstreams(self):
+        def view(request):
+            record_upstream(0.01)
+            response = HttpResponse('ok')
+            response['Server-Timing'] = 'app;dur=5.00'
+            return response
+
+        self.assertEqual(
+            self.timing(view),
+            ['app', 'gateway', 'gateway-upstream', 'gateway-db', 'gateway-cache'],
+        )
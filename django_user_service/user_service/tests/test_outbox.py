@@ -0,0 +1,105 @@
+"""User Service Outbox Tests
+One relay per shard: leases are renewed atomically and checked before publishing
+"""
+
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase, TestCase
+
+from user_service.models import OutboxEvent
+from user_service.outbox import (
+    LeaseLost,
+    LocalStreamPublisher,
+    OutboxRelay,
+    RelayLease,
+    record_event,
+)
+
+
+def redis_connection():
+    try:
+        from django_redis import get_redis_connection
+        connection = get_redis_connection('default')
+        connection.ping()
+        return connection
+    except Exception:
+        return None
+
+
+@skipUnless(redis_connection(), 'needs the default cache on a reachable Redis')
+class RedisRelayLeaseTests(SimpleTestCase):
+
+    def setUp(self):
+        self.connection = redis_connection()
+        self.first = RelayLease('test', 30, self.connection)
+        self.second = RelayLease('test', 30, self.connection)
+        self.connection.delete(self.first.redis_key)
+        self.addCleanup(self.connection.delete, self.first.redis_key)
+
+    def test_one_holder_at_a_time(self):
+        self.assertTrue(self.first.acquire())
+        self.assertFalse(self.second.acquire())
+        self.assertTrue(self.first.acquire())
+
+    def test_renewal_extends_the_lease(self):
+        self.assertTrue(self.first.acquire())
+        self.connection.pexpire(self.first.redis_key, 100)
+        self.assertTrue(self.first.acquire())
+        self.assertGreater(self.connection.pttl(self.first.redis_key), 29000)
+
+    def test_expired_lease_cannot_be_renewed_once_taken(self):
+        self.assertTrue(self.first.acquire())
+        self.connection.delete(self.first.redis_key)
+        self.assertTrue(self.second.acquire())
+
+        self.assertFalse(self.first.acquire())
+        self.assertEqual(self.connection.get(self.first.redis_key).decode(), self.second.token)
+
+    def test_release_keeps_another_relays_lease(self):
+        self.assertTrue(self.second.acquire())
+        self.first.release()
+        self.assertFalse(self.first.acquire())
+
+        self.second.release()
+        self.assertTrue(self.first.acquire())
+
+
+class RelayLeaseLossTests(TestCase):
+
+    def setUp(self):
+        self.publisher = LocalStreamPublisher(max_length=1000)
+        self.relay = OutboxRelay(self.publisher, batch_size=10)
+        for aggregate_id in range(3):
+            record_event(OutboxEvent.AGGREGATE_USER, aggregate_id, 'user.updated', {'id': aggregate_id})
+
+    def test_batch_is_not_published_without_the_lease(self):
+        lease = mock.Mock()
+        lease.acquire.return_value = False
+
+        with self.assertRaises(LeaseLost):
+            self.relay.relay_batch(lease)
+
+        self.assertEqual(self.publisher.streams, {})
+        self.assertEqual(OutboxEvent.objects.filter(published_at__isnull=True).count(), 3)
+
+    def test_lease_is_renewed_before_publishing(self):
+        lease = mock.Mock()
+        lease.acquire.return_value = True
+
+        self.assertEqual(self.relay.relay_batch(lease), 3)
+        lease.acquire.assert_called_once_with()
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+
+    def test_run_stands_by_after_losing_the_lease(self):
+        lease = mock.Mock()
+        # Taken for the loop, lost before the publish, then stopped
+        lease.acquire.side_effect = [True, False]
+        stop = mock.Mock()
+        stop.is_set.side_effect = [False, True]
+
+        self.relay.run(stop, poll_interval=0, lease=lease)
+
+        self.assertEqual(self.publisher.streams, {})
+        self.assertEqual(self.relay.errors, 0)
+        stop.wait.assert_called_once_with(0)
+        lease.release.assert_called_once_with()
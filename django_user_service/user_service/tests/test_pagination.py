@@ -0,0 +1,117 @@
+"""User Service Pagination Tests
+Keyset cursors walk (created_at, id) without skipping or repeating rows
+"""
+
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from user_service.models import User
+from user_service.pagination import ListPagination
+
+LIST_URL = '/api/users/list/'
+
+
+class ListPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.dz', city='Oran', wilaya='Oran')
+            for i in range(11)
+        )
+        # Four rows per timestamp, so page boundaries fall inside ties
+        base = timezone.now() - timedelta(days=1)
+        for i, user in enumerate(users):
+            User.objects.filter(pk=user.pk).update(created_at=base + timedelta(minutes=i // 4))
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.expected = list(User.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def fetch(self, url, params=None, queryset=None):
+        paginator = ListPagination()
+        request = Request(self.factory.get(url, params or {}))
+        page = paginator.paginate_queryset(queryset if queryset is not None else User.objects.all(), request)
+        return paginator.get_paginated_response([user.pk for user in page]).data
+
+    def walk(self, url, params, link):
+        pages = []
+        data = self.fetch(url, params)
+        while True:
+            pages.append(data['results'])
+            if not data[link]:
+                return pages, data
+            data = self.fetch(data[link])
+
+    def test_cursor_pages_continue_across_equal_created_at(self):
+        pages, _ = self.walk(LIST_URL, {'pagination': 'cursor', 'page_size': 3}, 'next')
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_previous_links_walk_back_over_the_same_pages(self):
+        forward, last = self.walk(LIST_URL, {'pagination': 'cursor', 'page_size': 3}, 'next')
+
+        backward = [last['results']]
+        data = last
+        while data['previous']:
+            data = self.fetch(data['previous'])
+            backward.append(data['results'])
+
+        self.assertEqual(backward[::-1], forward)
+
+    def test_rows_added_while_paging_are_not_repeated(self):
+        first = self.fetch(LIST_URL, {'pagination': 'cursor', 'page_size': 4})
+        User.objects.create(username='late', email='late@example.dz', city='Oran', wilaya='Oran')
+
+        pages, _ = self.walk(first['next'], None, 'next')
+
+        self.assertEqual(first['results'] + sum(pages, []), self.expected)
+
+    def test_page_numbers_by_default(self):
+        data = self.fetch(LIST_URL, {'page_size': 4, 'page': 2})
+
+        self.assertEqual(data['count'], 11)
+        self.assertEqual(data['results'], self.expected[4:8])
+
+    def test_both_modes_share_one_order(self):
+        numbered = []
+        for page in (1, 2, 3):
+            numbered += self.fetch(LIST_URL, {'page_size': 4, 'page': page})['results']
+        cursored, _ = self.walk(LIST_URL, {'pagination': 'cursor', 'page_size': 4}, 'next')
+
+        self.assertEqual(numbered, sum(cursored, []))
+
+    def test_a_cursor_alone_switches_to_keyset_mode(self):
+        first = self.fetch(LIST_URL, {'pagination': 'cursor', 'page_size': 5})
+        self.assertNotIn('count', first)
+
+        cursor = parse_qs(urlparse(first['next']).query)['cursor'][0]
+        second = self.fetch(LIST_URL, {'cursor': cursor, 'page_size': 5})
+
+        self.assertNotIn('count', second)
+        self.assertEqual(second['results'], self.expected[5:10])
+
+    def test_page_numbers_keep_the_views_ordering(self):
+        queryset = User.objects.order_by('username')
+
+        data = self.fetch(LIST_URL, {'page_size': 3}, queryset)
+
+        self.assertEqual(data['results'], list(queryset.values_list('pk', flat=True)[:3]))
+
+    def test_cursors_ignore_the_views_ordering(self):
+        pages, _ = self.walk(LIST_URL, {'pagination': 'cursor', 'page_size': 6}, 'next')
+        ordered = self.fetch(LIST_URL, {'pagination': 'cursor', 'page_size': 6}, User.objects.order_by('username'))
+
+        self.assertEqual(ordered['results'], pages[0])
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('not-base64!', 'eyJ4IjoxfQ==', 'bm90IGpzb24='):
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                self.fetch(LIST_URL, {'cursor': cursor})
@@ -0,0 +1,33 @@
+"""User Service Password Hashing Tests
+The hashing pools of all gunicorn workers share the host's CPUs
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from user_service import passwords
+
+
+class HashingPoolSizeTests(SimpleTestCase):
+
+    def setUp(self):
+        self.addCleanup(passwords.reset_password_hasher)
+        passwords.reset_password_hasher()
+
+    def pool_workers(self, **options):
+        hashing = dict(passwords.DEFAULT_PASSWORD_HASHING_SETTINGS, **options)
+        with override_settings(PASSWORD_HASHING=hashing), \
+                mock.patch.object(passwords.os, 'cpu_count', return_value=16):
+            passwords.reset_password_hasher()
+            return passwords.get_password_hasher().workers
+
+    def test_default_splits_cpus_between_server_workers(self):
+        self.assertEqual(self.pool_workers(WORKERS=0, SERVER_WORKERS=4), 4)
+        self.assertEqual(self.pool_workers(WORKERS=0, SERVER_WORKERS=1), 16)
+
+    def test_default_keeps_one_process_when_workers_outnumber_cpus(self):
+        self.assertEqual(self.pool_workers(WORKERS=0, SERVER_WORKERS=32), 1)
+
+    def test_explicit_workers_win(self):
+        self.assertEqual(self.pool_workers(WORKERS=3, SERVER_WORKERS=4), 3)
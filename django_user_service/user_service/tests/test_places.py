@@ -0,0 +1,51 @@
+"""User Service Place Directory Tests
+Every process picks up reference data changes through the shared version
+"""
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from user_service import places
+from user_service.models import Commune, Wilaya
+
+
+class PlaceDirectoryVersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.clock = 1000.0
+        patcher = mock.patch.object(places, 'time')
+        patcher.start().monotonic.side_effect = lambda: self.clock
+        self.addCleanup(patcher.stop)
+        self.addCleanup(places.reset_place_directory)
+        places.reset_place_directory()
+        self.oran = Wilaya.objects.get_or_create(code=31, defaults={'name': 'Oran'})[0]
+
+    def test_reloads_when_another_process_bumps_the_version(self):
+        directory = places.get_place_directory()
+        self.assertIsNone(directory.commune_id('Bir El Djir', 31))
+
+        # Another worker commits a new commune and bumps the shared version;
+        # this process's directory is left as it was
+        commune = Commune.objects.create(wilaya=self.oran, name='Bir El Djir')
+        cache.incr(places.PLACES_VERSION_KEY)
+
+        with self.assertNumQueries(0):
+            self.assertIs(places.get_place_directory(), directory)
+
+        self.clock += places.VERSION_CHECK_SECONDS
+        self.assertEqual(places.get_place_directory().commune_id('Bir El Djir', 31), commune.id)
+
+    def test_keeps_the_directory_while_the_version_holds(self):
+        directory = places.get_place_directory()
+        self.clock += places.VERSION_CHECK_SECONDS * 3
+        with self.assertNumQueries(0):
+            self.assertIs(places.get_place_directory(), directory)
+
+    def test_keeps_the_directory_when_the_cache_is_down(self):
+        directory = places.get_place_directory()
+        self.clock += places.VERSION_CHECK_SECONDS
+        with mock.patch.object(places.cache, 'get', side_effect=ConnectionError('down')):
+            self.assertIs(places.get_place_directory(), directory)
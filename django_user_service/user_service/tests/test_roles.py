@@ -0,0 +1,80 @@
+"""User Service Role Cache Tests
+Cached role sets change with the roles, once the change commits
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from user_service.models import User, UserRole
+from user_service.permissions import load_roles, roles_version_key
+
+
+class RoleCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='karim', email='karim@example.dz', city='Oran', wilaya='Oran')
+
+    def setUp(self):
+        cache.clear()
+
+    def version(self):
+        return cache.get(roles_version_key(self.user.pk), 0)
+
+    def test_roles_are_cached(self):
+        self.assertEqual(load_roles(self.user.pk), {'ROLE_USER'})
+        with self.assertNumQueries(0):
+            self.assertEqual(load_roles(self.user.pk), {'ROLE_USER'})
+
+    def test_added_role_is_visible_right_after_commit(self):
+        load_roles(self.user.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            UserRole.objects.create(user=self.user, role='ROLE_DRIVER')
+        # Until the commit, requests keep the roles they could still read
+        self.assertEqual(load_roles(self.user.pk), {'ROLE_USER'})
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(load_roles(self.user.pk), {'ROLE_USER', 'ROLE_DRIVER'})
+
+    def test_removed_role_is_gone_right_after_commit(self):
+        driver = UserRole.objects.create(user=self.user, role='ROLE_DRIVER')
+        cache.clear()
+        self.assertEqual(load_roles(self.user.pk), {'ROLE_USER', 'ROLE_DRIVER'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            driver.delete()
+
+        self.assertEqual(load_roles(self.user.pk), {'ROLE_USER'})
+
+    def test_rolled_back_change_does_not_bump_the_version(self):
+        load_roles(self.user.pk)
+        version = self.version()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    UserRole.objects.create(user=self.user, role='ROLE_ADMIN')
+                    raise RuntimeError('abort')
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.version(), version)
+        with self.assertNumQueries(0):
+            self.assertEqual(load_roles(self.user.pk), {'ROLE_USER'})
+
+    def test_granted_admin_passes_the_permission_check_after_commit(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.assertEqual(client.get('/api/users/export/').status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserRole.objects.create(user=self.user, role='ROLE_ADMIN')
+
+        response = client.get('/api/users/export/')
+        self.assertEqual(response.status_code, 200)
+        b''.join(response.streaming_content)
@@ -0,0 +1,120 @@
+"""User Service Search Tests
+Every database finds the same users; PostgreSQL ranks them by trigram similarity
+"""
+
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from user_service import places
+from user_service.models import User
+from user_service.search import filter_users, search_users
+
+
+class SearchTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        people = [
+            # username, first name, last name, email, license, wilaya, active
+            ('haddad', 'Amina', 'Haddad', 'amina@example.dz', None, 'Oran', True),
+            ('haddadi', 'Karim', 'Haddadi', 'karim@example.dz', None, 'Alger', True),
+            ('benhaddad', 'Yacine', 'Benhaddadoune', 'yacine@example.dz', None, 'Oran', False),
+            ('mail', 'Lina', 'Mansouri', 'lina.haddad@example.dz', None, 'Oran', True),
+            ('license', 'Sofiane', 'Khelifi', 'sofiane@example.dz', 'HAD-DAD-31', 'Oran', True),
+            ('other', 'Nadia', 'Bensalem', 'nadia@example.dz', None, 'Oran', True),
+        ]
+        cls.users = {}
+        for username, first_name, last_name, email, license_number, wilaya, is_active in people:
+            cls.users[username] = User.objects.create(
+                username=username, first_name=first_name, last_name=last_name, email=email,
+                license_number=license_number, city=wilaya, wilaya=wilaya, is_active=is_active,
+            )
+
+    def setUp(self):
+        cache.clear()
+        places.reset_place_directory()
+        self.addCleanup(places.reset_place_directory)
+
+    def usernames(self, queryset):
+        # In the queryset's order, which on PostgreSQL is the search ranking
+        return [user.username for user in queryset]
+
+
+class SubstringSearchTests(SearchTestCase):
+
+    def test_every_search_field_matches_case_insensitively(self):
+        found = search_users(User.objects.all(), 'HADDAD')
+
+        self.assertEqual(sorted(self.usernames(found)), ['benhaddad', 'haddad', 'haddadi', 'mail'])
+        self.assertEqual(self.usernames(search_users(User.objects.all(), 'had-dad')), ['license'])
+        self.assertEqual(self.usernames(search_users(User.objects.all(), 'Nadia')), ['other'])
+
+    def test_no_match(self):
+        self.assertFalse(search_users(User.objects.all(), 'zzz').exists())
+
+    @skipUnless(connection.vendor != 'postgresql', 'PostgreSQL orders by similarity instead')
+    def test_order_is_left_to_the_caller(self):
+        matching = {'haddad', 'haddadi', 'benhaddad', 'mail'}
+        for ordering in ('username', '-username', 'pk'):
+            with self.subTest(ordering=ordering):
+                queryset = User.objects.order_by(ordering)
+                found = search_users(queryset, 'haddad')
+
+                self.assertEqual(self.usernames(found), [name for name in self.usernames(queryset) if name in matching])
+                self.assertNotIn('search_rank', found.query.annotations)
+
+    def test_search_combines_with_the_other_filters(self):
+        found = filter_users(User.objects.all(), {'search': 'haddad', 'wilaya': 'Oran', 'is_active': 'true'})
+
+        self.assertEqual(sorted(self.usernames(found)), ['haddad', 'mail'])
+
+    def test_list_endpoint_searches(self):
+        client = APIClient()
+        client.force_authenticate(user=self.users['other'])
+
+        response = client.get('/api/users/list/', {'search': 'haddad', 'wilaya': 'Oran'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(user['id'] for user in response.data['results']),
+            sorted(self.users[name].pk for name in ('haddad', 'benhaddad', 'mail')),
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL for TrigramSimilarity')
+class TrigramRankingTests(SearchTestCase):
+
+    def test_closest_match_comes_first(self):
+        found = search_users(User.objects.all(), 'haddad')
+
+        self.assertEqual(self.usernames(found)[:2], ['haddad', 'haddadi'])
+        ranks = [user.search_rank for user in found]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertEqual(ranks[0], 1.0)
+
+    def test_rank_is_the_best_of_any_field(self):
+        found = {user.username: user.search_rank for user in search_users(User.objects.all(), 'lina.haddad')}
+
+        # Only the email holds the term, and its similarity is the rank
+        self.assertEqual(list(found), ['mail'])
+        self.assertGreater(found['mail'], 0.4)
+
+    def test_ranking_replaces_the_callers_order(self):
+        found = search_users(User.objects.order_by('-username'), 'haddad')
+
+        self.assertEqual(self.usernames(found)[0], 'haddad')
+
+    def test_page_numbers_keep_the_ranking(self):
+        client = APIClient()
+        client.force_authenticate(user=self.users['other'])
+
+        response = client.get('/api/users/list/', {'search': 'haddad', 'page_size': 2})
+
+        self.assertEqual(
+            [user['id'] for user in response.data['results']],
+            [self.users['haddad'].pk, self.users['haddadi'].pk],
+        )
@@ -22,11 +22,21 @@ from user_service.views import (
     UserListView,
     HealthCheckView,
     UserDetailView,
+    UserImportView,
+    DataExportView,
+    DriverLocationView,
+    NearbyDriversView,
+    TripRequestListView,
+    TripRequestDetailView,
+    RideGroupListView,
+    RideGroupDetailView,
 )
+from user_service.exports import UserExport, VehicleExport
+from service_metrics import metrics_view
 
 # Create router for ViewSets
 router = DefaultRouter()
-router.register(r'vehicles', VehicleViewSet)
+router.register(r'vehicles', VehicleViewSet, basename='vehicle')
 
 urlpatterns = [
     # Admin
@@ -34,6 +44,7 @@ urlpatterns = [
     
     # Health check
     path('api/health/', HealthCheckView.as_view(), name='health'),
+    path('metrics', metrics_view, name='metrics'),
     
     # Authentication endpoints
     path('api/auth/', include([
@@ -47,14 +58,30 @@ urlpatterns = [
     path('api/users/', include([
         path('me/', UserProfileView.as_view(), name='current_user'),
         path('list/', UserListView.as_view(), name='user_list'),
+        path('import/', UserImportView.as_view(), name='user_import'),
+        path('export/', DataExportView.as_view(export_class=UserExport), name='user_export'),
         path('<int:user_id>/', UserDetailView.as_view(), name='user_detail'),
     ])),
     
-    # Vehicle management (nested under users)
-    path('api/users/<int:user_id>/vehicles/', include([
-        '',  # This will be handled by the VehicleViewSet
+    # Driver locations and matching
+    path('api/drivers/', include([
+        path('location/', DriverLocationView.as_view(), name='driver_location'),
+        path('nearby/', NearbyDriversView.as_view(), name='nearby_drivers'),
     ])),
     
+    # Shared rides
+    path('api/trips/', include([
+        path('', TripRequestListView.as_view(), name='trip_request_list'),
+        path('<int:trip_id>/', TripRequestDetailView.as_view(), name='trip_request_detail'),
+    ])),
+    path('api/groups/', include([
+        path('', RideGroupListView.as_view(), name='ride_group_list'),
+        path('<int:group_id>/', RideGroupDetailView.as_view(), name='ride_group_detail'),
+    ])),
+    
+    # Ahead of the router, which would read "export" as a vehicle id
+    path('api/vehicles/export/', DataExportView.as_view(export_class=VehicleExport), name='vehicle_export'),
+    
     # Vehicle standalone endpoints
     path('api/', include(router.urls)),
 ]
@@ -6,19 +6,38 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.pagination import PageNumberPagination
 from django.contrib.auth import get_user_model
 from django.db import connection
-from django.db.models import Q
+from django.db.models import Prefetch
 from django.utils import timezone
 from django.core.cache import cache
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from datetime import datetime, timezone as dt_timezone
+import csv
+import io
 import redis
 import logging
 
-from .models import User, Vehicle, UserRole, UserVehicle
+from .models import User, Vehicle, UserRole, UserVehicle, RideGroup, TripRequest
+from .exports import (
+    CONTENT_TYPES as EXPORT_CONTENT_TYPES,
+    FORMATS as EXPORT_FORMATS,
+    export_filename,
+    get_export_settings,
+    stream_export,
+)
+from .grouping import cancel_trip_request, submit_trip_request
+from .imports import ImportFormatError, UserImporter, guess_format, read_rows
+from .locations import DriverPosition, get_driver_location_settings, get_driver_locator
+from .pagination import ListPagination
+from .permissions import IsAdmin, IsAdminOrReadOnly, IsDriver, IsDriverOrAdmin, has_role
+from .passwords import get_password_hasher
+from .places import get_place_directory
+from .profiles import get_profile_cache, load_profile
+from .search import filter_users
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
@@ -29,6 +48,11 @@ from .serializers import (
     VehicleCreateSerializer,
     UserVehicleAssociationSerializer,
     PasswordChangeSerializer,
+    DriverHeartbeatSerializer,
+    NearbyDriversSerializer,
+    TripRequestCreateSerializer,
+    TripRequestSerializer,
+    RideGroupSerializer,
     HealthCheckSerializer,
 )
 
@@ -38,13 +62,6 @@ logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    """Standard pagination for list endpoints"""
-    page_size = 20
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-
 class HealthCheckView(APIView):
     """Health check endpoint for service monitoring"""
     permission_classes = [AllowAny]
@@ -71,6 +88,8 @@ class HealthCheckView(APIView):
                 'timestamp': timezone.now().isoformat(),
                 'database': db_status,
                 'cache': cache_status,
+                'profile_cache': get_profile_cache().stats(),
+                'password_hashing': get_password_hasher().stats(),
             }
             
             return Response(health_data, status=status.HTTP_200_OK)
@@ -115,8 +134,7 @@ class UserProfileView(APIView):
     
     def get(self, request):
         """Get current user profile"""
-        serializer = UserProfileSerializer(request.user)
-        return Response(serializer.data)
+        return Response(load_profile(request.user.pk, request.user))
     
     def put(self, request):
         """Update current user profile"""
@@ -143,39 +161,12 @@ class UserProfileView(APIView):
 class UserListView(APIView):
     """User listing endpoint with filtering and pagination"""
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = ListPagination
     
     def get(self, request):
         """Get paginated list of users"""
-        # Query parameters for filtering
-        city = request.query_params.get('city')
-        wilaya = request.query_params.get('wilaya')
-        is_active = request.query_params.get('is_active')
-        is_verified = request.query_params.get('is_verified')
-        search = request.query_params.get('search')
-        
-        # Build query
-        queryset = User.objects.all()
-        
-        if city:
-            queryset = queryset.filter(city__icontains=city)
-        
-        if wilaya:
-            queryset = queryset.filter(wilaya__icontains=wilaya)
-        
-        if is_active is not None:
-            queryset = queryset.filter(is_active=is_active.lower() == 'true')
-        
-        if is_verified is not None:
-            queryset = queryset.filter(is_verified=is_verified.lower() == 'true')
-        
-        if search:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(email__icontains=search) |
-                Q(license_number__icontains=search)
-            )
+        queryset = filter_users(User.objects.all(), request.query_params)
+        queryset = UserListSerializer.annotate_queryset(queryset)
         
         # Pagination
         paginator = self.pagination_class()
@@ -185,28 +176,76 @@ class UserListView(APIView):
         return paginator.get_paginated_response(serializer.data)
 
 
+class UserImportView(APIView):
+    """Bulk user import endpoint (admin only)"""
+    permission_classes = [IsAuthenticated, IsAdmin]
+    parser_classes = [MultiPartParser]
+    
+    def post(self, request):
+        """Create users from an uploaded CSV or JSON Lines file"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({
+                'error': 'No file uploaded'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Not ?format=, which DRF reserves for choosing the renderer
+        file_format = request.query_params.get('file_format') or guess_format(upload.name)
+        dry_run = request.query_params.get('dry_run', 'false').lower() == 'true'
+        
+        try:
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            report = UserImporter.from_settings().run(read_rows(stream, file_format), dry_run=dry_run)
+        except (ImportFormatError, UnicodeDecodeError, csv.Error) as e:
+            return Response({
+                'error': 'Import failed',
+                'details': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        logger.info(f"Admin {request.user.email} imported users: {report.created} created, {len(report.errors)} failed")
+        return Response(report.to_dict(), status=status.HTTP_201_CREATED if report.created else status.HTTP_200_OK)
+
+
+class DataExportView(APIView):
+    """Full table export endpoint (admin only), streamed as CSV or JSON Lines"""
+    permission_classes = [IsAuthenticated, IsAdmin]
+    export_class = None
+    
+    def get(self, request):
+        """Stream every row matching the filters"""
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({
+                'error': f"Unsupported format: {file_format}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('gzip', 'false').lower() == 'true'
+        
+        export_settings = get_export_settings()
+        export = self.export_class.from_params(request.query_params, export_settings['CHUNK_SIZE'])
+        response = StreamingHttpResponse(
+            stream_export(export, file_format, compress, export_settings['FLUSH_BYTES']),
+            content_type='application/gzip' if compress else EXPORT_CONTENT_TYPES[file_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(export.name, file_format, compress)}"'
+        logger.info(f"Admin {request.user.email} exported {export.name} as {file_format}")
+        return response
+
+
 class UserDetailView(APIView):
     """User detail endpoint"""
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
     
     def get(self, request, user_id):
         """Get user details by ID"""
-        try:
-            user = User.objects.get(id=user_id)
-            serializer = UserProfileSerializer(user)
-            return Response(serializer.data)
-        except User.DoesNotExist:
+        profile = load_profile(user_id)
+        if profile is None:
             return Response({
                 'error': 'User not found'
             }, status=status.HTTP_404_NOT_FOUND)
+        return Response(profile)
     
     def put(self, request, user_id):
         """Update user (admin only)"""
-        if not request.user.user_roles.filter(role='ROLE_ADMIN').exists():
-            return Response({
-                'error': 'Insufficient permissions'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         try:
             user = User.objects.get(id=user_id)
             serializer = UserUpdateSerializer(user, data=request.data, partial=True)
@@ -231,11 +270,6 @@ class UserDetailView(APIView):
     
     def delete(self, request, user_id):
         """Delete/Deactivate user (admin only)"""
-        if not request.user.user_roles.filter(role='ROLE_ADMIN').exists():
-            return Response({
-                'error': 'Insufficient permissions'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         try:
             user = User.objects.get(id=user_id)
             user.deactivate()
@@ -253,16 +287,45 @@ class VehicleViewSet(viewsets.ModelViewSet):
     """Vehicle management ViewSet"""
     serializer_class = VehicleSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = ListPagination
     
     def get_queryset(self):
         """Get vehicles based on user permissions"""
-        if self.request.user.user_roles.filter(role='ROLE_ADMIN').exists():
+        if has_role(self.request, 'ROLE_ADMIN'):
             # Admin can see all vehicles
-            return Vehicle.objects.all()
+            queryset = Vehicle.objects.all()
         else:
             # Regular users can only see their own vehicles
-            return Vehicle.objects.filter(drivers=self.request.user)
+            queryset = Vehicle.objects.filter(drivers=self.request.user)
+        
+        if self.action not in ('list', 'retrieve', 'update', 'partial_update'):
+            # Nothing nested is rendered
+            return queryset
+        
+        # Full driver profiles also need their roles and active vehicles
+        drivers = User.objects.all()
+        if self.expands_drivers():
+            drivers = drivers.prefetch_related(
+                'user_roles',
+                Prefetch(
+                    'vehicles',
+                    queryset=Vehicle.objects.filter(is_active=True),
+                    to_attr='active_vehicles',
+                ),
+            )
+        return queryset.prefetch_related(Prefetch('drivers', queryset=drivers))
+    
+    def expands_drivers(self):
+        """Lists nest driver summaries unless ?expand=drivers is given"""
+        if self.action != 'list':
+            return True
+        expand = self.request.query_params.get('expand', '')
+        return 'drivers' in expand.split(',')
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['compact_drivers'] = not self.expands_drivers()
+        return context
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action"""
@@ -270,14 +333,9 @@ class VehicleViewSet(viewsets.ModelViewSet):
             return VehicleCreateSerializer
         return VehicleSerializer
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsAdmin])
     def associate_driver(self, request, pk=None):
         """Associate a driver with a vehicle (admin only)"""
-        if not request.user.user_roles.filter(role='ROLE_ADMIN').exists():
-            return Response({
-                'error': 'Insufficient permissions'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         vehicle = self.get_object()
         serializer = UserVehicleAssociationSerializer(data=request.data)
         
@@ -300,14 +358,9 @@ class VehicleViewSet(viewsets.ModelViewSet):
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    @action(detail=True, methods=['delete'])
+    @action(detail=True, methods=['delete'], permission_classes=[IsAuthenticated, IsAdmin])
     def remove_driver(self, request, pk=None):
         """Remove driver association (admin only)"""
-        if not request.user.user_roles.filter(role='ROLE_ADMIN').exists():
-            return Response({
-                'error': 'Insufficient permissions'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         vehicle = self.get_object()
         user_id = request.data.get('user_id')
         
@@ -329,14 +382,9 @@ class VehicleViewSet(viewsets.ModelViewSet):
                 'error': 'Association not found'
             }, status=status.HTTP_404_NOT_FOUND)
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsAdmin])
     def verify(self, request, pk=None):
         """Verify a vehicle (admin only)"""
-        if not request.user.user_roles.filter(role='ROLE_ADMIN').exists():
-            return Response({
-                'error': 'Insufficient permissions'
-            }, status=status.HTTP_403_FORBIDDEN)
-        
         vehicle = self.get_object()
         vehicle.verify()
         logger.info(f"Admin verified vehicle: {vehicle.license_plate}")
@@ -365,6 +413,215 @@ class VehicleViewSet(viewsets.ModelViewSet):
         })
 
 
+class DriverLocationView(APIView):
+    """Driver position heartbeat endpoint"""
+    permission_classes = [IsAuthenticated, IsDriver]
+    
+    def post(self, request):
+        """Record the requesting driver's position"""
+        serializer = DriverHeartbeatSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        locator = get_driver_locator()
+        heartbeat = serializer.validated_data
+        vehicle = locator.vehicle_details(request.user.pk, heartbeat['vehicle_id'])
+        if vehicle is None:
+            return Response({
+                'error': 'Vehicle not found'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        locator.heartbeat(DriverPosition(
+            request.user.pk,
+            heartbeat['latitude'],
+            heartbeat['longitude'],
+            available=heartbeat['available'],
+            **vehicle
+        ))
+        return Response({
+            'message': 'Location updated',
+            'expires_in': locator.ttl,
+        })
+    
+    def delete(self, request):
+        """Take the requesting driver offline"""
+        get_driver_locator().go_offline(request.user.pk)
+        return Response({
+            'message': 'Driver offline'
+        })
+
+
+class NearbyDriversView(APIView):
+    """Nearest available drivers endpoint"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        """Find the nearest available drivers matching the filters"""
+        serializer = NearbyDriversSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        location_settings = get_driver_location_settings()
+        query = serializer.validated_data
+        matches = get_driver_locator().nearest(
+            query['latitude'],
+            query['longitude'],
+            limit=min(query.get('limit', 10), location_settings['MAX_RESULTS']),
+            radius_km=min(query.get('radius_km', location_settings['DEFAULT_RADIUS_KM']), location_settings['MAX_RADIUS_KM']),
+            vehicle_type=query.get('vehicle_type'),
+            min_seats=query.get('seats'),
+            verified_only=query['verified'],
+            insured_only=query['insured'],
+        )
+        
+        return Response({
+            'count': len(matches),
+            'results': [
+                {
+                    'driver_id': position.driver_id,
+                    'vehicle_id': position.vehicle_id,
+                    'vehicle_type': position.vehicle_type,
+                    'seats': position.seats,
+                    'is_verified': position.is_verified,
+                    'latitude': position.latitude,
+                    'longitude': position.longitude,
+                    'distance_km': round(distance, 3),
+                    'updated_at': datetime.fromtimestamp(position.updated_at, tz=dt_timezone.utc).isoformat(),
+                }
+                for distance, position in matches
+            ],
+        })
+
+
+class TripRequestListView(APIView):
+    """Trip request submission and listing endpoint"""
+    permission_classes = [IsAuthenticated]
+    pagination_class = ListPagination
+    
+    def get(self, request):
+        """Get the requesting user's trip requests"""
+        queryset = TripRequest.objects.filter(passenger=request.user).select_related(
+            'group__driver', 'group__vehicle'
+        )
+        
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = TripRequestSerializer(page, many=True)
+        
+        return paginator.get_paginated_response(serializer.data)
+    
+    def post(self, request):
+        """Submit a trip request and place it in a shared ride"""
+        serializer = TripRequestCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        trip = submit_trip_request(TripRequest(passenger=request.user, **serializer.validated_data))
+        logger.info(f"Trip request {trip.pk} submitted by {request.user.email}: {trip.status}")
+        
+        return Response({
+            'message': 'Trip request submitted',
+            'trip_request': TripRequestSerializer(trip).data
+        }, status=status.HTTP_201_CREATED)
+
+
+class TripRequestDetailView(APIView):
+    """Trip request detail and cancellation endpoint"""
+    permission_classes = [IsAuthenticated]
+    
+    def get_trip(self, request, trip_id):
+        queryset = TripRequest.objects.select_related('group__driver', 'group__vehicle')
+        if not has_role(request, 'ROLE_ADMIN'):
+            queryset = queryset.filter(passenger=request.user)
+        return queryset.filter(id=trip_id).first()
+    
+    def get(self, request, trip_id):
+        """Get a trip request and the state of its group"""
+        trip = self.get_trip(request, trip_id)
+        if trip is None:
+            return Response({
+                'error': 'Trip request not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response(TripRequestSerializer(trip).data)
+    
+    def delete(self, request, trip_id):
+        """Cancel a trip request"""
+        trip = self.get_trip(request, trip_id)
+        if trip is None:
+            return Response({
+                'error': 'Trip request not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        cancel_trip_request(trip)
+        logger.info(f"Trip request {trip.pk} cancelled by {request.user.email}")
+        return Response({
+            'message': 'Trip request cancelled'
+        })
+
+
+class RideGroupListView(APIView):
+    """Ride group listing endpoint: drivers see their groups, administrators all"""
+    permission_classes = [IsAuthenticated, IsDriverOrAdmin]
+    pagination_class = ListPagination
+    
+    def get(self, request):
+        """Get paginated list of ride groups"""
+        queryset = RideGroup.objects.select_related('driver', 'vehicle').prefetch_related('requests__passenger')
+        if not has_role(request, 'ROLE_ADMIN'):
+            queryset = queryset.filter(driver=request.user)
+        
+        places = get_place_directory()
+        for param in ('origin', 'destination'):
+            value = request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{f'{param}_id': places.wilaya_code(value)})
+        
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = RideGroupSerializer(page, many=True, context={'show_passengers': True})
+        
+        return paginator.get_paginated_response(serializer.data)
+
+
+class RideGroupDetailView(APIView):
+    """Ride group state endpoint, for its driver, passengers and administrators"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, group_id):
+        """Get the state of a ride group"""
+        group = (
+            RideGroup.objects.select_related('driver', 'vehicle')
+            .prefetch_related('requests__passenger')
+            .filter(id=group_id)
+            .first()
+        )
+        if group is None:
+            return Response({
+                'error': 'Ride group not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        manages = group.driver_id == request.user.pk or has_role(request, 'ROLE_ADMIN')
+        rides = any(
+            trip.passenger_id == request.user.pk and trip.status == TripRequest.STATUS_GROUPED
+            for trip in group.requests.all()
+        )
+        if not (manages or rides):
+            return Response({
+                'error': 'Ride group not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        serializer = RideGroupSerializer(group, context={'show_passengers': manages})
+        return Response(serializer.data)
+
+
 # Error handlers
 def bad_request(request, exception):
     """Handle 400 Bad Request errors"""